@@ -52,12 +52,39 @@ TARGET_FIELDS_WITH_HINTS = {
 }
 
 
+# フィールドごとの詳細説明（プロンプト用）
+FIELD_DESCRIPTIONS: Mapping[str, str] = {
+    "industry": "業界・業種（簡潔なカテゴリ名。例: IT・ソフトウェア、人材サービス）",
+    "contact_person_name": "担当者名（役職や括弧内の情報は除く）",
+    "contact_person_position": "担当者役職",
+    "established_year": "設立年（4桁の西暦、例: 2020）",
+    "capital": "資本金（整数値のみ、単位は除く、例: 10000000）",
+    "employee_count": "従業員数（整数値のみ、例: 100）",
+    "prefecture": "都道府県",
+    "city": "市区町村・番地",
+    "business_description": "事業内容",
+}
+
+
 @dataclass
 class RuleBasedResult:
     values: Dict[str, str]
     metadata: Dict[str, str]
 
 
+@dataclass
+class BatchPromptItem:
+    """複数企業をまとめたプロンプトの1企業分"""
+
+    company: Company
+    missing_fields: Sequence[str]
+    context: Optional["EnrichmentContext"] = None
+
+    @property
+    def key(self) -> str:
+        return str(self.company.id)
+
+
 def detect_missing_fields(company: Company) -> List[str]:
     missing: List[str] = []
     for field in TARGET_FIELDS:
@@ -81,17 +108,7 @@ def build_prompt(company: Company, missing_fields: Sequence[str]) -> str:
     field_labels = TARGET_FIELDS
     
     # フィールドごとの詳細説明
-    field_descriptions = {
-        "industry": "業界・業種（簡潔なカテゴリ名。例: IT・ソフトウェア、人材サービス）",
-        "contact_person_name": "担当者名（役職や括弧内の情報は除く）",
-        "contact_person_position": "担当者役職",
-        "established_year": "設立年（4桁の西暦、例: 2020）",
-        "capital": "資本金（整数値のみ、単位は除く、例: 10000000）",
-        "employee_count": "従業員数（整数値のみ、例: 100）",
-        "prefecture": "都道府県",
-        "city": "市区町村・番地",
-        "business_description": "事業内容",
-    }
+    field_descriptions = FIELD_DESCRIPTIONS
     
     # ターゲットJSONの構築（値は空文字列の例）
     lines = []
@@ -111,29 +128,7 @@ def build_prompt(company: Company, missing_fields: Sequence[str]) -> str:
             field_explanations.append(f"- {field_labels[field]}: {field_descriptions[field]}")
 
     # 企業情報の収集
-    company_info_parts = [f"企業名: {company.name}"]
-    
-    if company.website_url:
-        company_info_parts.append(f"URL: {company.website_url}")
-    
-    location_parts = []
-    if company.prefecture:
-        location_parts.append(company.prefecture)
-    if company.city:
-        location_parts.append(company.city)
-    if location_parts:
-        company_info_parts.append(f"所在地: {' '.join(location_parts)}")
-    
-    # 法人番号や業種があれば追加
-    if hasattr(company, 'corporate_number') and company.corporate_number:
-        company_info_parts.append(f"法人番号: {company.corporate_number}")
-    
-    if hasattr(company, 'industry') and company.industry:
-        company_info_parts.append(f"業種: {company.industry}")
-    
-    # gBizINFOから取得した情報があれば追加（AI補完の精度向上のため）
-    # これはbuild_prompt関数の引数として渡す必要があるが、現在はcompanyオブジェクトから取得できない
-    # そのため、後で改善が必要
+    company_info_parts = _company_info_parts(company)
 
     # プロンプトの構築
     parts = [
@@ -188,6 +183,30 @@ def build_prompt(company: Company, missing_fields: Sequence[str]) -> str:
     return "\n".join(parts) + "\n"
 
 
+def _company_info_parts(company: Company) -> List[str]:
+    company_info_parts = [f"企業名: {company.name}"]
+
+    if company.website_url:
+        company_info_parts.append(f"URL: {company.website_url}")
+
+    location_parts = []
+    if company.prefecture:
+        location_parts.append(company.prefecture)
+    if company.city:
+        location_parts.append(company.city)
+    if location_parts:
+        company_info_parts.append(f"所在地: {' '.join(location_parts)}")
+
+    # 法人番号や業種があれば追加
+    if hasattr(company, 'corporate_number') and company.corporate_number:
+        company_info_parts.append(f"法人番号: {company.corporate_number}")
+
+    if hasattr(company, 'industry') and company.industry:
+        company_info_parts.append(f"業種: {company.industry}")
+
+    return company_info_parts
+
+
 def build_prompt_with_constraints(
     company: Company,
     missing_fields: Sequence[str],
@@ -257,12 +276,119 @@ def build_system_prompt() -> str:
 - 積極的に情報を探し、可能な限り多くのフィールドを埋めてください。"""
 
 
+def build_batch_prompt(items: Sequence[BatchPromptItem]) -> str:
+    """
+    複数企業の補完をまとめて依頼するプロンプトを構築（企業IDをキーにしたJSONで回答させる）
+
+    共通の指示・出力形式は1回だけ記載し、企業ごとに企業情報・抽出項目・制約条件のみを列挙する。
+
+    Args:
+        items: 企業ごとの補完対象（BatchPromptItem）のリスト
+
+    Returns:
+        構築されたプロンプト文字列
+    """
+    parts = [
+        f"以下の{len(items)}社について、それぞれ指定された情報をオンライン検索して抽出してください。",
+        "企業ごとに独立して調査し、別の企業の情報を混同しないでください。",
+    ]
+
+    used_fields: List[str] = []
+    for item in items:
+        labels = [TARGET_FIELDS[f] for f in item.missing_fields if f in TARGET_FIELDS]
+        for field in item.missing_fields:
+            if field in TARGET_FIELDS and field not in used_fields:
+                used_fields.append(field)
+        parts.extend([
+            "",
+            f"【企業ID: {item.key}】",
+            "\n".join(_company_info_parts(item.company)),
+            f"抽出が必要な情報: {', '.join(labels)}",
+        ])
+        if item.context and item.context.has_gbizinfo_constraints():
+            constraints = item.context.get_constraints_for_prompt()
+            if constraints:
+                parts.append("制約条件（これらと一致しない情報は採用しないこと）:")
+                parts.append("\n".join(constraints))
+
+    field_explanations = [
+        f"- {TARGET_FIELDS[field]}: {FIELD_DESCRIPTIONS[field]}"
+        for field in used_fields
+        if field in FIELD_DESCRIPTIONS
+    ]
+    if field_explanations:
+        parts.extend(["", "【各フィールドの説明】", "\n".join(field_explanations)])
+
+    example_key = items[0].key if items else "1"
+    example_fields = [TARGET_FIELDS[f] for f in (items[0].missing_fields if items else []) if f in TARGET_FIELDS]
+    example_body = ", ".join(f'"{label}": ""' for label in example_fields[:2])
+    parts.extend([
+        "",
+        "【重要】",
+        "- 部分的な情報でも構いません。情報が見つからないフィールドのみ空文字列（\"\"）にしてください",
+        "- 推測や不確実な情報は含めないでください",
+        "",
+        "【出力形式】",
+        "企業IDをキー、その企業の抽出結果オブジェクトを値とするJSONのみを返してください。余計な文章や説明は不要です。",
+        "各オブジェクトのキー名は、その企業の「抽出が必要な情報」に出ている日本語ラベルと一致させてください。",
+        '可能であれば各オブジェクトに "official_name_candidates"（正式法人名の候補の配列）と "english_name"（英語名）も含めてください。',
+        f'出力例:\n{{"{example_key}": {{{example_body}, "official_name_candidates": [], "english_name": ""}}}}',
+    ])
+    return "\n".join(parts) + "\n"
+
+
+def build_batch_system_prompt() -> str:
+    """複数企業まとめて補完する場合のシステムプロンプト"""
+    return (
+        build_system_prompt()
+        + "\n- 複数の企業が指定された場合は、企業IDをキーとしたJSONオブジェクトで企業ごとに回答してください。"
+    )
+
+
+def parse_batch_completion(
+    completion: Mapping[str, object],
+    items: Sequence[BatchPromptItem],
+) -> Dict[int, Dict[str, object]]:
+    """
+    企業IDキーのJSON回答を企業ごとに分解・検証する。
+
+    企業ごとに独立して検証し、セクションが欠けている・オブジェクトでない企業は結果に含めない
+    （呼び出し側で単一企業リクエストにフォールバックする）。
+
+    Returns:
+        {company_id: completion_dict}
+    """
+    parsed: Dict[int, Dict[str, object]] = {}
+    if not isinstance(completion, Mapping):
+        return parsed
+
+    for item in items:
+        section = completion.get(item.key)
+        if section is None:
+            # 「企業ID: 123」のようなキーで返る場合のフォールバック
+            for raw_key, raw_value in completion.items():
+                digits = "".join(ch for ch in str(raw_key) if ch.isdigit())
+                if digits == item.key:
+                    section = raw_value
+                    break
+        if not isinstance(section, Mapping):
+            logger.info(
+                "[AI_ENRICH][BATCH_PARSE_MISSING] company_id=%s, section_type=%s",
+                item.key,
+                type(section).__name__,
+            )
+            continue
+        parsed[item.company.id] = {str(label): value for label, value in section.items()}
+    return parsed
+
+
 def apply_rule_based(
     company: Company,
     missing_fields: Sequence[str],
     *,
     corporate_number_api_stats: Optional[Dict[str, int]] = None,
     return_best_match: bool = False,  # Phase 2: best_matchを返すオプション
+    corporate_number_client: Optional[CorporateNumberAPIClient] = None,
 ) -> RuleBasedResult:
     """
     ルールベースの補完を適用する。
@@ -271,6 +397,7 @@ def apply_rule_based(
         company: 企業オブジェクト
         missing_fields: 補完が必要なフィールドのリスト
         corporate_number_api_stats: 法人番号APIの統計情報を追跡する辞書（呼び出し回数、成功数、失敗数）
+        corporate_number_client: 使い回す法人番号APIクライアント（省略時はこの呼び出し用に作成する）
     
     Returns:
         RuleBasedResult: 補完結果
@@ -284,10 +411,15 @@ def apply_rule_based(
             corporate_number_api_stats = {"calls": 0, "success": 0, "failed": 0}
         
         try:
-            client = CorporateNumberAPIClient()
-            corporate_number_api_stats["calls"] += 1
-            
-            candidates = client.search(company.name, prefecture=company.prefecture)
+            client = corporate_number_client or CorporateNumberAPIClient()
+            try:
+                candidates = client.search(company.name, prefecture=company.prefecture)
+            finally:
+                # キャッシュヒットは API 呼び出し回数に含めない
+                if getattr(client, "last_search_cached", False):
+                    corporate_number_api_stats["cache_hits"] = corporate_number_api_stats.get("cache_hits", 0) + 1
+                else:
+                    corporate_number_api_stats["calls"] += 1
             
             if candidates:
                 # 最適な候補を選択
@@ -299,6 +431,8 @@ def apply_rule_based(
                     # 実際の更新は別のプロセスで行うが、補完情報として通知に含める
                     corporate_number = best_match["corporate_number"]
                     metadata["corporate_number_found"] = corporate_number
+                    if best_match.get("match_confidence") is not None:
+                        metadata["gbizinfo_match_confidence"] = best_match["match_confidence"]
                     # Phase 2: best_matchの正式法人名もmetadataに保存
                     if best_match.get("name"):
                         metadata["gbizinfo_official_name"] = best_match["name"]
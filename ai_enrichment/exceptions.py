@@ -1,5 +1,7 @@
 from typing import Optional
 
+from saleslist_backend.circuit_breaker import CircuitOpenError
+
 
 class PowerplexyError(Exception):
     """Base class for PowerPlexy related errors."""
@@ -13,6 +15,10 @@ class PowerplexyRateLimitError(PowerplexyError):
     """Raised when the upstream API indicates a rate limit issue."""
 
 
+class PowerplexyCircuitOpenError(CircuitOpenError, PowerplexyRateLimitError):
+    """Raised without calling the API while the PowerPlexy circuit breaker is open."""
+
+
 class PowerplexyResponseError(PowerplexyError):
     """Raised when the upstream API returns an unexpected response."""
 
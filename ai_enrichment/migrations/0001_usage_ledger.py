@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsageMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=7, unique=True, verbose_name='対象月')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='呼び出し回数')),
+                ('cost', models.FloatField(default=0.0, verbose_name='推定コスト（USD）')),
+                ('prompt_tokens', models.BigIntegerField(default=0, verbose_name='入力トークン数')),
+                ('completion_tokens', models.BigIntegerField(default=0, verbose_name='出力トークン数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'AI月次使用量',
+                'verbose_name_plural': 'AI月次使用量',
+                'db_table': 'ai_usage_month',
+            },
+        ),
+        migrations.CreateModel(
+            name='AIUsageReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reservation_id', models.CharField(max_length=32, unique=True, verbose_name='予約ID')),
+                ('period', models.CharField(max_length=7, verbose_name='対象月')),
+                ('amount', models.FloatField(verbose_name='予約コスト（USD）')),
+                ('expires_at', models.DateTimeField(verbose_name='有効期限')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+            ],
+            options={
+                'verbose_name': 'AI使用量予約',
+                'verbose_name_plural': 'AI使用量予約',
+                'db_table': 'ai_usage_reservation',
+                'indexes': [models.Index(fields=['period', 'expires_at'], name='ai_usage_re_period_0042d0_idx')],
+            },
+        ),
+    ]
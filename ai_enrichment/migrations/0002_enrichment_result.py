@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_enrichment', '0001_usage_ledger'),
+        ('companies', '0011_corporate_number_search_cache'),
+        ('data_collection', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIEnrichmentResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('success', '成功'), ('no_data', '取得なし'), ('skipped', 'スキップ'), ('error', 'エラー'), ('attempted', '試行')], max_length=16, verbose_name='結果')),
+                ('fields', models.JSONField(blank=True, default=list, verbose_name='補完フィールド')),
+                ('field_count', models.PositiveSmallIntegerField(default=0, verbose_name='補完フィールド数')),
+                ('reason', models.TextField(blank=True, verbose_name='理由')),
+                ('no_data_reason_code', models.CharField(blank=True, max_length=64, verbose_name='取得なし理由コード')),
+                ('no_data_reason_message', models.TextField(blank=True, verbose_name='取得なし理由')),
+                ('error', models.TextField(blank=True, verbose_name='エラー')),
+                ('prompt_tokens', models.PositiveIntegerField(default=0, verbose_name='入力トークン数')),
+                ('completion_tokens', models.PositiveIntegerField(default=0, verbose_name='出力トークン数')),
+                ('cost_usd', models.FloatField(default=0.0, verbose_name='推定コスト（USD）')),
+                ('batched', models.BooleanField(default=False, verbose_name='複数企業まとめて問い合わせ')),
+                ('duration_ms', models.PositiveIntegerField(default=0, verbose_name='処理時間（ミリ秒）')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_enrichment_results', to='companies.company', verbose_name='企業')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_enrichment_results', to='data_collection.datacollectionrun', verbose_name='実行')),
+            ],
+            options={
+                'verbose_name': 'AI補完結果',
+                'verbose_name_plural': 'AI補完結果',
+                'db_table': 'ai_enrichment_result',
+                'indexes': [models.Index(fields=['run', 'status'], name='ai_enrichme_run_id_1f908a_idx'), models.Index(fields=['company', '-created_at'], name='ai_enrichme_company_1708af_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:28
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_enrichment', '0002_enrichment_result'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlackNotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(default='default', max_length=64, verbose_name='チャンネル')),
+                ('level', models.CharField(default='info', max_length=16, verbose_name='通知レベル')),
+                ('message', models.TextField(verbose_name='メッセージ')),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Slack ペイロード')),
+                ('status', models.CharField(choices=[('pending', '送信待ち'), ('sending', '送信中'), ('sent', '送信済み'), ('failed', '送信失敗')], default='pending', max_length=16, verbose_name='状態')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='送信試行回数')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後のエラー')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='送信開始日時')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='送信日時')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+            ],
+            options={
+                'verbose_name': 'Slack通知キュー',
+                'verbose_name_plural': 'Slack通知キュー',
+                'db_table': 'slack_notification_outbox',
+                'indexes': [models.Index(fields=['status', 'channel', 'created_at'], name='slack_notif_status_83352e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,200 @@
+"""
+AI補完のモデル振り分け（コストを考慮したモデル選択）
+
+AI_ENRICH_MODEL_ROUTES の表を上から順に評価し、最初に条件を満たしたルールのモデルで問い合わせる。
+安価なモデルの回答の信頼度（confidence.py）が低い場合は escalate_to のモデルで問い合わせ直す。
+
+ルールのキー:
+    name: ルール名（run の集計に使う）
+    model: 使用するモデル（省略時は POWERPLEXY_MODEL）
+    fields: 不足フィールドがすべてこの中に含まれる場合のみ適用
+    max_missing_fields: 不足フィールド数がこれ以下の場合のみ適用
+    max_remaining_budget_ratio: 今月の残り予算の割合がこれ以下の場合のみ適用
+    skip_if_failed: 前回の補完が失敗・再探索待ちの企業には適用しない
+    escalate_to: 回答の信頼度が低い場合に問い合わせ直すモデル
+"""
+from __future__ import annotations
+
+import copy
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence
+
+from django.conf import settings
+
+from companies.models import Company
+
+from .confidence import calculate_confidence
+from .enrich_rules import TARGET_FIELDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ESCALATION_CONFIDENCE = 0.6
+
+# calculate_confidence のキー名（内部フィールド名と異なるもの）
+_CONFIDENCE_KEYS: Mapping[str, str] = {
+    "contact_person_name": "person_name",
+    "contact_person_position": "role",
+}
+# 信頼度が計算されないフィールドの既定値（tasks の候補登録と同じ）
+_DEFAULT_AI_CONFIDENCE = 0.85
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    name: str
+    model: Optional[str] = None
+    fields: FrozenSet[str] = frozenset()
+    max_missing_fields: Optional[int] = None
+    max_remaining_budget_ratio: Optional[float] = None
+    skip_if_failed: bool = False
+    escalate_to: Optional[str] = None
+
+    @classmethod
+    def from_config(cls, raw: Mapping[str, Any]) -> "ModelRoute":
+        return cls(
+            name=str(raw.get("name") or raw.get("model") or "default"),
+            model=raw.get("model") or None,
+            fields=frozenset(raw.get("fields") or ()),
+            max_missing_fields=raw.get("max_missing_fields"),
+            max_remaining_budget_ratio=raw.get("max_remaining_budget_ratio"),
+            skip_if_failed=bool(raw.get("skip_if_failed", False)),
+            escalate_to=raw.get("escalate_to") or None,
+        )
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str
+    model: str
+    escalate_to: Optional[str] = None
+
+
+def _has_failure_history(company: Company) -> bool:
+    if getattr(company, "ai_last_enrichment_status", "") == "failed":
+        return True
+    return (getattr(company, "next_retry_strategy", None) or "none") != "none"
+
+
+class ModelRouter:
+    """不足フィールド・失敗履歴・残り予算からモデルを選ぶ"""
+
+    def __init__(
+        self,
+        routes: Iterable[Mapping[str, Any]],
+        *,
+        default_model: str,
+        usage_tracker=None,
+        escalation_confidence: Optional[float] = None,
+    ) -> None:
+        self.routes: List[ModelRoute] = [ModelRoute.from_config(route) for route in routes]
+        self.default_model = default_model
+        self.usage_tracker = usage_tracker
+        self.escalation_confidence = (
+            escalation_confidence
+            if escalation_confidence is not None
+            else getattr(settings, "AI_ENRICH_ESCALATION_CONFIDENCE", DEFAULT_ESCALATION_CONFIDENCE)
+        )
+
+    @classmethod
+    def from_settings(cls, *, default_model: str, usage_tracker=None) -> "ModelRouter":
+        routes = getattr(settings, "AI_ENRICH_MODEL_ROUTES", []) if getattr(settings, "AI_ENRICH_MODEL_ROUTING_ENABLED", True) else []
+        return cls(routes, default_model=default_model, usage_tracker=usage_tracker)
+
+    def _remaining_budget_ratio(self) -> Optional[float]:
+        if self.usage_tracker is None:
+            return None
+        limit = float(self.usage_tracker.cost_limit)
+        if limit <= 0:
+            return None
+        return float(self.usage_tracker.remaining().cost) / limit
+
+    def select(self, company: Company, missing_fields: Sequence[str]) -> RouteDecision:
+        missing = set(missing_fields)
+        failed_before = _has_failure_history(company)
+        budget_ratio: Optional[float] = None
+        budget_checked = False
+        for route in self.routes:
+            if route.fields and not missing <= route.fields:
+                continue
+            if route.max_missing_fields is not None and len(missing) > route.max_missing_fields:
+                continue
+            if route.skip_if_failed and failed_before:
+                continue
+            if route.max_remaining_budget_ratio is not None:
+                if not budget_checked:
+                    budget_ratio = self._remaining_budget_ratio()
+                    budget_checked = True
+                if budget_ratio is None or budget_ratio > route.max_remaining_budget_ratio:
+                    continue
+            model = route.model or self.default_model
+            escalate_to = route.escalate_to if route.escalate_to != model else None
+            return RouteDecision(route=route.name, model=model, escalate_to=escalate_to)
+        return RouteDecision(route="default", model=self.default_model)
+
+    def should_escalate(
+        self,
+        decision: RouteDecision,
+        completion: Optional[Mapping[str, Any]],
+        missing_fields: Sequence[str],
+        context=None,
+    ) -> bool:
+        """回答が空、または要求フィールドの信頼度が閾値未満の場合に True"""
+        if not decision.escalate_to:
+            return False
+        found = {
+            field: completion.get(TARGET_FIELDS[field]) or completion.get(field)
+            for field in missing_fields
+            if field in TARGET_FIELDS and completion
+        }
+        found = {field: value for field, value in found.items() if value}
+        if not found:
+            return True
+        if context is None:
+            return False
+        # 実際のコンテキストを変更しないよう複製して信頼度を計算する
+        probe = copy.deepcopy(context)
+        probe.add_ai_findings({**completion, **found})
+        confidence = calculate_confidence(probe)
+        lowest = min(
+            float(confidence.get(_CONFIDENCE_KEYS.get(field, field), _DEFAULT_AI_CONFIDENCE))
+            for field in found
+        )
+        return lowest < self.escalation_confidence
+
+
+class ModelUsageStats:
+    """モデルごとの呼び出し回数・コスト・補完できたフィールド数（run の集計用）"""
+
+    def __init__(self, initial: Optional[Mapping[str, Mapping[str, Any]]] = None) -> None:
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        for model, values in (initial or {}).items():
+            self._entry(model).update({key: values.get(key, 0) for key in ("calls", "cost_usd", "filled_fields", "escalations")})
+
+    def _entry(self, model: str) -> Dict[str, Any]:
+        return self._stats.setdefault(model, {"calls": 0, "cost_usd": 0.0, "filled_fields": 0, "escalations": 0})
+
+    def add_call(self, model: str, cost: Optional[float], *, calls: int = 1) -> None:
+        entry = self._entry(model)
+        entry["calls"] += calls
+        entry["cost_usd"] += float(cost or 0.0)
+
+    def add_filled(self, model: str, count: int) -> None:
+        self._entry(model)["filled_fields"] += count
+
+    def add_escalation(self, model: str) -> None:
+        self._entry(model)["escalations"] += 1
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {model: dict(values) for model, values in self._stats.items()}
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        result: Dict[str, Dict[str, Any]] = {}
+        for model, values in self._stats.items():
+            filled = values["filled_fields"]
+            result[model] = {
+                **values,
+                "cost_usd": round(values["cost_usd"], 6),
+                "cost_per_filled_field": round(values["cost_usd"] / filled, 6) if filled else None,
+            }
+        return result
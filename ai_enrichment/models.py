@@ -0,0 +1,133 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class AIUsageMonth(models.Model):
+    """PowerPlexy の月次使用量（Redis を使わない環境での集計先。行ロックで更新する）"""
+
+    period = models.CharField(max_length=7, unique=True, verbose_name="対象月")  # 例: "2026-10"
+    calls = models.PositiveIntegerField(default=0, verbose_name="呼び出し回数")
+    cost = models.FloatField(default=0.0, verbose_name="推定コスト（USD）")
+    prompt_tokens = models.BigIntegerField(default=0, verbose_name="入力トークン数")
+    completion_tokens = models.BigIntegerField(default=0, verbose_name="出力トークン数")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        db_table = "ai_usage_month"
+        verbose_name = "AI月次使用量"
+        verbose_name_plural = "AI月次使用量"
+
+    def __str__(self):
+        return f"{self.period}: {self.calls} calls / ${self.cost:.2f}"
+
+
+class AIUsageReservation(models.Model):
+    """API呼び出し前に確保したコスト枠（commit/release で削除、期限切れは自動で無効）"""
+
+    reservation_id = models.CharField(max_length=32, unique=True, verbose_name="予約ID")
+    period = models.CharField(max_length=7, verbose_name="対象月")
+    amount = models.FloatField(verbose_name="予約コスト（USD）")
+    expires_at = models.DateTimeField(verbose_name="有効期限")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+
+    class Meta:
+        db_table = "ai_usage_reservation"
+        verbose_name = "AI使用量予約"
+        verbose_name_plural = "AI使用量予約"
+        indexes = [
+            models.Index(fields=["period", "expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.reservation_id} ({self.period}: ${self.amount:.4f})"
+
+
+class AIEnrichmentResult(models.Model):
+    """AI補完の企業ごとの結果（run_ai_enrich の実行中に bulk_create で記録）"""
+
+    class Status(models.TextChoices):
+        SUCCESS = "success", "成功"
+        NO_DATA = "no_data", "取得なし"
+        SKIPPED = "skipped", "スキップ"
+        ERROR = "error", "エラー"
+        ATTEMPTED = "attempted", "試行"
+
+    run = models.ForeignKey(
+        "data_collection.DataCollectionRun",
+        on_delete=models.CASCADE,
+        related_name="ai_enrichment_results",
+        verbose_name="実行",
+    )
+    company = models.ForeignKey(
+        "companies.Company",
+        on_delete=models.CASCADE,
+        related_name="ai_enrichment_results",
+        verbose_name="企業",
+    )
+    status = models.CharField(max_length=16, choices=Status.choices, verbose_name="結果")
+    fields = models.JSONField(default=list, blank=True, verbose_name="補完フィールド")  # [{"field", "value", "source"}]
+    field_count = models.PositiveSmallIntegerField(default=0, verbose_name="補完フィールド数")
+    reason = models.TextField(blank=True, verbose_name="理由")
+    no_data_reason_code = models.CharField(max_length=64, blank=True, verbose_name="取得なし理由コード")
+    no_data_reason_message = models.TextField(blank=True, verbose_name="取得なし理由")
+    error = models.TextField(blank=True, verbose_name="エラー")
+    prompt_tokens = models.PositiveIntegerField(default=0, verbose_name="入力トークン数")
+    completion_tokens = models.PositiveIntegerField(default=0, verbose_name="出力トークン数")
+    cost_usd = models.FloatField(default=0.0, verbose_name="推定コスト（USD）")
+    batched = models.BooleanField(default=False, verbose_name="複数企業まとめて問い合わせ")
+    duration_ms = models.PositiveIntegerField(default=0, verbose_name="処理時間（ミリ秒）")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+
+    class Meta:
+        db_table = "ai_enrichment_result"
+        verbose_name = "AI補完結果"
+        verbose_name_plural = "AI補完結果"
+        indexes = [
+            models.Index(fields=["run", "status"]),
+            models.Index(fields=["company", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id}: {self.status}"
+
+
+class SlackNotificationOutbox(models.Model):
+    """
+    Slack 通知の送信待ちキュー。
+
+    ワーカーは行を追加するだけで Webhook を待たない。送信は dispatch_slack_notifications が
+    チャンネル・時間枠ごとにまとめて行う。
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "送信待ち"
+        SENDING = "sending", "送信中"
+        SENT = "sent", "送信済み"
+        FAILED = "failed", "送信失敗"
+
+    channel = models.CharField(max_length=64, default="default", verbose_name="チャンネル")
+    level = models.CharField(max_length=16, default="info", verbose_name="通知レベル")
+    message = models.TextField(verbose_name="メッセージ")
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="Slack ペイロード")
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name="状態",
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="送信試行回数")
+    last_error = models.TextField(blank=True, verbose_name="最後のエラー")
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name="送信開始日時")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="送信日時")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+
+    class Meta:
+        db_table = "slack_notification_outbox"
+        verbose_name = "Slack通知キュー"
+        verbose_name_plural = "Slack通知キュー"
+        indexes = [
+            models.Index(fields=["status", "channel", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.channel}: {self.message[:30]} ({self.status})"
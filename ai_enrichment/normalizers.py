@@ -4,6 +4,8 @@ import re
 from decimal import Decimal, InvalidOperation
 from typing import Callable, Optional
 
+from companies.services.address_parser import normalize_prefecture, parse_address
+
 _NON_NUMERIC_TOKENS = {"未公開", "不明", "不詳", "なし", "N/A", "n/a", "-", "―"}
 _ROLE_PREFIXES = {"代表取締役", "代表取締役社長", "取締役", "社長", "CEO", "COO", "CTO"}
 
@@ -125,11 +127,25 @@ def _normalize_contact_person_position(value: str) -> Optional[str]:
     return text or None
 
 
+def _normalize_prefecture(value: str) -> Optional[str]:
+    # 「東京」「東京都港区…」などを都道府県名に揃える
+    return normalize_prefecture(value)
+
+
+def _normalize_city(value: str) -> Optional[str]:
+    # 都道府県が付いている場合は除く（city は市区町村・番地）
+    text = re.sub(r"\s+", " ", value.replace("　", " ")).strip()
+    parsed = parse_address(text)
+    return (parsed.city if parsed.prefecture else text) or None
+
+
 _NORMALIZER_MAP: dict[str, Callable[[str], Optional[str]]] = {
     "established_year": _normalize_established_year,
     "capital": _normalize_capital,
     "contact_person_name": _normalize_contact_person_name,
     "contact_person_position": _normalize_contact_person_position,
+    "prefecture": _normalize_prefecture,
+    "city": _normalize_city,
 }
 
 
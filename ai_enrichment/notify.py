@@ -8,28 +8,25 @@ from typing import Any, Dict, Optional
 import requests
 from django.conf import settings
 
+from .slack_dispatch import DEFAULT_CHANNEL, enqueue_slack_notification, get_notification_sink
+
 logger = logging.getLogger(__name__)
 
 
-def _send_slack_notification(
+def build_slack_payload(
     message: str,
     *,
     level: str = "info",
     extra: Optional[dict] = None,
-) -> None:
+) -> Dict[str, Any]:
     """
-    Slack Webhookに通知を送信する
-    
+    Slack Webhook に送るペイロード（Block Kit）を構築する
+
     Args:
         message: 通知メッセージ
         level: 通知レベル (info, warning, error, success)
         extra: 追加情報の辞書
     """
-    webhook_url = getattr(settings, "SLACK_WEBHOOK_URL", None)
-    if not webhook_url:
-        logger.info("SLACK_WEBHOOK_URL is not set. Skipping Slack notification.")
-        return
-
     # レベルに応じた色と絵文字を設定
     color_map = {
         "success": "good",
@@ -52,6 +49,7 @@ def _send_slack_notification(
 
     # extraから基本情報のみを追加（補完情報は別処理）
     enrichment_details = None
+    enrichment_total = None  # 補完情報の全件数（extra には先頭の数件のみ渡される）
     if extra:
         logger.info("[SLACK_NOTIFY] extra keys: %s", list(extra.keys()))
         for key, value in extra.items():
@@ -59,6 +57,9 @@ def _send_slack_notification(
                 enrichment_details = value
                 logger.info("[SLACK_NOTIFY] enrichment_details found: %d items", len(value) if isinstance(value, list) else 0)
                 continue
+            if key == "補完情報件数":
+                enrichment_total = value
+                continue
             
             # 基本情報のみ表示（運用判断に必要な最小項目）
             if key in ("AI利用(推定)", "処理企業数", "成功", "失敗", "作成された候補数", "補完されたフィールド数"):
@@ -162,8 +163,10 @@ def _send_slack_notification(
             
             enrichment_texts.append("")  # 空行
         
-        if len(enrichment_details) > 15:
-            enrichment_texts.append(f"... (他{len(enrichment_details) - 15}件)")
+        total_details = int(enrichment_total or len(enrichment_details))
+        shown_details = min(len(enrichment_details), 15)
+        if total_details > shown_details:
+            enrichment_texts.append(f"... (他{total_details - shown_details}件)")
         
         if enrichment_texts:
             logger.info("[SLACK_NOTIFY] Adding enrichment section with %d lines", len(enrichment_texts))
@@ -193,18 +196,35 @@ def _send_slack_notification(
                    len(enrichment_details) if isinstance(enrichment_details, list) else "N/A")
 
     # blocksのみを使用（attachmentsは削除して重複を防ぐ）
-    payload = {
+    return {
         "blocks": blocks,
     }
 
-    # Slackに通知を送信
+
+def _send_slack_notification(
+    message: str,
+    *,
+    level: str = "info",
+    extra: Optional[dict] = None,
+) -> None:
+    """
+    Slack 通知を送信キューに登録する（SLACK_NOTIFY_ASYNC=False の場合はその場で送信）
+
+    送信は低優先度の dispatch_slack_notifications が行うため、呼び出し元のタスクは Webhook を待たない。
+    """
+    webhook_url = getattr(settings, "SLACK_WEBHOOK_URL", None)
+    sink_name = getattr(settings, "SLACK_NOTIFICATION_SINK", "webhook")
+    if not webhook_url and sink_name == "webhook":
+        logger.info("SLACK_WEBHOOK_URL is not set. Skipping Slack notification.")
+        return
+
+    payload = build_slack_payload(message, level=level, extra=extra)
+    if getattr(settings, "SLACK_NOTIFY_ASYNC", True):
+        enqueue_slack_notification(payload, message=message, level=level)
+        return
+
     try:
-        response = requests.post(
-            webhook_url,
-            json=payload,
-            timeout=10,
-        )
-        response.raise_for_status()
+        get_notification_sink().send(DEFAULT_CHANNEL, payload)
         logger.info("Slack notification sent successfully")
     except requests.RequestException as exc:
         logger.warning("Failed to send Slack notification: %s", exc, exc_info=True)
@@ -9,7 +9,11 @@ from typing import Any, Dict, Optional, Tuple
 import requests
 from django.conf import settings
 
+from saleslist_backend.circuit_breaker import CircuitBreaker
+from saleslist_backend.http_sessions import get_session
+
 from .exceptions import (
+    PowerplexyCircuitOpenError,
     PowerplexyConfigurationError,
     PowerplexyRateLimitError,
     PowerplexyResponseError,
@@ -45,15 +49,25 @@ class PowerplexyClient:
         self.model = model or getattr(settings, "POWERPLEXY_MODEL", DEFAULT_MODEL)
         self.timeout = timeout or getattr(settings, "POWERPLEXY_TIMEOUT", DEFAULT_TIMEOUT)
         self.max_tokens = max_tokens or getattr(settings, "POWERPLEXY_MAX_TOKENS", DEFAULT_MAX_TOKENS)
-        self.session = session or requests.Session()
+        self.session = session or get_session("powerplexy")
+        self.breaker = CircuitBreaker("powerplexy", open_error=PowerplexyCircuitOpenError)
 
-    def query(self, prompt: str, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+    def query(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        *,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Perplexity AI APIにリクエストを送信
         
         Args:
             prompt: ユーザープロンプト
             system_prompt: システムプロンプト（オプション）
+            max_tokens: 出力トークン上限の上書き（複数企業まとめて問い合わせる場合など）
+            model: 使用するモデルの上書き（モデルの振り分けを行う場合）
         
         Returns:
             APIレスポンスのJSON
@@ -64,10 +78,10 @@ class PowerplexyClient:
         messages.append({"role": "user", "content": prompt})
         
         payload = {
-            "model": self.model,
+            "model": model or self.model,
             "messages": messages,
             "temperature": 0.2,  # 低い温度で一貫性のある結果を取得
-            "max_tokens": self.max_tokens,
+            "max_tokens": max_tokens or self.max_tokens,
             "stream": False,
         }
 
@@ -78,11 +92,13 @@ class PowerplexyClient:
 
         def _post(request_payload: Dict[str, Any]) -> requests.Response:
             try:
-                return self.session.post(
-                    self.endpoint,
-                    headers=headers,
-                    data=json.dumps(request_payload),
-                    timeout=self.timeout,
+                return self.breaker.request(
+                    lambda: self.session.post(
+                        self.endpoint,
+                        headers=headers,
+                        data=json.dumps(request_payload),
+                        timeout=self.timeout,
+                    )
                 )
             except requests.RequestException as exc:
                 raise PowerplexyResponseError(f"PowerPlexy request failed: {exc}") from exc
@@ -105,11 +121,11 @@ class PowerplexyClient:
             if (
                 response.status_code == 400
                 and "Invalid model" in response.text
-                and self.model != DEFAULT_MODEL
+                and payload["model"] != DEFAULT_MODEL
             ):
                 logger.warning(
                     "PowerPlexy invalid model %r; retrying with default model %r",
-                    self.model,
+                    payload["model"],
                     DEFAULT_MODEL,
                 )
                 payload_retry = {**payload, "model": DEFAULT_MODEL}
@@ -163,7 +179,12 @@ class PowerplexyClient:
         return parsed
 
     def extract_json_with_usage(
-        self, prompt: str, system_prompt: Optional[str] = None
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        *,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None,
     ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """
         extract_json と同様にJSONを抽出しつつ、Perplexityの usage を返す。
@@ -171,7 +192,7 @@ class PowerplexyClient:
         Returns:
             (parsed_json, usage_dict)
         """
-        data = self.query(prompt, system_prompt)
+        data = self.query(prompt, system_prompt, max_tokens=max_tokens, model=model)
         return self._extract_parsed_and_usage(data)
 
     def _extract_parsed_and_usage(
@@ -0,0 +1,191 @@
+"""
+トークン予算付きの補完プロンプト（必要なフィールドの指示だけを含める）
+
+build_prompt_with_constraints はフィールド数に関係なく検索手順・注意事項を全文送るため、
+1フィールドだけの再補完でも入力トークンが大きい。ここでは
+
+- 検索方法・共通の注意事項はシステムプロンプトに1回だけ記載する
+- フィールド説明・検索キーワード・出力例は要求されたフィールドの分だけ含める
+- 企業情報と重複する制約条件は省く
+- 推定トークン数が max_tokens を超える場合は優先度の低いセクションから省く
+
+ようにしてプロンプトを組み立てる。トークン数は外部のトークナイザに依存しないローカルの推定値。
+"""
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from companies.models import Company
+
+from .enrich_rules import FIELD_DESCRIPTIONS, TARGET_FIELDS, _company_info_parts
+
+# 1メッセージあたりのロール等のオーバーヘッド（推定）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# フィールドごとの検索キーワード（「企業名 ○○」の形で提示する）
+FIELD_SEARCH_KEYWORDS: Mapping[str, str] = {
+    "industry": "事業内容",
+    "contact_person_name": "代表者",
+    "contact_person_position": "代表者",
+    "established_year": "設立",
+    "capital": "資本金",
+    "employee_count": "従業員数",
+    "prefecture": "本社所在地",
+    "city": "本社所在地",
+    "business_description": "事業内容",
+}
+
+_CJK_PATTERN = re.compile(r"[　-ヿ㐀-䶿一-鿿豈-﫿＀-￯]")
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+_SYMBOL_PATTERN = re.compile(r"[^\sA-Za-z0-9_　-ヿ㐀-䶿一-鿿豈-﫿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数の推定（日本語・全角文字は1文字1トークン、英数字は4文字1トークン、記号は1つ1トークン）
+
+    実際のトークナイザより多めに出る傾向があるため、予算判定には安全側に働く。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    words = sum(math.ceil(len(word) / 4) for word in _WORD_PATTERN.findall(text))
+    symbols = len(_SYMBOL_PATTERN.findall(text))
+    return cjk + words + symbols
+
+
+@dataclass
+class CompactPrompt:
+    prompt: str
+    system_prompt: str
+    estimated_tokens: int
+    dropped_sections: List[str] = field(default_factory=list)
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.dropped_sections)
+
+
+def build_compact_system_prompt() -> str:
+    """共通の検索方法・注意事項（ユーザープロンプトには繰り返さない）"""
+    return """あなたは日本の企業情報を正確に抽出する専門家です。
+指定された企業について、指定されたフィールドだけをオンライン検索して抽出してください。
+
+【検索方法】
+- 必ずオンライン検索を実行し、公式ウェブサイトの会社概要・企業情報ページを確認してください
+- 企業情報サイト（Wikipedia、コトバンク、全国法人データベースなど）やプレスリリースも確認してください
+- 見つからない場合は企業名のバリエーションや別のキーワードで再検索してください
+
+【回答ルール】
+- 推測や不確実な情報は含めず、信頼できる情報源で確認できた値のみを返してください
+- 見つからないフィールドのみ空文字列（""）にしてください
+- JSONのみを返し、余計な説明や文章は含めないでください"""
+
+
+def _dedupe_constraints(constraints: Sequence[str], company_info: Sequence[str]) -> List[str]:
+    """企業情報に同じ値が既に含まれる制約・重複する制約を省く"""
+    known = "\n".join(company_info)
+    seen = set()
+    result: List[str] = []
+    for line in constraints:
+        value = line.split(":", 1)[-1].strip()
+        if not value or value in known or line in seen:
+            continue
+        seen.add(line)
+        result.append(line)
+    return result
+
+
+def build_compact_prompt(
+    company: Company,
+    missing_fields: Sequence[str],
+    context=None,
+    *,
+    max_tokens: Optional[int] = None,
+) -> CompactPrompt:
+    """
+    要求されたフィールドの指示だけを含むプロンプトを構築する
+
+    Args:
+        company: 企業オブジェクト
+        missing_fields: 補完が必要なフィールドのリスト
+        context: EnrichmentContext（オプション）
+        max_tokens: システムプロンプトを含めた推定トークン数の上限（省略時は AI_ENRICH_PROMPT_MAX_TOKENS、0 で無制限）
+    """
+    if max_tokens is None:
+        max_tokens = getattr(settings, "AI_ENRICH_PROMPT_MAX_TOKENS", 0)
+    fields = [f for f in dict.fromkeys(missing_fields) if f in TARGET_FIELDS]
+    labels = [TARGET_FIELDS[f] for f in fields]
+    company_info = _company_info_parts(company)
+
+    constraints: List[str] = []
+    if context and context.has_gbizinfo_constraints():
+        constraints = _dedupe_constraints(context.get_constraints_for_prompt(), company_info)
+
+    keywords = list(dict.fromkeys(FIELD_SEARCH_KEYWORDS[f] for f in fields if f in FIELD_SEARCH_KEYWORDS))
+    example_body = ", ".join(f'"{label}": ""' for label in labels)
+
+    # (名前, 行, 省略可能か)。省略可能なものは予算超過時に末尾から省く
+    sections: List[Tuple[str, List[str], bool]] = [
+        ("company", ["【企業情報】", *company_info], False),
+        ("fields", ["【抽出が必要な情報】", ", ".join(labels)], False),
+        (
+            "descriptions",
+            ["【各フィールドの説明】", *(f"- {TARGET_FIELDS[f]}: {FIELD_DESCRIPTIONS[f]}" for f in fields if f in FIELD_DESCRIPTIONS)],
+            True,
+        ),
+        ("constraints", ["【制約条件】（これらと一致しない情報は採用しないこと）", *constraints] if constraints else [], False),
+        ("search_keywords", [f"検索キーワード例: {' / '.join(f'{company.name} {k}' for k in keywords)}"] if keywords else [], True),
+        (
+            "hints",
+            ['可能であれば "official_name_candidates"（正式法人名の候補の配列）と "english_name"（英語名）も含めてください。'],
+            True,
+        ),
+        (
+            "output",
+            [
+                "【出力形式】",
+                "キーは上記の日本語ラベルと一致させたJSONのみを返してください。",
+                f"出力例: {{{example_body}}}",
+            ],
+            False,
+        ),
+    ]
+
+    system_prompt = build_compact_system_prompt()
+    system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+
+    def _render(active: List[Tuple[str, List[str], bool]]) -> str:
+        parts = [f"企業「{company.name}」について、以下の情報を抽出してください。"]
+        for _name, lines, _optional in active:
+            if lines:
+                parts.extend(["", *lines])
+        return "\n".join(parts) + "\n"
+
+    active = [section for section in sections if section[1]]
+    dropped: List[str] = []
+    prompt = _render(active)
+    estimated = system_tokens + estimate_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS
+    # 優先度の低い順（search_keywords → descriptions → hints）に省く
+    for name in ("search_keywords", "descriptions", "hints"):
+        if not max_tokens or estimated <= max_tokens:
+            break
+        remaining = [section for section in active if section[0] != name]
+        if len(remaining) == len(active):
+            continue
+        active = remaining
+        dropped.append(name)
+        prompt = _render(active)
+        estimated = system_tokens + estimate_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS
+
+    return CompactPrompt(
+        prompt=prompt,
+        system_prompt=system_prompt,
+        estimated_tokens=estimated,
+        dropped_sections=dropped,
+    )
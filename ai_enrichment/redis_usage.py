@@ -2,13 +2,17 @@
 from __future__ import annotations
 
 import calendar
+import logging
 import os
+import uuid
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, Mapping, Optional, Tuple
 
 from django.conf import settings as django_settings
 from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Sum
 from django.utils import timezone
 
 try:
@@ -17,11 +21,67 @@ except ImportError:  # pragma: no cover
     get_redis_connection = None
 
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_COST_LIMIT = 150.0
 DEFAULT_COST_PER_REQUEST = 0.05
+DEFAULT_RESERVATION_TTL_SECONDS = 600
 
 _USAGE_KEY_TEMPLATE = "ai_usage:{year}-{month}:{metric}"
 
+# 予約: 期限切れの予約を掃除し、確定コスト + 予約中コスト + 今回分 が上限以内なら予約を登録する
+# KEYS: cost, reservations(hash: id -> amount), reservation_expiry(zset: id -> expires_at)
+# ARGV: reservation_id, amount, limit（負値は上限なし）, now, expires_at, ttl
+_RESERVE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[4])
+for _, rid in ipairs(expired) do
+  redis.call('HDEL', KEYS[2], rid)
+  redis.call('ZREM', KEYS[3], rid)
+end
+local reserved = 0
+for _, value in ipairs(redis.call('HVALS', KEYS[2])) do
+  reserved = reserved + tonumber(value)
+end
+local cost = tonumber(redis.call('GET', KEYS[1]) or '0')
+local amount = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+if limit >= 0 and cost + reserved + amount > limit then
+  return 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[3], ARGV[5], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+redis.call('EXPIRE', KEYS[3], ARGV[6])
+return 1
+"""
+
+# 確定/解放: 予約を削除し、実績（呼び出し回数・コスト・トークン）を加算する
+# KEYS: calls, cost, prompt_tokens, completion_tokens, reservations, reservation_expiry
+# ARGV: reservation_id（空文字は予約なし）, calls, cost, prompt_tokens, completion_tokens, ttl
+_COMMIT_SCRIPT = """
+if ARGV[1] ~= '' then
+  redis.call('HDEL', KEYS[5], ARGV[1])
+  redis.call('ZREM', KEYS[6], ARGV[1])
+end
+if tonumber(ARGV[2]) > 0 then
+  redis.call('INCRBY', KEYS[1], ARGV[2])
+  redis.call('EXPIRE', KEYS[1], ARGV[6])
+end
+if tonumber(ARGV[3]) > 0 then
+  redis.call('INCRBYFLOAT', KEYS[2], ARGV[3])
+  redis.call('EXPIRE', KEYS[2], ARGV[6])
+end
+if tonumber(ARGV[4]) > 0 then
+  redis.call('INCRBY', KEYS[3], ARGV[4])
+  redis.call('EXPIRE', KEYS[3], ARGV[6])
+end
+if tonumber(ARGV[5]) > 0 then
+  redis.call('INCRBY', KEYS[4], ARGV[5])
+  redis.call('EXPIRE', KEYS[4], ARGV[6])
+end
+return 1
+"""
+
 
 def _enforce_monthly_cost_limit() -> bool:
     """True のときのみ月次コスト上限で AI 実行を止める。settings 未定義時は環境変数を参照。"""
@@ -41,6 +101,10 @@ def _key(metric: str, *, year: int, month: int) -> str:
     return _USAGE_KEY_TEMPLATE.format(year=year, month=str(month).zfill(2), metric=metric)
 
 
+def _period(year: int, month: int) -> str:
+    return f"{year}-{str(month).zfill(2)}"
+
+
 def _month_ttl(year: int, month: int) -> int:
     last_day = calendar.monthrange(year, month)[1]
     now = timezone.now()
@@ -81,13 +145,99 @@ def _derive_daily_limit(call_limit: int, *, now: Optional[datetime] = None) -> i
 class UsageSnapshot:
     calls: int
     cost: float
+    reserved: float = 0.0  # 予約中（API呼び出し中）のコスト
 
     def can_execute(self, *, cost_limit: float, call_limit: int, cost_per_call: float) -> bool:
         # 月次実行回数による制限は削除。コスト上限のみチェック
-        return self.cost + cost_per_call <= cost_limit
+        return self.cost + self.reserved + cost_per_call <= cost_limit
+
+
+@dataclass(frozen=True)
+class UsageReservation:
+    """reserve() で確保したコスト枠。commit() または release() で必ず解消する"""
+
+    reservation_id: str
+    amount: float
+    year: int
+    month: int
+
+
+@dataclass
+class TokenAttribution:
+    """複数企業まとめたリクエストのうち、1企業に按分したトークン数・コスト"""
+
+    company_id: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost: float
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost, 6),
+        }
+
+
+def _split_tokens(total: int, weights: Mapping[int, int]) -> Dict[int, int]:
+    """total を weights の比率で整数按分する（端数は最大剰余で配分し合計を total に一致させる）"""
+    keys = list(weights.keys())
+    if not keys:
+        return {}
+    weight_sum = sum(max(int(weights[key]), 0) for key in keys)
+    if weight_sum <= 0:
+        raw = {key: total / len(keys) for key in keys}
+    else:
+        raw = {key: total * max(int(weights[key]), 0) / weight_sum for key in keys}
+    result = {key: int(raw[key]) for key in keys}
+    remainder = total - sum(result.values())
+    for key in sorted(keys, key=lambda k: raw[k] - result[k], reverse=True)[:max(remainder, 0)]:
+        result[key] += 1
+    return result
+
+
+def attribute_batch_usage(
+    weights: Mapping[int, Tuple[int, int]],
+    *,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cost: float,
+) -> Dict[int, TokenAttribution]:
+    """
+    複数企業まとめたリクエストの usage を企業ごとに按分する。
+
+    Args:
+        weights: {company_id: (プロンプト中の企業セクション文字数, 回答中の企業セクション文字数)}
+        prompt_tokens / completion_tokens: API が返した usage
+        cost: リクエスト全体の推定コスト（USD）
+    """
+    prompt_split = _split_tokens(int(prompt_tokens or 0), {key: value[0] for key, value in weights.items()})
+    completion_split = _split_tokens(int(completion_tokens or 0), {key: value[1] for key, value in weights.items()})
+    total_tokens = sum(prompt_split.values()) + sum(completion_split.values())
+
+    attributions: Dict[int, TokenAttribution] = {}
+    for company_id in weights:
+        company_tokens = prompt_split.get(company_id, 0) + completion_split.get(company_id, 0)
+        share = company_tokens / total_tokens if total_tokens else 1 / len(weights)
+        attributions[company_id] = TokenAttribution(
+            company_id=company_id,
+            prompt_tokens=prompt_split.get(company_id, 0),
+            completion_tokens=completion_split.get(company_id, 0),
+            cost=float(cost or 0.0) * share,
+        )
+    return attributions
 
 
 class UsageTracker:
+    """
+    PowerPlexy の月次使用量を集計する。
+
+    django_redis が使える場合は Redis（Luaスクリプトで原子的に更新）、
+    それ以外は DB（AIUsageMonth の行ロック）に記録する。
+    並列ワーカーでも上限を超えないよう、API呼び出し前に reserve() で推定コストを確保し、
+    呼び出し後に commit()（実コストで確定）または release()（失敗時）を呼ぶ。
+    """
+
     def __init__(
         self,
         *,
@@ -98,12 +248,17 @@ class UsageTracker:
     ) -> None:
         self.connection_alias = connection_alias
         backend_name = django_settings.CACHES.get(connection_alias, {}).get("BACKEND", "")
-        self._use_cache = (
+        # Redis が使えない場合は DB の行ロックで記録する
+        self._use_db = (
             get_redis_connection is None
             or "django_redis" not in backend_name
         )
         self.cost_limit = cost_limit if cost_limit is not None else getattr(django_settings, "POWERPLEXY_MONTHLY_COST_LIMIT", DEFAULT_COST_LIMIT)
         self.cost_per_call = cost_per_call if cost_per_call is not None else getattr(django_settings, "POWERPLEXY_COST_PER_REQUEST", DEFAULT_COST_PER_REQUEST)
+        self.reservation_ttl = int(
+            getattr(django_settings, "POWERPLEXY_RESERVATION_TTL_SECONDS", DEFAULT_RESERVATION_TTL_SECONDS)
+            or DEFAULT_RESERVATION_TTL_SECONDS
+        )
 
         if call_limit is not None:
             resolved_call_limit = call_limit
@@ -124,25 +279,150 @@ class UsageTracker:
 
     @property
     def client(self):
-        if self._use_cache:
-            return caches[self.connection_alias]
+        """Redis 接続（Redis が使えない場合は None。以降は DB に記録する）"""
+        if self._use_db:
+            return None
         try:
             return get_redis_connection(self.connection_alias)
         except NotImplementedError:
-            self._use_cache = True
-            return caches[self.connection_alias]
+            self._use_db = True
+            return None
+
+    # --- DB（Redis 以外）の実装 -------------------------------------------------
+
+    def _legacy_cache_totals(self, year: int, month: int) -> Dict[str, object]:
+        """以前のキャッシュ記録（非原子的な get+set）から当月分を引き継ぐ"""
+        try:
+            cache = caches[self.connection_alias]
+            return {
+                "calls": int(cache.get(_key("calls", year=year, month=month), 0) or 0),
+                "cost": float(cache.get(_key("cost", year=year, month=month), 0.0) or 0.0),
+            }
+        except Exception:  # pragma: no cover - キャッシュ未設定時は0から
+            return {"calls": 0, "cost": 0.0}
+
+    def _locked_month(self, year: int, month: int):
+        from .models import AIUsageMonth
+
+        usage, _created = AIUsageMonth.objects.select_for_update().get_or_create(
+            period=_period(year, month),
+            defaults=self._legacy_cache_totals(year, month),
+        )
+        return usage
+
+    def _db_reserved(self, year: int, month: int, now: datetime) -> float:
+        from .models import AIUsageReservation
+
+        total = AIUsageReservation.objects.filter(
+            period=_period(year, month),
+            expires_at__gt=now,
+        ).aggregate(total=Sum("amount"))["total"]
+        return float(total or 0.0)
+
+    def _db_snapshot(self, year: int, month: int) -> UsageSnapshot:
+        from .models import AIUsageMonth
+
+        usage = AIUsageMonth.objects.filter(period=_period(year, month)).only("calls", "cost").first()
+        if usage is None:
+            totals = self._legacy_cache_totals(year, month)
+            calls, cost = int(totals["calls"]), float(totals["cost"])
+        else:
+            calls, cost = usage.calls, usage.cost
+        return UsageSnapshot(calls=calls, cost=cost, reserved=self._db_reserved(year, month, timezone.now()))
+
+    def _db_reserve(self, reservation: UsageReservation, limit: float) -> bool:
+        from .models import AIUsageReservation
+
+        now = timezone.now()
+        period = _period(reservation.year, reservation.month)
+        with transaction.atomic():
+            usage = self._locked_month(reservation.year, reservation.month)
+            AIUsageReservation.objects.filter(period=period, expires_at__lte=now).delete()
+            reserved = self._db_reserved(reservation.year, reservation.month, now)
+            if limit >= 0 and usage.cost + reserved + reservation.amount > limit:
+                return False
+            AIUsageReservation.objects.create(
+                reservation_id=reservation.reservation_id,
+                period=period,
+                amount=reservation.amount,
+                expires_at=now + timedelta(seconds=self.reservation_ttl),
+            )
+        return True
+
+    def _db_apply(
+        self,
+        year: int,
+        month: int,
+        *,
+        reservation_id: str,
+        calls: int,
+        cost: float,
+        prompt_tokens: int,
+        completion_tokens: int,
+    ) -> None:
+        from .models import AIUsageMonth, AIUsageReservation
+
+        with transaction.atomic():
+            usage = self._locked_month(year, month)
+            if reservation_id:
+                AIUsageReservation.objects.filter(reservation_id=reservation_id).delete()
+            if calls or cost or prompt_tokens or completion_tokens:
+                AIUsageMonth.objects.filter(pk=usage.pk).update(
+                    calls=F("calls") + calls,
+                    cost=F("cost") + cost,
+                    prompt_tokens=F("prompt_tokens") + prompt_tokens,
+                    completion_tokens=F("completion_tokens") + completion_tokens,
+                    updated_at=timezone.now(),
+                )
+
+    # --- Redis の実装 -----------------------------------------------------------
+
+    def _redis_reserved(self, year: int, month: int) -> float:
+        now = timezone.now().timestamp()
+        active = self.client.zrangebyscore(_key("reservation_expiry", year=year, month=month), now, "+inf")
+        if not active:
+            return 0.0
+        amounts = self.client.hmget(_key("reservations", year=year, month=month), active)
+        return sum(float(amount) for amount in amounts if amount is not None)
+
+    def _redis_apply(
+        self,
+        year: int,
+        month: int,
+        *,
+        reservation_id: str,
+        calls: int,
+        cost: float,
+        prompt_tokens: int,
+        completion_tokens: int,
+    ) -> None:
+        keys = [
+            _key(metric, year=year, month=month)
+            for metric in ("calls", "cost", "prompt_tokens", "completion_tokens", "reservations", "reservation_expiry")
+        ]
+        self.client.eval(
+            _COMMIT_SCRIPT,
+            len(keys),
+            *keys,
+            reservation_id,
+            int(calls),
+            repr(float(cost)),
+            int(prompt_tokens),
+            int(completion_tokens),
+            _month_ttl(year, month),
+        )
+
+    # --- 公開API ----------------------------------------------------------------
 
     def snapshot(self, *, now: Optional[datetime] = None) -> UsageSnapshot:
         year, month = _current_month(now)
-        if self._use_cache:
-            cache = self.client
-            calls = int(cache.get(_key("calls", year=year, month=month), 0))
-            cost = float(cache.get(_key("cost", year=year, month=month), 0.0))
-        else:
-            calls = int(self.client.get(_key("calls", year=year, month=month)) or 0)
-            cost_raw = self.client.get(_key("cost", year=year, month=month))
-            cost = float(cost_raw) if cost_raw is not None else 0.0
-        return UsageSnapshot(calls=calls, cost=cost)
+        client = self.client
+        if client is None:
+            return self._db_snapshot(year, month)
+        calls = int(client.get(_key("calls", year=year, month=month)) or 0)
+        cost_raw = client.get(_key("cost", year=year, month=month))
+        cost = float(cost_raw) if cost_raw is not None else 0.0
+        return UsageSnapshot(calls=calls, cost=cost, reserved=self._redis_reserved(year, month))
 
     def can_execute(self) -> bool:
         if not _enforce_monthly_cost_limit():
@@ -154,27 +434,146 @@ class UsageTracker:
             cost_per_call=self.cost_per_call,
         )
 
-    def increment(self, *, calls: int = 1, cost: Optional[float] = None) -> UsageSnapshot:
-        cost = cost if cost is not None else calls * self.cost_per_call
+    def reserve(self, amount: Optional[float] = None) -> Optional[UsageReservation]:
+        """
+        推定コストを原子的に確保する。上限を超える場合は None を返す（API を呼び出さないこと）。
+
+        Args:
+            amount: 確保するコスト（USD）。未指定時は cost_per_call
+        """
+        amount = self.cost_per_call if amount is None else max(float(amount), 0.0)
         year, month = _current_month()
-        ttl = _month_ttl(year, month)
-        if self._use_cache:
-            cache = self.client
-            call_key = _key("calls", year=year, month=month)
-            cost_key = _key("cost", year=year, month=month)
-            cache.set(call_key, int(cache.get(call_key, 0)) + calls, ttl)
-            cache.set(cost_key, float(cache.get(cost_key, 0.0)) + cost, ttl)
+        reservation = UsageReservation(
+            reservation_id=uuid.uuid4().hex,
+            amount=float(amount),
+            year=year,
+            month=month,
+        )
+        limit = float(self.cost_limit) if _enforce_monthly_cost_limit() else -1.0
+
+        client = self.client
+        if client is None:
+            granted = self._db_reserve(reservation, limit)
+        else:
+            now = timezone.now().timestamp()
+            keys = [
+                _key(metric, year=year, month=month)
+                for metric in ("cost", "reservations", "reservation_expiry")
+            ]
+            granted = bool(
+                client.eval(
+                    _RESERVE_SCRIPT,
+                    len(keys),
+                    *keys,
+                    reservation.reservation_id,
+                    repr(reservation.amount),
+                    repr(limit),
+                    repr(now),
+                    repr(now + self.reservation_ttl),
+                    _month_ttl(year, month),
+                )
+            )
+
+        if not granted:
+            logger.info(
+                "[AI_ENRICH][USAGE_RESERVE_DENIED] amount=%.6f, cost_limit=%.2f",
+                reservation.amount,
+                self.cost_limit,
+            )
+            return None
+        return reservation
+
+    def commit(
+        self,
+        reservation: Optional[UsageReservation],
+        *,
+        cost: Optional[float] = None,
+        calls: int = 1,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+    ) -> UsageSnapshot:
+        """
+        予約を実績で確定する（予約は解消され、実コストが加算される）。
+        cost 未指定時は予約額（予約がなければ calls * cost_per_call）で計上する。
+        """
+        if cost is None:
+            cost = reservation.amount if reservation is not None else calls * self.cost_per_call
+        if reservation is not None:
+            year, month = reservation.year, reservation.month
         else:
-            pipe = self.client.pipeline(True)
-            pipe.incrby(_key("calls", year=year, month=month), calls)
-            pipe.expire(_key("calls", year=year, month=month), ttl)
-            pipe.incrbyfloat(_key("cost", year=year, month=month), cost)
-            pipe.expire(_key("cost", year=year, month=month), ttl)
-            pipe.execute()
+            year, month = _current_month()
+        apply = self._db_apply if self.client is None else self._redis_apply
+        apply(
+            year,
+            month,
+            reservation_id=reservation.reservation_id if reservation is not None else "",
+            calls=int(calls),
+            cost=float(cost),
+            prompt_tokens=int(prompt_tokens or 0),
+            completion_tokens=int(completion_tokens or 0),
+        )
         return self.snapshot()
 
+    def release(self, reservation: Optional[UsageReservation]) -> None:
+        """API を呼び出さなかった（失敗した）場合に予約を解放する"""
+        if reservation is None:
+            return
+        apply = self._db_apply if self.client is None else self._redis_apply
+        apply(
+            reservation.year,
+            reservation.month,
+            reservation_id=reservation.reservation_id,
+            calls=0,
+            cost=0.0,
+            prompt_tokens=0,
+            completion_tokens=0,
+        )
+
+    def increment(
+        self,
+        *,
+        calls: int = 1,
+        cost: Optional[float] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+    ) -> UsageSnapshot:
+        """予約なしで使用量を加算する（reserve/commit を使わない呼び出し元向け）"""
+        return self.commit(
+            None,
+            cost=cost,
+            calls=calls,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+
+    def increment_batch(
+        self,
+        attributions: Mapping[int, TokenAttribution],
+        *,
+        reservation: Optional[UsageReservation] = None,
+    ) -> UsageSnapshot:
+        """
+        複数企業まとめた1リクエスト分の使用量を記録する。
+        呼び出し回数は1回として加算し、コスト・トークンは企業ごとの按分結果の合計を加算する。
+        """
+        for attribution in attributions.values():
+            logger.info(
+                "[AI_ENRICH][USAGE_ATTRIBUTION] company_id=%s, prompt_tokens=%d, completion_tokens=%d, cost_usd=%.6f",
+                attribution.company_id,
+                attribution.prompt_tokens,
+                attribution.completion_tokens,
+                attribution.cost,
+            )
+        return self.commit(
+            reservation,
+            calls=1,
+            cost=sum(a.cost for a in attributions.values()),
+            prompt_tokens=sum(a.prompt_tokens for a in attributions.values()),
+            completion_tokens=sum(a.completion_tokens for a in attributions.values()),
+        )
+
     def remaining(self) -> UsageSnapshot:
         usage = self.snapshot()
         remaining_calls = max(self.call_limit - usage.calls, 0)
-        remaining_cost = max(self.cost_limit - usage.cost, 0.0)
+        remaining_cost = max(self.cost_limit - usage.cost - usage.reserved, 0.0)
         return UsageSnapshot(calls=remaining_calls, cost=remaining_cost)
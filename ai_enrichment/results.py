@@ -0,0 +1,136 @@
+"""
+AI補完の企業ごとの結果を AIEnrichmentResult に記録・集計する。
+
+run_ai_enrich は企業ごとの結果をメモリに溜め込まず、一定件数ごとに bulk_create で書き出す。
+通知や run の metadata に載せるサマリは SQL の集計で作成する。
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from data_collection.models import DataCollectionRun
+
+from .models import AIEnrichmentResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_BATCH_SIZE = 100
+
+
+class EnrichmentResultWriter:
+    """
+    企業ごとの結果レコード（dict）を受け取り、AIEnrichmentResult としてまとめて書き込む。
+
+    append() したレコードは finish_company() で処理時間を付けて確定し、
+    batch_size 件たまったら bulk_create する。終了時・チェックポイント保存時は flush() を呼ぶこと。
+    """
+
+    def __init__(self, run: DataCollectionRun, *, batch_size: Optional[int] = None) -> None:
+        self.run = run
+        self.batch_size = max(
+            int(batch_size or getattr(settings, "AI_ENRICH_RESULT_BATCH_SIZE", DEFAULT_RESULT_BATCH_SIZE) or 1),
+            1,
+        )
+        self._pending: List[Dict[str, Any]] = []
+        self._buffer: List[AIEnrichmentResult] = []
+        self.written = 0
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self._pending.append(record)
+
+    def finish_company(self, company_id: int, *, duration_ms: int = 0) -> None:
+        remaining: List[Dict[str, Any]] = []
+        for record in self._pending:
+            if record.get("company_id") == company_id:
+                self._buffer.append(self._build(record, duration_ms=duration_ms))
+            else:
+                remaining.append(record)
+        self._pending = remaining
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        # finish_company 前のレコードは書き出さない（中断した企業は retry 時に再処理され、その結果を記録する）
+        if not self._buffer:
+            return
+        AIEnrichmentResult.objects.bulk_create(self._buffer, batch_size=self.batch_size)
+        self.written += len(self._buffer)
+        self._buffer = []
+
+    def _build(self, record: Dict[str, Any], *, duration_ms: int = 0) -> AIEnrichmentResult:
+        usage = record.get("usage") or {}
+        fields = list(record.get("fields") or [])
+        return AIEnrichmentResult(
+            run=self.run,
+            company_id=record["company_id"],
+            status=record.get("status") or AIEnrichmentResult.Status.ATTEMPTED,
+            fields=fields,
+            field_count=len(fields),
+            reason=str(record.get("reason") or ""),
+            no_data_reason_code=str(record.get("no_data_reason_code") or "")[:64],
+            no_data_reason_message=str(record.get("no_data_reason_message") or ""),
+            error=str(record.get("error") or ""),
+            prompt_tokens=int(usage.get("prompt_tokens") or 0),
+            completion_tokens=int(usage.get("completion_tokens") or 0),
+            cost_usd=float(usage.get("cost_usd") or 0.0),
+            batched=bool(record.get("batched")),
+            duration_ms=max(int(duration_ms), 0),
+        )
+
+
+def summarize_results(run: DataCollectionRun) -> Dict[str, Any]:
+    """run の結果を SQL で集計する"""
+    queryset = AIEnrichmentResult.objects.filter(run=run)
+    totals = queryset.aggregate(
+        count=Count("id"),
+        field_count=Sum("field_count"),
+        prompt_tokens=Sum("prompt_tokens"),
+        completion_tokens=Sum("completion_tokens"),
+        cost_usd=Sum("cost_usd"),
+        duration_ms=Sum("duration_ms"),
+    )
+    by_status = {
+        row["status"]: row["count"]
+        for row in queryset.values("status").annotate(count=Count("id")).order_by()
+    }
+    return {
+        "count": totals["count"] or 0,
+        "field_count": totals["field_count"] or 0,
+        "prompt_tokens": totals["prompt_tokens"] or 0,
+        "completion_tokens": totals["completion_tokens"] or 0,
+        "cost_usd": round(float(totals["cost_usd"] or 0.0), 6),
+        "duration_ms": totals["duration_ms"] or 0,
+        "by_status": by_status,
+    }
+
+
+def result_details(run: DataCollectionRun, *, limit: int = 15) -> List[Dict[str, Any]]:
+    """通知用に先頭 limit 件の結果を従来の補完情報（dict）形式で返す"""
+    details: List[Dict[str, Any]] = []
+    queryset = (
+        AIEnrichmentResult.objects.filter(run=run)
+        .select_related("company")
+        .only("company_id", "company__name", "status", "fields", "reason", "no_data_reason_code",
+              "no_data_reason_message", "error")
+        .order_by("id")[:limit]
+    )
+    for result in queryset:
+        detail: Dict[str, Any] = {
+            "company_id": result.company_id,
+            "company_name": result.company.name,
+            "fields": result.fields,
+            "status": result.status,
+        }
+        if result.reason:
+            detail["reason"] = result.reason
+        if result.no_data_reason_code:
+            detail["no_data_reason_code"] = result.no_data_reason_code
+            detail["no_data_reason_message"] = result.no_data_reason_message
+        if result.error:
+            detail["error"] = result.error
+        details.append(detail)
+    return details
@@ -0,0 +1,219 @@
+"""
+Slack 通知の非同期送信（送信キュー + まとめ送信）
+
+notify_* は SlackNotificationOutbox に行を追加するだけで、Webhook への送信は低優先度の
+dispatch_slack_notifications タスクが行う。同じチャンネル・同じ時間枠（SLACK_NOTIFY_COALESCE_SECONDS）の
+通知は1つのメッセージにまとめ、接続を使い回すセッションとタイムアウト付きで送信する。
+
+SLACK_NOTIFICATION_SINK=local の場合は Webhook に送らず local_sink に溜める（テスト・ローカル確認用）。
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from saleslist_backend.http_sessions import get_session
+
+from .models import SlackNotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = "default"
+# Slack の1メッセージあたりの blocks 上限
+MAX_BLOCKS_PER_MESSAGE = 50
+
+
+class NotificationSink(Protocol):
+    def send(self, channel: str, payload: Dict[str, Any]) -> None:
+        ...
+
+
+class WebhookSink:
+    """Slack Incoming Webhook へ送信する（セッションはプロセス内で使い回す）"""
+
+    def __init__(self, session: Optional[requests.Session] = None) -> None:
+        self._session = session
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            # プールの大きさなどは HTTP_SESSION_PROVIDER_OPTIONS["slack"] で調整する（fork 後は作り直される）
+            return get_session("slack")
+        return self._session
+
+    def send(self, channel: str, payload: Dict[str, Any]) -> None:
+        webhook_url = getattr(settings, "SLACK_WEBHOOK_URL", "")
+        if not webhook_url:
+            raise ValueError("SLACK_WEBHOOK_URL is not set")
+        response = self.session.post(
+            webhook_url,
+            json=payload,
+            timeout=(
+                getattr(settings, "SLACK_WEBHOOK_CONNECT_TIMEOUT", 3),
+                getattr(settings, "SLACK_WEBHOOK_READ_TIMEOUT", 10),
+            ),
+        )
+        response.raise_for_status()
+
+
+class LocalSink:
+    """送信内容をメモリに保持するだけのスタブ"""
+
+    def __init__(self) -> None:
+        self.sent: List[Tuple[str, Dict[str, Any]]] = []
+
+    def send(self, channel: str, payload: Dict[str, Any]) -> None:
+        self.sent.append((channel, payload))
+
+    def clear(self) -> None:
+        self.sent = []
+
+
+webhook_sink = WebhookSink()
+local_sink = LocalSink()
+
+
+def get_notification_sink() -> NotificationSink:
+    if getattr(settings, "SLACK_NOTIFICATION_SINK", "webhook") == "local":
+        return local_sink
+    return webhook_sink
+
+
+def enqueue_slack_notification(
+    payload: Dict[str, Any],
+    *,
+    message: str,
+    level: str = "info",
+    channel: str = DEFAULT_CHANNEL,
+) -> SlackNotificationOutbox:
+    """通知を送信キューに登録し、コミット後に送信タスクを予約する"""
+    notification = SlackNotificationOutbox.objects.create(
+        channel=channel,
+        level=level,
+        message=message,
+        payload=payload,
+    )
+    transaction.on_commit(_schedule_dispatch)
+    return notification
+
+
+def _schedule_dispatch() -> None:
+    from .tasks import dispatch_slack_notifications
+
+    try:
+        dispatch_slack_notifications.apply_async(
+            countdown=getattr(settings, "SLACK_NOTIFY_COALESCE_SECONDS", 30),
+            queue=getattr(settings, "SLACK_NOTIFY_QUEUE", None) or None,
+            priority=getattr(settings, "SLACK_NOTIFY_PRIORITY", 9),
+        )
+    except Exception:  # noqa: BLE001
+        # ブローカーに繋がらなくても通知は失わない（定期実行の dispatch で送信される）
+        logger.warning("Failed to schedule Slack notification dispatch", exc_info=True)
+
+
+def merge_payloads(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """複数の通知を区切り線付きで1つのメッセージにまとめる"""
+    blocks: List[Dict[str, Any]] = []
+    for payload in payloads:
+        if blocks:
+            blocks.append({"type": "divider"})
+        blocks.extend(payload.get("blocks") or [])
+    return {"blocks": blocks}
+
+
+def _coalesce(notifications: List[SlackNotificationOutbox], window_seconds: int) -> List[List[SlackNotificationOutbox]]:
+    """チャンネル・時間枠ごとにまとめ、さらに blocks 上限に収まるよう分割する"""
+    window = max(int(window_seconds), 1)
+    groups: Dict[Tuple[str, int], List[SlackNotificationOutbox]] = {}
+    for notification in notifications:
+        bucket = int(notification.created_at.timestamp()) // window
+        groups.setdefault((notification.channel, bucket), []).append(notification)
+
+    messages: List[List[SlackNotificationOutbox]] = []
+    for group in groups.values():
+        current: List[SlackNotificationOutbox] = []
+        block_count = 0
+        for notification in group:
+            size = len(notification.payload.get("blocks") or []) + (1 if current else 0)
+            if current and block_count + size > MAX_BLOCKS_PER_MESSAGE:
+                messages.append(current)
+                current, block_count = [], 0
+                size -= 1
+            current.append(notification)
+            block_count += size
+        if current:
+            messages.append(current)
+    return messages
+
+
+def dispatch_pending_notifications(
+    *,
+    sink: Optional[NotificationSink] = None,
+    now: Optional[datetime] = None,
+    limit: int = 200,
+) -> Dict[str, int]:
+    """送信待ちの通知をまとめて送信する"""
+    sink = sink or get_notification_sink()
+    now = now or timezone.now()
+    claim_timeout = timedelta(seconds=getattr(settings, "SLACK_NOTIFY_CLAIM_TIMEOUT_SECONDS", 600))
+    max_attempts = getattr(settings, "SLACK_NOTIFY_MAX_ATTEMPTS", 5)
+
+    # 他のワーカーと同じ通知を二重に送らないよう、送信中として確保してから送る（送信中のまま残った行は期限後に再送）
+    with transaction.atomic():
+        notifications = list(
+            SlackNotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=SlackNotificationOutbox.Status.PENDING)
+                | Q(status=SlackNotificationOutbox.Status.SENDING, claimed_at__lt=now - claim_timeout)
+            )
+            .order_by("created_at", "id")[:limit]
+        )
+        SlackNotificationOutbox.objects.filter(id__in=[n.id for n in notifications]).update(
+            status=SlackNotificationOutbox.Status.SENDING,
+            claimed_at=now,
+            attempts=F("attempts") + 1,
+        )
+
+    stats = {"notifications": len(notifications), "messages": 0, "sent": 0, "failed": 0}
+    for group in _coalesce(notifications, getattr(settings, "SLACK_NOTIFY_COALESCE_SECONDS", 30)):
+        ids = [notification.id for notification in group]
+        try:
+            sink.send(group[0].channel, merge_payloads([notification.payload for notification in group]))
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Failed to send Slack notification: %s", exc, exc_info=True)
+            attempts = max(notification.attempts + 1 for notification in group)
+            SlackNotificationOutbox.objects.filter(id__in=ids).update(
+                status=(
+                    SlackNotificationOutbox.Status.FAILED
+                    if attempts >= max_attempts
+                    else SlackNotificationOutbox.Status.PENDING
+                ),
+                last_error=str(exc)[:1000],
+            )
+            stats["failed"] += len(ids)
+            continue
+        SlackNotificationOutbox.objects.filter(id__in=ids).update(
+            status=SlackNotificationOutbox.Status.SENT,
+            sent_at=timezone.now(),
+            last_error="",
+        )
+        stats["messages"] += 1
+        stats["sent"] += len(ids)
+
+    retention_days = getattr(settings, "SLACK_NOTIFY_RETENTION_DAYS", 7)
+    if retention_days > 0:
+        SlackNotificationOutbox.objects.filter(
+            status=SlackNotificationOutbox.Status.SENT,
+            sent_at__lt=now - timedelta(days=retention_days),
+        ).delete()
+
+    if stats["notifications"]:
+        logger.info("[SLACK_NOTIFY][DISPATCH] %s", stats)
+    return stats
@@ -1,8 +1,10 @@
 
 from __future__ import annotations
 
+import json
 import logging
 import time
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Sequence, Tuple
 
@@ -13,7 +15,10 @@ from django.db.models import BooleanField, Case, Value, When
 from django.utils import timezone
 
 from companies.models import Company, CompanyUpdateCandidate
+from companies.services.address_parser import split_prefecture
+from companies.services.corporate_number_client import CorporateNumberAPIClient
 from companies.services.review_ingestion import ingest_rule_based_candidates
+from data_collection.models import DataCollectionRun
 from data_collection.tracker import track_data_collection_run
 from saleslist_backend.settings.base import get_ai_enrichment_cooldown_for_company
 
@@ -21,11 +26,16 @@ from .constants import AI_ENRICH_BATCH_SIZE, AI_ENRICH_API_DELAY_SECONDS
 from .enrich_rules import (
     AI_OUTPUT_LABEL_ALIASES,
     TARGET_FIELDS,
+    BatchPromptItem,
+    RuleBasedResult,
     apply_rule_based,
+    build_batch_prompt,
+    build_batch_system_prompt,
     build_prompt,
     build_prompt_with_constraints,
     build_system_prompt,
     detect_missing_fields,
+    parse_batch_completion,
 )
 from .normalizers import normalize_candidate_value
 from .enrichment_context import EnrichmentContext
@@ -45,12 +55,29 @@ from .exceptions import (
 from .notify import notify_error, notify_success, notify_warning
 from .powerplexy_client import PowerplexyClient
 from .pricing import estimate_powerplexy_cost_usd
-from .redis_usage import UsageTracker
+from .model_routing import ModelRouter, ModelUsageStats, RouteDecision
+from .prompt_budget import MESSAGE_OVERHEAD_TOKENS, CompactPrompt, build_compact_prompt, estimate_tokens
+from .redis_usage import TokenAttribution, UsageTracker, attribute_batch_usage
+from .results import EnrichmentResultWriter, result_details, summarize_results
+from .slack_dispatch import dispatch_pending_notifications
+from .timing import (
+    STAGE_AI_BATCH_REQUEST,
+    STAGE_AI_REQUEST,
+    STAGE_COMPANY_TOTAL,
+    STAGE_GBIZINFO_RETRY,
+    STAGE_INGEST,
+    STAGE_NORMALIZE,
+    STAGE_RULE_BASED,
+    StageTimings,
+)
 
 logger = logging.getLogger(__name__)
 
 AI_SOURCE_DETAIL = "powerplexy"
 DEFAULT_DAILY_LIMIT = 10000
+DEFAULT_CHECKPOINT_INTERVAL = 5
+# 通知に載せる補完情報の件数（残りは件数のみ表示）
+NOTIFICATION_DETAILS_LIMIT = 15
 
 
 def _unique_int_list(values: Sequence[int]) -> List[int]:
@@ -75,6 +102,22 @@ def _metadata_with_processed(base: Dict[str, object], processed_ids: Sequence[in
     return metadata
 
 
+def _load_checkpoint(execution_uuid: Optional[str]) -> Dict[str, Any]:
+    """
+    同じ execution_uuid の前回実行（Rate Limit による retry 前）のチェックポイントを取得する。
+    チェックポイントがない場合は空の dict。
+    """
+    if not execution_uuid:
+        return {}
+    metadata = (
+        DataCollectionRun.objects.filter(execution_uuid=execution_uuid)
+        .values_list("metadata", flat=True)
+        .first()
+    )
+    checkpoint = (metadata or {}).get("checkpoint") if isinstance(metadata, dict) else None
+    return checkpoint if isinstance(checkpoint, dict) else {}
+
+
 def _reverse_field_map() -> Dict[str, str]:
     m = {label: field for field, label in TARGET_FIELDS.items()}
     for alias_label, field in AI_OUTPUT_LABEL_ALIASES.items():
@@ -91,6 +134,208 @@ def _normalize_candidate_value(field: str, value: object) -> str:
     return str(value).strip()
 
 
+def _resolve_prompt_batch_size(payload: Dict[str, Any]) -> int:
+    """1リクエストにまとめる企業数（1以下ならまとめない）"""
+    raw = payload.get("prompt_batch_size", getattr(settings, "AI_ENRICH_PROMPT_BATCH_SIZE", 1))
+    try:
+        return max(int(raw or 1), 1)
+    except (TypeError, ValueError):
+        logger.warning("Invalid prompt_batch_size provided to AI enrichment: %s", raw)
+        return 1
+
+
+def _build_single_prompt(
+    company: Company,
+    missing_fields: Sequence[str],
+    context: EnrichmentContext,
+    mode: str,
+) -> CompactPrompt:
+    """単一企業のプロンプトを構築する（compact: 必要なフィールドの指示のみ / full: 従来の全文）"""
+    if mode == "compact":
+        return build_compact_prompt(company, missing_fields, context)
+    prompt = build_prompt_with_constraints(company, missing_fields, context)
+    system_prompt = build_system_prompt()
+    return CompactPrompt(
+        prompt=prompt,
+        system_prompt=system_prompt,
+        estimated_tokens=estimate_tokens(prompt) + estimate_tokens(system_prompt) + 2 * MESSAGE_OVERHEAD_TOKENS,
+    )
+
+
+def _build_enrichment_context(company: Company, rule_result: RuleBasedResult) -> EnrichmentContext:
+    """Phase 2: EnrichmentContext を初期化し、gBizINFO APIの結果を追加する"""
+    context = EnrichmentContext(
+        company_id=company.id,
+        company_name=company.name,
+    )
+    best_match = rule_result.metadata.get("best_match")
+    if best_match:
+        context.add_gbizinfo_result(best_match)
+    elif rule_result.metadata.get("corporate_number_found"):
+        # best_matchがない場合でも、corporate_number_foundがあればコンテキストに追加
+        gbizinfo_result = {
+            "corporate_number": rule_result.metadata.get("corporate_number_found"),
+            "name": rule_result.metadata.get("gbizinfo_official_name", ""),
+            "address": rule_result.metadata.get("gbizinfo_address", ""),
+            "prefecture": rule_result.metadata.get("gbizinfo_prefecture", ""),
+        }
+        if gbizinfo_result.get("corporate_number") or gbizinfo_result.get("address"):
+            context.add_gbizinfo_result(gbizinfo_result)
+    return context
+
+
+def _apply_gbizinfo_overrides(company: Company, rule_result: RuleBasedResult) -> Dict[str, Any]:
+    """
+    gBizINFOから取得した法人番号・住所を一時的に company に設定する（プロンプトに含めるため）。
+    既存値は上書きしない。元に戻すための {field: 元の値} を返す。
+    """
+    originals: Dict[str, Any] = {}
+
+    corporate_number_found = rule_result.metadata.get("corporate_number_found")
+    if corporate_number_found and not company.corporate_number:
+        originals["corporate_number"] = company.corporate_number
+        company.corporate_number = corporate_number_found
+
+    gbizinfo_prefecture = rule_result.metadata.get("gbizinfo_prefecture")
+    if gbizinfo_prefecture and not company.prefecture:
+        originals["prefecture"] = company.prefecture
+        company.prefecture = gbizinfo_prefecture
+
+    gbizinfo_address = rule_result.metadata.get("gbizinfo_address")
+    if gbizinfo_address and not company.city:
+        # 都道府県を除いた住所部分を抽出
+        _prefecture, address_without_pref = split_prefecture(gbizinfo_address)
+        if address_without_pref:
+            originals["city"] = company.city
+            company.city = address_without_pref
+
+    return originals
+
+
+def _restore_company_overrides(company: Company, originals: Dict[str, Any]) -> None:
+    for field, value in originals.items():
+        setattr(company, field, value)
+
+
+@dataclass
+class _PrefetchedCompletion:
+    completion: Dict[str, Any]
+    attribution: TokenAttribution
+
+
+@dataclass
+class _BatchCompletionResult:
+    completions: Dict[int, _PrefetchedCompletion]
+    cost_usd: float
+
+
+def _request_batch_completions(
+    client: PowerplexyClient,
+    usage_tracker: UsageTracker,
+    targets: Sequence[Tuple[Company, List[str], RuleBasedResult]],
+    *,
+    execution_uuid: Optional[str] = None,
+) -> Optional[_BatchCompletionResult]:
+    """
+    複数企業分の補完を1リクエストで問い合わせ、企業ごとに分解した結果を返す。
+
+    リクエスト自体が失敗した場合は None を返す（呼び出し側は企業ごとの単一リクエストにフォールバック）。
+    ただし Rate Limit・サーキットオープン（PowerplexyRateLimitError）は確保した枠を戻して再スローする。
+    回答から企業のセクションを取り出せなかった企業は結果に含めない。
+    """
+    items = [
+        BatchPromptItem(company, remaining, _build_enrichment_context(company, rule_result))
+        for company, remaining, rule_result in targets
+    ]
+    overrides = [
+        (company, _apply_gbizinfo_overrides(company, rule_result))
+        for company, _remaining, rule_result in targets
+    ]
+    try:
+        prompt = build_batch_prompt(items)
+        # 企業ごとのプロンプト量（トークン按分の重み）
+        prompt_weights = {item.company.id: len(build_batch_prompt([item])) for item in items}
+    finally:
+        for company, originals in overrides:
+            _restore_company_overrides(company, originals)
+
+    company_ids = [item.company.id for item in items]
+    max_tokens = int(getattr(client, "max_tokens", 0) or 0) * len(items) or None
+    # 並列ワーカー間で月次上限を超えないよう、企業数分の推定コストを先に確保する
+    reservation = usage_tracker.reserve(float(usage_tracker.cost_per_call) * len(items))
+    if reservation is None:
+        return None
+    logger.info(
+        "[AI_ENRICH][AI_BATCH_REQUEST] company_ids=%s, prompt_length=%d",
+        company_ids,
+        len(prompt),
+    )
+    try:
+        completion, usage = client.extract_json_with_usage(
+            prompt=prompt,
+            system_prompt=build_batch_system_prompt(),
+            max_tokens=max_tokens,
+        )
+    except PowerplexyRateLimitError:
+        # Rate Limit・サーキットオープンは単一リクエストに分けても同じ制限に当たるため、再スローして
+        # 呼び出し側のチェックポイント・Celery retry に任せる
+        usage_tracker.release(reservation)
+        raise
+    except PowerplexyError as exc:
+        usage_tracker.release(reservation)
+        logger.warning(
+            "[AI_ENRICH][AI_BATCH_FAILED] company_ids=%s, execution_uuid=%s, error=%s",
+            company_ids,
+            execution_uuid,
+            str(exc),
+        )
+        return None
+    except Exception:
+        usage_tracker.release(reservation)
+        raise
+
+    parsed = parse_batch_completion(completion, items)
+
+    prompt_tokens = int(usage.get("prompt_tokens") or 0) if isinstance(usage, dict) else 0
+    completion_tokens = int(usage.get("completion_tokens") or 0) if isinstance(usage, dict) else 0
+    estimated_cost = estimate_powerplexy_cost_usd(
+        model=getattr(client, "model", "sonar-pro"),
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        search_context_size="low",
+    )
+    if estimated_cost is None:
+        # usageが取れない場合は従来の固定推定で計上
+        estimated_cost = float(usage_tracker.cost_per_call)
+    weights = {
+        company_id: (
+            prompt_weights.get(company_id, 0),
+            len(json.dumps(parsed[company_id], ensure_ascii=False)) if company_id in parsed else 0,
+        )
+        for company_id in company_ids
+    }
+    attributions = attribute_batch_usage(
+        weights,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cost=float(estimated_cost),
+    )
+    usage_tracker.increment_batch(attributions, reservation=reservation)
+
+    logger.info(
+        "[AI_ENRICH][AI_BATCH_RESPONSE] company_ids=%s, parsed_company_ids=%s",
+        company_ids,
+        list(parsed.keys()),
+    )
+    return _BatchCompletionResult(
+        completions={
+            company_id: _PrefetchedCompletion(completion=section, attribution=attributions[company_id])
+            for company_id, section in parsed.items()
+        },
+        cost_usd=float(estimated_cost),
+    )
+
+
 def should_skip_company(
     company: Company, now: datetime, *, bypass_cooldown: bool = False
 ) -> Tuple[bool, Optional[str]]:
@@ -268,6 +513,11 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
     - include_successful_companies: True で ai_last_enrichment_status=success も未取得フィールドがあれば対象
     - bypass_cooldown: True で再実行クールダウンを無視（バックフィル用。負荷・API上限に注意）
     - only_fields: 未取得のうち指定フィールドのみ補完（例: ["industry"]）。業界バックフィルで他項目を触りたくないときに使用
+    - prompt_batch_size: 1リクエストにまとめる企業数（既定: AI_ENRICH_PROMPT_BATCH_SIZE）。
+      2以上で企業IDキーのJSONでまとめて問い合わせ、取り出せなかった企業は単一リクエストにフォールバック
+
+    処理済み企業と途中結果は AI_ENRICH_CHECKPOINT_INTERVAL 件ごとに run の metadata["checkpoint"] に保存する。
+    Rate Limit で retry された場合は、最初に選定した企業のうち未処理のものを企業IDで個別に再選定して続きから処理する。
 
     注意: このタスクは enqueue_job 経由でのみ実行されることを想定しています。
     execution_uuid が None の場合は RuntimeError を発生させます。
@@ -279,12 +529,22 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
         )
 
     payload = payload or {}
-    tracker_metadata = {"options": payload}
+    tracker_metadata: Dict[str, Any] = {"options": payload}
     processed_company_ids: List[int] = []
 
+    checkpoint = _load_checkpoint(execution_uuid)
+    if checkpoint:
+        # tracker 初期化時に metadata が上書きされるため引き継ぐ
+        tracker_metadata["checkpoint"] = checkpoint
+    checkpoint_interval = max(
+        int(getattr(settings, "AI_ENRICH_CHECKPOINT_INTERVAL", DEFAULT_CHECKPOINT_INTERVAL) or 1),
+        1,
+    )
+
     include_successful_companies = bool(payload.get("include_successful_companies"))
     bypass_cooldown = bool(payload.get("bypass_cooldown"))
     only_fields = payload.get("only_fields")
+    prompt_batch_size = _resolve_prompt_batch_size(payload)
 
     daily_limit = payload.get(
         "limit", getattr(settings, "POWERPLEXY_DAILY_RECORD_LIMIT", DEFAULT_DAILY_LIMIT)
@@ -376,14 +636,37 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
             ))
             return {"status": "skipped", "reason": "missing_api_key", "processed_company_ids": []}
 
-        companies = _companies_requiring_update(
-            daily_limit,
-            company_ids,
-            offset=offset,
-            include_successful_companies=include_successful_companies,
-        )
-        processed_company_ids = [company.id for company in companies]
-        if not companies:
+        planned_company_ids = checkpoint.get("planned_company_ids")
+        if isinstance(planned_company_ids, list) and planned_company_ids:
+            # retry: 完了済みの企業は除き、残りを企業IDで個別に再選定（対象外になった企業は除外される）
+            completed_before = set(checkpoint.get("completed_company_ids") or [])
+            remaining_ids = [cid for cid in planned_company_ids if cid not in completed_before]
+            companies = (
+                _companies_requiring_update(
+                    0,
+                    remaining_ids,
+                    include_successful_companies=include_successful_companies,
+                )
+                if remaining_ids
+                else []
+            )
+            processed_company_ids = list(planned_company_ids)
+            logger.info(
+                "[AI_ENRICH][RESUME] execution_uuid=%s, completed=%d, remaining=%d, eligible=%d",
+                execution_uuid,
+                len(completed_before),
+                len(remaining_ids),
+                len(companies),
+            )
+        else:
+            companies = _companies_requiring_update(
+                daily_limit,
+                company_ids,
+                offset=offset,
+                include_successful_companies=include_successful_companies,
+            )
+            processed_company_ids = [company.id for company in companies]
+        if not processed_company_ids:
             logger.info("No companies require AI enrichment")
             run_tracker.complete_success(metadata=_metadata_with_processed(
                 {
@@ -396,18 +679,180 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
             return {"status": "ok", "processed": 0, "created_candidates": 0, "processed_company_ids": []}
 
         reverse_map = _reverse_field_map()
-        total_candidates = 0
-        calls_made = 0
-        batch_ai_cost_usd = 0.0
-        success_company_ids: List[int] = []
-        failed_company_ids: List[int] = []
-        error_details: List[Dict[str, Any]] = []
-        companies_with_corporate_number = 0  # 法人番号がプロンプトに含まれた企業数
-        ai_api_used = False  # AI APIが実際に使用されたか
+        # retry 時は前回実行の途中結果から再開する
+        total_candidates = int(checkpoint.get("created_candidates", 0))
+        calls_made = int(checkpoint.get("calls", 0))
+        batch_ai_cost_usd = float(checkpoint.get("cost_usd", 0.0))
+        success_company_ids: List[int] = list(checkpoint.get("success_company_ids") or [])
+        failed_company_ids: List[int] = list(checkpoint.get("failed_company_ids") or [])
+        error_details: List[Dict[str, Any]] = list(checkpoint.get("error_details") or [])
+        companies_with_corporate_number = int(checkpoint.get("companies_with_corporate_number", 0))  # 法人番号がプロンプトに含まれた企業数
+        ai_api_used = bool(checkpoint.get("ai_api_used", False))  # AI APIが実際に使用されたか
         corporate_number_api_stats = {"calls": 0, "success": 0, "failed": 0}  # 法人番号API統計
-        enrichment_details: List[Dict[str, Any]] = []  # 補完情報の詳細
-
-        for company in companies:
+        corporate_number_api_stats.update(checkpoint.get("corporate_number_api") or {})
+        # 法人番号APIクライアントは実行全体で1つを使い回す（接続はプロバイダ単位のセッションで再利用される）
+        corporate_number_client = CorporateNumberAPIClient()
+        # 補完情報の詳細はメモリに溜めず AIEnrichmentResult に書き出す（retry 前の分も同じ run に残る）
+        enrichment_details = EnrichmentResultWriter(run_tracker.run)
+        attempts = int(checkpoint.get("attempts", 0)) + 1
+
+        def _save_checkpoint() -> None:
+            enrichment_details.flush()
+            run_tracker.update_progress(
+                metadata={
+                    **(run_tracker.run.metadata or {}),
+                    "checkpoint": {
+                        "attempts": attempts,
+                        "planned_company_ids": processed_company_ids,
+                        "completed_company_ids": _unique_int_list(success_company_ids + failed_company_ids),
+                        "success_company_ids": success_company_ids,
+                        "failed_company_ids": failed_company_ids,
+                        "error_details": error_details[:10],
+                        "created_candidates": total_candidates,
+                        "calls": calls_made,
+                        "cost_usd": batch_ai_cost_usd,
+                        "companies_with_corporate_number": companies_with_corporate_number,
+                        "ai_api_used": ai_api_used,
+                        "corporate_number_api": corporate_number_api_stats,
+                        "prompt_tokens": prompt_token_stats,
+                        "models": model_stats.as_dict(),
+                        "routes": route_counts,
+                        "saved_at": timezone.now().isoformat(),
+                    },
+                }
+            )
+        # 複数企業まとめて問い合わせた結果（company_id -> 回答/ルールベース結果）
+        prefetched_rule_results: Dict[int, RuleBasedResult] = {}
+        prefetched_completions: Dict[int, _PrefetchedCompletion] = {}
+        prompt_batch_stats = {"size": prompt_batch_size, "requests": 0, "companies": 0, "fallbacks": 0}
+        # 単一企業リクエストのプロンプトの推定トークン数と実際の prompt_tokens（推定値の精度・削減効果の確認用）
+        prompt_mode = getattr(settings, "AI_ENRICH_PROMPT_MODE", "compact")
+        prompt_token_stats = {"mode": prompt_mode, "requests": 0, "estimated": 0, "actual": 0, "trimmed": 0}
+        prompt_token_stats.update(checkpoint.get("prompt_tokens") or {})
+        # 企業ごとのモデル振り分けとモデル別の集計
+        default_model = str(getattr(client, "model", "") or getattr(settings, "POWERPLEXY_MODEL", "sonar-pro"))
+        model_router = ModelRouter.from_settings(default_model=default_model, usage_tracker=usage_tracker)
+        model_stats = ModelUsageStats(checkpoint.get("models"))
+        route_counts: Dict[str, int] = dict(checkpoint.get("routes") or {})
+
+        def _request_single_completion(
+            company: Company,
+            model: str,
+            prompt: str,
+            system_prompt: str,
+            reservation,
+            estimated_prompt_tokens: int,
+            trimmed: bool,
+        ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+            """1企業分を問い合わせ、使用量を計上して (回答, 使用量) を返す"""
+            nonlocal ai_api_used, batch_ai_cost_usd, calls_made
+            with timings.measure(STAGE_AI_REQUEST, company_id=company.id):
+                completion, usage = client.extract_json_with_usage(
+                    prompt=prompt, system_prompt=system_prompt, model=model
+                )
+            ai_api_used = True
+
+            # usage（prompt/completion tokens）を元に、1リクエストの推定コストを算出して計上する。
+            # Slackには「今月 $X/$Y（残 $Z）, 今回 +$W」を1行で出す。
+            prompt_tokens = int(usage.get("prompt_tokens") or 0) if isinstance(usage, dict) else 0
+            completion_tokens = int(usage.get("completion_tokens") or 0) if isinstance(usage, dict) else 0
+            if prompt_tokens:
+                prompt_token_stats["requests"] += 1
+                prompt_token_stats["estimated"] += estimated_prompt_tokens
+                prompt_token_stats["actual"] += prompt_tokens
+                prompt_token_stats["trimmed"] += int(trimmed)
+            estimated_cost = estimate_powerplexy_cost_usd(
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                search_context_size="low",
+            )
+            # 予約を実コストで確定（usageが取れない場合は予約額＝従来の固定推定で計上）
+            usage_tracker.commit(
+                reservation,
+                cost=estimated_cost,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+            )
+            if estimated_cost is not None:
+                batch_ai_cost_usd += float(estimated_cost)
+            calls_made += 1
+            model_stats.add_call(model, estimated_cost)
+            return completion, {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": float(estimated_cost or 0.0),
+            }
+        usage_limit_reached = False  # 実行途中で月次上限に達したか
+        timings = StageTimings()  # 段階ごとの処理時間
+
+        def _prefetch_window(window: Sequence[Company]) -> None:
+            nonlocal calls_made, batch_ai_cost_usd, ai_api_used
+            targets: List[Tuple[Company, List[str], RuleBasedResult]] = []
+            for candidate in window:
+                try:
+                    skip, _reason = should_skip_company(
+                        candidate, timezone.now(), bypass_cooldown=bypass_cooldown
+                    )
+                    candidate_missing = [] if skip else _restrict_missing_fields(detect_missing_fields(candidate))
+                    if not candidate_missing:
+                        continue
+                    with timings.measure(STAGE_RULE_BASED, company_id=candidate.id):
+                        candidate_rule_result = apply_rule_based(
+                            candidate,
+                            candidate_missing,
+                            corporate_number_api_stats=corporate_number_api_stats,
+                            return_best_match=True,
+                            corporate_number_client=corporate_number_client,
+                        )
+                except Exception:
+                    # 企業単位の処理に任せる（エラーはそちらで記録される）
+                    logger.debug("[AI_ENRICH][AI_BATCH_PREPARE_FAILED] company_id=%s", candidate.id, exc_info=True)
+                    continue
+                prefetched_rule_results[candidate.id] = candidate_rule_result
+                candidate_remaining = [
+                    field for field in candidate_missing if field not in candidate_rule_result.values
+                ]
+                if candidate_remaining:
+                    targets.append((candidate, candidate_remaining, candidate_rule_result))
+
+            if len(targets) < 2:
+                return
+            with timings.measure(STAGE_AI_BATCH_REQUEST):
+                batch_result = _request_batch_completions(
+                    client,
+                    usage_tracker,
+                    targets,
+                    execution_uuid=execution_uuid,
+                )
+            if batch_result is None:
+                prompt_batch_stats["fallbacks"] += len(targets)
+                return
+            ai_api_used = True
+            calls_made += 1
+            batch_ai_cost_usd += batch_result.cost_usd
+            model_stats.add_call(default_model, batch_result.cost_usd)
+            prompt_batch_stats["requests"] += 1
+            prompt_batch_stats["companies"] += len(batch_result.completions)
+            prompt_batch_stats["fallbacks"] += len(targets) - len(batch_result.completions)
+            prefetched_completions.update(batch_result.completions)
+            # Rate Limit対策: API呼び出し間隔を空ける
+            timings.sleep(AI_ENRICH_API_DELAY_SECONDS)
+
+        for index, company in enumerate(companies):
+            if usage_limit_reached:
+                # 月次上限に達した企業の処理後に打ち切る（残りは deferred_company_ids として次回に回す）
+                break
+            if prompt_batch_size > 1 and index % prompt_batch_size == 0:
+                try:
+                    _prefetch_window(companies[index:index + prompt_batch_size])
+                except PowerplexyRateLimitError:
+                    # まとめたリクエストが Rate Limit・サーキットオープン: 単一リクエストにせず、ここまでの結果を保存して
+                    # Celery retry に任せる（retry 時はこの企業から再開）
+                    _save_checkpoint()
+                    raise
+            company_started = time.perf_counter()
+            completed_before_company = len(success_company_ids) + len(failed_company_ids)
             try:
                 # Phase 1: 再実行ガードチェック
                 now = timezone.now()
@@ -454,36 +899,22 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                     success_company_ids.append(company.id)
                     continue
 
-                # Phase 2: EnrichmentContext初期化
-                context = EnrichmentContext(
-                    company_id=company.id,
-                    company_name=company.name,
-                )
-                
-                rule_result = apply_rule_based(
-                    company,
-                    missing_fields,
-                    corporate_number_api_stats=corporate_number_api_stats,
-                    return_best_match=True,  # Phase 2: best_matchを取得
-                )
+                rule_result = prefetched_rule_results.pop(company.id, None)
+                if rule_result is None:
+                    with timings.measure(STAGE_RULE_BASED, company_id=company.id):
+                        rule_result = apply_rule_based(
+                            company,
+                            missing_fields,
+                            corporate_number_api_stats=corporate_number_api_stats,
+                            return_best_match=True,  # Phase 2: best_matchを取得
+                            corporate_number_client=corporate_number_client,
+                        )
                 provisional_values = dict(rule_result.values)
                 
-                # Phase 2: gBizINFO APIの結果をコンテキストに追加
+                # Phase 2: EnrichmentContext初期化（gBizINFO APIの結果をコンテキストに追加）
                 # Phase 3-②: 初期gBizINFO検索の成功/失敗を記録
                 gbiz_initial_404 = not rule_result.metadata.get("corporate_number_found")
-                best_match = rule_result.metadata.get("best_match")
-                if best_match:
-                    context.add_gbizinfo_result(best_match)
-                elif rule_result.metadata.get("corporate_number_found"):
-                    # best_matchがない場合でも、corporate_number_foundがあればコンテキストに追加
-                    gbizinfo_result = {
-                        "corporate_number": rule_result.metadata.get("corporate_number_found"),
-                        "name": rule_result.metadata.get("gbizinfo_official_name", ""),
-                        "address": rule_result.metadata.get("gbizinfo_address", ""),
-                        "prefecture": rule_result.metadata.get("gbizinfo_prefecture", ""),
-                    }
-                    if gbizinfo_result.get("corporate_number") or gbizinfo_result.get("address"):
-                        context.add_gbizinfo_result(gbizinfo_result)
+                context = _build_enrichment_context(company, rule_result)
                 
                 # 補完できなかった理由を記録（簡潔に）
                 reasons = []
@@ -508,39 +939,8 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                     if "corporate_number" not in missing_fields or company.corporate_number:
                         reasons.append("ルールベースで補完不可")
                 
-                # 法人番号APIで取得した法人番号を一時的に設定（プロンプトに含めるため）
-                corporate_number_found = rule_result.metadata.get("corporate_number_found")
-                original_corporate_number = company.corporate_number
-                if corporate_number_found and not company.corporate_number:
-                    company.corporate_number = corporate_number_found
-                
-                # gBizINFOから取得した情報を一時的に設定（AI補完の精度向上のため）
-                gbizinfo_address = rule_result.metadata.get("gbizinfo_address")
-                gbizinfo_prefecture = rule_result.metadata.get("gbizinfo_prefecture")
-                original_prefecture = company.prefecture
-                original_city = company.city
-                
-                # gBizINFOから取得した住所情報を一時的に設定（プロンプトに含めるため）
-                if gbizinfo_prefecture and not company.prefecture:
-                    company.prefecture = gbizinfo_prefecture
-                if gbizinfo_address:
-                    # 住所から都道府県を除いた部分をcityに設定
-                    # ただし、既にcityがある場合は上書きしない
-                    if not company.city and gbizinfo_address:
-                        # 都道府県を除いた住所部分を抽出
-                        address_without_pref = gbizinfo_address
-                        for pref in ["北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
-                                    "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
-                                    "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
-                                    "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
-                                    "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
-                                    "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
-                                    "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県"]:
-                            if gbizinfo_address.startswith(pref):
-                                address_without_pref = gbizinfo_address[len(pref):].strip()
-                                break
-                        if address_without_pref:
-                            company.city = address_without_pref
+                # gBizINFOから取得した法人番号・住所を一時的に設定（プロンプトに含めるため）
+                company_overrides = _apply_gbizinfo_overrides(company, rule_result)
 
                 remaining = [field for field in missing_fields if field not in provisional_values]
                 ai_values: Dict[str, str] = {}
@@ -550,84 +950,149 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                     if hasattr(company, 'corporate_number') and company.corporate_number:
                         companies_with_corporate_number += 1
                     
-                    # Phase 2: 制約注入版のプロンプトを使用
-                    prompt = build_prompt_with_constraints(company, remaining, context)
-                    system_prompt = build_system_prompt()
-                    try:
-                        logger.info(
-                            "[AI_ENRICH][AI_REQUEST] company_id=%d, missing_fields=%s, prompt_length=%d",
-                            company.id,
-                            remaining,
-                            len(prompt),
-                        )
-                        completion, usage = client.extract_json_with_usage(prompt=prompt, system_prompt=system_prompt)
+                    prefetched = prefetched_completions.pop(company.id, None)
+                    answer_model = default_model  # 最終的に採用した回答のモデル
+                    if prefetched is not None:
+                        # 複数企業まとめたリクエストの回答を使用（使用量は按分済み）
+                        completion = prefetched.completion
                         ai_api_used = True
                         ai_attempted = True
-
-                        # usage（prompt/completion tokens）を元に、1リクエストの推定コストを算出して計上する。
-                        # Slackには「今月 $X/$Y（残 $Z）, 今回 +$W」を1行で出す。
-                        prompt_tokens = int(usage.get("prompt_tokens") or 0) if isinstance(usage, dict) else 0
-                        completion_tokens = int(usage.get("completion_tokens") or 0) if isinstance(usage, dict) else 0
-                        estimated_cost = estimate_powerplexy_cost_usd(
-                            model=getattr(client, "model", "sonar-pro"),
-                            prompt_tokens=prompt_tokens,
-                            completion_tokens=completion_tokens,
-                            search_context_size="low",
-                        )
-                        if estimated_cost is not None:
-                            usage_tracker.increment(cost=estimated_cost)
-                            batch_ai_cost_usd += float(estimated_cost)
-                            calls_made += 1
-                        else:
-                            # usageが取れない場合は従来の固定推定で計上
-                            usage_tracker.increment()
-                            calls_made += 1
-
+                        company_enrichment_record["usage"] = prefetched.attribution.as_dict()
+                        company_enrichment_record["batched"] = True
                         logger.info(
-                            "[AI_ENRICH][AI_RESPONSE] company_id=%d, completion=%s",
+                            "[AI_ENRICH][AI_RESPONSE] company_id=%d, batched=True, completion=%s",
                             company.id,
                             completion if completion else "empty",
                         )
-                    except PowerplexyRateLimitError:
-                        # Rate Limitは再スローしてCelery retryに任せる
-                        raise
-                    except PowerplexyError as exc:
-                        # エラー詳細をメッセージに含めてログに確実に出力（extra はフォーマットにより出ない場合がある）
-                        status_code = getattr(exc, "status_code", None)
-                        response_body = getattr(exc, "response_body", None)
-                        err_msg = str(exc)
-                        if status_code is not None:
-                            logger.warning(
-                                "[AI_ENRICH][FAILED] company_id=%s, execution_uuid=%s, status_code=%s, error=%s, response_body=%s",
-                                company.id,
-                                execution_uuid,
-                                status_code,
-                                err_msg,
-                                (response_body[:500] + "..." if response_body and len(response_body) > 500 else response_body) if response_body else "",
-                            )
+                    else:
+                        # Phase 2: 制約注入版のプロンプトを使用（トークン予算内に収める）
+                        built_prompt = _build_single_prompt(company, remaining, context, prompt_mode)
+                        prompt = built_prompt.prompt
+                        system_prompt = built_prompt.system_prompt
+                        route: RouteDecision = model_router.select(company, remaining)
+                        answer_model = route.model
+                        route_counts[route.route] = route_counts.get(route.route, 0) + 1
+                        # 並列ワーカー間で月次上限を超えないよう、推定コストを先に確保する
+                        reservation = usage_tracker.reserve()
+                        if reservation is None:
+                            # 上限に達した（他ワーカーの実行中分を含む）: この企業は AI に問い合わせず、ルールベースの結果のみ記録する。
+                            # 残りの企業は次回の実行に回す（この企業の処理後に打ち切る）
+                            usage_limit_reached = True
+                            completion = None
+                            reasons.append("AI利用上限に達したためAI補完未実施")
                         else:
-                            logger.warning(
-                                "[AI_ENRICH][FAILED] company_id=%s, execution_uuid=%s, error=%s",
-                                company.id,
-                                execution_uuid,
-                                err_msg,
-                            )
-                        failed_company_ids.append(company.id)
-                        error_details.append({
-                            "company_id": company.id,
-                            "error_type": "PowerPlexyError",
-                            "error": str(exc),
-                        })
-                        # エラーが発生した場合も記録
-                        company_enrichment_record["status"] = "error"
-                        company_enrichment_record["error"] = str(exc)
-                        enrichment_details.append(company_enrichment_record)
-                        continue
-                    
-                    # Rate Limit対策: API呼び出し間隔を空ける
-                    if calls_made > 0:
-                        time.sleep(AI_ENRICH_API_DELAY_SECONDS)
+                            try:
+                                logger.info(
+                                    "[AI_ENRICH][AI_REQUEST] company_id=%d, missing_fields=%s, prompt_length=%d",
+                                    company.id,
+                                    remaining,
+                                    len(prompt),
+                                )
+                                completion, request_usage = _request_single_completion(
+                                    company,
+                                    route.model,
+                                    prompt,
+                                    system_prompt,
+                                    reservation,
+                                    built_prompt.estimated_tokens,
+                                    built_prompt.trimmed,
+                                )
+                                ai_attempted = True
+                                company_enrichment_record["usage"] = request_usage
 
+                                logger.info(
+                                    "[AI_ENRICH][AI_RESPONSE] company_id=%d, completion=%s",
+                                    company.id,
+                                    completion if completion else "empty",
+                                )
+                            except PowerplexyRateLimitError:
+                                # Rate Limitは再スローしてCelery retryに任せる
+                                usage_tracker.release(reservation)
+                                raise
+                            except PowerplexyError as exc:
+                                usage_tracker.release(reservation)
+                                # エラー詳細をメッセージに含めてログに確実に出力（extra はフォーマットにより出ない場合がある）
+                                status_code = getattr(exc, "status_code", None)
+                                response_body = getattr(exc, "response_body", None)
+                                err_msg = str(exc)
+                                if status_code is not None:
+                                    logger.warning(
+                                        "[AI_ENRICH][FAILED] company_id=%s, execution_uuid=%s, status_code=%s, error=%s, response_body=%s",
+                                        company.id,
+                                        execution_uuid,
+                                        status_code,
+                                        err_msg,
+                                        (response_body[:500] + "..." if response_body and len(response_body) > 500 else response_body) if response_body else "",
+                                    )
+                                else:
+                                    logger.warning(
+                                        "[AI_ENRICH][FAILED] company_id=%s, execution_uuid=%s, error=%s",
+                                        company.id,
+                                        execution_uuid,
+                                        err_msg,
+                                    )
+                                failed_company_ids.append(company.id)
+                                error_details.append({
+                                    "company_id": company.id,
+                                    "error_type": "PowerPlexyError",
+                                    "error": str(exc),
+                                })
+                                # エラーが発生した場合も記録
+                                company_enrichment_record["status"] = "error"
+                                company_enrichment_record["error"] = str(exc)
+                                enrichment_details.append(company_enrichment_record)
+                                continue
+                    
+                            # Rate Limit対策: API呼び出し間隔を空ける
+                            if calls_made > 0:
+                                timings.sleep(AI_ENRICH_API_DELAY_SECONDS)
+
+                            # 安価なモデルの回答が空・低信頼度の場合は上位モデルで問い合わせ直す
+                            if model_router.should_escalate(route, completion, remaining, context):
+                                escalation_reservation = usage_tracker.reserve()
+                                if escalation_reservation is not None:
+                                    model_stats.add_escalation(route.model)
+                                    try:
+                                        escalated, escalated_usage = _request_single_completion(
+                                            company,
+                                            route.escalate_to,
+                                            prompt,
+                                            system_prompt,
+                                            escalation_reservation,
+                                            built_prompt.estimated_tokens,
+                                            built_prompt.trimmed,
+                                        )
+                                    except PowerplexyRateLimitError:
+                                        usage_tracker.release(escalation_reservation)
+                                        raise
+                                    except PowerplexyError as exc:
+                                        # 上位モデルで失敗しても安価なモデルの回答で続行する
+                                        usage_tracker.release(escalation_reservation)
+                                        logger.warning(
+                                            "[AI_ENRICH][ESCALATION_FAILED] company_id=%s, model=%s, error=%s",
+                                            company.id,
+                                            route.escalate_to,
+                                            str(exc),
+                                        )
+                                    else:
+                                        logger.info(
+                                            "[AI_ENRICH][ESCALATED] company_id=%d, from=%s, to=%s",
+                                            company.id,
+                                            route.model,
+                                            route.escalate_to,
+                                        )
+                                        if escalated:
+                                            completion = {
+                                                **(completion or {}),
+                                                **{key: value for key, value in escalated.items() if value},
+                                            }
+                                            answer_model = route.escalate_to
+                                        company_enrichment_record["usage"] = {
+                                            key: request_usage[key] + escalated_usage[key] for key in request_usage
+                                        }
+                                        timings.sleep(AI_ENRICH_API_DELAY_SECONDS)
+
+                    normalize_started = time.perf_counter()
                     mapped: Dict[str, str] = {}
                     if completion:
                         logger.info(
@@ -679,6 +1144,8 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                             )
                     
                     ai_values = mapped
+                    model_stats.add_filled(answer_model, len(mapped))
+                    timings.add(STAGE_NORMALIZE, time.perf_counter() - normalize_started, company_id=company.id)
                     
                     # Phase 2: AI補完の結果をコンテキストに追加
                     if completion:
@@ -717,6 +1184,7 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                 gbiz_retry_404 = False
                 if context.has_ai_hints_for_retry():
                     gbiz_retry_attempted = True
+                    retry_started = time.perf_counter()
                     logger.info(
                         "[AI_ENRICH][GBIZINFO_RETRY] company_id=%d, candidates=%s, english_name=%s",
                         company.id,
@@ -724,8 +1192,7 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                         context.ai_english_name or "",
                     )
                     try:
-                        from companies.services.corporate_number_client import CorporateNumberAPIClient
-                        retry_client = CorporateNumberAPIClient()
+                        retry_client = corporate_number_client
                         
                         # 再探索候補リストを構築（正式法人名候補 + 英語名）
                         retry_candidates = list(context.ai_official_name_candidates)
@@ -782,16 +1249,14 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                             exc_info=True,
                         )
                 
+                if gbiz_retry_attempted:
+                    timings.add(STAGE_GBIZINFO_RETRY, time.perf_counter() - retry_started, company_id=company.id)
+
                 # Phase 2: 信頼度計算
                 context.confidence = calculate_confidence(context)
                 
                 # 一時的に設定した情報を元に戻す
-                if corporate_number_found and not original_corporate_number:
-                    company.corporate_number = original_corporate_number
-                if gbizinfo_prefecture and not original_prefecture:
-                    company.prefecture = original_prefecture
-                if gbizinfo_address and not original_city:
-                    company.city = original_city
+                _restore_company_overrides(company, company_overrides)
 
                 combined: Dict[str, str] = {}
                 combined.update({field: value for field, value in provisional_values.items() if value})
@@ -877,16 +1342,17 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                     success_company_ids.append(company.id)
                     continue
                 
-                normalized_entries: Dict[str, str] = {}
-                for field, raw_value in combined.items():
-                    normalized = normalize_candidate_value(field, raw_value)
-                    if normalized:
-                        normalized_entries[field] = normalized
-                    else:
-                        logger.debug(
-                            "Skipping candidate due to normalization failure",
-                            extra={"field": field, "raw_value": raw_value, "company_id": company.id},
-                        )
+                with timings.measure(STAGE_NORMALIZE, company_id=company.id):
+                    normalized_entries: Dict[str, str] = {}
+                    for field, raw_value in combined.items():
+                        normalized = normalize_candidate_value(field, raw_value)
+                        if normalized:
+                            normalized_entries[field] = normalized
+                        else:
+                            logger.debug(
+                                "Skipping candidate due to normalization failure",
+                                extra={"field": field, "raw_value": raw_value, "company_id": company.id},
+                            )
 
                 if not normalized_entries:
                     # normalized_entriesが空でも、combinedがあれば補完情報を記録
@@ -932,17 +1398,18 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                     )
                 
                 if entry_records:
-                    ingested = ingest_rule_based_candidates(entry_records)
-                    total_candidates += len(ingested)
-                    # Phase 1: 再実行ガード - ステータスを更新
-                    # Phase 3-③: 成功時はnext_retry_strategyをNONEにリセット
-                    enrichment_status = "success" if enriched_fields else "partial"
-                    Company.objects.filter(id=company.id).update(
-                        ai_last_enriched_at=timezone.now(),
-                        ai_last_enriched_source="ai" if ai_values else "rule",
-                        ai_last_enrichment_status=enrichment_status,
-                        next_retry_strategy=RetryStrategy.NONE.value,
-                    )
+                    with timings.measure(STAGE_INGEST, company_id=company.id):
+                        ingested = ingest_rule_based_candidates(entry_records)
+                        total_candidates += len(ingested)
+                        # Phase 1: 再実行ガード - ステータスを更新
+                        # Phase 3-③: 成功時はnext_retry_strategyをNONEにリセット
+                        enrichment_status = "success" if enriched_fields else "partial"
+                        Company.objects.filter(id=company.id).update(
+                            ai_last_enriched_at=timezone.now(),
+                            ai_last_enriched_source="ai" if ai_values else "rule",
+                            ai_last_enrichment_status=enrichment_status,
+                            next_retry_strategy=RetryStrategy.NONE.value,
+                        )
                 
                 # 補完情報を記録（enriched_fieldsがあれば記録）
                 # 候補が作成されなくても（既存値と一致する場合など）、補完が試みられた場合は記録
@@ -967,6 +1434,10 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                         )
                 
                 success_company_ids.append(company.id)
+            except PowerplexyRateLimitError:
+                # Rate Limit: ここまでの結果を保存して Celery retry に任せる（retry 時はこの企業から再開）
+                _save_checkpoint()
+                raise
             except Exception as exc:
                 # 予期しないエラーも記録（部分成功前提）
                 logger.warning(
@@ -984,6 +1455,39 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                     "error_type": type(exc).__name__,
                     "error": str(exc),
                 })
+            finally:
+                completed_count = len(success_company_ids) + len(failed_company_ids)
+                company_elapsed = time.perf_counter() - company_started
+                if completed_count > completed_before_company:
+                    enrichment_details.finish_company(company.id, duration_ms=int(round(company_elapsed * 1000)))
+                    if completed_count % checkpoint_interval == 0:
+                        _save_checkpoint()
+                timings.add(STAGE_COMPANY_TOTAL, company_elapsed, company_id=company.id)
+                stage_ms = timings.finish_company(company.id)
+                logger.info(
+                    "[AI_ENRICH][TIMING] company_id=%d, stages_ms=%s",
+                    company.id,
+                    stage_ms,
+                    extra={
+                        "company_id": company.id,
+                        "execution_uuid": execution_uuid,
+                        "stage_timings_ms": stage_ms,
+                    },
+                )
+
+        deferred_company_ids: List[int] = []
+        if usage_limit_reached:
+            handled_ids = set(success_company_ids) | set(failed_company_ids)
+            deferred_company_ids = [cid for cid in processed_company_ids if cid not in handled_ids]
+            processed_company_ids = [cid for cid in processed_company_ids if cid in handled_ids]
+            logger.warning(
+                "[AI_ENRICH][USAGE_LIMIT_REACHED] deferred_count=%d, execution_uuid=%s",
+                len(deferred_company_ids),
+                execution_uuid,
+            )
+
+        enrichment_details.flush()
+        result_summary = summarize_results(run_tracker.run)
 
         usage_after = usage_tracker.snapshot()
         usage_after_dict = {"calls": usage_after.calls, "cost": usage_after.cost}
@@ -991,7 +1495,7 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
         # 失敗した会社IDをmetadataに保存（再実行用）
         metadata_base = {
             "result": "ok",
-            "processed": len(companies),
+            "processed": len(processed_company_ids),
             "success_count": len(success_company_ids),
             "failed_count": len(failed_company_ids),
             "created_candidates": total_candidates,
@@ -1002,23 +1506,39 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
             "ai_api_used": ai_api_used,
             "corporate_number_api": corporate_number_api_stats,
         }
+        if prompt_batch_size > 1:
+            metadata_base["prompt_batch"] = prompt_batch_stats
+        metadata_base["stage_timings"] = timings.summary()
+        if calls_made:
+            metadata_base["models"] = model_stats.summary()
+            metadata_base["routes"] = route_counts
+        if prompt_token_stats["requests"]:
+            metadata_base["prompt_tokens"] = {
+                **prompt_token_stats,
+                "avg_actual": round(prompt_token_stats["actual"] / prompt_token_stats["requests"], 1),
+                "actual_to_estimated": round(
+                    prompt_token_stats["actual"] / max(prompt_token_stats["estimated"], 1), 3
+                ),
+            }
+        metadata_base["results"] = result_summary
+        if attempts > 1:
+            metadata_base["resumed_attempts"] = attempts
+        if usage_limit_reached:
+            metadata_base["usage_limit_reached"] = True
+            metadata_base["deferred_count"] = len(deferred_company_ids)
         
         # 補完情報が記録されている場合のみ通知を送信
-        if not enrichment_details and total_candidates == 0:
+        if not result_summary["count"] and total_candidates == 0:
             logger.info(
                 "[AI_ENRICH][NOTIFICATION] Skipping notification: no enrichment details and no candidates created"
             )
         else:
             # 通知用の詳細情報を構築（シンプルに）
             # 補完情報のフィールド数を計算（実際に補完された情報の数）
-            total_enriched_fields = sum(
-                len(detail.get("fields", [])) 
-                for detail in enrichment_details 
-                if isinstance(detail, dict)
-            )
+            total_enriched_fields = result_summary["field_count"]
             
             notification_extra = {
-                "処理企業数": len(companies),
+                "処理企業数": len(processed_company_ids),
                 "成功": len(success_company_ids),
                 "失敗": len(failed_company_ids),
                 "作成された候補数": total_candidates,
@@ -1036,13 +1556,16 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
             # 補完情報を追加（折りたたみ可能な形式で）
             logger.info(
                 "[AI_ENRICH][NOTIFICATION] enrichment_details count: %d, total_fields: %d, total_candidates: %d",
-                len(enrichment_details),
+                result_summary["count"],
                 total_enriched_fields,
                 total_candidates,
-                extra={"enrichment_details": enrichment_details},
+                extra={"enrichment_results": result_summary},
             )
-            if enrichment_details:
-                notification_extra["補完情報"] = enrichment_details
+            if result_summary["count"]:
+                notification_extra["補完情報"] = result_details(
+                    run_tracker.run, limit=NOTIFICATION_DETAILS_LIMIT
+                )
+                notification_extra["補完情報件数"] = result_summary["count"]
             
             if failed_company_ids:
                 metadata_base["failed_company_ids"] = failed_company_ids
@@ -1062,7 +1585,7 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
                 metadata_base,
                 processed_company_ids,
             ),
-            input_count=len(companies),
+            input_count=len(processed_company_ids),
             inserted_count=total_candidates,
             skipped_count=0,
             error_count=len(failed_company_ids),
@@ -1070,7 +1593,7 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
 
         return {
             "status": "ok",
-            "processed": len(companies),
+            "processed": len(processed_company_ids),
             "success_count": len(success_company_ids),
             "failed_count": len(failed_company_ids),
             "failed_company_ids": failed_company_ids,
@@ -1078,3 +1601,9 @@ def run_ai_enrich(self, payload: Optional[dict] = None, execution_uuid: Optional
             "calls": calls_made,
             "processed_company_ids": processed_company_ids,
         }
+
+
+@shared_task(ignore_result=True)
+def dispatch_slack_notifications() -> dict:
+    """送信キューの Slack 通知をまとめて送信する（低優先度で実行）"""
+    return dispatch_pending_notifications()
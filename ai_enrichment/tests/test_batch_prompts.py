@@ -0,0 +1,162 @@
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from companies.models import Company, CompanyUpdateCandidate
+from data_collection.models import DataCollectionRun
+
+from ai_enrichment.enrich_rules import (
+    BatchPromptItem,
+    RuleBasedResult,
+    build_batch_prompt,
+    parse_batch_completion,
+)
+from ai_enrichment.exceptions import PowerplexyCircuitOpenError, PowerplexyRateLimitError, PowerplexyResponseError
+from ai_enrichment.redis_usage import UsageSnapshot, attribute_batch_usage
+from ai_enrichment.tasks import _request_batch_completions, run_ai_enrich
+
+
+class BatchPromptTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.first = Company(id=11, name="テスト株式会社", website_url="https://example.com")
+        self.second = Company(id=12, name="別会社", prefecture="大阪府")
+
+    def test_build_batch_prompt_lists_each_company_once(self):
+        prompt = build_batch_prompt([
+            BatchPromptItem(self.first, ["contact_person_name"]),
+            BatchPromptItem(self.second, ["contact_person_name", "capital"]),
+        ])
+
+        self.assertIn("【企業ID: 11】", prompt)
+        self.assertIn("【企業ID: 12】", prompt)
+        self.assertIn("企業名: 別会社", prompt)
+        # 共通の指示・フィールド説明は1回のみ
+        self.assertEqual(prompt.count("【出力形式】"), 1)
+        self.assertEqual(prompt.count("- 担当者名:"), 1)
+
+    def test_parse_batch_completion_validates_each_company(self):
+        items = [
+            BatchPromptItem(self.first, ["contact_person_name"]),
+            BatchPromptItem(self.second, ["contact_person_name"]),
+            BatchPromptItem(Company(id=13, name="三社目"), ["capital"]),
+        ]
+        parsed = parse_batch_completion(
+            {
+                "11": {"担当者名": "田中 太郎"},
+                "企業ID: 12": {"担当者名": "佐藤 花子"},
+                "13": "見つかりませんでした",
+            },
+            items,
+        )
+
+        self.assertEqual(parsed[11], {"担当者名": "田中 太郎"})
+        self.assertEqual(parsed[12], {"担当者名": "佐藤 花子"})
+        self.assertNotIn(13, parsed)
+
+    def test_attribute_batch_usage_preserves_totals(self):
+        attributions = attribute_batch_usage(
+            {1: (300, 20), 2: (100, 0), 3: (200, 40)},
+            prompt_tokens=601,
+            completion_tokens=61,
+            cost=0.012,
+        )
+
+        self.assertEqual(sum(a.prompt_tokens for a in attributions.values()), 601)
+        self.assertEqual(sum(a.completion_tokens for a in attributions.values()), 61)
+        self.assertAlmostEqual(sum(a.cost for a in attributions.values()), 0.012)
+        self.assertEqual(attributions[2].completion_tokens, 0)
+        self.assertGreater(attributions[1].prompt_tokens, attributions[2].prompt_tokens)
+
+
+@override_settings(POWERPLEXY_API_KEY="dummy-key", CORPORATE_NUMBER_API_TOKEN="")
+class RunAIEnrichBatchedPromptTests(TestCase):
+    def setUp(self) -> None:
+        self.first = Company.objects.create(name="テスト株式会社", website_url="https://example.com")
+        self.second = Company.objects.create(name="別会社", website_url="https://other.example.com")
+
+    @mock.patch("ai_enrichment.tasks.time.sleep")
+    @mock.patch("ai_enrichment.tasks.notify_success")
+    @mock.patch("ai_enrichment.tasks.notify_warning")
+    @mock.patch("ai_enrichment.tasks.PowerplexyClient")
+    @mock.patch("ai_enrichment.tasks.UsageTracker")
+    def test_batched_request_falls_back_to_single_call_for_unparsed_company(
+        self, mock_tracker, mock_client_cls, _warning, _success, _sleep
+    ):
+        tracker_instance = mock_tracker.return_value
+        tracker_instance.snapshot.return_value = UsageSnapshot(calls=0, cost=0.0)
+        tracker_instance.can_execute.return_value = True
+        tracker_instance.cost_per_call = 0.05
+
+        client_instance = mock_client_cls.return_value
+        client_instance.model = "sonar-pro"
+        client_instance.max_tokens = 1000
+        client_instance.extract_json_with_usage.side_effect = [
+            (
+                {str(self.first.id): {"担当者名": "田中 太郎"}},
+                {"prompt_tokens": 400, "completion_tokens": 40},
+            ),
+            ({"担当者名": "佐藤 花子"}, {"prompt_tokens": 200, "completion_tokens": 20}),
+        ]
+
+        execution_uuid = str(uuid.uuid4())
+        result = run_ai_enrich.run(
+            {"company_ids": [self.first.id, self.second.id], "prompt_batch_size": 2},
+            execution_uuid=execution_uuid,
+        )
+
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(result["calls"], 2)
+        batch_call, single_call = client_instance.extract_json_with_usage.call_args_list
+        self.assertEqual(batch_call.kwargs["max_tokens"], 2000)
+        self.assertIsNone(single_call.kwargs.get("max_tokens"))
+
+        tracker_instance.increment_batch.assert_called_once()
+        attributions = tracker_instance.increment_batch.call_args.args[0]
+        self.assertEqual(set(attributions), {self.first.id, self.second.id})
+        tracker_instance.commit.assert_called_once()
+
+        for company, value in ((self.first, "田中 太郎"), (self.second, "佐藤 花子")):
+            self.assertTrue(
+                CompanyUpdateCandidate.objects.filter(
+                    company=company,
+                    field="contact_person_name",
+                    candidate_value=value,
+                    source_type=CompanyUpdateCandidate.SOURCE_AI,
+                ).exists()
+            )
+
+        stage_timings = DataCollectionRun.objects.get(execution_uuid=execution_uuid).metadata["stage_timings"]
+        self.assertEqual(stage_timings["stages"]["ai_batch_request"]["count"], 1)
+        self.assertEqual(stage_timings["stages"]["ai_request"]["count"], 1)
+        self.assertEqual(stage_timings["stages"]["company_total"]["count"], 2)
+
+
+class RequestBatchCompletionsTests(TestCase):
+    def setUp(self) -> None:
+        companies = [
+            Company.objects.create(name=f"まとめ{i}", website_url=f"https://batch{i}.example.com") for i in range(2)
+        ]
+        self.targets = [(company, ["contact_person_name"], RuleBasedResult(values={}, metadata={})) for company in companies]
+        self.tracker = mock.Mock(cost_per_call=0.05)
+        self.tracker.reserve.return_value = "reservation"
+        self.client = mock.Mock(model="sonar-pro", max_tokens=1000)
+
+    def test_rate_limit_and_circuit_open_are_raised_after_release(self):
+        for exc in (PowerplexyRateLimitError("429"), PowerplexyCircuitOpenError("powerplexy", 30)):
+            self.tracker.release.reset_mock()
+            self.client.extract_json_with_usage.side_effect = exc
+            with self.assertRaises(type(exc)):
+                _request_batch_completions(self.client, self.tracker, self.targets)
+            self.tracker.release.assert_called_once_with("reservation")
+
+    def test_other_errors_fall_back_or_raise_after_release(self):
+        self.client.extract_json_with_usage.side_effect = PowerplexyResponseError("bad response")
+        self.assertIsNone(_request_batch_completions(self.client, self.tracker, self.targets))
+        self.tracker.release.assert_called_once_with("reservation")
+
+        self.tracker.release.reset_mock()
+        self.client.extract_json_with_usage.side_effect = ValueError("unexpected")
+        with self.assertRaises(ValueError):
+            _request_batch_completions(self.client, self.tracker, self.targets)
+        self.tracker.release.assert_called_once_with("reservation")
@@ -0,0 +1,123 @@
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from companies.models import Company
+from data_collection.models import DataCollectionRun
+
+from ai_enrichment.enrichment_context import EnrichmentContext
+from ai_enrichment.model_routing import ModelRouter
+from ai_enrichment.redis_usage import UsageSnapshot
+from ai_enrichment.tasks import run_ai_enrich
+
+ROUTES = [
+    {
+        "name": "cheap_fields",
+        "model": "sonar",
+        "fields": ["established_year", "capital"],
+        "max_missing_fields": 2,
+        "skip_if_failed": True,
+        "escalate_to": "sonar-pro",
+    },
+    {"name": "low_budget", "model": "sonar", "max_remaining_budget_ratio": 0.1},
+]
+
+
+class ModelRouterTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.tracker = mock.Mock(cost_limit=100.0)
+        self.tracker.remaining.return_value = UsageSnapshot(calls=0, cost=50.0)
+        self.router = ModelRouter(ROUTES, default_model="sonar-pro", usage_tracker=self.tracker)
+        self.company = Company(id=31, name="テスト株式会社")
+
+    def test_cheap_fields_use_cheap_model_with_escalation(self):
+        decision = self.router.select(self.company, ["established_year"])
+
+        self.assertEqual(decision.route, "cheap_fields")
+        self.assertEqual(decision.model, "sonar")
+        self.assertEqual(decision.escalate_to, "sonar-pro")
+
+    def test_failure_history_and_other_fields_use_default_model(self):
+        self.assertEqual(self.router.select(self.company, ["established_year", "contact_person_name"]).model, "sonar-pro")
+
+        self.company.ai_last_enrichment_status = "failed"
+        self.assertEqual(self.router.select(self.company, ["established_year"]).route, "default")
+
+    def test_low_remaining_budget_routes_to_cheap_model(self):
+        self.tracker.remaining.return_value = UsageSnapshot(calls=0, cost=5.0)
+
+        decision = self.router.select(self.company, ["contact_person_name"])
+
+        self.assertEqual(decision.route, "low_budget")
+        self.assertIsNone(decision.escalate_to)
+
+    def test_should_escalate_on_empty_or_low_confidence_answer(self):
+        decision = self.router.select(self.company, ["established_year"])
+        context = EnrichmentContext(company_id=self.company.id, company_name=self.company.name)
+
+        self.assertTrue(self.router.should_escalate(decision, {}, ["established_year"], context))
+        # 単一言及（信頼度 0.5）は上位モデルで確認する
+        self.assertTrue(self.router.should_escalate(decision, {"設立年": "2001"}, ["established_year"], context))
+        context.add_gbizinfo_result({"corporate_number": "1234567890123"})
+        context.ai_website_url = "https://example.com"
+        self.assertFalse(
+            self.router.should_escalate(decision, {"設立年": "2001", "会社HP": "https://example.com"}, ["established_year"], context)
+        )
+        # 元のコンテキストは変更しない
+        self.assertFalse(context.ai_findings)
+
+
+@override_settings(
+    POWERPLEXY_API_KEY="dummy-key",
+    CORPORATE_NUMBER_API_TOKEN="",
+    AI_ENRICH_MODEL_ROUTES=ROUTES,
+)
+class RunAIEnrichModelRoutingTests(TestCase):
+    @mock.patch("ai_enrichment.tasks.time.sleep")
+    @mock.patch("ai_enrichment.tasks.notify_success")
+    @mock.patch("ai_enrichment.tasks.notify_warning")
+    @mock.patch("ai_enrichment.tasks.PowerplexyClient")
+    @mock.patch("ai_enrichment.tasks.UsageTracker")
+    def test_escalates_empty_cheap_answer_and_reports_cost_per_model(
+        self, mock_tracker, mock_client_cls, _warning, _success, _sleep
+    ):
+        company = Company.objects.create(
+            name="設立年だけ不明",
+            website_url="https://example.com",
+            industry="IT",
+            contact_person_name="田中 太郎",
+            contact_person_position="代表取締役",
+            capital=10000000,
+            employee_count=10,
+            prefecture="東京都",
+            city="千代田区",
+            business_description="ソフトウェア開発",
+        )
+        tracker_instance = mock_tracker.return_value
+        tracker_instance.snapshot.return_value = UsageSnapshot(calls=0, cost=0.0)
+        tracker_instance.can_execute.return_value = True
+        tracker_instance.cost_limit = 150.0
+
+        client_instance = mock_client_cls.return_value
+        client_instance.model = "sonar-pro"
+        client_instance.extract_json_with_usage.side_effect = [
+            ({}, {"prompt_tokens": 300, "completion_tokens": 5}),
+            ({"設立年": "2001"}, {"prompt_tokens": 300, "completion_tokens": 10}),
+        ]
+
+        execution_uuid = str(uuid.uuid4())
+        result = run_ai_enrich.run({"company_ids": [company.id]}, execution_uuid=execution_uuid)
+
+        self.assertEqual(result["calls"], 2)
+        cheap_call, escalated_call = client_instance.extract_json_with_usage.call_args_list
+        self.assertEqual(cheap_call.kwargs["model"], "sonar")
+        self.assertEqual(escalated_call.kwargs["model"], "sonar-pro")
+
+        metadata = DataCollectionRun.objects.get(execution_uuid=execution_uuid).metadata
+        self.assertEqual(metadata["routes"], {"cheap_fields": 1})
+        self.assertEqual(metadata["models"]["sonar"]["escalations"], 1)
+        self.assertEqual(metadata["models"]["sonar"]["filled_fields"], 0)
+        self.assertIsNone(metadata["models"]["sonar"]["cost_per_filled_field"])
+        self.assertEqual(metadata["models"]["sonar-pro"]["filled_fields"], 1)
+        self.assertGreater(metadata["models"]["sonar-pro"]["cost_per_filled_field"], 0)
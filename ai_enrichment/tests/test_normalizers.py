@@ -53,3 +53,12 @@ class NormalizerTests(SimpleTestCase):
             normalize_candidate_value("contact_person_position", "代表取締役 菊地航輔"),
             "代表取締役",
         )
+
+    def test_prefecture_accepts_short_name_and_full_address(self):
+        self.assertEqual(normalize_candidate_value("prefecture", "東京"), "東京都")
+        self.assertEqual(normalize_candidate_value("prefecture", "大阪府大阪市北区梅田1-1"), "大阪府")
+        self.assertIsNone(normalize_candidate_value("prefecture", "関東地方"))
+
+    def test_city_strips_prefecture(self):
+        self.assertEqual(normalize_candidate_value("city", "東京都　港区芝公園4-2-8"), "港区芝公園4-2-8")
+        self.assertEqual(normalize_candidate_value("city", "港区芝公園4-2-8"), "港区芝公園4-2-8")
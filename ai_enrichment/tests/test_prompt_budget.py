@@ -0,0 +1,56 @@
+from django.test import SimpleTestCase
+
+from companies.models import Company
+
+from ai_enrichment.enrich_rules import build_prompt_with_constraints, build_system_prompt, detect_missing_fields
+from ai_enrichment.enrichment_context import EnrichmentContext
+from ai_enrichment.prompt_budget import build_compact_prompt, estimate_tokens
+
+
+class CompactPromptTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.company = Company(
+            id=21,
+            name="テスト株式会社",
+            website_url="https://example.com",
+            prefecture="東京都",
+            corporate_number="1234567890123",
+        )
+
+    def test_estimate_tokens_counts_japanese_per_character(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("資本金"), 3)
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+
+    def test_single_field_prompt_only_describes_requested_field(self):
+        compact = build_compact_prompt(self.company, ["capital"], max_tokens=0)
+
+        self.assertIn("資本金", compact.prompt)
+        self.assertNotIn("従業員数", compact.prompt)
+        self.assertNotIn("担当者名", compact.prompt)
+        full_tokens = estimate_tokens(build_prompt_with_constraints(self.company, ["capital"])) + estimate_tokens(
+            build_system_prompt()
+        )
+        self.assertLess(compact.estimated_tokens, full_tokens / 2)
+
+    def test_constraints_already_in_company_info_are_dropped(self):
+        context = EnrichmentContext(company_id=self.company.id, company_name=self.company.name)
+        context.add_gbizinfo_result({
+            "corporate_number": "1234567890123",
+            "name": "テスト株式会社",
+            "address": "東京都千代田区1-1",
+        })
+
+        compact = build_compact_prompt(self.company, ["capital"], context, max_tokens=0)
+
+        self.assertEqual(compact.prompt.count("1234567890123"), 1)
+        self.assertIn("- 所在地: 東京都千代田区1-1", compact.prompt)
+
+    def test_budget_drops_optional_sections(self):
+        fields = detect_missing_fields(self.company)
+        unlimited = build_compact_prompt(self.company, fields, max_tokens=0)
+        limited = build_compact_prompt(self.company, fields, max_tokens=unlimited.estimated_tokens - 1)
+
+        self.assertTrue(limited.trimmed)
+        self.assertLess(limited.estimated_tokens, unlimited.estimated_tokens)
+        self.assertIn("【出力形式】", limited.prompt)
@@ -0,0 +1,70 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ai_enrichment.models import SlackNotificationOutbox
+from ai_enrichment.notify import notify_success, notify_warning
+from ai_enrichment.slack_dispatch import dispatch_pending_notifications, local_sink
+
+
+class FailingSink:
+    def send(self, channel, payload):
+        raise ConnectionError("webhook timeout")
+
+
+@override_settings(
+    SLACK_WEBHOOK_URL="",
+    SLACK_NOTIFICATION_SINK="local",
+    SLACK_NOTIFY_ASYNC=True,
+    SLACK_NOTIFY_COALESCE_SECONDS=60,
+)
+class SlackDispatchTests(TestCase):
+    def setUp(self) -> None:
+        local_sink.clear()
+
+    @mock.patch("ai_enrichment.notify.requests.post")
+    def test_notify_only_enqueues(self, mock_post):
+        notify_success("AI補完バッチが完了しました", extra={"成功": 3})
+
+        notification = SlackNotificationOutbox.objects.get()
+        self.assertEqual(notification.status, SlackNotificationOutbox.Status.PENDING)
+        self.assertEqual(notification.level, "success")
+        self.assertIn("成功", str(notification.payload["blocks"]))
+        mock_post.assert_not_called()
+        self.assertEqual(local_sink.sent, [])
+
+    def test_dispatch_coalesces_notifications_in_same_window(self):
+        notify_success("一件目")
+        notify_warning("二件目")
+        # 別の時間枠の通知は別メッセージになる
+        later = SlackNotificationOutbox.objects.create(message="三件目", payload={"blocks": [{"type": "section"}]})
+        SlackNotificationOutbox.objects.filter(id=later.id).update(created_at=timezone.now() + timedelta(minutes=5))
+
+        stats = dispatch_pending_notifications()
+
+        self.assertEqual(stats["sent"], 3)
+        self.assertEqual(stats["messages"], 2)
+        channel, merged = local_sink.sent[0]
+        self.assertEqual(channel, "default")
+        self.assertIn({"type": "divider"}, merged["blocks"])
+        self.assertFalse(
+            SlackNotificationOutbox.objects.exclude(status=SlackNotificationOutbox.Status.SENT).exists()
+        )
+        # 送信済みは再送しない
+        self.assertEqual(dispatch_pending_notifications()["notifications"], 0)
+
+    @override_settings(SLACK_NOTIFY_MAX_ATTEMPTS=2)
+    def test_failed_send_is_retried_until_max_attempts(self):
+        notify_success("送信失敗")
+
+        dispatch_pending_notifications(sink=FailingSink())
+        notification = SlackNotificationOutbox.objects.get()
+        self.assertEqual(notification.status, SlackNotificationOutbox.Status.PENDING)
+        self.assertIn("webhook timeout", notification.last_error)
+
+        dispatch_pending_notifications(sink=FailingSink())
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, SlackNotificationOutbox.Status.FAILED)
+        self.assertEqual(notification.attempts, 2)
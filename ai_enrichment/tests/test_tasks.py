@@ -1,11 +1,15 @@
 
+import uuid
 from unittest import mock
 
 from django.test import TestCase, override_settings
 from django.utils import timezone
 
 from companies.models import Company, CompanyUpdateCandidate
+from data_collection.models import DataCollectionRun
 
+from ai_enrichment.exceptions import PowerplexyRateLimitError
+from ai_enrichment.models import AIEnrichmentResult
 from ai_enrichment.redis_usage import UsageSnapshot
 from ai_enrichment.tasks import run_ai_enrich
 
@@ -124,3 +128,140 @@ class RunAIEnrichTaskTests(TestCase):
             ).exists()
         )
         client_instance.extract_json.assert_called_once()
+
+
+@override_settings(POWERPLEXY_API_KEY='dummy-key', CORPORATE_NUMBER_API_TOKEN='')
+class RunAIEnrichUsageReservationTests(TestCase):
+    @mock.patch('ai_enrichment.tasks.notify_success')
+    @mock.patch('ai_enrichment.tasks.notify_warning')
+    @mock.patch('ai_enrichment.tasks.PowerplexyClient')
+    @mock.patch('ai_enrichment.tasks.UsageTracker')
+    def test_defers_remaining_companies_when_reservation_denied(self, mock_tracker, mock_client_cls, _warning, _success):
+        first = Company.objects.create(name="一社目", website_url="https://first.example.com")
+        second = Company.objects.create(name="二社目", website_url="https://second.example.com")
+        tracker_instance = mock_tracker.return_value
+        tracker_instance.snapshot.return_value = UsageSnapshot(calls=0, cost=0.0)
+        tracker_instance.can_execute.return_value = True
+        tracker_instance.reserve.return_value = None
+
+        result = run_ai_enrich.run(
+            {"company_ids": [first.id, second.id]},
+            execution_uuid=str(uuid.uuid4()),
+        )
+
+        self.assertEqual(result['status'], 'ok')
+        mock_client_cls.return_value.extract_json_with_usage.assert_not_called()
+        # 上限に達した企業はルールベースの結果のみ記録し、残りの企業は次回に回す
+        self.assertEqual(len(result['processed_company_ids']), 1)
+        handled_id = result['processed_company_ids'][0]
+        self.assertTrue(AIEnrichmentResult.objects.filter(company_id=handled_id).exists())
+        deferred = Company.objects.get(id=({first.id, second.id} - {handled_id}).pop())
+        self.assertIsNone(deferred.ai_last_enriched_at)
+
+
+@override_settings(POWERPLEXY_API_KEY='dummy-key', CORPORATE_NUMBER_API_TOKEN='')
+class RunAIEnrichCheckpointTests(TestCase):
+    @mock.patch('ai_enrichment.tasks.time.sleep')
+    @mock.patch('ai_enrichment.tasks.notify_success')
+    @mock.patch('ai_enrichment.tasks.notify_warning')
+    @mock.patch('ai_enrichment.tasks.PowerplexyClient')
+    @mock.patch('ai_enrichment.tasks.UsageTracker')
+    def test_rate_limit_retry_resumes_after_last_completed_company(
+        self, mock_tracker, mock_client_cls, _warning, _success, _sleep
+    ):
+        companies = [
+            Company.objects.create(name=f"チェックポイント{i}", website_url=f"https://cp{i}.example.com")
+            for i in range(3)
+        ]
+        tracker_instance = mock_tracker.return_value
+        tracker_instance.snapshot.return_value = UsageSnapshot(calls=0, cost=0.0)
+        tracker_instance.can_execute.return_value = True
+
+        client_instance = mock_client_cls.return_value
+        client_instance.model = "sonar-pro"
+        answer = ({'担当者名': '田中 太郎'}, {"prompt_tokens": 100, "completion_tokens": 10})
+        client_instance.extract_json_with_usage.side_effect = [
+            answer,
+            PowerplexyRateLimitError("PowerPlexy rate limit reached"),
+        ]
+
+        execution_uuid = str(uuid.uuid4())
+        payload = {"company_ids": [company.id for company in companies]}
+        with self.assertRaises(PowerplexyRateLimitError):
+            run_ai_enrich.run(payload, execution_uuid=execution_uuid)
+
+        checkpoint = DataCollectionRun.objects.get(execution_uuid=execution_uuid).metadata["checkpoint"]
+        self.assertEqual(len(checkpoint["completed_company_ids"]), 1)
+        completed_id = checkpoint["completed_company_ids"][0]
+
+        client_instance.extract_json_with_usage.reset_mock()
+        client_instance.extract_json_with_usage.side_effect = [answer, answer]
+        result = run_ai_enrich.run(payload, execution_uuid=execution_uuid)
+
+        # 完了済みの企業は再処理しない
+        self.assertEqual(client_instance.extract_json_with_usage.call_count, 2)
+        self.assertEqual(result['success_count'], 3)
+        self.assertEqual(result['calls'], 3)
+        self.assertEqual(
+            CompanyUpdateCandidate.objects.filter(company_id=completed_id, source_type=CompanyUpdateCandidate.SOURCE_AI).count(),
+            1,
+        )
+        run = DataCollectionRun.objects.get(execution_uuid=execution_uuid)
+        self.assertEqual(run.metadata["resumed_attempts"], 2)
+        self.assertNotIn("checkpoint", run.metadata)
+        # 中断した企業の結果は retry 時の1件だけが残る
+        self.assertEqual(AIEnrichmentResult.objects.filter(run=run).count(), 3)
+
+
+@override_settings(POWERPLEXY_API_KEY='dummy-key', CORPORATE_NUMBER_API_TOKEN='', AI_ENRICH_RESULT_BATCH_SIZE=1)
+class RunAIEnrichResultTableTests(TestCase):
+    @mock.patch('ai_enrichment.tasks.time.sleep')
+    @mock.patch('ai_enrichment.tasks.notify_success')
+    @mock.patch('ai_enrichment.tasks.notify_warning')
+    @mock.patch('ai_enrichment.tasks.PowerplexyClient')
+    @mock.patch('ai_enrichment.tasks.UsageTracker')
+    def test_results_are_written_per_company_and_summarized(
+        self, mock_tracker, mock_client_cls, _warning, mock_success, _sleep
+    ):
+        found = Company.objects.create(name="結果あり", website_url="https://found.example.com")
+        empty = Company.objects.create(name="結果なし", website_url="https://empty.example.com")
+        tracker_instance = mock_tracker.return_value
+        tracker_instance.snapshot.return_value = UsageSnapshot(calls=0, cost=0.0)
+        tracker_instance.can_execute.return_value = True
+        tracker_instance.cost_limit = 150.0
+
+        client_instance = mock_client_cls.return_value
+        client_instance.model = "sonar-pro"
+        client_instance.extract_json_with_usage.side_effect = [
+            ({'担当者名': '田中 太郎'}, {"prompt_tokens": 120, "completion_tokens": 15}),
+            ({}, {"prompt_tokens": 80, "completion_tokens": 5}),
+        ]
+
+        execution_uuid = str(uuid.uuid4())
+        run_ai_enrich.run({"company_ids": [found.id, empty.id]}, execution_uuid=execution_uuid)
+
+        run = DataCollectionRun.objects.get(execution_uuid=execution_uuid)
+        found_result = AIEnrichmentResult.objects.get(run=run, company=found)
+        self.assertEqual(found_result.status, AIEnrichmentResult.Status.SUCCESS)
+        self.assertEqual(found_result.field_count, 1)
+        self.assertEqual(found_result.prompt_tokens, 120)
+        self.assertEqual(found_result.completion_tokens, 15)
+        self.assertFalse(found_result.batched)
+        empty_result = AIEnrichmentResult.objects.get(run=run, company=empty)
+        self.assertEqual(empty_result.status, AIEnrichmentResult.Status.NO_DATA)
+
+        summary = run.metadata["results"]
+        self.assertEqual(summary["count"], 2)
+        self.assertEqual(summary["field_count"], 1)
+        self.assertEqual(summary["prompt_tokens"], 200)
+        self.assertEqual(summary["by_status"], {"success": 1, "no_data": 1})
+        prompt_tokens = run.metadata["prompt_tokens"]
+        self.assertEqual(prompt_tokens["mode"], "compact")
+        self.assertEqual(prompt_tokens["requests"], 2)
+        self.assertEqual(prompt_tokens["actual"], 200)
+        self.assertGreater(prompt_tokens["estimated"], 0)
+
+        extra = mock_success.call_args.kwargs["extra"]
+        self.assertEqual(extra["補完情報件数"], 2)
+        self.assertEqual(extra["補完されたフィールド数"], 1)
+        self.assertEqual([detail["company_name"] for detail in extra["補完情報"]], ["結果あり", "結果なし"])
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ai_enrichment.timing import STAGE_AI_REQUEST, STAGE_RULE_BASED, StageTimings
+
+
+class StageTimingsTests(SimpleTestCase):
+    def test_summary_reports_percentiles_per_stage(self):
+        timings = StageTimings()
+        for company_id, elapsed in enumerate([0.1, 0.2, 0.3, 0.4, 2.0], start=1):
+            timings.add(STAGE_AI_REQUEST, elapsed, company_id=company_id)
+        timings.add(STAGE_RULE_BASED, 0.05, company_id=1)
+
+        summary = timings.summary()
+
+        ai_request = summary["stages"][STAGE_AI_REQUEST]
+        self.assertEqual(ai_request["count"], 5)
+        self.assertEqual(ai_request["p50_ms"], 300)
+        self.assertEqual(ai_request["p95_ms"], 2000)
+        self.assertEqual(ai_request["max_ms"], 2000)
+        self.assertEqual(ai_request["total_ms"], 3000)
+        self.assertEqual(summary["stages"][STAGE_RULE_BASED]["count"], 1)
+
+    def test_finish_company_returns_per_stage_milliseconds(self):
+        timings = StageTimings()
+        timings.add(STAGE_RULE_BASED, 0.25, company_id=7)
+        timings.add(STAGE_AI_REQUEST, 1.5, company_id=7)
+        timings.add(STAGE_AI_REQUEST, 0.5, company_id=8)
+
+        self.assertEqual(timings.finish_company(7), {STAGE_RULE_BASED: 250, STAGE_AI_REQUEST: 1500})
+        self.assertEqual(timings.finish_company(7), {})
+
+    @mock.patch("ai_enrichment.timing.time.sleep")
+    def test_sleep_is_accumulated(self, mock_sleep):
+        timings = StageTimings()
+        timings.sleep(0.5)
+        timings.sleep(0.5)
+
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertIn("sleep_ms", timings.summary())
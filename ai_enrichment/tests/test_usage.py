@@ -1,15 +1,17 @@
 
 import calendar
+from datetime import timedelta
 from unittest import mock
 
-from django.test import SimpleTestCase, override_settings
+from django.test import TestCase, override_settings
 from django.utils import timezone
 
+from ai_enrichment.models import AIUsageMonth, AIUsageReservation
 from ai_enrichment.redis_usage import UsageTracker
 
 
 @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
-class UsageTrackerTests(SimpleTestCase):
+class UsageTrackerTests(TestCase):
     @override_settings(POWERPLEXY_DAILY_RECORD_LIMIT=None)  # 未設定時は月間上限から導出されることを検証
     @mock.patch('ai_enrichment.redis_usage.get_redis_connection', new=None)
     def test_usage_tracker_with_cache_backend(self):
@@ -74,3 +76,51 @@ class UsageTrackerTests(SimpleTestCase):
         tracker = UsageTracker()
         self.assertEqual(tracker.call_limit, 0)
         self.assertEqual(tracker.daily_limit, 0)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    POWERPLEXY_MONTHLY_COST_LIMIT=1.0,
+    POWERPLEXY_COST_PER_REQUEST=0.4,
+    POWERPLEXY_ENFORCE_MONTHLY_COST_LIMIT=True,
+)
+@mock.patch('ai_enrichment.redis_usage.get_redis_connection', new=None)
+class UsageReservationTests(TestCase):
+    def test_reserve_denies_when_reserved_cost_would_exceed_limit(self):
+        tracker = UsageTracker()
+        first = tracker.reserve()
+        second = tracker.reserve()
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        # 0.4 + 0.4 予約中のため 3件目は上限 1.0 を超える
+        self.assertIsNone(tracker.reserve())
+        self.assertFalse(tracker.can_execute())
+        self.assertAlmostEqual(tracker.snapshot().reserved, 0.8)
+
+    def test_commit_records_actual_cost_and_frees_reservation(self):
+        tracker = UsageTracker()
+        reservation = tracker.reserve()
+
+        snapshot = tracker.commit(reservation, cost=0.01, prompt_tokens=120, completion_tokens=30)
+
+        self.assertEqual(snapshot.calls, 1)
+        self.assertAlmostEqual(snapshot.cost, 0.01)
+        self.assertAlmostEqual(snapshot.reserved, 0.0)
+        usage = AIUsageMonth.objects.get()
+        self.assertEqual((usage.prompt_tokens, usage.completion_tokens), (120, 30))
+        self.assertFalse(AIUsageReservation.objects.exists())
+
+    def test_release_and_expired_reservations_do_not_count(self):
+        tracker = UsageTracker()
+        released = tracker.reserve()
+        tracker.release(released)
+        stale = tracker.reserve()
+        AIUsageReservation.objects.filter(reservation_id=stale.reservation_id).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        snapshot = tracker.snapshot()
+        self.assertEqual(snapshot.calls, 0)
+        self.assertAlmostEqual(snapshot.reserved, 0.0)
+        self.assertIsNotNone(tracker.reserve())
+        self.assertIsNotNone(tracker.reserve())
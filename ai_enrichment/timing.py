@@ -0,0 +1,94 @@
+"""
+AI補完バッチの処理段階ごとの計測（どこに時間がかかっているかの把握用）
+
+企業ごと・段階ごとの経過時間を記録し、段階ごとの p50/p95/max と待機（sleep）時間の合計を集計する。
+"""
+from __future__ import annotations
+
+import math
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# 段階名
+STAGE_RULE_BASED = "rule_based"  # apply_rule_based（gBizINFO検索）
+STAGE_AI_REQUEST = "ai_request"  # PowerPlexy 呼び出し（単一企業）
+STAGE_AI_BATCH_REQUEST = "ai_batch_request"  # PowerPlexy 呼び出し（複数企業まとめて）
+STAGE_GBIZINFO_RETRY = "gbizinfo_retry"  # AIのヒントによる gBizINFO 再探索
+STAGE_NORMALIZE = "normalize"  # AI回答のマッピング・正規化
+STAGE_INGEST = "ingest"  # 候補登録・企業ステータス更新
+STAGE_COMPANY_TOTAL = "company_total"  # 企業1件あたりの合計
+
+
+def _percentile(sorted_values: Sequence[float], percent: float) -> float:
+    """nearest-rank 法によるパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(math.ceil(percent / 100.0 * len(sorted_values))), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class StageTimings:
+    """段階ごとの経過時間（秒）を記録する"""
+
+    def __init__(self) -> None:
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._per_company: Dict[int, Dict[str, float]] = defaultdict(dict)
+        self._company_totals: Dict[int, Dict[str, float]] = {}
+        self.sleep_seconds = 0.0
+
+    @contextmanager
+    def measure(self, stage: str, *, company_id: Optional[int] = None) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started, company_id=company_id)
+
+    def add(self, stage: str, elapsed: float, *, company_id: Optional[int] = None) -> None:
+        self._samples[stage].append(elapsed)
+        if company_id is not None:
+            company = self._per_company[company_id]
+            company[stage] = company.get(stage, 0.0) + elapsed
+
+    def sleep(self, seconds: float) -> None:
+        """time.sleep して待機時間を計上する"""
+        started = time.perf_counter()
+        time.sleep(seconds)
+        self.sleep_seconds += time.perf_counter() - started
+
+    def finish_company(self, company_id: int) -> Dict[str, int]:
+        """企業の計測を確定し、段階ごとの経過時間（ミリ秒）を返す"""
+        stages = self._per_company.pop(company_id, {})
+        self._company_totals[company_id] = stages
+        return {stage: int(round(elapsed * 1000)) for stage, elapsed in stages.items()}
+
+    def summary(self, *, slowest: int = 10) -> Dict[str, object]:
+        stages: Dict[str, Dict[str, object]] = {}
+        for stage, samples in self._samples.items():
+            ordered = sorted(samples)
+            stages[stage] = {
+                "count": len(ordered),
+                "total_ms": int(round(sum(ordered) * 1000)),
+                "p50_ms": int(round(_percentile(ordered, 50) * 1000)),
+                "p95_ms": int(round(_percentile(ordered, 95) * 1000)),
+                "max_ms": int(round(ordered[-1] * 1000)),
+            }
+
+        slowest_companies = sorted(
+            self._company_totals.items(),
+            key=lambda item: item[1].get(STAGE_COMPANY_TOTAL, 0.0),
+            reverse=True,
+        )[:slowest]
+        return {
+            "stages": stages,
+            "sleep_ms": int(round(self.sleep_seconds * 1000)),
+            "slowest_companies": [
+                {
+                    "company_id": company_id,
+                    **{f"{stage}_ms": int(round(elapsed * 1000)) for stage, elapsed in company_stages.items()},
+                }
+                for company_id, company_stages in slowest_companies
+            ],
+        }
@@ -1,15 +1,25 @@
 from __future__ import annotations
 
+import json
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence, Union
 
 import requests
 from django.conf import settings
 from django.utils import timezone
 
+from saleslist_backend.circuit_breaker import CircuitBreaker, CircuitOpenError
+from saleslist_backend.http_sessions import get_session
+
 logger = logging.getLogger(__name__)
 
 GRAPH_API_BASE = "https://graph.facebook.com"
+PAGE_METRICS_FIELDS = "fan_count,posts.limit(1){created_time}"
+# Graph API accepts at most 50 sub-requests per batch call.
+GRAPH_BATCH_MAX_SIZE = 50
+BATCH_SIZE = min(max(int(getattr(settings, "FACEBOOK_GRAPH_BATCH_SIZE", GRAPH_BATCH_MAX_SIZE)), 1), GRAPH_BATCH_MAX_SIZE)
+# Graph API throttling error codes (application / user / page / custom rate limits).
+THROTTLE_ERROR_CODES = frozenset({4, 17, 32, 613})
 
 
 class FacebookClientConfigurationError(RuntimeError):
@@ -20,6 +30,22 @@ class FacebookAPIError(RuntimeError):
     """Raised when Facebook API returns an error response."""
 
 
+class FacebookCircuitOpenError(CircuitOpenError, FacebookAPIError):
+    """Raised without calling the API while the Facebook circuit breaker is open."""
+
+
+class FacebookRateLimitError(FacebookAPIError):
+    """Raised when a batch call was throttled; the pages should be retried after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = max(float(retry_after), 0.0)
+
+
+def facebook_breaker() -> CircuitBreaker:
+    return CircuitBreaker("facebook", open_error=FacebookCircuitOpenError)
+
+
 class FacebookClient:
     def __init__(
         self,
@@ -35,18 +61,36 @@ class FacebookClient:
             raise FacebookClientConfigurationError("FACEBOOK_ACCESS_TOKEN is not configured")
         if not self.version:
             raise FacebookClientConfigurationError("FACEBOOK_GRAPH_API_VERSION is not configured")
+        self.breaker = facebook_breaker()
+        self.session = get_session("facebook")
 
     def _build_url(self, path: str) -> str:
         path = path.lstrip("/")
         return f"{GRAPH_API_BASE}/{self.version}/{path}"
 
-    def _request(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def _request(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        data: Optional[Dict[str, Any]] = None,
+        record_success: bool = True,
+    ) -> Any:
+        """
+        Call the Graph API (POST when data is given).
+        With record_success=False the caller records the circuit breaker outcome after
+        inspecting the body.
+        """
         params = params.copy() if params else {}
         params.setdefault("access_token", self.access_token)
         url = self._build_url(path)
 
+        if data is None:
+            send = lambda: self.session.get(url, params=params, timeout=self.timeout)
+        else:
+            send = lambda: self.session.post(url, params=params, data=data, timeout=self.timeout)
         try:
-            response = requests.get(url, params=params, timeout=self.timeout)
+            response = self.breaker.request(send, record_success=record_success)
         except requests.RequestException as exc:
             raise FacebookAPIError(f"Network error calling Facebook API: {exc}") from exc
 
@@ -62,29 +106,83 @@ class FacebookClient:
         except ValueError as exc:
             raise FacebookAPIError(f"Invalid JSON response from Facebook API: {exc}") from exc
 
-    def fetch_page_metrics(self, page_id: str) -> Dict[str, Any]:
-        """
-        Retrieve fan count and latest post created time for the given page.
-        Returns a dictionary containing friend_count, friend_count_fetched_at,
-        latest_posted_at and latest_post_fetched_at (timestamps are ISO strings).
-        """
-        if not page_id:
-            raise ValueError("page_id is required")
-
-        fields = "fan_count,posts.limit(1){created_time}"
-        payload = self._request(page_id, params={"fields": fields})
-
+    @staticmethod
+    def _metrics_from_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
         friend_count = payload.get("fan_count")
         posts = (payload.get("posts") or {}).get("data") or []
         latest_post = posts[0].get("created_time") if posts else None
         now_iso = timezone.now().isoformat()
-
-        metrics = {
+        return {
             "friend_count": friend_count,
             "friend_count_fetched_at": now_iso,
             "latest_posted_at": latest_post,
             "latest_post_fetched_at": now_iso,
         }
 
+    def fetch_page_metrics(self, page_id: str) -> Dict[str, Any]:
+        """
+        Retrieve fan count and latest post created time for the given page.
+        Returns a dictionary containing friend_count, friend_count_fetched_at,
+        latest_posted_at and latest_post_fetched_at (timestamps are ISO strings).
+        """
+        if not page_id:
+            raise ValueError("page_id is required")
+
+        payload = self._request(page_id, params={"fields": PAGE_METRICS_FIELDS})
+        metrics = self._metrics_from_payload(payload)
         logger.debug("Fetched Facebook metrics for %s: %s", page_id, metrics)
         return metrics
+
+    def fetch_pages_metrics(
+        self,
+        page_ids: Sequence[str],
+    ) -> Dict[str, Union[Dict[str, Any], FacebookAPIError]]:
+        """
+        Retrieve metrics for many pages using Graph API batch requests (BATCH_SIZE pages per call).
+        Returns a dictionary keyed by page_id whose values are either metrics (same shape as
+        fetch_page_metrics) or a FacebookAPIError for that page (deleted page, missing permission,
+        sub-request error...). Failures of a whole batch call are raised. A throttled or timed-out
+        sub-request fails the whole batch with FacebookRateLimitError and counts as a circuit
+        breaker failure, so healthy pages are not reported as failed.
+        """
+        unique_ids = list(dict.fromkeys(page_id for page_id in page_ids if page_id))
+        results: Dict[str, Union[Dict[str, Any], FacebookAPIError]] = {}
+        for start in range(0, len(unique_ids), BATCH_SIZE):
+            batch_ids = unique_ids[start : start + BATCH_SIZE]
+            batch = [
+                {"method": "GET", "relative_url": f"{page_id}?fields={PAGE_METRICS_FIELDS}"}
+                for page_id in batch_ids
+            ]
+            items = self._request(
+                "", data={"batch": json.dumps(batch), "include_headers": "false"}, record_success=False
+            )
+            if not isinstance(items, list) or len(items) != len(batch_ids):
+                # A malformed body must not close a half-open circuit.
+                self.breaker.record_failure()
+                raise FacebookAPIError(f"Unexpected batch response from Facebook API: {items!r}")
+            for page_id, item in zip(batch_ids, items):
+                results[page_id] = self._parse_batch_item(page_id, item)
+            self.breaker.record_success()
+        logger.debug("Fetched Facebook metrics for %s pages", len(unique_ids))
+        return results
+
+    def _parse_batch_item(self, page_id: str, item: Optional[Dict[str, Any]]) -> Union[Dict[str, Any], FacebookAPIError]:
+        # Sub-requests that did not complete in time come back as null.
+        if not item:
+            self._raise_throttled(f"Facebook API batch item timed out for page {page_id}")
+        try:
+            payload = json.loads(item.get("body") or "null")
+        except ValueError:
+            payload = item.get("body")
+        code = int(item.get("code") or 0)
+        if code >= 400 or not isinstance(payload, dict):
+            error = (payload.get("error") if isinstance(payload, dict) else None) or {}
+            if error.get("code") in THROTTLE_ERROR_CODES:
+                self._raise_throttled(f"Facebook API rate limit ({error.get('code')}) for page {page_id}: {payload}")
+            return FacebookAPIError(f"Facebook API error ({code}) for page {page_id}: {payload}")
+        return self._metrics_from_payload(payload)
+
+    def _raise_throttled(self, message: str) -> None:
+        # Throttling applies to the whole batch: let the circuit breaker see it and leave the pages due.
+        self.breaker.record_failure()
+        raise FacebookRateLimitError(message, self.breaker.retry_after() or self.breaker.reset_seconds)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from companies.models import CorporateNumberSearchCache
+from companies.services.corporate_number_cache import purge_expired
+
+
+class Command(BaseCommand):
+    help = "有効期限切れの法人番号検索キャッシュを削除します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='削除件数のみを表示し、削除は実行しません。'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options.get('dry_run', False):
+            count = CorporateNumberSearchCache.objects.filter(expires_at__lte=now).count()
+            self.stdout.write(self.style.WARNING(
+                f"[DRY-RUN] {count} 件の検索キャッシュが削除対象です。"
+            ))
+            return
+
+        deleted_count = purge_expired(now)
+        self.stdout.write(self.style.SUCCESS(
+            f"{deleted_count} 件の検索キャッシュを削除しました。"
+        ))
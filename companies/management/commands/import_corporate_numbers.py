@@ -1,22 +1,28 @@
 import logging
 import time
 from collections import Counter
-from datetime import timedelta
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from typing import Dict, List, Optional
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Q
 from django.utils import timezone
 
 from companies.models import Company, CompanyReviewItem, CompanyUpdateCandidate, ExternalSourceRecord
+from companies.services.corporate_number_cache import get_cached_results, store_results
 from companies.services.corporate_number_client import (
     CorporateNumberAPIClient,
     CorporateNumberAPIError,
+    corporate_number_breaker,
     select_best_match,
 )
+from companies.services.corporate_number_registry import REGISTRY_SOURCE, find_registry_candidates
+from companies.services.name_matching import DEFAULT_MIN_CONFIDENCE
+from companies.services.rate_limiter import TokenBucketLimiter
 from companies.services.review_ingestion import ingest_corporate_number_candidates, ingest_rule_based_candidates
 
 STAT_KEYS = (
@@ -28,6 +34,9 @@ STAT_KEYS = (
     "skipped_name",
     "skipped_cooldown",
     "skipped_rate_limit",
+    "skipped_circuit_open",
+    "cache_hits",
+    "registry_hits",
 )
 
 logger = logging.getLogger(__name__)
@@ -35,47 +44,46 @@ logger = logging.getLogger(__name__)
 DEFAULT_DAILY_LIMIT = getattr(settings, "CORPORATE_NUMBER_API_DAILY_LIMIT", 5000)
 DEFAULT_INTERVAL_SECONDS = getattr(settings, "CORPORATE_NUMBER_API_INTERVAL_SECONDS", 2)
 DEFAULT_COMPANY_COOLDOWN_DAYS = getattr(settings, "CORPORATE_NUMBER_API_COMPANY_COOLDOWN_DAYS", 30)
+DEFAULT_BURST = getattr(settings, "CORPORATE_NUMBER_API_BURST", 1)
+DEFAULT_WORKERS = getattr(settings, "CORPORATE_NUMBER_IMPORT_WORKERS", 1)
+# api: 法人番号APIのみ / registry: ローカル全件データのみ / auto: 全件データで見つからない企業のみAPI
+DEFAULT_SOURCE = getattr(settings, "CORPORATE_NUMBER_IMPORT_SOURCE", "auto")
+SOURCES = ("api", "registry", "auto")
 
 _CACHE_PREFIX = "corporate_number_api"
-_CACHE_LAST_CALL_KEY = f"{_CACHE_PREFIX}:last_call"
+RATE_LIMIT_KEY = "corporate_number_api"
 
 
-def _seconds_until_tomorrow(now: timezone.datetime) -> int:
-    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-    return max(int((tomorrow - now).total_seconds()), 1)
+def _legacy_daily_count(day: date) -> int:
+    """以前のキャッシュ上の日次カウンタ（移行当日の呼び出し数を引き継ぐ）"""
+    return int(cache.get(f"{_CACHE_PREFIX}:daily:{day:%Y%m%d}") or 0)
 
 
-def _get_daily_counter_key(now: timezone.datetime) -> str:
-    return f"{_CACHE_PREFIX}:daily:{now:%Y%m%d}"
+def build_rate_limiter() -> TokenBucketLimiter:
+    """法人番号APIの呼び出し枠（全プロセス共通。日次上限は枠の確保時点で数える）"""
+    interval_seconds = max(DEFAULT_INTERVAL_SECONDS, 0)
+    return TokenBucketLimiter(
+        RATE_LIMIT_KEY,
+        rate_per_second=1.0 / interval_seconds if interval_seconds else 0.0,
+        capacity=DEFAULT_BURST,
+        daily_limit=DEFAULT_DAILY_LIMIT if DEFAULT_DAILY_LIMIT and DEFAULT_DAILY_LIMIT > 0 else None,
+        seed_day_count=_legacy_daily_count,
+    )
 
 
-def _get_daily_count(now: timezone.datetime) -> Tuple[str, int]:
-    key = _get_daily_counter_key(now)
-    count = cache.get(key)
-    if count is None:
-        cache.add(key, 0, timeout=_seconds_until_tomorrow(now))
-        count = cache.get(key) or 0
-    return key, int(count)
-
-
-def _set_daily_count(key: str, value: int, now: timezone.datetime) -> None:
-    cache.set(key, value, timeout=_seconds_until_tomorrow(now))
-
-
-def _respect_interval(last_call: Optional[timezone.datetime], interval_seconds: int, now: timezone.datetime) -> timezone.datetime:
-    if interval_seconds <= 0:
-        cache.set(_CACHE_LAST_CALL_KEY, now, timeout=interval_seconds * 2 if interval_seconds else 5)
-        return now
-    if last_call is not None:
-        elapsed = (now - last_call).total_seconds()
-        if elapsed < interval_seconds:
-            time.sleep(interval_seconds - elapsed)
-    cache.set(_CACHE_LAST_CALL_KEY, timezone.now(), timeout=interval_seconds * 2)
-    return cache.get(_CACHE_LAST_CALL_KEY)
-
+def _fetch_after(client: CorporateNumberAPIClient, company: Company, wait_seconds: float) -> Optional[List[dict]]:
+    """
+    確保した枠の時刻まで待ってからAPIを呼び出す（ワーカースレッドで実行）
 
-def _normalize_name(value: str) -> str:
-    return "".join(ch for ch in (value or "") if not ch.isspace()).lower()
+    サーキットブレーカーの状態は Django キャッシュにあり、DatabaseCache の場合はこのスレッドでも
+    DB 接続が開かれるため、呼び出し後に閉じる（スレッドごとの接続を残さない）。
+    """
+    try:
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return client.fetch(company.name, company.prefecture)
+    finally:
+        connection.close()
 
 
 def _normalize_numeric_string(value: Optional[str]) -> str:
@@ -149,12 +157,27 @@ def run_corporate_number_import(
     prefecture_strict: bool = False,
     allow_missing_token: bool = False,
     force_refresh: bool = False,
+    workers: Optional[int] = None,
+    source: Optional[str] = None,
+    min_confidence: Optional[float] = None,
 ) -> Dict[str, object]:
     """
     法人番号APIからデータを取得し、レビュー候補を投入する共通処理。
     コマンド／APIの双方から利用できるよう関数化している。
+
+    workers が 2 以上の場合は API 呼び出しのみをスレッドで並列に行う（呼び出し間隔・日次上限は
+    全プロセス共通の枠で管理するため、並列でも上限を超えない）。候補の判定・DB への保存はメインスレッドで行う。
+
+    source が registry / auto の場合は、ローカルの法人番号全件データ（load_corporate_number_registry で取込）と
+    対象企業をまとめて照合し、一意に特定できた企業は API を呼ばずに候補を投入する。
+
+    min_confidence（名称の一致度の下限）を省略した場合は実行時の CORPORATE_NUMBER_MATCH_MIN_CONFIDENCE を使う。
     """
-    if not settings.CORPORATE_NUMBER_API_TOKEN:
+    source = source or DEFAULT_SOURCE
+    if source not in SOURCES:
+        raise CommandError(f"source は {', '.join(SOURCES)} のいずれかを指定してください。")
+
+    if source != "registry" and not settings.CORPORATE_NUMBER_API_TOKEN:
         if allow_missing_token:
             stats_dict = {key: 0 for key in STAT_KEYS}
             summary = "法人番号APIトークンが未設定のため処理をスキップしました。"
@@ -182,68 +205,45 @@ def run_corporate_number_import(
         queryset = queryset.order_by("id")[:limit]
 
     client = CorporateNumberAPIClient()
+    companies = list(queryset)
+    registry_matches = find_registry_candidates(companies) if source != "api" else {}
 
     entries: List[Dict[str, object]] = []
     rule_entries: List[dict] = []
     stats = Counter()
     now = timezone.now()
-    base_daily_limit = DEFAULT_DAILY_LIMIT if DEFAULT_DAILY_LIMIT and DEFAULT_DAILY_LIMIT > 0 else None
-    daily_limit = None if force_refresh else base_daily_limit
-    interval_seconds = 0 if force_refresh else max(DEFAULT_INTERVAL_SECONDS, 0)
     company_cooldown_days = 0 if force_refresh else max(DEFAULT_COMPANY_COOLDOWN_DAYS, 0)
-
-    daily_key, current_daily_count = _get_daily_count(now)
-    last_call = cache.get(_CACHE_LAST_CALL_KEY)
+    # force_refresh（手動の再取得）は従来どおり呼び出し間隔・日次上限の対象外
+    limiter = None if force_refresh else build_rate_limiter()
+    workers = max(int(workers if workers is not None else DEFAULT_WORKERS), 1)
+    if min_confidence is None:
+        min_confidence = getattr(settings, "CORPORATE_NUMBER_MATCH_MIN_CONFIDENCE", DEFAULT_MIN_CONFIDENCE)
     daily_limit_reached = False
+    breaker = corporate_number_breaker()
+    # サーキットが開いて（API側の障害・制限で）取得を止めた場合の再開までの秒数
+    circuit_retry_after = 0.0
 
     processed_company_ids: List[int] = []
 
-    for company in queryset:
-        stats["checked"] += 1
-        processed_company_ids.append(company.id)
-
-        if company_cooldown_days > 0 and not force_refresh:
-            record = ExternalSourceRecord.objects.filter(
-                company=company,
-                field="corporate_number",
-                source__in=["nta-api", "corporate-number-import"],
-            ).first()
-            if record and record.last_fetched_at and now - record.last_fetched_at < timedelta(days=company_cooldown_days):
-                stats["skipped_cooldown"] += 1
-                continue
-
-        if daily_limit is not None and current_daily_count >= daily_limit:
-            stats["skipped_rate_limit"] += 1
-            daily_limit_reached = True
-            break
-
-        try:
-            last_call = _respect_interval(last_call, interval_seconds, timezone.now())
-            candidates = client.search(company.name, prefecture=company.prefecture)
-            last_call = timezone.now()
-            current_daily_count += 1
-            _set_daily_count(daily_key, current_daily_count, last_call)
-        except CorporateNumberAPIError as exc:
-            logger.warning("法人番号API取得失敗 company_id=%s name=%s error=%s", company.id, company.name, exc)
-            stats["errors"] += 1
-            continue
-
+    def _handle(company: Company, candidates: Optional[List[dict]], origin: str = "nta-api") -> None:
         if not candidates:
             stats["not_found"] += 1
-            continue
+            return
 
         candidate = select_best_match(candidates, company.name, prefecture=company.prefecture)
         if not candidate:
             stats["not_found"] += 1
-            continue
+            return
 
         if prefecture_strict and company.prefecture and candidate.get("prefecture") != company.prefecture:
             stats["skipped_prefecture"] += 1
-            continue
+            return
 
-        if candidate.get("name_normalized") and candidate["name_normalized"] != _normalize_name(company.name):
+        # 法人格の表記ゆれ（(株)・全角など）は同一とみなし、名称の confidence が閾値未満の候補は採用しない
+        match_confidence = candidate.get("match_confidence", 0.0)
+        if match_confidence < min_confidence:
             stats["skipped_name"] += 1
-            continue
+            return
 
         entries.append(
             {
@@ -251,11 +251,13 @@ def run_corporate_number_import(
                 "corporate_number": candidate["corporate_number"],
                 "source_company_name": candidate.get("name"),
                 "source_detail": candidate.get("raw", {}).get("sequenceNumber", "nta-api"),
-                "source": "nta-api",
-                "cooldown_days": 0 if force_refresh else company_cooldown_days,
+                "source": origin,
+                "confidence": int(round(match_confidence * 100)),
+                "cooldown_days": company_cooldown_days,
                 "metadata": {
                     "prefecture": candidate.get("prefecture"),
                     "raw": candidate.get("raw"),
+                    "match_confidence": match_confidence,
                 },
             }
         )
@@ -265,11 +267,101 @@ def run_corporate_number_import(
             _extract_rule_entries_from_candidate(
                 company=company,
                 candidate=candidate,
-                source_detail="nta-api",
-                cooldown_days=0 if force_refresh else company_cooldown_days,
+                source_detail=origin,
+                cooldown_days=company_cooldown_days,
             )
         )
 
+    def _acquire_slot() -> Optional[float]:
+        """API呼び出し枠を確保し、待ち時間を返す（日次上限に達した場合は None）"""
+        if limiter is None:
+            return 0.0
+        slot = limiter.acquire()
+        if not slot.allowed:
+            return None
+        return slot.wait_seconds
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="corporate-number") if workers > 1 else None
+    pending: Dict[Future, Company] = {}
+
+    def _drain(block_until: int) -> None:
+        """実行中の取得が block_until 件以下になるまで完了分を処理する"""
+        while len(pending) > block_until:
+            done, _not_done = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                company = pending.pop(future)
+                try:
+                    results = future.result()
+                except CorporateNumberAPIError as exc:
+                    logger.warning("法人番号API取得失敗 company_id=%s name=%s error=%s", company.id, company.name, exc)
+                    stats["errors"] += 1
+                    continue
+                if results is not None:
+                    store_results(company.name, company.prefecture, results)
+                _handle(company, results)
+
+    try:
+        for company in companies:
+            stats["checked"] += 1
+            processed_company_ids.append(company.id)
+
+            if company_cooldown_days > 0 and not force_refresh:
+                record = ExternalSourceRecord.objects.filter(
+                    company=company,
+                    field="corporate_number",
+                    source__in=["nta-api", REGISTRY_SOURCE, "corporate-number-import"],
+                ).first()
+                if record and record.last_fetched_at and now - record.last_fetched_at < timedelta(days=company_cooldown_days):
+                    stats["skipped_cooldown"] += 1
+                    continue
+
+            if company.id in registry_matches:
+                stats["registry_hits"] += 1
+                _handle(company, registry_matches[company.id], origin=REGISTRY_SOURCE)
+                continue
+            if source == "registry":
+                stats["not_found"] += 1
+                continue
+
+            # キャッシュにある企業は日次上限・呼び出し間隔の対象外
+            candidates = None if force_refresh else get_cached_results(company.name, company.prefecture)
+            if candidates is not None:
+                stats["cache_hits"] += 1
+                _handle(company, candidates)
+                continue
+
+            # API側の障害・制限でサーキットが開いている間は呼び出さず、残りの企業は次回に回す
+            circuit_retry_after = breaker.retry_after()
+            if circuit_retry_after > 0:
+                stats["skipped_circuit_open"] += 1
+                break
+
+            wait_seconds = _acquire_slot()
+            if wait_seconds is None:
+                stats["skipped_rate_limit"] += 1
+                daily_limit_reached = True
+                break
+
+            if executor is not None:
+                pending[executor.submit(_fetch_after, client, company, wait_seconds)] = company
+                _drain(workers - 1)
+                continue
+
+            try:
+                if wait_seconds > 0:
+                    time.sleep(wait_seconds)
+                candidates = client.search(company.name, prefecture=company.prefecture, refresh=True)
+            except CorporateNumberAPIError as exc:
+                logger.warning("法人番号API取得失敗 company_id=%s name=%s error=%s", company.id, company.name, exc)
+                stats["errors"] += 1
+                continue
+            _handle(company, candidates)
+
+        _drain(0)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
     created_corporate_items: List[CompanyReviewItem] = []
     created_rule_items: List[CompanyReviewItem] = []
     if not dry_run:
@@ -294,10 +386,15 @@ def run_corporate_number_import(
         f"skipped_name={stats_dict['skipped_name']}",
         f"skipped_cooldown={stats_dict['skipped_cooldown']}",
         f"skipped_rate_limit={stats_dict['skipped_rate_limit']}",
+        f"skipped_circuit_open={stats_dict['skipped_circuit_open']}",
+        f"cache_hits={stats_dict['cache_hits']}",
+        f"registry_hits={stats_dict['registry_hits']}",
         f"created={created_count}",
     ]
     if daily_limit_reached:
         summary_parts.append("日次制限に達したため取得を停止しました。")
+    if circuit_retry_after > 0:
+        summary_parts.append(f"法人番号APIの障害・制限のため取得を停止しました（{circuit_retry_after:.0f}秒後に再開可能）。")
     summary = " ".join(summary_parts)
 
     return {
@@ -311,6 +408,9 @@ def run_corporate_number_import(
         "skipped": False,
         "force_refresh": force_refresh,
         "daily_rate_limit_reached": daily_limit_reached,
+        "circuit_open_retry_after": round(circuit_retry_after, 1),
+        "workers": workers,
+        "source": source,
         "processed_company_ids": processed_company_ids,
     }
 
@@ -344,6 +444,18 @@ class Command(BaseCommand):
             dest="prefecture_strict",
             help="都道府県が一致する候補のみ採用します。",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            dest="workers",
+            help="API呼び出しの並列数（呼び出し間隔・日次上限は全ワーカーで共有）。",
+        )
+        parser.add_argument(
+            "--source",
+            choices=SOURCES,
+            dest="source",
+            help="照合元（api / registry / auto）。auto は法人番号全件データで特定できない企業のみAPIを呼び出します。",
+        )
 
     def handle(self, *args, **options):
         result = run_corporate_number_import(
@@ -351,6 +463,8 @@ class Command(BaseCommand):
             limit=options.get("limit"),
             dry_run=options.get("dry_run", False),
             prefecture_strict=options.get("prefecture_strict", False),
+            workers=options.get("workers"),
+            source=options.get("source"),
         )
 
         self.stdout.write(self.style.SUCCESS(result["summary"]))
@@ -32,6 +32,12 @@ class Command(BaseCommand):
             dest="dry_run",
             help="候補を投入せず統計のみ出力します。",
         )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            dest="force",
+            help="前回の取得状態（ETag・内容のハッシュ・取込済みの行）を使わず全行を処理します。",
+        )
 
     def handle(self, *args, **options):
         configs = load_opendata_configs()
@@ -44,6 +50,7 @@ class Command(BaseCommand):
             limit=options.get("limit"),
             dry_run=options.get("dry_run", False),
             config_map=configs,
+            force=options.get("force", False),
         )
 
         summary = (
@@ -54,5 +61,9 @@ class Command(BaseCommand):
             f"created={result.get('created', 0)}"
         )
         self.stdout.write(self.style.SUCCESS(summary))
+        for skipped in result.get("skipped_sources") or []:
+            self.stdout.write(f"  - {skipped['source']}: 前回の取込から変更がないためスキップ（{skipped['reason']}）")
+        if result.get("unchanged_rows"):
+            self.stdout.write(f"  - 前回から変更のない行: {result['unchanged_rows']}")
         if result.get("dry_run"):
             self.stdout.write(self.style.WARNING("dry-run のため候補は投入していません。"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from companies.services.corporate_number_registry import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_ENCODING,
+    load_registry_file,
+)
+
+
+class Command(BaseCommand):
+    help = "国税庁 法人番号公表サイトの全件・差分データ（zip / CSV）をローカルの照合用テーブルに取り込みます。"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="取り込むファイル（zip または CSV）。差分ファイルは日付順に指定。")
+        parser.add_argument(
+            "--encoding",
+            default=DEFAULT_ENCODING,
+            help="CSV の文字コード（Unicode版: utf-8-sig、Shift_JIS版: cp932）。",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="1回の一括登録の件数。",
+        )
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            try:
+                stats = load_registry_file(path, encoding=options["encoding"], batch_size=options["batch_size"])
+            except (OSError, UnicodeDecodeError) as exc:
+                raise CommandError(f"{path} の取込に失敗しました: {exc}") from exc
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{path}: rows={stats['rows']} upserted={stats['upserted']} deleted={stats['deleted']} "
+                    f"skipped_history={stats['skipped_history']} invalid={stats['invalid']}"
+                )
+            )
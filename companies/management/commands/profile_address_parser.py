@@ -0,0 +1,60 @@
+import random
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from companies.services.address_parser import PREFECTURES, parse_address, parse_addresses, split_prefecture
+
+_SAMPLE_CITIES = ("千代田区丸の内1-1-1", "札幌市中央区北1条西2丁目", "四日市市諏訪町1-5", "西多摩郡瑞穂町箱根ケ崎2335")
+
+
+def _legacy_split(value: str):
+    """共通パーサ導入前の実装（47都道府県の startswith ループ）"""
+    for pref in PREFECTURES:
+        if value.startswith(pref):
+            return pref, value[len(pref) :].strip()
+    return "", value
+
+
+class Command(BaseCommand):
+    help = "住所パーサの処理時間を計測します（都道府県の分解は従来の startswith ループと比較します）。"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000, help="計測に使う住所の件数")
+        parser.add_argument("--iterations", type=int, default=5, help="各実装を実行する回数")
+        parser.add_argument("--seed", type=int, default=0, help="住所生成の乱数シード")
+
+    def _measure(self, func, iterations):
+        durations = []
+        for _ in range(iterations):
+            parse_address.cache_clear()
+            started = perf_counter()
+            func()
+            durations.append((perf_counter() - started) * 1000)
+        return median(durations)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        iterations = options["iterations"]
+        if rows < 1 or iterations < 1:
+            raise CommandError("rows / iterations は1以上を指定してください")
+
+        rng = random.Random(options["seed"])
+        # 後半の都道府県ほど従来のループが遅くなるため、全都道府県から均等に生成する
+        addresses = [f"{rng.choice(PREFECTURES)}{rng.choice(_SAMPLE_CITIES)}{index % 97}" for index in range(rows)]
+
+        legacy_ms = self._measure(lambda: [_legacy_split(value) for value in addresses], iterations)
+        split_ms = self._measure(lambda: [split_prefecture(value) for value in addresses], iterations)
+        # 市区町村までの分解は従来の処理より仕事が多いため、同じ分解を1件ずつ行う場合と比べる
+        # （parse_addresses が速くなるのは重複する住所の分だけ）
+        single_ms = self._measure(lambda: [parse_address.__wrapped__(value) for value in addresses], iterations)
+        batch_ms = self._measure(lambda: parse_addresses(addresses), iterations)
+
+        self.stdout.write(self.style.NOTICE(f"住所 {rows} 件（重複を除くと {len(set(addresses))} 件）× {iterations} 回（中央値）"))
+        self.stdout.write("都道府県の分解")
+        self.stdout.write(f"  - startswith ループ（従来）: {legacy_ms:.1f}ms")
+        self.stdout.write(f"  - split_prefecture          : {split_ms:.1f}ms ({legacy_ms / split_ms:.1f}x)")
+        self.stdout.write("市区町村までの分解")
+        self.stdout.write(f"  - parse_address（1件ずつ）  : {single_ms:.1f}ms")
+        self.stdout.write(f"  - parse_addresses（まとめて）: {batch_ms:.1f}ms ({single_ms / batch_ms:.1f}x)")
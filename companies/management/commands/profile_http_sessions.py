@@ -0,0 +1,76 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import median
+from time import perf_counter
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from saleslist_backend.http_sessions import build_session
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # keep-alive を有効にする（HTTP/1.0 では毎回切断される）
+    protocol_version = "HTTP/1.1"
+    # ヘッダと本文を別々に書き出すため、Nagle で keep-alive 側だけ遅延しないようにする
+    disable_nagle_algorithm = True
+    body = b'{"hojin-infos": []}'
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "外部API呼び出しの1回あたりの時間を、requests.get（毎回接続）とプール済みセッションで比較します（ローカルのスタブサーバを使用）。"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=500, help="各方式で呼び出す回数")
+        parser.add_argument("--iterations", type=int, default=3, help="各方式を実行する回数")
+
+    def _measure(self, send, calls, iterations):
+        durations = []
+        for _ in range(iterations):
+            started = perf_counter()
+            for _ in range(calls):
+                send().raise_for_status()
+            durations.append((perf_counter() - started) * 1000 / calls)
+        return median(durations)
+
+    def handle(self, *args, **options):
+        calls = options["calls"]
+        iterations = options["iterations"]
+        if calls < 1 or iterations < 1:
+            raise CommandError("calls / iterations は1以上を指定してください")
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        server.daemon_threads = True
+        server.connections = set()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/hojin/v1/hojin"
+        session = build_session()
+        try:
+            direct_ms = self._measure(lambda: requests.get(url, timeout=5), calls, iterations)
+            direct_connections = len(server.connections)
+            server.connections.clear()
+            pooled_ms = self._measure(lambda: session.get(url, timeout=5), calls, iterations)
+            pooled_connections = len(server.connections)
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+        self.stdout.write(self.style.NOTICE(f"呼び出し {calls} 回 × {iterations} 回（1回あたりの中央値）"))
+        self.stdout.write(f"  - requests.get（毎回接続）: {direct_ms:.3f}ms（接続 {direct_connections} 回）")
+        self.stdout.write(
+            f"  - プール済みセッション    : {pooled_ms:.3f}ms（接続 {pooled_connections} 回, {direct_ms / pooled_ms:.1f}x）"
+        )
+        self.stdout.write(f"  - 1回あたりの短縮: {direct_ms - pooled_ms:.3f}ms（TLS の外部APIではハンドシェイク分さらに大きくなる）")
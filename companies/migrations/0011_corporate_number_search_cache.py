@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0010_company_next_retry_strategy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorporateNumberSearchCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64, unique=True, verbose_name='キャッシュキー')),
+                ('name_normalized', models.CharField(max_length=255, verbose_name='正規化企業名')),
+                ('prefecture_code', models.CharField(blank=True, max_length=2, verbose_name='都道府県コード')),
+                ('results', models.JSONField(blank=True, default=list, verbose_name='検索結果')),
+                ('is_negative', models.BooleanField(default=False, verbose_name='該当なし')),
+                ('expires_at', models.DateTimeField(verbose_name='有効期限')),
+                ('hit_count', models.PositiveIntegerField(default=0, verbose_name='ヒット回数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': '法人番号検索キャッシュ',
+                'verbose_name_plural': '法人番号検索キャッシュ',
+                'db_table': 'corporate_number_search_cache',
+                'indexes': [models.Index(fields=['expires_at'], name='corporate_n_expires_1df7da_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0011_corporate_number_search_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIRateLimitBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='キー')),
+                ('tokens', models.FloatField(default=0.0, verbose_name='残りトークン')),
+                ('refilled_at', models.DateTimeField(verbose_name='最終補充日時')),
+                ('day', models.DateField(verbose_name='集計日')),
+                ('day_count', models.PositiveIntegerField(default=0, verbose_name='当日の呼び出し数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'API呼び出し枠',
+                'verbose_name_plural': 'API呼び出し枠',
+                'db_table': 'api_rate_limit_bucket',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0012_api_rate_limit_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorporateNumberRegistryEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('corporate_number', models.CharField(max_length=13, unique=True, verbose_name='法人番号')),
+                ('name', models.CharField(max_length=255, verbose_name='商号又は名称')),
+                ('name_normalized', models.CharField(max_length=255, verbose_name='正規化名称')),
+                ('kind', models.CharField(blank=True, max_length=3, verbose_name='法人種別')),
+                ('prefecture_name', models.CharField(blank=True, max_length=10, verbose_name='都道府県')),
+                ('prefecture_code', models.CharField(blank=True, max_length=2, verbose_name='都道府県コード')),
+                ('city_name', models.CharField(blank=True, max_length=100, verbose_name='市区町村')),
+                ('street_number', models.CharField(blank=True, max_length=300, verbose_name='丁目番地等')),
+                ('post_code', models.CharField(blank=True, max_length=7, verbose_name='郵便番号')),
+                ('close_date', models.DateField(blank=True, null=True, verbose_name='登記記録の閉鎖等年月日')),
+                ('updated_on', models.DateField(blank=True, null=True, verbose_name='更新年月日')),
+                ('loaded_at', models.DateTimeField(auto_now=True, verbose_name='取込日時')),
+            ],
+            options={
+                'verbose_name': '法人番号全件データ',
+                'verbose_name_plural': '法人番号全件データ',
+                'db_table': 'corporate_number_registry',
+                'indexes': [models.Index(fields=['name_normalized', 'prefecture_code'], name='corporate_n_name_no_3ddef6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0013_corporate_number_registry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='corporatenumberregistryentry',
+            name='name_core',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='照合用名称（法人格除く）'),
+        ),
+        migrations.AddIndex(
+            model_name='corporatenumberregistryentry',
+            index=models.Index(fields=['name_core', 'prefecture_code'], name='corporate_n_name_co_8210b8_idx'),
+        ),
+    ]
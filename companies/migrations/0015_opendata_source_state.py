@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0014_corporate_number_registry_name_core'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenDataSourceState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_key', models.CharField(max_length=100, unique=True, verbose_name='ソースキー')),
+                ('url', models.URLField(blank=True, max_length=500, verbose_name='URL')),
+                ('config_hash', models.CharField(blank=True, max_length=64, verbose_name='設定のハッシュ')),
+                ('etag', models.CharField(blank=True, max_length=255, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, max_length=64, verbose_name='Last-Modified')),
+                ('content_hash', models.CharField(blank=True, max_length=64, verbose_name='内容のハッシュ')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='行数')),
+                ('last_checked_at', models.DateTimeField(blank=True, null=True, verbose_name='最終確認日時')),
+                ('last_success_at', models.DateTimeField(blank=True, null=True, verbose_name='最終取込日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'オープンデータ取得状態',
+                'verbose_name_plural': 'オープンデータ取得状態',
+                'db_table': 'opendata_source_states',
+            },
+        ),
+        migrations.CreateModel(
+            name='OpenDataSourceRow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_hash', models.CharField(max_length=32, verbose_name='行のハッシュ')),
+                ('state', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='companies.opendatasourcestate', verbose_name='取得状態')),
+            ],
+            options={
+                'verbose_name': 'オープンデータ取込済み行',
+                'verbose_name_plural': 'オープンデータ取込済み行',
+                'db_table': 'opendata_source_rows',
+                'unique_together': {('state', 'row_hash')},
+            },
+        ),
+    ]
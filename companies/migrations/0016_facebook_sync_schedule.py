@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0015_opendata_source_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='facebook_next_sync_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Facebook次回同期日時'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='facebook_sync_failures',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Facebook同期の連続失敗回数'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['facebook_next_sync_at'], name='companies_faceboo_87442c_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0016_facebook_sync_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyFacebookDailySummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('snapshot_count', models.PositiveIntegerField(default=0, verbose_name='スナップショット数')),
+                ('friend_count_min', models.IntegerField(blank=True, null=True, verbose_name='友だち数（最小）')),
+                ('friend_count_max', models.IntegerField(blank=True, null=True, verbose_name='友だち数（最大）')),
+                ('friend_count_last', models.IntegerField(blank=True, null=True, verbose_name='友だち数（最終）')),
+                ('latest_posted_at', models.DateTimeField(blank=True, null=True, verbose_name='最新投稿時刻')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='観測した新規投稿数')),
+                ('last_snapshot_at', models.DateTimeField(blank=True, null=True, verbose_name='最終スナップショット時刻')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facebook_daily_summaries', to='companies.company', verbose_name='企業')),
+            ],
+            options={
+                'verbose_name': 'Facebook日次集計',
+                'verbose_name_plural': 'Facebook日次集計',
+                'db_table': 'company_facebook_daily_summaries',
+                'ordering': ['company', 'date'],
+                'unique_together': {('company', 'date')},
+            },
+        ),
+    ]
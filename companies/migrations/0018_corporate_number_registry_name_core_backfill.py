@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:40
+
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def backfill_name_core(apps, schema_editor):
+    """0014 より前に取り込んだ法人番号全件データの照合用名称（name_core）を再計算"""
+    from companies.services.name_matching import normalize_company_name
+
+    CorporateNumberRegistryEntry = apps.get_model('companies', 'CorporateNumberRegistryEntry')
+    queryset = CorporateNumberRegistryEntry.objects.filter(name_core='').only('id', 'name').order_by('id')
+    last_id = 0
+    while True:
+        entries = list(queryset.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not entries:
+            break
+        last_id = entries[-1].id
+        for entry in entries:
+            entry.name_core = normalize_company_name(entry.name).core[:255]
+        CorporateNumberRegistryEntry.objects.bulk_update(entries, ['name_core'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0017_facebook_daily_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_name_core, migrations.RunPython.noop),
+        # 照合は name_core で行うため、name_normalized の索引は使われない
+        migrations.RemoveIndex(
+            model_name='corporatenumberregistryentry',
+            name='corporate_n_name_no_3ddef6_idx',
+        ),
+    ]
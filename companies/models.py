@@ -48,6 +48,8 @@ class Company(models.Model):
     facebook_friend_count = models.IntegerField(null=True, blank=True, verbose_name="Facebook友だち数")
     facebook_latest_post_at = models.DateTimeField(null=True, blank=True, verbose_name="Facebook最新投稿日時")
     facebook_data_synced_at = models.DateTimeField(null=True, blank=True, verbose_name="Facebook同期日時")
+    facebook_next_sync_at = models.DateTimeField(null=True, blank=True, verbose_name="Facebook次回同期日時")
+    facebook_sync_failures = models.PositiveSmallIntegerField(default=0, verbose_name="Facebook同期の連続失敗回数")
     latest_activity_at = models.DateTimeField(null=True, blank=True, verbose_name="最新アクティビティ時刻")
     ai_last_enriched_at = models.DateTimeField(null=True, blank=True, verbose_name="AI最終補完日時")
     ai_last_enriched_source = models.CharField(max_length=32, blank=True, verbose_name="AI補完ソース")
@@ -92,6 +94,7 @@ class Company(models.Model):
             models.Index(fields=['is_global_ng']),
             models.Index(fields=['created_at']),
             models.Index(fields=['latest_activity_at']),
+            models.Index(fields=['facebook_next_sync_at']),
         ]
 
     def __str__(self):
@@ -126,6 +129,36 @@ class CompanyFacebookSnapshot(models.Model):
     def __str__(self):
         return f"{self.company.name} snapshot @ {self.created_at:%Y-%m-%d %H:%M}"
 
+class CompanyFacebookDailySummary(models.Model):
+    """Facebookスナップショットの日次集計（保持期間を過ぎたスナップショットを集約したもの）"""
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='facebook_daily_summaries',
+        verbose_name="企業"
+    )
+    date = models.DateField(verbose_name="日付")
+    snapshot_count = models.PositiveIntegerField(default=0, verbose_name="スナップショット数")
+    friend_count_min = models.IntegerField(null=True, blank=True, verbose_name="友だち数（最小）")
+    friend_count_max = models.IntegerField(null=True, blank=True, verbose_name="友だち数（最大）")
+    friend_count_last = models.IntegerField(null=True, blank=True, verbose_name="友だち数（最終）")
+    latest_posted_at = models.DateTimeField(null=True, blank=True, verbose_name="最新投稿時刻")
+    post_count = models.PositiveIntegerField(default=0, verbose_name="観測した新規投稿数")
+    last_snapshot_at = models.DateTimeField(null=True, blank=True, verbose_name="最終スナップショット時刻")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        db_table = 'company_facebook_daily_summaries'
+        verbose_name = "Facebook日次集計"
+        verbose_name_plural = "Facebook日次集計"
+        ordering = ['company', 'date']
+        unique_together = ('company', 'date')
+
+    def __str__(self):
+        return f"{self.company.name} facebook @ {self.date:%Y-%m-%d}"
+
+
 class Executive(models.Model):
     """代表者・役員情報"""
     company = models.ForeignKey(
@@ -456,3 +489,117 @@ class CompanyUpdateHistory(models.Model):
 
     def __str__(self):
         return f"UpdateHistory({self.company.name}, {self.field})"
+
+
+class CorporateNumberSearchCache(models.Model):
+    """gBizINFO 検索結果のキャッシュ（正規化企業名 + 都道府県コード単位）"""
+
+    cache_key = models.CharField(max_length=64, unique=True, verbose_name="キャッシュキー")
+    name_normalized = models.CharField(max_length=255, verbose_name="正規化企業名")
+    prefecture_code = models.CharField(max_length=2, blank=True, verbose_name="都道府県コード")
+    results = models.JSONField(default=list, blank=True, verbose_name="検索結果")
+    is_negative = models.BooleanField(default=False, verbose_name="該当なし")
+    expires_at = models.DateTimeField(verbose_name="有効期限")
+    hit_count = models.PositiveIntegerField(default=0, verbose_name="ヒット回数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        db_table = "corporate_number_search_cache"
+        verbose_name = "法人番号検索キャッシュ"
+        verbose_name_plural = "法人番号検索キャッシュ"
+        indexes = [
+            models.Index(fields=["expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name_normalized} ({self.prefecture_code or '-'})"
+
+
+class APIRateLimitBucket(models.Model):
+    """外部APIの呼び出し枠（トークンバケット + 日次上限）。プロセス間で共有し、行ロックで更新する"""
+
+    key = models.CharField(max_length=64, unique=True, verbose_name="キー")
+    tokens = models.FloatField(default=0.0, verbose_name="残りトークン")  # 負の値は予約済みの将来の枠
+    refilled_at = models.DateTimeField(verbose_name="最終補充日時")
+    day = models.DateField(verbose_name="集計日")
+    day_count = models.PositiveIntegerField(default=0, verbose_name="当日の呼び出し数")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        db_table = "api_rate_limit_bucket"
+        verbose_name = "API呼び出し枠"
+        verbose_name_plural = "API呼び出し枠"
+
+    def __str__(self):
+        return f"{self.key}: {self.day} {self.day_count}"
+
+
+class CorporateNumberRegistryEntry(models.Model):
+    """国税庁の法人番号公表サイトの全件データ（ローカルコピー。一括照合用）"""
+
+    corporate_number = models.CharField(max_length=13, unique=True, verbose_name="法人番号")
+    name = models.CharField(max_length=255, verbose_name="商号又は名称")
+    name_normalized = models.CharField(max_length=255, verbose_name="正規化名称")
+    name_core = models.CharField(max_length=255, blank=True, default="", verbose_name="照合用名称（法人格除く）")
+    kind = models.CharField(max_length=3, blank=True, verbose_name="法人種別")
+    prefecture_name = models.CharField(max_length=10, blank=True, verbose_name="都道府県")
+    prefecture_code = models.CharField(max_length=2, blank=True, verbose_name="都道府県コード")
+    city_name = models.CharField(max_length=100, blank=True, verbose_name="市区町村")
+    street_number = models.CharField(max_length=300, blank=True, verbose_name="丁目番地等")
+    post_code = models.CharField(max_length=7, blank=True, verbose_name="郵便番号")
+    close_date = models.DateField(null=True, blank=True, verbose_name="登記記録の閉鎖等年月日")
+    updated_on = models.DateField(null=True, blank=True, verbose_name="更新年月日")
+    loaded_at = models.DateTimeField(auto_now=True, verbose_name="取込日時")
+
+    class Meta:
+        db_table = "corporate_number_registry"
+        verbose_name = "法人番号全件データ"
+        verbose_name_plural = "法人番号全件データ"
+        indexes = [
+            models.Index(fields=["name_core", "prefecture_code"]),
+        ]
+
+    def __str__(self):
+        return f"{self.corporate_number} {self.name}"
+
+
+class OpenDataSourceState(models.Model):
+    """自治体オープンデータのソースごとの取得状態（条件付きリクエスト・変更の判定用）"""
+
+    source_key = models.CharField(max_length=100, unique=True, verbose_name="ソースキー")
+    url = models.URLField(max_length=500, blank=True, verbose_name="URL")
+    config_hash = models.CharField(max_length=64, blank=True, verbose_name="設定のハッシュ")
+    etag = models.CharField(max_length=255, blank=True, verbose_name="ETag")
+    last_modified = models.CharField(max_length=64, blank=True, verbose_name="Last-Modified")
+    content_hash = models.CharField(max_length=64, blank=True, verbose_name="内容のハッシュ")
+    row_count = models.PositiveIntegerField(default=0, verbose_name="行数")
+    last_checked_at = models.DateTimeField(null=True, blank=True, verbose_name="最終確認日時")
+    last_success_at = models.DateTimeField(null=True, blank=True, verbose_name="最終取込日時")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        db_table = "opendata_source_states"
+        verbose_name = "オープンデータ取得状態"
+        verbose_name_plural = "オープンデータ取得状態"
+
+    def __str__(self):
+        return f"{self.source_key} ({self.last_success_at or '-'})"
+
+
+class OpenDataSourceRow(models.Model):
+    """前回の取込で候補を作成した行のハッシュ（変更のない行は次回以降スキップする）"""
+
+    state = models.ForeignKey(
+        OpenDataSourceState,
+        on_delete=models.CASCADE,
+        related_name="rows",
+        verbose_name="取得状態",
+    )
+    row_hash = models.CharField(max_length=32, verbose_name="行のハッシュ")
+
+    class Meta:
+        db_table = "opendata_source_rows"
+        verbose_name = "オープンデータ取込済み行"
+        verbose_name_plural = "オープンデータ取込済み行"
+        unique_together = ("state", "row_hash")
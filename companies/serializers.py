@@ -354,6 +354,7 @@ class OpenDataIngestionTriggerSerializer(serializers.Serializer):
     )
     limit = serializers.IntegerField(min_value=1, required=False)
     dry_run = serializers.BooleanField(required=False, default=False)
+    force = serializers.BooleanField(required=False, default=False)
 
     def validate(self, attrs):
         sources = attrs.get("sources")
@@ -0,0 +1,233 @@
+"""
+日本の住所の分解（都道府県・市区町村・それ以降）
+
+都道府県と市区町村の判定は、モジュール読込時に一度だけコンパイルする正規表現で行う
+（47都道府県の startswith ループを各所で繰り返さない）。市区町村は
+
+- 政令指定都市（+ 行政区）
+- 名称の途中に「市・町・村」を含む市町村（四日市市・東村山市など。汎用パターンでは途中で切れるもの）
+- （郡 +）「市・区・町・村」で終わる名称
+
+の順に照合する。全市区町村の一覧は持たないため、表記が規則から外れる市区町村は
+municipality が途中で切れる場合がある（prefecture と city の分解には影響しない）。
+
+city は本システムの Company.city と同じく「市区町村・番地」（住所から都道府県を除いた部分）。
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+from companies.services.name_matching import normalize_company_name
+
+# JIS X 0401 の順
+PREFECTURES: Tuple[str, ...] = (
+    "北海道",
+    "青森県",
+    "岩手県",
+    "宮城県",
+    "秋田県",
+    "山形県",
+    "福島県",
+    "茨城県",
+    "栃木県",
+    "群馬県",
+    "埼玉県",
+    "千葉県",
+    "東京都",
+    "神奈川県",
+    "新潟県",
+    "富山県",
+    "石川県",
+    "福井県",
+    "山梨県",
+    "長野県",
+    "岐阜県",
+    "静岡県",
+    "愛知県",
+    "三重県",
+    "滋賀県",
+    "京都府",
+    "大阪府",
+    "兵庫県",
+    "奈良県",
+    "和歌山県",
+    "鳥取県",
+    "島根県",
+    "岡山県",
+    "広島県",
+    "山口県",
+    "徳島県",
+    "香川県",
+    "愛媛県",
+    "高知県",
+    "福岡県",
+    "佐賀県",
+    "長崎県",
+    "熊本県",
+    "大分県",
+    "宮崎県",
+    "鹿児島県",
+    "沖縄県",
+)
+PREFECTURE_CODES: Mapping[str, str] = {name: f"{index:02d}" for index, name in enumerate(PREFECTURES, start=1)}
+# 「東京」「大阪」など都道府県を省いた表記
+_PREFECTURE_SHORT_NAMES: Mapping[str, str] = {
+    (name if name == "北海道" else name[:-1]): name for name in PREFECTURES
+}
+
+# 政令指定都市 → 都道府県（住所に都道府県がない場合の補完にも使う）
+DESIGNATED_CITIES: Mapping[str, str] = {
+    "札幌市": "北海道",
+    "仙台市": "宮城県",
+    "さいたま市": "埼玉県",
+    "千葉市": "千葉県",
+    "横浜市": "神奈川県",
+    "川崎市": "神奈川県",
+    "相模原市": "神奈川県",
+    "新潟市": "新潟県",
+    "静岡市": "静岡県",
+    "浜松市": "静岡県",
+    "名古屋市": "愛知県",
+    "京都市": "京都府",
+    "大阪市": "大阪府",
+    "堺市": "大阪府",
+    "神戸市": "兵庫県",
+    "岡山市": "岡山県",
+    "広島市": "広島県",
+    "北九州市": "福岡県",
+    "福岡市": "福岡県",
+    "熊本市": "熊本県",
+}
+
+# 名称の途中に「市・区・町・村・郡」を含み、汎用パターンでは途中で切れる市町村
+_IRREGULAR_MUNICIPALITIES: Tuple[str, ...] = (
+    "四日市市",
+    "廿日市市",
+    "野々市市",
+    "大町市",
+    "東村山市",
+    "武蔵村山市",
+    "羽村市",
+    "十日町市",
+    "大村市",
+    "田村市",
+    "小郡市",
+    "蒲郡市",
+    "大和郡山市",
+    "上市町",
+    "下市町",
+    "余市町",
+    "大町町",
+    "玉村町",
+)
+# 名称に「市・町・村」を含み、汎用パターンでは郡と判定できない郡
+_IRREGULAR_COUNTIES: Tuple[str, ...] = ("余市郡", "高市郡", "田村郡", "北村山郡", "西村山郡", "東村山郡")
+
+
+def _alternation(names: Iterable[str]) -> str:
+    # 長い名称から照合する
+    return "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+
+
+_PREFECTURE_PATTERN = re.compile(rf"(?:{_alternation(PREFECTURES)})")
+_MUNICIPALITY_PATTERN = re.compile(
+    rf"(?:{_alternation(DESIGNATED_CITIES)})(?:[^\d\s区]{{1,5}}区)?"
+    rf"|(?:{_alternation(_IRREGULAR_MUNICIPALITIES)})"
+    rf"|(?:(?:{_alternation(_IRREGULAR_COUNTIES)})|[^\d\s市区町村郡]{{1,6}}郡)?"
+    rf"(?:{_alternation(_IRREGULAR_MUNICIPALITIES)}|[^\d\s]{{1,8}}?[市区町村])"
+)
+
+
+@dataclass(frozen=True)
+class ParsedAddress:
+    prefecture: str = ""
+    municipality: str = ""
+    remainder: str = ""
+
+    @property
+    def prefecture_code(self) -> str:
+        return PREFECTURE_CODES.get(self.prefecture, "")
+
+    @property
+    def city(self) -> str:
+        """都道府県を除いた住所（市区町村・番地）"""
+        return f"{self.municipality}{self.remainder}".strip()
+
+
+@lru_cache(maxsize=8192)
+def parse_address(value: Optional[str]) -> ParsedAddress:
+    """住所を都道府県・市区町村・それ以降に分解する（都道府県がなく政令指定都市で始まる場合は補完する）"""
+    text = (value or "").strip()
+    if not text:
+        return ParsedAddress()
+
+    prefecture = ""
+    match = _PREFECTURE_PATTERN.match(text)
+    if match:
+        prefecture = match.group(0)
+        text = text[match.end():].lstrip()
+
+    municipality = ""
+    match = _MUNICIPALITY_PATTERN.match(text)
+    if match:
+        municipality = match.group(0)
+        text = text[match.end():]
+        if not prefecture:
+            prefecture = next(
+                (pref for city, pref in DESIGNATED_CITIES.items() if municipality.startswith(city)),
+                "",
+            )
+    return ParsedAddress(prefecture=prefecture, municipality=municipality, remainder=text.strip())
+
+
+def parse_addresses(values: Iterable[Optional[str]]) -> List[ParsedAddress]:
+    """
+    複数の住所をまとめて分解する（同じ住所は1回だけ解析する）
+
+    1件あたりの解析は parse_address と同じで、速くなるのは重複する住所の分だけ。
+    """
+    parsed: dict = {}
+    results: List[ParsedAddress] = []
+    for value in values:
+        if value not in parsed:
+            parsed[value] = parse_address.__wrapped__(value)
+        results.append(parsed[value])
+    return results
+
+
+def split_prefecture(value: Optional[str]) -> Tuple[str, str]:
+    """住所を (都道府県, 都道府県を除いた住所) に分ける。都道府県がない場合は ("", 住所)"""
+    text = (value or "").strip()
+    match = _PREFECTURE_PATTERN.match(text)
+    if not match:
+        return "", text
+    return match.group(0), text[match.end():].strip()
+
+
+def prefecture_to_code(prefecture: Optional[str]) -> Optional[str]:
+    """都道府県名を JIS X 0401 都道府県コード（2桁）に変換する。変換できない場合は None"""
+    return PREFECTURE_CODES.get((prefecture or "").strip())
+
+
+def normalize_prefecture(value: Optional[str]) -> Optional[str]:
+    """「東京」「東京都千代田区…」などから都道府県名を取り出す。判定できない場合は None"""
+    text = unicodedata.normalize("NFKC", value or "").strip()
+    if not text:
+        return None
+    if text in _PREFECTURE_SHORT_NAMES:
+        return _PREFECTURE_SHORT_NAMES[text]
+    return parse_address(text).prefecture or None
+
+
+def build_name_location_key(name: Optional[str], prefecture: Optional[str] = None) -> Tuple[str, str]:
+    """
+    企業の照合キー（法人格を除いた名称, 都道府県コード）
+
+    prefecture には都道府県名のほか住所も渡せる（先頭の都道府県を使う）。
+    """
+    prefecture_name = normalize_prefecture(prefecture) or ""
+    return normalize_company_name(name or "").core, PREFECTURE_CODES.get(prefecture_name, "")
@@ -0,0 +1,119 @@
+"""
+gBizINFO 検索結果の永続キャッシュ。
+
+正規化した企業名 + JIS都道府県コードをキーに、ヒットした検索結果は
+CORPORATE_NUMBER_API_CACHE_TTL_DAYS 日、404/0件の結果（ネガティブキャッシュ）は
+CORPORATE_NUMBER_API_NEGATIVE_CACHE_TTL_DAYS 日保持する。
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
+
+from companies.models import CorporateNumberSearchCache
+from companies.services.address_parser import prefecture_to_code
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POSITIVE_TTL_DAYS = 30
+DEFAULT_NEGATIVE_TTL_DAYS = 3
+
+
+def _positive_ttl_days() -> int:
+    return max(int(getattr(settings, "CORPORATE_NUMBER_API_CACHE_TTL_DAYS", DEFAULT_POSITIVE_TTL_DAYS) or 0), 0)
+
+
+def _negative_ttl_days() -> int:
+    return max(
+        int(getattr(settings, "CORPORATE_NUMBER_API_NEGATIVE_CACHE_TTL_DAYS", DEFAULT_NEGATIVE_TTL_DAYS) or 0),
+        0,
+    )
+
+
+def is_cache_enabled() -> bool:
+    return bool(getattr(settings, "CORPORATE_NUMBER_API_CACHE_ENABLED", True))
+
+
+def build_cache_key(name: str, prefecture: Optional[str]) -> Tuple[str, str, str]:
+    """
+    キャッシュキーを生成する。
+
+    Returns:
+        (cache_key, name_normalized, prefecture_code)
+    """
+    from companies.services.corporate_number_client import _normalize_spaces
+
+    name_normalized = _normalize_spaces(name or "")
+    prefecture_code = prefecture_to_code(prefecture) if prefecture else None
+    prefecture_code = prefecture_code or ""
+    digest = hashlib.sha256(f"{name_normalized}|{prefecture_code}".encode("utf-8")).hexdigest()
+    return digest, name_normalized, prefecture_code
+
+
+def get_cached_results(name: str, prefecture: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    有効期限内のキャッシュがあれば検索結果を返す。キャッシュがない場合は None。
+    ネガティブキャッシュの場合は空リストを返す。
+    """
+    if not is_cache_enabled() or not name:
+        return None
+
+    cache_key, _, _ = build_cache_key(name, prefecture)
+    now = timezone.now()
+    try:
+        entry = (
+            CorporateNumberSearchCache.objects.filter(cache_key=cache_key, expires_at__gt=now)
+            .only("id", "results", "is_negative")
+            .first()
+        )
+        if entry is None:
+            return None
+        CorporateNumberSearchCache.objects.filter(id=entry.id).update(hit_count=F("hit_count") + 1)
+    except DatabaseError:
+        logger.warning("corporate-number-cache lookup failed", exc_info=True)
+        return None
+
+    if entry.is_negative:
+        return []
+    return list(entry.results or [])
+
+
+def store_results(name: str, prefecture: Optional[str], results: List[Dict[str, Any]]) -> None:
+    """検索結果をキャッシュに保存する。TTL が 0 の場合は保存しない。"""
+    if not is_cache_enabled() or not name:
+        return
+
+    is_negative = not results
+    ttl_days = _negative_ttl_days() if is_negative else _positive_ttl_days()
+    if ttl_days <= 0:
+        return
+
+    cache_key, name_normalized, prefecture_code = build_cache_key(name, prefecture)
+    try:
+        CorporateNumberSearchCache.objects.update_or_create(
+            cache_key=cache_key,
+            defaults={
+                "name_normalized": name_normalized[:255],
+                "prefecture_code": prefecture_code,
+                "results": [] if is_negative else results,
+                "is_negative": is_negative,
+                "expires_at": timezone.now() + timedelta(days=ttl_days),
+                "hit_count": 0,
+            },
+        )
+    except DatabaseError:
+        logger.warning("corporate-number-cache store failed", exc_info=True)
+
+
+def purge_expired(now: Optional[timezone.datetime] = None) -> int:
+    """期限切れのキャッシュを削除し、削除件数を返す。"""
+    now = now or timezone.now()
+    deleted, _ = CorporateNumberSearchCache.objects.filter(expires_at__lte=now).delete()
+    return deleted
@@ -5,6 +5,13 @@ from urllib.parse import urlencode
 import requests
 from django.conf import settings
 
+from saleslist_backend.circuit_breaker import CircuitBreaker, CircuitOpenError
+from saleslist_backend.http_sessions import get_session
+
+from .address_parser import parse_addresses, prefecture_to_code
+from .corporate_number_cache import get_cached_results, store_results
+from .name_matching import rank_candidates
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,6 +19,14 @@ class CorporateNumberAPIError(Exception):
     """Raised when the corporate number API call fails."""
 
 
+class CorporateNumberCircuitOpenError(CircuitOpenError, CorporateNumberAPIError):
+    """サーキットブレーカーが開いているため法人番号APIを呼び出さなかった"""
+
+
+def corporate_number_breaker() -> CircuitBreaker:
+    return CircuitBreaker("corporate-number", open_error=CorporateNumberCircuitOpenError)
+
+
 def _normalize_spaces(value: str) -> str:
     if value is None:
         return ""
@@ -28,56 +43,7 @@ def _prefecture_to_code(prefecture: str) -> Optional[str]:
     Returns:
         JIS都道府県コード（例: "13"）、変換できない場合はNone
     """
-    prefecture_map = {
-        "北海道": "01",
-        "青森県": "02",
-        "岩手県": "03",
-        "宮城県": "04",
-        "秋田県": "05",
-        "山形県": "06",
-        "福島県": "07",
-        "茨城県": "08",
-        "栃木県": "09",
-        "群馬県": "10",
-        "埼玉県": "11",
-        "千葉県": "12",
-        "東京都": "13",
-        "神奈川県": "14",
-        "新潟県": "15",
-        "富山県": "16",
-        "石川県": "17",
-        "福井県": "18",
-        "山梨県": "19",
-        "長野県": "20",
-        "岐阜県": "21",
-        "静岡県": "22",
-        "愛知県": "23",
-        "三重県": "24",
-        "滋賀県": "25",
-        "京都府": "26",
-        "大阪府": "27",
-        "兵庫県": "28",
-        "奈良県": "29",
-        "和歌山県": "30",
-        "鳥取県": "31",
-        "島根県": "32",
-        "岡山県": "33",
-        "広島県": "34",
-        "山口県": "35",
-        "徳島県": "36",
-        "香川県": "37",
-        "愛媛県": "38",
-        "高知県": "39",
-        "福岡県": "40",
-        "佐賀県": "41",
-        "長崎県": "42",
-        "熊本県": "43",
-        "大分県": "44",
-        "宮崎県": "45",
-        "鹿児島県": "46",
-        "沖縄県": "47",
-    }
-    return prefecture_map.get(prefecture.strip())
+    return prefecture_to_code(prefecture)
 
 
 class CorporateNumberAPIClient:
@@ -96,9 +62,18 @@ class CorporateNumberAPIClient:
         self.base_url = (base_url or settings.CORPORATE_NUMBER_API_BASE_URL).rstrip("/")
         self.timeout = timeout or settings.CORPORATE_NUMBER_API_TIMEOUT
         self.max_results = max_results or settings.CORPORATE_NUMBER_API_MAX_RESULTS
+        # 直近の search() がキャッシュから返されたか（API呼び出し統計用）
+        self.last_search_cached = False
+        self.breaker = corporate_number_breaker()
+        self.session = get_session("corporate-number")
 
     def search(
-        self, name: str, prefecture: Optional[str] = None, limit: Optional[int] = None
+        self,
+        name: str,
+        prefecture: Optional[str] = None,
+        limit: Optional[int] = None,
+        *,
+        refresh: bool = False,
     ) -> List[Dict[str, Any]]:
         """
         企業名と都道府県から法人番号APIを検索（gBizINFO API）
@@ -107,16 +82,52 @@ class CorporateNumberAPIClient:
             name: 企業名
             prefecture: 都道府県名（オプション、JIS都道府県コードに変換される）
             limit: 取得件数上限（オプション）
+            refresh: True の場合はキャッシュを参照せずAPIを呼び出す（結果はキャッシュに保存）
         
         Returns:
             企業情報のリスト
         """
+        self.last_search_cached = False
         if not self.token:
             raise CorporateNumberAPIError("CORPORATE_NUMBER_API_TOKEN is not configured.")
 
         if not name:
             return []
 
+        # 永続キャッシュ（ヒット: N日 / 404・0件: 短期間）を優先して参照する
+        if not refresh:
+            cached = get_cached_results(name, prefecture)
+            if cached is not None:
+                self.last_search_cached = True
+                logger.info(
+                    "corporate-number-api cache hit: name=%s, prefecture=%s, results=%d",
+                    name,
+                    prefecture,
+                    len(cached),
+                )
+                return cached
+
+        results = self._search_remote(name, prefecture)
+        if results is not None:
+            store_results(name, prefecture, results)
+        return results or []
+
+    def fetch(self, name: str, prefecture: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        キャッシュを参照・保存せずにAPIを呼び出す（並列取得用。キャッシュへの保存は呼び出し側で行う）。
+        キャッシュ可能な結果はリスト、キャッシュすべきでない結果は None を返す。
+        """
+        if not self.token:
+            raise CorporateNumberAPIError("CORPORATE_NUMBER_API_TOKEN is not configured.")
+        if not name:
+            return []
+        return self._search_remote(name, prefecture)
+
+    def _search_remote(self, name: str, prefecture: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """
+        gBizINFO APIを呼び出す。キャッシュ可能な結果はリスト、
+        キャッシュすべきでない結果（レスポンス異常等）は None を返す。
+        """
         # gBizINFO APIのエンドポイント
         # API仕様: https://info.gbiz.go.jp/hojin/swagger-ui/index.html
         # サーバーURL: /hojin
@@ -176,7 +187,7 @@ class CorporateNumberAPIClient:
                 {k: v[:10] + "..." if len(v) > 10 else v for k, v in headers.items()},
             )
             # 完全なURLを直接使用（paramsは使わない）
-            response = requests.get(full_url, headers=headers, timeout=self.timeout)
+            response = self.breaker.request(lambda: self.session.get(full_url, headers=headers, timeout=self.timeout))
             # 実際のリクエストURLをログに出力（curlと比較可能）
             logger.info(
                 "corporate-number-api actual URL: %s, status=%d",
@@ -202,7 +213,7 @@ class CorporateNumberAPIClient:
                     "corporate-number-api 404: 企業が見つかりませんでした。AI補完を継続します。",
                     extra={"company_name": name, "prefecture": prefecture},
                 )
-                return []  # 空のリストを返して処理を継続
+                return []  # 空のリストを返して処理を継続（ネガティブキャッシュ対象）
             else:
                 raise CorporateNumberAPIError(f"法人番号APIからエラーが返却されました（ステータス: {response.status_code}）。")
 
@@ -216,51 +227,31 @@ class CorporateNumberAPIClient:
         results = []
         if not isinstance(data, dict):
             logger.warning("corporate-number-api unexpected response format: %s", type(data))
-            return results
+            return None
 
         # エラーチェック
         if data.get("errors"):
             logger.warning("corporate-number-api errors in response: %s", data.get("errors"))
-            return results
+            return None
 
         # hojin-infos 配列から企業情報を取得
         items = data.get("hojin-infos", [])
         if not isinstance(items, list):
             logger.warning("corporate-number-api hojin-infos is not a list: %s", type(items))
-            return results
-
-        for item in items:
-            if not isinstance(item, dict):
-                continue
-            
-            corporate_number = item.get("corporate_number")
-            if not corporate_number:
-                continue
-            
+            return None
+
+        items = [item for item in items if isinstance(item, dict) and item.get("corporate_number")]
+        # locationから都道府県を抽出（例: "東京都千代田区..." → "東京都"）
+        parsed_locations = parse_addresses(item.get("location", "") for item in items)
+        for item, parsed in zip(items, parsed_locations):
             company_name = item.get("name", "")
-            location = item.get("location", "")
-            
-            # locationから都道府県を抽出（例: "東京都千代田区..." → "東京都"）
-            prefecture_name = ""
-            if location:
-                for pref in ["北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
-                            "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
-                            "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
-                            "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
-                            "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
-                            "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
-                            "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県"]:
-                    if location.startswith(pref):
-                        prefecture_name = pref
-                        break
-            
             results.append(
                 {
-                    "corporate_number": str(corporate_number).strip(),
+                    "corporate_number": str(item["corporate_number"]).strip(),
                     "name": company_name,
                     "name_normalized": _normalize_spaces(company_name),
-                    "prefecture": prefecture_name,
-                    "address": location,
+                    "prefecture": parsed.prefecture,
+                    "address": item.get("location", ""),
                     "raw": item,
                 }
             )
@@ -273,28 +264,15 @@ def select_best_match(
     company_name: str,
     prefecture: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
-    """Choose the best candidate based on name and prefecture."""
+    """
+    Choose the best candidate based on name and prefecture.
+
+    候補全体を表記ゆれ込みの名称類似度（name_matching）で採点し、最上位の候補を
+    match_confidence（0.0〜1.0）付きで返す。名称が一致しない候補しかない場合も、
+    従来どおり都道府県が一致する候補 → 先頭の候補の順に返す（採否は呼び出し側で confidence を見て判断する）。
+    """
     if not candidates:
         return None
 
-    normalized_target = _normalize_spaces(company_name)
-    prefecture = (prefecture or "").strip()
-
-    prefecture_matches = [
-        item
-        for item in candidates
-        if item.get("prefecture") and prefecture and item["prefecture"] == prefecture
-    ]
-    name_matches = [
-        item
-        for item in (prefecture_matches or candidates)
-        if item.get("name_normalized") == normalized_target
-    ]
-    if name_matches:
-        return name_matches[0]
-
-    # fallback to prefecture match if available
-    if prefecture_matches:
-        return prefecture_matches[0]
-
-    return candidates[0]
+    best, confidence = rank_candidates(candidates, company_name, prefecture)[0]
+    return {**best, "match_confidence": confidence}
@@ -0,0 +1,227 @@
+"""
+国税庁 法人番号公表サイトの全件データ（ローカルコピー）の取込と一括照合
+
+全件・差分ファイル（zip / CSV、ヘッダなし）を CorporateNumberRegistryEntry に取り込み、
+企業名（正規化）+ 都道府県コードの索引で多数の企業をまとめて照合する。
+企業名は法人格・全角などの表記ゆれを除いた名称（name_matching.normalize_company_name）で照合する。
+照合結果は法人番号API（CorporateNumberAPIClient.search）と同じ形式の候補 dict を返すため、
+import_corporate_numbers の選択・候補投入の処理をそのまま使える。
+"""
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import zipfile
+from collections import Counter, defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from django.db import transaction
+
+from companies.models import Company, CorporateNumberRegistryEntry
+from companies.services.address_parser import build_name_location_key, prefecture_to_code
+from companies.services.corporate_number_client import _normalize_spaces
+from companies.services.name_matching import normalize_company_name, rank_candidates
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_SOURCE = "nta-bulk"
+DEFAULT_ENCODING = "utf-8-sig"
+DEFAULT_BATCH_SIZE = 5000
+# name_core__in の1クエリあたりの件数
+MATCH_CHUNK_SIZE = 500
+
+# 法人番号公表サイト CSV（ヘッダなし）の列位置
+COL_CORPORATE_NUMBER = 1
+COL_PROCESS = 2
+COL_UPDATE_DATE = 4
+COL_NAME = 6
+COL_KIND = 8
+COL_PREFECTURE_NAME = 9
+COL_CITY_NAME = 10
+COL_STREET_NUMBER = 11
+COL_PREFECTURE_CODE = 13
+COL_POST_CODE = 15
+COL_CLOSE_DATE = 18
+COL_LATEST = 23
+MIN_COLUMNS = COL_LATEST + 1
+
+# 処理区分「削除」
+PROCESS_DELETED = "99"
+
+_UPDATE_FIELDS = [
+    "name",
+    "name_normalized",
+    "name_core",
+    "kind",
+    "prefecture_name",
+    "prefecture_code",
+    "city_name",
+    "street_number",
+    "post_code",
+    "close_date",
+    "updated_on",
+    "loaded_at",
+]
+
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def iter_registry_rows(path: Union[str, Path], *, encoding: str = DEFAULT_ENCODING) -> Iterator[List[str]]:
+    """zip（中の CSV をすべて）または CSV の行を順に返す（全件を読み込まずに逐次処理する）"""
+    path = Path(path)
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if not member.lower().endswith(".csv"):
+                    continue
+                with archive.open(member) as raw:
+                    yield from csv.reader(io.TextIOWrapper(raw, encoding=encoding, newline=""))
+        return
+    with path.open(encoding=encoding, newline="") as handle:
+        yield from csv.reader(handle)
+
+
+def _row_to_entry(row: Sequence[str]) -> CorporateNumberRegistryEntry:
+    name = row[COL_NAME].strip()
+    prefecture_name = row[COL_PREFECTURE_NAME].strip()
+    return CorporateNumberRegistryEntry(
+        corporate_number=row[COL_CORPORATE_NUMBER].strip(),
+        name=name[:255],
+        name_normalized=_normalize_spaces(name)[:255],
+        name_core=normalize_company_name(name).core[:255],
+        kind=row[COL_KIND].strip()[:3],
+        prefecture_name=prefecture_name,
+        prefecture_code=row[COL_PREFECTURE_CODE].strip()[:2] or (prefecture_to_code(prefecture_name) or ""),
+        city_name=row[COL_CITY_NAME].strip()[:100],
+        street_number=row[COL_STREET_NUMBER].strip()[:300],
+        post_code=row[COL_POST_CODE].strip()[:7],
+        close_date=_parse_date(row[COL_CLOSE_DATE].strip()),
+        updated_on=_parse_date(row[COL_UPDATE_DATE].strip()),
+    )
+
+
+def _flush(upserts: Dict[str, CorporateNumberRegistryEntry], deletes: set, stats: Counter) -> None:
+    with transaction.atomic():
+        if upserts:
+            CorporateNumberRegistryEntry.objects.bulk_create(
+                list(upserts.values()),
+                update_conflicts=True,
+                unique_fields=["corporate_number"],
+                update_fields=_UPDATE_FIELDS,
+            )
+            stats["upserted"] += len(upserts)
+        if deletes:
+            deleted, _ = CorporateNumberRegistryEntry.objects.filter(corporate_number__in=deletes).delete()
+            stats["deleted"] += deleted
+    upserts.clear()
+    deletes.clear()
+
+
+def load_registry_rows(rows: Iterable[Sequence[str]], *, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    公表サイト形式の行を取り込む（法人番号で upsert、処理区分「削除」は削除）
+
+    差分ファイルでは同じ法人番号が複数回現れるため、バッチ内では後の行を優先する。
+    最新履歴でない行（latest=0）は取り込まない。
+    """
+    stats: Counter = Counter()
+    upserts: Dict[str, CorporateNumberRegistryEntry] = {}
+    deletes: set = set()
+    batch_size = max(int(batch_size), 1)
+
+    for row in rows:
+        stats["rows"] += 1
+        if len(row) < MIN_COLUMNS or not row[COL_CORPORATE_NUMBER].strip():
+            stats["invalid"] += 1
+            continue
+        corporate_number = row[COL_CORPORATE_NUMBER].strip()
+        if row[COL_PROCESS].strip() == PROCESS_DELETED:
+            upserts.pop(corporate_number, None)
+            deletes.add(corporate_number)
+        elif row[COL_LATEST].strip() == "0":
+            stats["skipped_history"] += 1
+            continue
+        else:
+            deletes.discard(corporate_number)
+            upserts[corporate_number] = _row_to_entry(row)
+        if len(upserts) + len(deletes) >= batch_size:
+            _flush(upserts, deletes, stats)
+
+    _flush(upserts, deletes, stats)
+    return {key: int(stats.get(key, 0)) for key in ("rows", "upserted", "deleted", "skipped_history", "invalid")}
+
+
+def load_registry_file(
+    path: Union[str, Path],
+    *,
+    encoding: str = DEFAULT_ENCODING,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, int]:
+    """全件・差分ファイル（zip / CSV）を取り込む"""
+    stats = load_registry_rows(iter_registry_rows(path, encoding=encoding), batch_size=batch_size)
+    logger.info("corporate-number-registry loaded path=%s stats=%s", path, stats)
+    return stats
+
+
+def registry_entry_to_candidate(entry: CorporateNumberRegistryEntry) -> Dict[str, object]:
+    """API 検索結果と同じ形式の候補（raw は公表サイトの項目名）"""
+    return {
+        "corporate_number": entry.corporate_number,
+        "name": entry.name,
+        "name_normalized": entry.name_normalized,
+        "prefecture": entry.prefecture_name,
+        "address": f"{entry.prefecture_name}{entry.city_name}{entry.street_number}",
+        "raw": {
+            "corporateNumber": entry.corporate_number,
+            "kind": entry.kind,
+            "prefectureName": entry.prefecture_name,
+            "cityName": entry.city_name,
+            "streetNumber": entry.street_number,
+            "postCode": entry.post_code,
+            "sequenceNumber": REGISTRY_SOURCE,
+        },
+    }
+
+
+def find_registry_candidates(companies: Sequence[Company]) -> Dict[int, List[Dict[str, object]]]:
+    """
+    企業ごとのローカル全件データの候補を返す（閉鎖済みの法人は除く）
+
+    法人格を除いた名称の IN 検索をまとめて行い、都道府県コードで絞り込む。都道府県が登録されている企業は
+    同じ都道府県の候補のみ、名称の一致度が最も高い法人が複数残る場合は特定できないため候補なしとする。
+    """
+    keys = {}
+    for company in companies:
+        name_core, prefecture_code = build_name_location_key(company.name, company.prefecture)
+        if not name_core:
+            continue
+        keys[company.id] = (company, name_core[:255], prefecture_code)
+
+    by_core: Dict[str, List[CorporateNumberRegistryEntry]] = defaultdict(list)
+    cores = sorted({name_core for _company, name_core, _code in keys.values()})
+    for start in range(0, len(cores), MATCH_CHUNK_SIZE):
+        chunk = cores[start : start + MATCH_CHUNK_SIZE]
+        for entry in CorporateNumberRegistryEntry.objects.filter(name_core__in=chunk, close_date__isnull=True):
+            by_core[entry.name_core].append(entry)
+
+    matches: Dict[int, List[Dict[str, object]]] = {}
+    for company_id, (company, name_core, prefecture_code) in keys.items():
+        entries = by_core.get(name_core) or []
+        if prefecture_code:
+            entries = [entry for entry in entries if entry.prefecture_code == prefecture_code]
+        if not entries:
+            continue
+        ranked = rank_candidates([registry_entry_to_candidate(entry) for entry in entries], company.name)
+        best, confidence = ranked[0]
+        # 法人格まで同じ一致度の法人が複数ある場合（同名・同一都道府県）は特定できない
+        if sum(1 for _item, score in ranked if score == confidence) == 1:
+            matches[company_id] = [{**best, "match_confidence": confidence}]
+    return matches
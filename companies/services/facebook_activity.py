@@ -1,9 +1,13 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, Optional
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+from django.conf import settings
 from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 
@@ -11,6 +15,11 @@ from companies.models import Company, CompanyFacebookSnapshot
 
 logger = logging.getLogger(__name__)
 
+SYNC_MIN_INTERVAL = timedelta(hours=getattr(settings, "FACEBOOK_SYNC_MIN_INTERVAL_HOURS", 6))
+SYNC_MAX_INTERVAL = timedelta(hours=getattr(settings, "FACEBOOK_SYNC_MAX_INTERVAL_HOURS", 168))
+# Pages without changes are re-synced after (latest post age * factor), within MIN..MAX.
+SYNC_POST_AGE_FACTOR = getattr(settings, "FACEBOOK_SYNC_POST_AGE_FACTOR", 0.25)
+
 
 def _normalize_datetime(value: Optional[Any]) -> Optional[timezone.datetime]:
     if value is None:
@@ -28,63 +37,129 @@ def _normalize_datetime(value: Optional[Any]) -> Optional[timezone.datetime]:
     return None
 
 
-def process_company_metrics(
+def next_sync_interval(
+    *,
+    changed: bool,
+    latest_posted_at: Optional[timezone.datetime],
+    now: timezone.datetime,
+) -> timedelta:
+    """
+    Interval until the next sync of a page.
+
+    Pages whose fan count or latest post changed since the previous snapshot are
+    synced again after SYNC_MIN_INTERVAL. Other pages back off in proportion to
+    the age of their latest post, and pages without posts wait SYNC_MAX_INTERVAL.
+    """
+    if changed:
+        return SYNC_MIN_INTERVAL
+    if latest_posted_at is None:
+        return SYNC_MAX_INTERVAL
+    interval = max(now - latest_posted_at, timedelta(0)) * SYNC_POST_AGE_FACTOR
+    return min(max(interval, SYNC_MIN_INTERVAL), SYNC_MAX_INTERVAL)
+
+
+def failure_retry_interval(failures: int) -> timedelta:
+    """Interval until retrying a page that failed `failures` times in a row."""
+    return min(SYNC_MIN_INTERVAL * (2 ** max(failures - 1, 0)), SYNC_MAX_INTERVAL)
+
+
+def record_sync_failures(companies: Sequence[Company], *, now: Optional[timezone.datetime] = None) -> None:
+    """Count a failed sync for the companies and push back their next sync time."""
+    if not companies:
+        return
+    now = now or timezone.now()
+    for company in companies:
+        company.facebook_sync_failures = min((company.facebook_sync_failures or 0) + 1, 32767)
+        company.facebook_next_sync_at = now + failure_retry_interval(company.facebook_sync_failures)
+    Company.objects.bulk_update(companies, ["facebook_sync_failures", "facebook_next_sync_at"])
+
+
+def _apply_metrics(
     company: Company,
     metrics: Dict[str, Any],
+    previous: Optional[Tuple[Optional[int], Optional[timezone.datetime]]],
     *,
-    source: str = "celery",
-) -> bool:
+    source: str,
+    now: timezone.datetime,
+) -> Tuple[CompanyFacebookSnapshot, List[str], bool]:
     """
-    Apply fetched Facebook metrics to a company.
+    Apply metrics to the company in memory.
 
-    Returns True if latest_activity_at was updated.
+    previous is (friend_count, latest_posted_at) of the latest snapshot, or None.
+    Returns the unsaved snapshot, the company fields to save and whether
+    latest_activity_at was updated.
     """
     friend_count = metrics.get("friend_count")
-    friend_count_fetched_at = _normalize_datetime(metrics.get("friend_count_fetched_at")) or timezone.now()
+    friend_count_fetched_at = _normalize_datetime(metrics.get("friend_count_fetched_at")) or now
     latest_posted_at = _normalize_datetime(metrics.get("latest_posted_at"))
-    latest_post_fetched_at = _normalize_datetime(metrics.get("latest_post_fetched_at")) or timezone.now()
+    latest_post_fetched_at = _normalize_datetime(metrics.get("latest_post_fetched_at")) or now
+    previous_friend_count, previous_post_at = previous or (None, None)
 
-    now = timezone.now()
     should_update_activity = False
+    changed = False
+    if friend_count is not None:
+        if previous_friend_count is None or friend_count > previous_friend_count:
+            should_update_activity = True
+        changed = changed or friend_count != previous_friend_count
+        company.facebook_friend_count = friend_count
+
+    if latest_posted_at is not None:
+        if previous_post_at is None or latest_posted_at > previous_post_at:
+            should_update_activity = True
+            changed = True
+        company.facebook_latest_post_at = latest_posted_at
+
+    company.facebook_data_synced_at = now
+    company.facebook_sync_failures = 0
+    company.facebook_next_sync_at = now + next_sync_interval(
+        changed=changed,
+        latest_posted_at=latest_posted_at or previous_post_at,
+        now=now,
+    )
+
+    update_fields = ['facebook_data_synced_at', 'facebook_next_sync_at', 'facebook_sync_failures']
+    if friend_count is not None:
+        update_fields.append('facebook_friend_count')
+    if latest_posted_at is not None:
+        update_fields.append('facebook_latest_post_at')
+    if should_update_activity:
+        company.latest_activity_at = now
+        update_fields.append('latest_activity_at')
+
+    snapshot = CompanyFacebookSnapshot(
+        company=company,
+        friend_count=friend_count,
+        friend_count_fetched_at=friend_count_fetched_at,
+        latest_posted_at=latest_posted_at,
+        latest_post_fetched_at=latest_post_fetched_at,
+        source=source,
+    )
+    return snapshot, update_fields, should_update_activity
+
+
+def process_company_metrics(
+    company: Company,
+    metrics: Dict[str, Any],
+    *,
+    source: str = "celery",
+) -> bool:
+    """
+    Apply fetched Facebook metrics to a company.
 
+    Returns True if latest_activity_at was updated.
+    """
     with transaction.atomic():
         previous_snapshot = (
             company.facebook_snapshots.order_by("-created_at").select_for_update().first()
         )
-
-        if friend_count is not None:
-            previous_friend_count = previous_snapshot.friend_count if previous_snapshot else None
-            if previous_friend_count is None or friend_count > previous_friend_count:
-                should_update_activity = True
-            company.facebook_friend_count = friend_count
-
-        if latest_posted_at is not None:
-            previous_post_at = previous_snapshot.latest_posted_at if previous_snapshot else None
-            if previous_post_at is None or latest_posted_at > previous_post_at:
-                should_update_activity = True
-            company.facebook_latest_post_at = latest_posted_at
-
-        company.facebook_data_synced_at = now
-
-        update_fields = ['facebook_data_synced_at']
-        if friend_count is not None:
-            update_fields.append('facebook_friend_count')
-        if latest_posted_at is not None:
-            update_fields.append('facebook_latest_post_at')
-        if should_update_activity:
-            company.latest_activity_at = now
-            update_fields.append('latest_activity_at')
-
-        company.save(update_fields=update_fields)
-
-        CompanyFacebookSnapshot.objects.create(
-            company=company,
-            friend_count=friend_count,
-            friend_count_fetched_at=friend_count_fetched_at,
-            latest_posted_at=latest_posted_at,
-            latest_post_fetched_at=latest_post_fetched_at,
-            source=source,
+        previous = (
+            (previous_snapshot.friend_count, previous_snapshot.latest_posted_at) if previous_snapshot else None
         )
+        snapshot, update_fields, should_update_activity = _apply_metrics(
+            company, metrics, previous, source=source, now=timezone.now()
+        )
+        company.save(update_fields=update_fields)
+        snapshot.save()
 
     logger.debug(
         "Processed Facebook metrics for company=%s updated=%s metrics=%s",
@@ -93,3 +168,63 @@ def process_company_metrics(
         metrics,
     )
     return should_update_activity
+
+
+def process_companies_metrics(
+    items: Sequence[Tuple[Company, Dict[str, Any]]],
+    *,
+    source: str = "celery",
+) -> Dict[int, bool]:
+    """
+    Bulk variant of process_company_metrics for a chunk of companies.
+
+    Locks the companies, loads the latest snapshot of every company in one query,
+    computes the deltas in memory, then writes the snapshots with bulk_create and
+    the touched company fields with bulk_update (one per distinct field set).
+    Items for the same company are applied in order, as repeated calls would.
+    Returns {company_id: latest_activity_at updated}.
+    """
+    if not items:
+        return {}
+    company_ids = sorted({company.id for company, _metrics in items})
+    latest_snapshot = CompanyFacebookSnapshot.objects.filter(company_id=OuterRef("company_id")).order_by(
+        "-created_at", "-id"
+    )
+
+    updated: Dict[int, bool] = {}
+    with transaction.atomic():
+        # Serialize with other workers processing the same companies.
+        list(Company.objects.select_for_update().filter(id__in=company_ids).order_by("id").values_list("id", flat=True))
+        previous: Dict[int, Tuple[Optional[int], Optional[timezone.datetime]]] = {
+            row["company_id"]: (row["friend_count"], row["latest_posted_at"])
+            for row in CompanyFacebookSnapshot.objects.filter(
+                company_id__in=company_ids,
+                id=Subquery(latest_snapshot.values("id")[:1]),
+            ).values("company_id", "friend_count", "latest_posted_at")
+        }
+
+        now = timezone.now()
+        snapshots: List[CompanyFacebookSnapshot] = []
+        touched: Dict[int, Tuple[Company, set]] = {}
+        for company, metrics in items:
+            snapshot, update_fields, should_update_activity = _apply_metrics(
+                company, metrics, previous.get(company.id), source=source, now=now
+            )
+            snapshots.append(snapshot)
+            touched.setdefault(company.id, (company, set()))[1].update(update_fields)
+            previous[company.id] = (snapshot.friend_count, snapshot.latest_posted_at)
+            updated[company.id] = updated.get(company.id, False) or should_update_activity
+
+        companies_by_fields: Dict[Tuple[str, ...], List[Company]] = defaultdict(list)
+        for company, update_fields in touched.values():
+            companies_by_fields[tuple(sorted(update_fields))].append(company)
+        for update_fields, companies in companies_by_fields.items():
+            Company.objects.bulk_update(companies, list(update_fields))
+        CompanyFacebookSnapshot.objects.bulk_create(snapshots)
+
+    logger.debug(
+        "Processed Facebook metrics for companies=%s updated=%s",
+        len(company_ids),
+        sum(updated.values()),
+    )
+    return updated
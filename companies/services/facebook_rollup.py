@@ -0,0 +1,184 @@
+"""
+Facebookスナップショットの日次集計と保持期間を過ぎたスナップショットの削除
+
+CompanyFacebookSnapshot は同期のたびに企業ごとに1行増えるため、保持期間（RETENTION_DAYS）を
+過ぎた行を企業・日付（ローカル日付）ごとの CompanyFacebookDailySummary に集約してから削除する。
+
+- id 順に BATCH_SIZE 行ずつ処理し、バッチごとに「集計の upsert + 削除」を1トランザクションで行う
+  （途中で止まっても集計と削除がずれない。次回は残りから続ける）
+- 企業ごとの最新のスナップショットは、次回同期時の差分判定（process_company_metrics）に使うため残す
+- 同じ日のスナップショットが複数のバッチ・実行に分かれても、既存の集計にマージする
+
+推移の参照は daily_facebook_trend を使う（集計済みの日は集計表、保持期間内の日はスナップショットから同じ形式で返す）。
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from companies.models import CompanyFacebookDailySummary, CompanyFacebookSnapshot
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = getattr(settings, "FACEBOOK_SNAPSHOT_RETENTION_DAYS", 90)
+BATCH_SIZE = getattr(settings, "FACEBOOK_SNAPSHOT_ROLLUP_BATCH_SIZE", 5000)
+
+_SNAPSHOT_FIELDS = ("id", "company_id", "friend_count", "latest_posted_at", "created_at")
+_SUMMARY_UPDATE_FIELDS = [
+    "snapshot_count",
+    "friend_count_min",
+    "friend_count_max",
+    "friend_count_last",
+    "latest_posted_at",
+    "post_count",
+    "last_snapshot_at",
+    "updated_at",
+]
+
+
+@dataclass
+class DailyPoint:
+    """企業・日付ごとの集計（CompanyFacebookDailySummary と同じ項目）"""
+
+    company_id: int
+    date: date
+    snapshot_count: int = 0
+    friend_count_min: Optional[int] = None
+    friend_count_max: Optional[int] = None
+    friend_count_last: Optional[int] = None
+    latest_posted_at: Optional[datetime] = None
+    post_count: int = 0
+    last_snapshot_at: Optional[datetime] = None
+
+    @classmethod
+    def from_summary(cls, summary: CompanyFacebookDailySummary) -> "DailyPoint":
+        return cls(**{name: getattr(summary, name) for name in cls.__dataclass_fields__})
+
+    def add(self, friend_count: Optional[int], latest_posted_at: Optional[datetime], created_at: datetime) -> None:
+        """スナップショット1件を加える（古い順に加える。前後しても最終値は取得時刻で判定する）"""
+        self.snapshot_count += 1
+        is_last = self.last_snapshot_at is None or created_at >= self.last_snapshot_at
+        if friend_count is not None:
+            counts = [value for value in (self.friend_count_min, self.friend_count_max) if value is not None]
+            self.friend_count_min = min([friend_count, *counts])
+            self.friend_count_max = max([friend_count, *counts])
+            if is_last or self.friend_count_last is None:
+                self.friend_count_last = friend_count
+        # 最新投稿時刻が進んだ回数を新規投稿として数える（その日の最初の観測は、その日の投稿の場合のみ）
+        if latest_posted_at is not None and (self.latest_posted_at is None or latest_posted_at > self.latest_posted_at):
+            if self.latest_posted_at is not None or timezone.localtime(latest_posted_at).date() == self.date:
+                self.post_count += 1
+            self.latest_posted_at = latest_posted_at
+        if is_last:
+            self.last_snapshot_at = created_at
+
+    def to_summary(self) -> CompanyFacebookDailySummary:
+        return CompanyFacebookDailySummary(**{name: getattr(self, name) for name in self.__dataclass_fields__})
+
+
+def _aggregate(rows: Iterable[dict], points: Dict[Tuple[int, date], DailyPoint]) -> None:
+    for row in rows:
+        day = timezone.localtime(row["created_at"]).date()
+        key = (row["company_id"], day)
+        point = points.get(key)
+        if point is None:
+            point = points[key] = DailyPoint(company_id=row["company_id"], date=day)
+        point.add(row["friend_count"], row["latest_posted_at"], row["created_at"])
+
+
+def retention_cutoff(now: Optional[datetime] = None, retention_days: Optional[int] = None) -> datetime:
+    """この時刻より前（ローカル日付の0時基準）のスナップショットを集約・削除する"""
+    days = RETENTION_DAYS if retention_days is None else retention_days
+    today = timezone.localdate(now or timezone.now())
+    return timezone.make_aware(datetime.combine(today - timedelta(days=max(int(days), 0)), time.min))
+
+
+def _rollup_batch(rows: List[dict]) -> int:
+    points: Dict[Tuple[int, date], DailyPoint] = {}
+    company_ids = {row["company_id"] for row in rows}
+    days = {timezone.localtime(row["created_at"]).date() for row in rows}
+    for summary in CompanyFacebookDailySummary.objects.select_for_update().filter(
+        company_id__in=company_ids, date__in=days
+    ):
+        points[(summary.company_id, summary.date)] = DailyPoint.from_summary(summary)
+    _aggregate(rows, points)
+    CompanyFacebookDailySummary.objects.bulk_create(
+        [point.to_summary() for point in points.values()],
+        update_conflicts=True,
+        unique_fields=["company", "date"],
+        update_fields=_SUMMARY_UPDATE_FIELDS,
+    )
+    deleted, _ = CompanyFacebookSnapshot.objects.filter(id__in=[row["id"] for row in rows]).delete()
+    return deleted
+
+
+def rollup_facebook_snapshots(
+    *,
+    retention_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, object]:
+    """
+    保持期間を過ぎたスナップショットを日次集計に集約して削除する
+
+    max_batches を指定すると、そのバッチ数で打ち切る（残りは次回の実行で処理する）。
+    """
+    cutoff = retention_cutoff(now, retention_days)
+    batch_size = max(int(batch_size or BATCH_SIZE), 1)
+    latest_per_company = CompanyFacebookSnapshot.objects.filter(company_id=OuterRef("company_id")).order_by(
+        "-created_at", "-id"
+    )
+    candidates = (
+        CompanyFacebookSnapshot.objects.filter(created_at__lt=cutoff)
+        .exclude(id=Subquery(latest_per_company.values("id")[:1]))
+        .order_by("id")
+    )
+
+    stats = {"batches": 0, "snapshots": 0, "deleted": 0}
+    last_id = 0
+    while max_batches is None or stats["batches"] < max_batches:
+        with transaction.atomic():
+            rows = list(candidates.filter(id__gt=last_id).values(*_SNAPSHOT_FIELDS)[:batch_size])
+            if not rows:
+                break
+            stats["deleted"] += _rollup_batch(rows)
+        stats["batches"] += 1
+        stats["snapshots"] += len(rows)
+        last_id = rows[-1]["id"]
+
+    result = {**stats, "cutoff": cutoff.isoformat(), "completed": max_batches is None or stats["batches"] < max_batches}
+    logger.info("Rolled up Facebook snapshots: %s", result)
+    return result
+
+
+def daily_facebook_trend(company_id: int, *, since: date, until: Optional[date] = None) -> List[DailyPoint]:
+    """
+    企業の日次の推移（古い順）
+
+    集約済みの日は日次集計から、保持期間内の日はスナップショットから同じ形式で返す。
+    集約の途中で同じ日が両方にある場合はまとめる。
+    """
+    until = until or timezone.localdate()
+    points: Dict[Tuple[int, date], DailyPoint] = {
+        (summary.company_id, summary.date): DailyPoint.from_summary(summary)
+        for summary in CompanyFacebookDailySummary.objects.filter(
+            company_id=company_id, date__gte=since, date__lte=until
+        )
+    }
+    start = timezone.make_aware(datetime.combine(since, time.min))
+    end = timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min))
+    _aggregate(
+        CompanyFacebookSnapshot.objects.filter(company_id=company_id, created_at__gte=start, created_at__lt=end)
+        .order_by("created_at", "id")
+        .values(*_SNAPSHOT_FIELDS),
+        points,
+    )
+    return [points[key] for key in sorted(points, key=lambda key: key[1])]
@@ -0,0 +1,169 @@
+"""
+企業名の表記ゆれを考慮した照合（法人番号の候補選択用）
+
+- NFKC 正規化（全角英数・㈱ などの互換文字を統一）・小文字化・空白や記号の除去
+- 法人格（株式会社 / (株) / 有限会社 / Co., Ltd. など）を前後から取り除き、法人格は別に比較する
+- 文字 bigram の転置索引で全候補の類似度（Dice 係数）をまとめて計算する
+
+confidence は 0.0〜1.0。法人格を除いた名称が一致すれば 1.0、法人格が異なる場合は減点する。
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+
+# 法人格の表記 → 正式名称（NFKC・小文字化後の表記で照合する）
+_LEGAL_FORMS: Mapping[str, str] = {
+    "株式会社": "株式会社",
+    "(株)": "株式会社",
+    "有限会社": "有限会社",
+    "(有)": "有限会社",
+    "合同会社": "合同会社",
+    "(同)": "合同会社",
+    "合資会社": "合資会社",
+    "(資)": "合資会社",
+    "合名会社": "合名会社",
+    "(名)": "合名会社",
+    "一般社団法人": "一般社団法人",
+    "(一社)": "一般社団法人",
+    "一般財団法人": "一般財団法人",
+    "(一財)": "一般財団法人",
+    "公益社団法人": "公益社団法人",
+    "(公社)": "公益社団法人",
+    "公益財団法人": "公益財団法人",
+    "(公財)": "公益財団法人",
+    "特定非営利活動法人": "特定非営利活動法人",
+    "npo法人": "特定非営利活動法人",
+    "(特非)": "特定非営利活動法人",
+    "社会福祉法人": "社会福祉法人",
+    "(福)": "社会福祉法人",
+    "医療法人社団": "医療法人",
+    "医療法人財団": "医療法人",
+    "医療法人": "医療法人",
+    "(医)": "医療法人",
+    "学校法人": "学校法人",
+    "(学)": "学校法人",
+    "co.,ltd.": "株式会社",
+    "co.,ltd": "株式会社",
+    "co.ltd.": "株式会社",
+    "co.ltd": "株式会社",
+    "kabushikikaisha": "株式会社",
+    "k.k.": "株式会社",
+    "corporation": "株式会社",
+    "corp.": "株式会社",
+    "inc.": "株式会社",
+    "ltd.": "株式会社",
+    "llc": "合同会社",
+}
+# 長い表記から先に照合する（「医療法人社団」を「医療法人」より先に）
+_LEGAL_FORM_TOKENS: Tuple[str, ...] = tuple(sorted(_LEGAL_FORMS, key=len, reverse=True))
+_SEPARATOR_PATTERN = re.compile(r"[\s・･.,'’\"「」『』【】\[\]()/_-]+")
+
+# 法人格が異なる場合の減点（同名の株式会社と有限会社は別法人の可能性が高い）
+LEGAL_FORM_MISMATCH_PENALTY = 0.7
+# 都道府県が一致する候補の加点（並び順のみに使い、confidence には含めない）
+PREFECTURE_BONUS = 0.1
+DEFAULT_MIN_CONFIDENCE = 0.85
+
+
+@dataclass(frozen=True)
+class NormalizedName:
+    core: str
+    legal_form: str = ""
+
+
+def _strip_legal_forms(value: str) -> Tuple[str, str]:
+    legal_form = ""
+    changed = True
+    while changed and value:
+        changed = False
+        for token in _LEGAL_FORM_TOKENS:
+            if value.startswith(token):
+                value, changed = value[len(token):].lstrip(","), True
+            elif value.endswith(token):
+                value, changed = value[: -len(token)].rstrip(","), True
+            if changed:
+                legal_form = legal_form or _LEGAL_FORMS[token]
+                break
+    return value, legal_form
+
+
+@lru_cache(maxsize=4096)
+def normalize_company_name(name: str) -> NormalizedName:
+    """法人格を除いた照合用の名称と法人格（正式名称）を返す"""
+    value = re.sub(r"\s+", "", unicodedata.normalize("NFKC", name or "").lower())
+    core, legal_form = _strip_legal_forms(value)
+    core = _SEPARATOR_PATTERN.sub("", core)
+    if not core:
+        # 法人格だけの名称は除去しない
+        core = _SEPARATOR_PATTERN.sub("", value)
+        legal_form = ""
+    return NormalizedName(core=core, legal_form=legal_form)
+
+
+def _ngrams(core: str) -> FrozenSet[str]:
+    if len(core) < 2:
+        return frozenset([core]) if core else frozenset()
+    return frozenset(core[i : i + 2] for i in range(len(core) - 1))
+
+
+class NameIndex:
+    """候補名の bigram 転置索引（候補ごとの正規化・n-gram は構築時に1回だけ計算する）"""
+
+    def __init__(self, names: Sequence[str]) -> None:
+        self.normalized: List[NormalizedName] = [normalize_company_name(name) for name in names]
+        self._grams: List[FrozenSet[str]] = [_ngrams(item.core) for item in self.normalized]
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for index, grams in enumerate(self._grams):
+            for gram in grams:
+                self._postings[gram].append(index)
+
+    def __len__(self) -> int:
+        return len(self.normalized)
+
+    def score_all(self, name: str) -> List[float]:
+        """name に対する全候補の confidence（候補の順）"""
+        target = normalize_company_name(name)
+        target_grams = _ngrams(target.core)
+        overlaps: Counter = Counter()
+        for gram in target_grams:
+            for index in self._postings.get(gram, ()):
+                overlaps[index] += 1
+
+        scores = [0.0] * len(self.normalized)
+        for index, candidate in enumerate(self.normalized):
+            if candidate.core == target.core and target.core:
+                score = 1.0
+            else:
+                total = len(target_grams) + len(self._grams[index])
+                score = 2.0 * overlaps.get(index, 0) / total if total else 0.0
+            if target.legal_form and candidate.legal_form and target.legal_form != candidate.legal_form:
+                score *= LEGAL_FORM_MISMATCH_PENALTY
+            scores[index] = round(score, 4)
+        return scores
+
+
+def rank_candidates(
+    candidates: Sequence[Mapping[str, Any]],
+    company_name: str,
+    prefecture: Optional[str] = None,
+) -> List[Tuple[Mapping[str, Any], float]]:
+    """
+    候補を (候補, confidence) の降順で返す
+
+    並び順は名称の confidence に都道府県一致の加点を足した値で決める（同点は元の順）。
+    """
+    index = NameIndex([item.get("name") or item.get("name_normalized") or "" for item in candidates])
+    scores = index.score_all(company_name)
+    prefecture = (prefecture or "").strip()
+
+    def _key(position: int) -> Tuple[float, int]:
+        item = candidates[position]
+        bonus = PREFECTURE_BONUS if prefecture and item.get("prefecture") == prefecture else 0.0
+        return (-(scores[position] + bonus), position)
+
+    return [(candidates[position], scores[position]) for position in sorted(range(len(candidates)), key=_key)]
@@ -0,0 +1,97 @@
+"""
+外部APIの呼び出し枠（プロセス間で共有するトークンバケット）
+
+APIRateLimitBucket の行ロックで更新するため、複数プロセス・複数ワーカーから同時に acquire() しても
+日次上限を超えない（上限は枠の確保時点で数える）。トークンが足りない場合は次に使える時刻までの待ち時間を返し、
+その時刻の枠を先に確保する（呼び出し側は待ってから API を呼ぶ）。
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from companies.models import APIRateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimitSlot:
+    allowed: bool
+    wait_seconds: float = 0.0
+    day_count: int = 0
+
+
+class TokenBucketLimiter:
+    """
+    Args:
+        key: 枠の識別子（API ごと）
+        rate_per_second: 1秒あたりの呼び出し数（0 以下で間隔の制限なし）
+        capacity: 連続して呼び出せる最大数（バースト）
+        daily_limit: 1日あたりの呼び出し上限（None で無制限）
+        seed_day_count: 行がない場合の当日の呼び出し数の初期値（旧カウンタからの移行用）
+    """
+
+    def __init__(
+        self,
+        key: str,
+        *,
+        rate_per_second: float,
+        capacity: int = 1,
+        daily_limit: Optional[int] = None,
+        seed_day_count: Optional[Callable[[date], int]] = None,
+    ) -> None:
+        self.key = key
+        self.rate_per_second = max(float(rate_per_second), 0.0)
+        self.capacity = max(int(capacity), 1)
+        self.daily_limit = daily_limit
+        self.seed_day_count = seed_day_count
+
+    def _locked_bucket(self, now: datetime) -> APIRateLimitBucket:
+        today = timezone.localdate(now)
+        bucket, _created = APIRateLimitBucket.objects.select_for_update().get_or_create(
+            key=self.key,
+            defaults={
+                "tokens": float(self.capacity),
+                "refilled_at": now,
+                "day": today,
+                "day_count": int(self.seed_day_count(today)) if self.seed_day_count else 0,
+            },
+        )
+        if bucket.day != today:
+            bucket.day = today
+            bucket.day_count = 0
+        return bucket
+
+    def acquire(self, now: Optional[datetime] = None) -> RateLimitSlot:
+        """1回分の枠を確保する。日次上限に達している場合は allowed=False"""
+        now = now or timezone.now()
+        with transaction.atomic():
+            bucket = self._locked_bucket(now)
+            if self.daily_limit is not None and bucket.day_count >= self.daily_limit:
+                bucket.save(update_fields=["day", "day_count", "updated_at"])
+                return RateLimitSlot(allowed=False, day_count=bucket.day_count)
+
+            wait_seconds = 0.0
+            if self.rate_per_second > 0:
+                elapsed = max((now - bucket.refilled_at).total_seconds(), 0.0)
+                tokens = min(float(self.capacity), bucket.tokens + elapsed * self.rate_per_second)
+                if tokens < 1.0:
+                    wait_seconds = (1.0 - tokens) / self.rate_per_second
+                bucket.tokens = tokens - 1.0
+                bucket.refilled_at = now
+            bucket.day_count += 1
+            bucket.save(update_fields=["tokens", "refilled_at", "day", "day_count", "updated_at"])
+        return RateLimitSlot(allowed=True, wait_seconds=wait_seconds, day_count=bucket.day_count)
+
+    def day_count(self, now: Optional[datetime] = None) -> int:
+        now = now or timezone.now()
+        bucket = APIRateLimitBucket.objects.filter(key=self.key).only("day", "day_count").first()
+        if bucket is None:
+            return int(self.seed_day_count(timezone.localdate(now))) if self.seed_day_count else 0
+        return bucket.day_count if bucket.day == timezone.localdate(now) else 0
@@ -1,25 +1,54 @@
 from __future__ import annotations
 
 import logging
+import math
+import time
+from collections import defaultdict
+from datetime import timedelta
 from typing import Dict, Iterable, List, Optional, Sequence
 
-from celery import shared_task, group
+from celery import group, shared_task
+from celery.exceptions import Retry
 from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
 
 from companies.facebook_client import (
+    BATCH_SIZE as FACEBOOK_BATCH_SIZE,
     FacebookAPIError,
+    FacebookCircuitOpenError,
     FacebookClient,
     FacebookClientConfigurationError,
+    FacebookRateLimitError,
+    facebook_breaker,
 )
 from companies.models import Company
-from companies.services.facebook_activity import process_company_metrics
+from companies.services.facebook_rollup import rollup_facebook_snapshots
+from companies.services.facebook_activity import (
+    process_companies_metrics,
+    process_company_metrics,
+    record_sync_failures,
+)
 from companies.management.commands.import_corporate_numbers import run_corporate_number_import
 from companies.services.opendata_sources import ingest_opendata_sources, load_opendata_configs
-from data_collection.tracker import track_data_collection_run
+from data_collection.models import DataCollectionRun
+from data_collection.tracker import merge_run_metadata, track_data_collection_run
 
 logger = logging.getLogger(__name__)
 
 CHUNK_SIZE = getattr(settings, "FACEBOOK_SYNC_CHUNK_SIZE", 500)
+FACEBOOK_SYNC_BUDGET = getattr(settings, "FACEBOOK_SYNC_BUDGET", 2000)
+FACEBOOK_SYNC_LEASE_MINUTES = getattr(settings, "FACEBOOK_SYNC_LEASE_MINUTES", 120)
+FACEBOOK_SNAPSHOT_ROLLUP_MAX_BATCHES = getattr(settings, "FACEBOOK_SNAPSHOT_ROLLUP_MAX_BATCHES", 200)
+FACEBOOK_CHUNKS_SECTION = "chunks"
+_FACEBOOK_CHUNK_COUNTERS = ("companies", "processed", "updated", "failed", "api_calls", "duration_seconds")
+_FACEBOOK_CHUNK_DONE = ("success", "failed")
+# 複数のオープンデータソースをソースごとのサブタスクに分けて並列に処理する
+OPENDATA_INGESTION_PARALLEL = getattr(settings, "OPENDATA_INGESTION_PARALLEL", True)
+OPENDATA_INGESTION_CONCURRENCY = getattr(settings, "OPENDATA_INGESTION_CONCURRENCY", 2)
+OPENDATA_SOURCES_SECTION = "sources"
+_OPENDATA_SOURCE_DONE = ("success", "failed")
+_OPENDATA_SOURCE_OPTION_KEYS = ("company_ids", "limit", "dry_run", "force")
 
 
 def _chunked(iterable: Sequence[int], size: int) -> Iterable[List[int]]:
@@ -68,14 +97,21 @@ def dispatch_facebook_sync(self, payload: Optional[dict] = None, execution_uuid:
             )
             return 0
 
-        company_ids = list(
-            Company.objects.exclude(facebook_page_id__isnull=True)
-            .exclude(facebook_page_id__exact="")
-            .values_list("id", flat=True)
+        # 次回同期時刻を過ぎた（未同期を含む）ページだけを、期限の古い順に予算の範囲で取得する
+        now = timezone.now()
+        budget = int(payload.get("budget") or FACEBOOK_SYNC_BUDGET)
+        targets = Company.objects.exclude(facebook_page_id__isnull=True).exclude(facebook_page_id__exact="")
+        if not payload.get("force"):
+            targets = targets.filter(Q(facebook_next_sync_at__isnull=True) | Q(facebook_next_sync_at__lte=now))
+        due_queryset = targets.order_by(F("facebook_next_sync_at").asc(nulls_first=True), "id").values_list(
+            "id", flat=True
         )
+        company_ids = list(due_queryset[:budget] if budget > 0 else due_queryset)
+        due_count = targets.count() if budget > 0 and len(company_ids) >= budget else len(company_ids)
+        metadata = {**metadata, "due_count": due_count, "budget": budget}
 
         if not company_ids:
-            logger.info("No companies configured with facebook_page_id. Skip sync.")
+            logger.info("No Facebook pages due for sync. Skip sync.")
             tracker.complete_success(
                 input_count=0,
                 inserted_count=0,
@@ -84,56 +120,233 @@ def dispatch_facebook_sync(self, payload: Optional[dict] = None, execution_uuid:
             )
             return 0
 
-        subtasks = [sync_facebook_chunk.s(chunk) for chunk in _chunked(company_ids, CHUNK_SIZE)]
-        group(subtasks).apply_async()
+        # Graph API の障害・制限でサーキットが開いている間は、閉じる見込みの時刻まで遅らせて実行する
+        countdown = math.ceil(facebook_breaker().retry_after())
+        # 処理が終わるまでの間に次の実行で同じページを配信しないよう、次回同期時刻を先送りしておく
+        lease_until = now + timedelta(minutes=FACEBOOK_SYNC_LEASE_MINUTES, seconds=countdown)
+        for chunk in _chunked(company_ids, CHUNK_SIZE):
+            Company.objects.filter(id__in=chunk).update(facebook_next_sync_at=lease_until)
+
+        # 完了の記録は最後に終わったチャンクに委ねる（チャンクごとの集計は metadata.chunks に記録される）
+        run_id = tracker.run.pk
+        chunks = list(_chunked(company_ids, CHUNK_SIZE))
+        tracker.update_progress(
+            input_count=len(company_ids),
+            skipped_count=due_count - len(company_ids),
+            metadata={
+                **metadata,
+                "deferred_seconds": countdown,
+                FACEBOOK_CHUNKS_SECTION: {str(index): {"status": "queued"} for index in range(len(chunks))},
+            },
+        )
+        subtasks = [sync_facebook_chunk.s(chunk, run_id, index) for index, chunk in enumerate(chunks)]
+        group(subtasks).apply_async(countdown=countdown or None)
+        tracker.hand_off()
         logger.info(
-            "Dispatched Facebook sync chunks: total_companies=%s chunks=%s",
+            "Dispatched Facebook sync chunks: run=%s total_companies=%s due=%s chunks=%s countdown=%s",
+            run_id,
             len(company_ids),
+            due_count,
             len(subtasks),
-        )
-        tracker.complete_success(
-            input_count=len(company_ids),
-            inserted_count=len(company_ids),
-            skipped_count=0,
-            metadata={**metadata, "chunks": len(subtasks)},
+            countdown,
         )
         return len(company_ids)
 
 
 @shared_task(bind=True, autoretry_for=(FacebookAPIError,), retry_backoff=True, retry_kwargs={"max_retries": 3})
-def sync_facebook_chunk(self, company_ids: Sequence[int]) -> int:
+def sync_facebook_chunk(
+    self,
+    company_ids: Sequence[int],
+    run_id: Optional[int] = None,
+    chunk_index: Optional[int] = None,
+    counts: Optional[dict] = None,
+) -> int:
+    """
+    企業のチャンクの Facebook 指標を同期する
+
+    run_id / chunk_index（dispatch_facebook_sync から渡される）がある場合は、チャンクの集計を親の
+    DataCollectionRun.metadata.chunks に記録し、最後に終わったチャンクが実行を完了させる
+    （result backend を使わないため chord が使えない環境でも集計できる）。counts はサーキットが
+    開いて残りを再実行する際に、それまでの集計を引き継ぐためのもの。
+    """
+    counts = {key: (counts or {}).get(key, 0) for key in _FACEBOOK_CHUNK_COUNTERS}
+    started = time.monotonic()
+    try:
+        _sync_facebook_companies(self, company_ids, counts, run_id=run_id, chunk_index=chunk_index, started=started)
+    except Retry:
+        raise
+    except Exception as exc:
+        # 自動再試行の上限に達した場合（再試行しない例外を含む）はチャンクを失敗として記録する
+        retryable = isinstance(exc, FacebookAPIError) and self.request.retries < (self.max_retries or 0)
+        if run_id is not None and not retryable:
+            counts["failed"] = max(int(counts["companies"]) - int(counts["processed"]), int(counts["failed"]))
+            _record_facebook_chunk(
+                run_id, chunk_index, {**counts, "status": "failed", "error": str(exc)[:512]}, started
+            )
+        raise
+    if run_id is not None:
+        _record_facebook_chunk(run_id, chunk_index, {**counts, "status": "success", "error": None}, started)
+    logger.info(
+        "Completed Facebook sync chunk: size=%s processed=%s failed=%s api_calls=%s",
+        len(company_ids),
+        counts["processed"],
+        counts["failed"],
+        counts["api_calls"],
+    )
+    return int(counts["processed"])
+
+
+def _sync_facebook_companies(
+    task,
+    company_ids: Sequence[int],
+    counts: Dict[str, float],
+    *,
+    run_id: Optional[int],
+    chunk_index: Optional[int],
+    started: float,
+) -> None:
     if not company_ids:
-        return 0
+        return
 
     try:
         client = FacebookClient()
     except FacebookClientConfigurationError as exc:
         logger.error("Facebook client misconfigured: %s", exc)
-        return 0
+        return
 
-    processed = 0
+    done_ids = set()
+    companies_by_page: Dict[str, List[Company]] = defaultdict(list)
     for company in Company.objects.filter(id__in=company_ids):
-        if not company.facebook_page_id:
-            continue
+        if company.facebook_page_id:
+            companies_by_page[company.facebook_page_id].append(company)
+        else:
+            done_ids.add(company.id)
+    # 再実行時は残りの企業だけが渡されるため、最初の実行で数えた件数を引き継ぐ
+    if not counts["companies"]:
+        counts["companies"] = sum(len(companies) for companies in companies_by_page.values())
 
+    # Graph API のバッチリクエストで BATCH_SIZE ページずつ取得する（1ページ1リクエストにしない）
+    page_ids = list(companies_by_page)
+    for start in range(0, len(page_ids), FACEBOOK_BATCH_SIZE):
+        batch_ids = page_ids[start : start + FACEBOOK_BATCH_SIZE]
         try:
-            metrics = client.fetch_page_metrics(company.facebook_page_id)
+            counts["api_calls"] += 1
+            results = client.fetch_pages_metrics(batch_ids)
+        except (FacebookCircuitOpenError, FacebookRateLimitError) as exc:
+            # サーキットが開いている・バッチが制限を受けた場合は、未処理の企業だけを再実行する（集計は引き継ぐ。
+            # 制限はページ単位の失敗として数えない）
+            if isinstance(exc, FacebookCircuitOpenError):
+                counts["api_calls"] -= 1
+            remaining = [company_id for company_id in company_ids if company_id not in done_ids]
+            logger.warning(
+                "Facebook %s. Retry %s companies in %.0fs (processed=%s)",
+                "circuit open" if isinstance(exc, FacebookCircuitOpenError) else "rate limited",
+                len(remaining),
+                exc.retry_after,
+                counts["processed"],
+            )
+            carried = {**counts, "duration_seconds": round(counts["duration_seconds"] + time.monotonic() - started, 3)}
+            raise task.retry(
+                args=(remaining,),
+                kwargs={"run_id": run_id, "chunk_index": chunk_index, "counts": carried},
+                exc=exc,
+                countdown=math.ceil(exc.retry_after),
+            )
         except FacebookAPIError as exc:
-            logger.warning("Facebook API error for company=%s: %s", company.id, exc)
+            logger.warning("Facebook API batch error for pages=%s: %s", len(batch_ids), exc)
             raise
-        except Exception as exc:  # pragma: no cover - unexpected errors
-            logger.exception("Unexpected error fetching Facebook metrics for company=%s: %s", company.id, exc)
-            continue
 
+        items = []
+        failed = []
+        for page_id in batch_ids:
+            metrics = results.get(page_id)
+            for company in companies_by_page[page_id]:
+                done_ids.add(company.id)
+                if not isinstance(metrics, dict):
+                    # ページ単位のエラー（削除済み・権限なしなど）はその企業だけスキップし、次回同期を遅らせる
+                    logger.warning("Facebook API error for company=%s: %s", company.id, metrics)
+                    failed.append(company)
+                    continue
+                items.append((company, metrics))
+        record_sync_failures(failed)
+        counts["failed"] += len(failed)
+
+        # スナップショットと企業の更新はバッチ単位でまとめて書き込む
         try:
-            updated = process_company_metrics(company, metrics, source="celery")
-            processed += 1
-            logger.debug("Updated company=%s updated=%s", company.id, updated)
+            updated = process_companies_metrics(items, source="celery")
+            counts["processed"] += len(items)
+            counts["updated"] += sum(updated.values())
         except Exception as exc:  # pragma: no cover
-            logger.exception("Failed to process Facebook metrics for company=%s: %s", company.id, exc)
+            logger.exception("Bulk Facebook metrics update failed, falling back per company: %s", exc)
+            for company, metrics in items:
+                try:
+                    counts["updated"] += int(process_company_metrics(company, metrics, source="celery"))
+                    counts["processed"] += 1
+                except Exception as exc:
+                    counts["failed"] += 1
+                    logger.exception("Failed to process Facebook metrics for company=%s: %s", company.id, exc)
+
+
+def _record_facebook_chunk(run_id: int, chunk_index: Optional[int], values: Dict[str, object], started: float) -> None:
+    """チャンクの集計を記録し、すべてのチャンクが終わっていれば実行を完了させる"""
+    values = {
+        **values,
+        "duration_seconds": round(float(values.get("duration_seconds") or 0) + time.monotonic() - started, 3),
+        "finished_at": timezone.now().isoformat(),
+    }
+    run = merge_run_metadata(
+        run_id,
+        FACEBOOK_CHUNKS_SECTION,
+        str(chunk_index),
+        values,
+        totals={"inserted_count": "processed", "error_count": "failed"},
+    )
+    # 行ロック内で更新した結果を見るため、最後のチャンクを記録したタスクだけがここを通る
+    chunks = (run.metadata or {}).get(FACEBOOK_CHUNKS_SECTION) or {}
+    if all(item.get("status") in _FACEBOOK_CHUNK_DONE for item in chunks.values()):
+        _complete_facebook_sync(run_id)
+
+
+def _complete_facebook_sync(run_id: int) -> None:
+    """チャンクごとの集計を合計して、dispatch_facebook_sync の実行を完了させる"""
+    with track_data_collection_run("clone.facebook_sync", run_id=run_id) as tracker:
+        if tracker.run.status != DataCollectionRun.Status.RUNNING:
+            # 同じチャンクが再配信されて二重に完了させようとした場合
+            tracker.hand_off()
+            return
+        metadata = dict(tracker.run.metadata or {})
+        chunks: Dict[str, dict] = metadata.get(FACEBOOK_CHUNKS_SECTION) or {}
+        totals = {key: sum(item.get(key) or 0 for item in chunks.values()) for key in _FACEBOOK_CHUNK_COUNTERS}
+        durations = [float(item.get("duration_seconds") or 0) for item in chunks.values()]
+        failed_chunks = {key: item.get("error") or "" for key, item in chunks.items() if item.get("status") != "success"}
+        result = {
+            **{key: int(value) for key, value in totals.items() if key != "duration_seconds"},
+            "chunks": len(chunks),
+            "failed_chunks": len(failed_chunks),
+            "chunk_duration_seconds": {
+                "total": round(sum(durations), 3),
+                "max": round(max(durations, default=0.0), 3),
+                "avg": round(sum(durations) / len(durations), 3) if durations else 0.0,
+            },
+        }
+        fields = {
+            "inserted_count": result["processed"],
+            "error_count": result["failed"],
+            "metadata": {**metadata, "result": result},
+        }
+        if failed_chunks:
+            fields["error_summary"] = "; ".join(f"chunk {key}: {error}" for key, error in failed_chunks.items())[:512]
+        logger.info("Facebook sync finished. run=%s result=%s", run_id, result)
+        if chunks and len(failed_chunks) == len(chunks):
+            tracker.complete_failure(fields.pop("error_summary"), **fields)
+        else:
+            tracker.complete_success(**fields)
 
-    logger.info("Completed Facebook sync chunk: size=%s processed=%s", len(company_ids), processed)
-    return processed
+
+@shared_task(ignore_result=True)
+def rollup_facebook_snapshots_task() -> dict:
+    """保持期間を過ぎた Facebook スナップショットを日次集計に集約して削除する"""
+    return rollup_facebook_snapshots(max_batches=FACEBOOK_SNAPSHOT_ROLLUP_MAX_BATCHES)
 
 
 @shared_task(bind=True, ignore_result=True)
@@ -173,6 +386,7 @@ def run_corporate_number_import_task(self, payload: Optional[dict] = None, execu
             "skipped_name": int(stats.get("skipped_name", 0)),
             "skipped_cooldown": int(stats.get("skipped_cooldown", 0)),
             "skipped_rate_limit": int(stats.get("skipped_rate_limit", 0)),
+            "skipped_circuit_open": int(stats.get("skipped_circuit_open", 0)),
         }
         skipped_count = sum(skip_breakdown.values())
         processed_ids = result.get("processed_company_ids") or []
@@ -233,30 +447,193 @@ def run_opendata_ingestion_task(self, payload: Optional[dict] = None, execution_
         execution_uuid=execution_uuid,
     ) as tracker:
         configs = load_opendata_configs()
+        target_keys = [key for key in (source_keys or list(configs)) if key in configs]
+        if bool(options.get("parallel", OPENDATA_INGESTION_PARALLEL)) and len(target_keys) > 1:
+            return _dispatch_opendata_sources(tracker, tracker_metadata, target_keys, options)
+
+        def _on_progress(progress: Dict[str, object]) -> None:
+            tracker.update_progress(
+                input_count=int(progress.get("rows", 0)),
+                metadata={**tracker_metadata, "progress": progress},
+            )
+
         result = ingest_opendata_sources(
             source_keys=source_keys,
             company_ids=company_ids,
             limit=options.get("limit"),
             dry_run=options.get("dry_run", False),
             config_map=configs,
+            progress_callback=_on_progress,
+            force=bool(options.get("force", False)),
         )
-        rows = int(result.get("rows", 0))
-        created = int(result.get("created", 0))
-        skipped = rows - created if rows > created else 0
-        processed_ids = result.get("processed_company_ids") or []
-        tracker.complete_success(
-            input_count=rows,
-            inserted_count=created,
-            skipped_count=skipped,
-            error_count=0,
-            skip_breakdown={"unmatched": skipped},
-            metadata=_metadata_with_processed({**tracker_metadata, "result": result}, processed_ids),
-        )
-        logger.info(
-            "Open data ingestion finished. sources=%s rows=%s matched=%s created=%s",
-            result.get("processed_sources"),
-            result.get("rows"),
-            result.get("matched"),
-            result.get("created"),
-        )
+        _complete_opendata_run(tracker, tracker_metadata, result)
         return result
+
+
+def _complete_opendata_run(tracker, tracker_metadata: Dict[str, object], result: Dict[str, object]) -> None:
+    rows = int(result.get("rows", 0))
+    created = int(result.get("created", 0))
+    skipped = rows - created if rows > created else 0
+    processed_ids = result.get("processed_company_ids") or []
+    tracker.complete_success(
+        input_count=rows,
+        inserted_count=created,
+        skipped_count=skipped,
+        error_count=len(result.get("failed_sources") or []),
+        skip_breakdown={"unmatched": skipped},
+        metadata=_metadata_with_processed({**tracker_metadata, "result": result}, processed_ids),
+    )
+    logger.info(
+        "Open data ingestion finished. sources=%s rows=%s matched=%s created=%s",
+        result.get("processed_sources"),
+        result.get("rows"),
+        result.get("matched"),
+        result.get("created"),
+    )
+
+
+def _dispatch_opendata_sources(
+    tracker,
+    tracker_metadata: Dict[str, object],
+    source_keys: Sequence[str],
+    options: Dict[str, object],
+) -> dict:
+    """
+    ソースごとのサブタスクを配信し、完了の記録は最後に結果を記録したサブタスクに委ねる
+
+    同時実行数は concurrency 本のレーン（レーン内のソースは前のソースが終わってから順に配信）で抑える。
+    limit はソースごとの上限として扱う。
+    """
+    concurrency = min(max(int(options.get("concurrency") or OPENDATA_INGESTION_CONCURRENCY), 1), len(source_keys))
+    lanes = [list(source_keys[index::concurrency]) for index in range(concurrency)]
+    source_options = {key: options[key] for key in _OPENDATA_SOURCE_OPTION_KEYS if key in options}
+    run_id = tracker.run.pk
+
+    tracker.update_progress(
+        data_source=list(source_keys),
+        metadata={
+            **tracker_metadata,
+            "parallel": True,
+            "concurrency": concurrency,
+            OPENDATA_SOURCES_SECTION: {key: {"status": "queued"} for key in source_keys},
+        },
+    )
+    subtasks = [ingest_opendata_source_task.s(run_id, lane[0], source_options, lane[1:]) for lane in lanes]
+    group(subtasks).apply_async()
+    tracker.hand_off()
+    logger.info(
+        "Dispatched open data ingestion per source. run=%s sources=%s concurrency=%s",
+        run_id,
+        len(source_keys),
+        concurrency,
+    )
+    return {
+        "dispatched": True,
+        "run_id": run_id,
+        "sources": list(source_keys),
+        "concurrency": concurrency,
+        "dry_run": bool(options.get("dry_run", False)),
+    }
+
+
+@shared_task(bind=True)
+def ingest_opendata_source_task(
+    self,
+    run_id: int,
+    source_key: str,
+    options: Optional[dict] = None,
+    remaining_keys: Optional[Sequence[str]] = None,
+) -> dict:
+    """
+    1ソース分の取込。結果と進捗は親の DataCollectionRun.metadata.sources[source_key] に記録する
+
+    remaining_keys は同じレーンで後に処理するソースで、このソースの成否にかかわらず次のソースを配信する。
+    すべてのソースの結果が揃っていれば、最後に記録したタスクが実行を完了させる。
+    """
+    options = options or {}
+
+    def _record(values: Dict[str, object]) -> DataCollectionRun:
+        return merge_run_metadata(run_id, OPENDATA_SOURCES_SECTION, source_key, values, totals={"input_count": "rows"})
+
+    def _on_progress(progress: Dict[str, object]) -> None:
+        _record({key: progress.get(key) for key in ("rows", "matched", "bytes_downloaded", "lookup_queries")})
+
+    try:
+        _record({"status": "running", "started_at": timezone.now().isoformat()})
+        result = ingest_opendata_sources(
+            source_keys=[source_key],
+            company_ids=options.get("company_ids"),
+            limit=options.get("limit"),
+            dry_run=options.get("dry_run", False),
+            config_map=load_opendata_configs(),
+            progress_callback=_on_progress,
+            force=bool(options.get("force", False)),
+        )
+    except Exception as exc:
+        # 他のソースの処理と集計は続ける
+        logger.exception("Open data ingestion failed. source=%s: %s", source_key, exc)
+        summary: Dict[str, object] = {"status": "failed", "error": str(exc)[:512]}
+    else:
+        failed = result.get("failed_sources") or []
+        processed_ids = _unique_int_list(result.get("processed_company_ids") or [])
+        summary = {
+            "status": "failed" if failed else "success",
+            "error": failed[0]["error"] if failed else None,
+            "rows": int(result.get("rows", 0)),
+            "matched": int(result.get("matched", 0)),
+            "created": int(result.get("created", 0)),
+            "unchanged_rows": int(result.get("unchanged_rows", 0)),
+            "skipped": (result.get("skipped_sources") or [{}])[0].get("reason"),
+            "processed_count": len(processed_ids),
+            "processed_company_ids": processed_ids[:100],
+        }
+    summary["finished_at"] = timezone.now().isoformat()
+    try:
+        run = _record(summary)
+    finally:
+        if remaining_keys:
+            ingest_opendata_source_task.apply_async(
+                args=(run_id, remaining_keys[0], options, list(remaining_keys[1:]))
+            )
+    # 行ロック内で更新した結果を見るため、最後のソースを記録したタスクだけがここを通る
+    sources = (run.metadata or {}).get(OPENDATA_SOURCES_SECTION) or {}
+    if all(item.get("status") in _OPENDATA_SOURCE_DONE for item in sources.values()):
+        _complete_opendata_ingestion(run_id)
+    return summary
+
+
+def _complete_opendata_ingestion(run_id: int) -> None:
+    """ソースごとの結果を集計して、親の DataCollectionRun を完了させる"""
+    with track_data_collection_run("clone.opendata", run_id=run_id) as tracker:
+        if tracker.run.status != DataCollectionRun.Status.RUNNING:
+            # 同じソースが再配信されて二重に完了させようとした場合
+            tracker.hand_off()
+            return
+        metadata = dict(tracker.run.metadata or {})
+        sources: Dict[str, dict] = metadata.get(OPENDATA_SOURCES_SECTION) or {}
+        failed_sources = [
+            {"source": key, "error": item.get("error") or ""}
+            for key, item in sources.items()
+            if item.get("status") != "success"
+        ]
+        processed_ids: List[int] = []
+        for item in sources.values():
+            processed_ids.extend(item.get("processed_company_ids") or [])
+        result = {
+            "processed_sources": len(sources),
+            "rows": sum(int(item.get("rows") or 0) for item in sources.values()),
+            "matched": sum(int(item.get("matched") or 0) for item in sources.values()),
+            "created": sum(int(item.get("created") or 0) for item in sources.values()),
+            "dry_run": bool((metadata.get("options") or {}).get("dry_run", False)),
+            "failed_sources": failed_sources,
+            "processed_company_ids": processed_ids,
+        }
+        if sources and len(failed_sources) == len(sources):
+            tracker.complete_failure(
+                "; ".join(f"{item['source']}: {item['error']}" for item in failed_sources),
+                input_count=result["rows"],
+                error_count=len(failed_sources),
+                metadata={**metadata, "result": result},
+            )
+        else:
+            _complete_opendata_run(tracker, metadata, result)
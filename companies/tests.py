@@ -1,29 +1,60 @@
+import importlib
+import io
+import json
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import timedelta
+from pathlib import Path
 from unittest import mock
 
+import requests
+from django.apps import apps as django_apps
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 from django.core.management import call_command, CommandError
 from django.urls import reverse
+from django.utils import timezone
 from django.test import override_settings, SimpleTestCase, TestCase
 from rest_framework.test import APITestCase
 from rest_framework import status
 from .models import (
     Company,
+    CompanyFacebookDailySummary,
+    CompanyFacebookSnapshot,
     Executive,
     CompanyReviewBatch,
     CompanyReviewItem,
     CompanyUpdateCandidate,
+    CorporateNumberRegistryEntry,
+    CorporateNumberSearchCache,
     ExternalSourceRecord,
+    OpenDataSourceState,
 )
 from .services.review_ingestion import create_candidate_entry, ingest_rule_based_candidates
 from .services.corporate_number_client import (
     CorporateNumberAPIClient,
     CorporateNumberAPIError,
+    CorporateNumberCircuitOpenError,
+    corporate_number_breaker,
     select_best_match,
 )
+from .services.corporate_number_registry import find_registry_candidates, load_registry_file
+from .services.address_parser import build_name_location_key, parse_address, parse_addresses, split_prefecture
+from .services.name_matching import LEGAL_FORM_MISMATCH_PENALTY, NameIndex, normalize_company_name
+from .services.rate_limiter import TokenBucketLimiter
 from .management.commands.import_corporate_numbers import run_corporate_number_import
 from .services.opendata_sources import OpenDataSourceConfig, ingest_opendata_sources
 from django.contrib.auth import get_user_model
+from .facebook_client import FacebookAPIError, FacebookClient, FacebookRateLimitError, facebook_breaker
+from .services.facebook_rollup import daily_facebook_trend, rollup_facebook_snapshots
+from .services.facebook_activity import process_companies_metrics, process_company_metrics, record_sync_failures
+from .tasks import dispatch_facebook_sync, sync_facebook_chunk
+from data_collection.models import DataCollectionRun
+from saleslist_backend.circuit_breaker import CircuitBreaker, CircuitOpenError
+from saleslist_backend.http_sessions import close_sessions, get_session
 
 
 class CompanyCSVImportTests(APITestCase):
@@ -794,7 +825,7 @@ def test_run_opendata_ingestion_dry_run_returns_200(self, mock_apply_async):
 
 
 class OpenDataSourceFilteringTests(TestCase):
-    @mock.patch("companies.services.opendata_sources.requests.get")
+    @mock.patch("requests.Session.get")
     def test_ingest_opendata_sources_respects_company_id_filter(self, mock_get):
         CompanyUpdateCandidate.objects.all().delete()
         allowed_company = Company.objects.create(name="対象企業", corporate_number="1234500000000")
@@ -807,7 +838,8 @@ class OpenDataSourceFilteringTests(TestCase):
         )
         mock_response = mock.Mock()
         mock_response.status_code = 200
-        mock_response.content = csv_content.encode("utf-8")
+        mock_response.iter_content.return_value = [csv_content.encode("utf-8")]
+        mock_response.headers = {}
         mock_response.raise_for_status = mock.Mock()
         mock_get.return_value = mock_response
 
@@ -848,6 +880,222 @@ class OpenDataSourceFilteringTests(TestCase):
         skipped_exists = CompanyUpdateCandidate.objects.filter(company=skipped_company).exists()
         self.assertFalse(skipped_exists)
 
+    @mock.patch("requests.Session.get")
+    def test_ingest_opendata_sources_streams_zip_members_and_reports_progress(self, mock_get):
+        CompanyUpdateCandidate.objects.all().delete()
+        first = Company.objects.create(name="分割一", corporate_number="1111100000000")
+        second = Company.objects.create(name="分割二", corporate_number="2222200000000")
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("part1.csv", "法人番号,所在地\n1111100000000,大阪府大阪市北区1-1\n3333300000000,京都府京都市1\n")
+            archive.writestr("readme.txt", "not a csv")
+            archive.writestr("part2.csv", "法人番号,所在地\n2222200000000,愛知県名古屋市中区2-2\n")
+        payload = buffer.getvalue()
+        mock_response = mock.Mock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [payload[:10], payload[10:]]
+        mock_response.headers = {}
+        mock_get.return_value = mock_response
+
+        config = {
+            "zip_source": OpenDataSourceConfig.from_dict(
+                "zip_source",
+                {
+                    "url": "https://example.com/data.zip",
+                    "format": "zip_csv",
+                    "source_detail": "local_gov_open_data_zip",
+                    "mappings": {"corporate_number": "法人番号", "address": "所在地"},
+                },
+            )
+        }
+        progress = []
+
+        result = ingest_opendata_sources(
+            source_keys=["zip_source"],
+            config_map=config,
+            progress_callback=progress.append,
+            progress_every=2,
+        )
+
+        self.assertTrue(mock_get.call_args.kwargs["stream"])
+        mock_response.close.assert_called_once()
+        self.assertEqual(result["rows"], 3)
+        self.assertEqual(result["matched"], 2)
+        self.assertEqual(sorted(result["processed_company_ids"]), sorted([first.id, second.id]))
+        self.assertEqual([item["rows"] for item in progress], [2, 3])
+        self.assertEqual(progress[-1]["sources_done"], 1)
+        self.assertEqual(progress[-1]["bytes_downloaded"], len(payload))
+        self.assertTrue(
+            CompanyUpdateCandidate.objects.filter(company=second, field="prefecture", candidate_value="愛知県").exists()
+        )
+
+    @mock.patch("companies.services.opendata_sources.MATCH_CHUNK_SIZE", 2)
+    @mock.patch("requests.Session.get")
+    def test_ingest_opendata_sources_matches_companies_in_chunks(self, mock_get):
+        first = Company.objects.create(name="一括一", corporate_number="5000000000001")
+        second = Company.objects.create(name="一括二", corporate_number="5000000000002")
+        by_name = Company.objects.create(name="名前だけの企業")
+        third = Company.objects.create(name="一括三", corporate_number="5000000000003")
+        csv_content = (
+            "法人番号,企業名,URL\n"
+            "5000000000001,一括一,one.example\n"
+            "5000000000002,一括二,two.example\n"
+            ",名前だけの企業,name.example\n"
+            "5999999999999,未登録,none.example\n"
+            "5000000000003,一括三,three.example\n"
+        )
+        mock_response = mock.Mock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [csv_content.encode("utf-8")]
+        mock_response.headers = {}
+        mock_get.return_value = mock_response
+        config = {
+            "test_source": OpenDataSourceConfig.from_dict(
+                "test_source",
+                {
+                    "url": "https://example.com/data.csv",
+                    "mappings": {"corporate_number": "法人番号", "name": "企業名", "website_url": "URL"},
+                },
+            )
+        }
+
+        result = ingest_opendata_sources(source_keys=["test_source"], config_map=config, dry_run=True)
+
+        self.assertEqual(result["processed_company_ids"], [first.id, second.id, by_name.id, third.id])
+        # 2行ごとに法人番号の IN 検索（3回）+ 法人番号のない行の企業名の IN 検索（1回）
+        self.assertEqual(result["lookup_queries"], 4)
+        self.assertEqual(result["queries_per_1000_rows"], 800.0)
+
+    @mock.patch("companies.services.opendata_sources.tempfile.TemporaryFile")
+    @mock.patch("requests.Session.get")
+    def test_ingest_opendata_sources_closes_download_when_limit_reached(self, mock_get, mock_tempfile):
+        handle = io.BytesIO()
+        mock_tempfile.return_value = handle
+        mock_response = mock.Mock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = ["法人番号\n1\n2\n3\n".encode("utf-8")]
+        mock_response.headers = {}
+        mock_get.return_value = mock_response
+        config = {
+            "test_source": OpenDataSourceConfig.from_dict(
+                "test_source",
+                {"url": "https://example.com/data.csv", "mappings": {"corporate_number": "法人番号"}},
+            )
+        }
+
+        result = ingest_opendata_sources(source_keys=["test_source"], config_map=config, limit=1, dry_run=True)
+
+        self.assertEqual(result["rows"], 1)
+        self.assertTrue(handle.closed)
+
+
+class OpenDataSourceStateTests(TestCase):
+    HEADER = "法人番号,所在地,URL\n"
+    ROW_A = "1000000000001,東京都港区1-1,a.example\n"
+    ROW_B = "1000000000002,東京都港区2-2,b.example\n"
+
+    def setUp(self):
+        self.company_a = Company.objects.create(name="状態A", corporate_number="1000000000001")
+        self.company_b = Company.objects.create(name="状態B", corporate_number="1000000000002")
+        self.config = {
+            "state_source": OpenDataSourceConfig.from_dict(
+                "state_source",
+                {
+                    "url": "https://example.com/state.csv",
+                    "source_detail": "local_gov_open_data_state",
+                    "mappings": {"corporate_number": "法人番号", "address": "所在地", "website_url": "URL"},
+                },
+            )
+        }
+
+    def _response(self, content="", status_code=200, etag=""):
+        response = mock.Mock()
+        response.status_code = status_code
+        response.iter_content.return_value = [content.encode("utf-8")]
+        response.headers = {"ETag": etag} if etag else {}
+        return response
+
+    def _ingest(self, **kwargs):
+        return ingest_opendata_sources(source_keys=["state_source"], config_map=self.config, **kwargs)
+
+    @mock.patch("requests.Session.get")
+    def test_skips_not_modified_and_unchanged_sources(self, mock_get):
+        content = self.HEADER + self.ROW_A
+        mock_get.return_value = self._response(content, etag='"v1"')
+        first = self._ingest()
+        self.assertEqual(first["matched"], 1)
+        self.assertEqual(mock_get.call_args.kwargs["headers"], {})
+
+        state = OpenDataSourceState.objects.get(source_key="state_source")
+        self.assertEqual(state.etag, '"v1"')
+        self.assertEqual(state.row_count, 1)
+        self.assertEqual(state.rows.count(), 1)
+
+        mock_get.return_value = self._response(status_code=304)
+        second = self._ingest()
+        self.assertEqual(mock_get.call_args.kwargs["headers"], {"If-None-Match": '"v1"'})
+        self.assertEqual(second["skipped_sources"], [{"source": "state_source", "reason": "not_modified"}])
+        self.assertEqual(second["rows"], 0)
+
+        # ETag を返さないサーバでも内容が同じなら処理しない
+        mock_get.return_value = self._response(content)
+        third = self._ingest()
+        self.assertEqual(third["skipped_sources"], [{"source": "state_source", "reason": "unchanged"}])
+        self.assertEqual(third["created"], 0)
+
+        forced = self._ingest(force=True, dry_run=True)
+        self.assertEqual(forced["skipped_sources"], [])
+        self.assertEqual(forced["matched"], 1)
+
+    @mock.patch("requests.Session.get")
+    def test_only_changed_rows_produce_candidates(self, mock_get):
+        mock_get.return_value = self._response(self.HEADER + self.ROW_A)
+        self._ingest()
+
+        mock_get.return_value = self._response(self.HEADER + self.ROW_A + self.ROW_B)
+        result = self._ingest()
+
+        self.assertEqual(result["rows"], 2)
+        self.assertEqual(result["unchanged_rows"], 1)
+        self.assertEqual(result["processed_company_ids"], [self.company_b.id])
+        state = OpenDataSourceState.objects.get(source_key="state_source")
+        self.assertEqual(state.rows.count(), 2)
+
+    @mock.patch("requests.Session.get")
+    def test_company_created_after_last_run_is_matched_against_unchanged_file(self, mock_get):
+        row_c = "1000000000003,東京都港区3-3,c.example\n"
+        content = self.HEADER + self.ROW_A + row_c
+        mock_get.return_value = self._response(content, etag='"v1"')
+        self.assertEqual(self._ingest()["matched"], 1)
+
+        company_c = Company.objects.create(name="状態C", corporate_number="1000000000003")
+        result = self._ingest()
+
+        # 前回以降に企業が増えたため条件付きリクエストにせず、未照合だった行だけを照合し直す
+        self.assertEqual(mock_get.call_args.kwargs["headers"], {})
+        self.assertEqual(result["skipped_sources"], [])
+        self.assertEqual(result["unchanged_rows"], 1)
+        self.assertEqual(result["processed_company_ids"], [company_c.id])
+        self.assertEqual(OpenDataSourceState.objects.get(source_key="state_source").rows.count(), 2)
+
+        # 対象を絞った実行はファイルが同じでもスキップしない
+        targeted = self._ingest(company_ids=[company_c.id], dry_run=True)
+        self.assertEqual(targeted["skipped_sources"], [])
+
+        mock_get.return_value = self._response(status_code=304)
+        self.assertEqual(self._ingest()["skipped_sources"], [{"source": "state_source", "reason": "not_modified"}])
+
+    @mock.patch("requests.Session.get")
+    def test_partial_runs_do_not_update_state(self, mock_get):
+        mock_get.return_value = self._response(self.HEADER + self.ROW_A + self.ROW_B)
+
+        self._ingest(limit=1)
+        self._ingest(dry_run=True)
+        self._ingest(company_ids=[self.company_a.id])
+
+        self.assertFalse(OpenDataSourceState.objects.filter(source_key="state_source").exists())
+
 
 @override_settings(
     CORPORATE_NUMBER_API_TOKEN="dummy-token",
@@ -855,7 +1103,7 @@ class OpenDataSourceFilteringTests(TestCase):
     CORPORATE_NUMBER_API_TIMEOUT=5,
     CORPORATE_NUMBER_API_MAX_RESULTS=3,
 )
-class CorporateNumberAPIClientTests(SimpleTestCase):
+class CorporateNumberAPIClientTests(TestCase):
     def test_search_parses_results(self):
         payload = {
             "status": "200",
@@ -868,7 +1116,7 @@ class CorporateNumberAPIClientTests(SimpleTestCase):
                 }
             ],
         }
-        with mock.patch("companies.services.corporate_number_client.requests.get") as mock_get:
+        with mock.patch("requests.Session.get") as mock_get:
             mock_response = mock.Mock()
             mock_response.status_code = 200
             mock_response.json.return_value = payload
@@ -888,7 +1136,7 @@ class CorporateNumberAPIClientTests(SimpleTestCase):
 
     def test_search_handles_error_status(self):
         payload = {"status": "500", "message": "error"}
-        with mock.patch("companies.services.corporate_number_client.requests.get") as mock_get:
+        with mock.patch("requests.Session.get") as mock_get:
             mock_response = mock.Mock()
             mock_response.status_code = 200
             mock_response.json.return_value = payload
@@ -906,6 +1154,76 @@ class CorporateNumberAPIClientTests(SimpleTestCase):
                 client.search("テスト株式会社")
 
 
+@override_settings(
+    CORPORATE_NUMBER_API_TOKEN="dummy-token",
+    CORPORATE_NUMBER_API_BASE_URL="https://api.info.gbiz.go.jp",
+    CORPORATE_NUMBER_API_CACHE_TTL_DAYS=30,
+    CORPORATE_NUMBER_API_NEGATIVE_CACHE_TTL_DAYS=3,
+)
+class CorporateNumberSearchCacheTests(TestCase):
+    def _response(self, status_code=200, payload=None):
+        response = mock.Mock()
+        response.status_code = status_code
+        response.url = "https://api.info.gbiz.go.jp/hojin/v1/hojin"
+        response.text = ""
+        response.json.return_value = payload or {}
+        return response
+
+    def test_positive_result_is_served_from_cache(self):
+        payload = {
+            "hojin-infos": [
+                {"corporate_number": "1234567890123", "name": "テスト株式会社", "location": "東京都千代田区1-1"}
+            ]
+        }
+        with mock.patch("requests.Session.get") as mock_get:
+            mock_get.return_value = self._response(payload=payload)
+            client = CorporateNumberAPIClient()
+            first = client.search("テスト 株式会社", prefecture="東京都")
+            self.assertFalse(client.last_search_cached)
+            second = client.search("テスト株式会社", prefecture="東京都")
+            self.assertTrue(client.last_search_cached)
+
+        mock_get.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertEqual(second[0]["prefecture"], "東京都")
+        entry = CorporateNumberSearchCache.objects.get()
+        self.assertFalse(entry.is_negative)
+        self.assertEqual(entry.prefecture_code, "13")
+        self.assertEqual(entry.hit_count, 1)
+
+    def test_not_found_is_negative_cached_with_shorter_ttl(self):
+        with mock.patch("requests.Session.get") as mock_get:
+            mock_get.return_value = self._response(status_code=404)
+            client = CorporateNumberAPIClient()
+            self.assertEqual(client.search("存在しない株式会社", prefecture="大阪府"), [])
+            self.assertEqual(client.search("存在しない株式会社", prefecture="大阪府"), [])
+
+        mock_get.assert_called_once()
+        entry = CorporateNumberSearchCache.objects.get()
+        self.assertTrue(entry.is_negative)
+        self.assertLess(entry.expires_at, timezone.now() + timedelta(days=4))
+
+    def test_expired_entry_and_refresh_hit_the_api(self):
+        with mock.patch("requests.Session.get") as mock_get:
+            mock_get.return_value = self._response(status_code=404)
+            client = CorporateNumberAPIClient()
+            client.search("期限切れ株式会社")
+            CorporateNumberSearchCache.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+            client.search("期限切れ株式会社")
+            client.search("期限切れ株式会社", refresh=True)
+
+        self.assertEqual(mock_get.call_count, 3)
+
+    def test_errors_are_not_cached(self):
+        with mock.patch("requests.Session.get") as mock_get:
+            mock_get.return_value = self._response(status_code=500)
+            client = CorporateNumberAPIClient()
+            with self.assertRaises(CorporateNumberAPIError):
+                client.search("エラー株式会社")
+
+        self.assertFalse(CorporateNumberSearchCache.objects.exists())
+
+
 class SelectBestMatchTests(SimpleTestCase):
     def test_selects_exact_match(self):
         candidates = [
@@ -915,6 +1233,62 @@ class SelectBestMatchTests(SimpleTestCase):
         best = select_best_match(candidates, "テスト株式会社", prefecture="東京都")
         self.assertEqual(best["corporate_number"], "2")
 
+    def test_legal_form_variants_and_full_width_match_with_full_confidence(self):
+        candidates = [
+            {"name": "テストシステム株式会社", "prefecture": "東京都", "corporate_number": "1"},
+            {"name": "テスト有限会社", "prefecture": "東京都", "corporate_number": "2"},
+            {"name": "株式会社テスト", "prefecture": "東京都", "corporate_number": "3"},
+        ]
+
+        best = select_best_match(candidates, "㈱テスト", prefecture="東京都")
+
+        self.assertEqual(best["corporate_number"], "3")
+        self.assertEqual(best["match_confidence"], 1.0)
+        self.assertEqual(select_best_match(candidates, "ＴＥＳＴ Co., Ltd.")["match_confidence"], 0.0)
+
+    def test_scores_all_candidates_with_index(self):
+        index = NameIndex(["テスト株式会社", "テストシステム株式会社", "(有)テスト", "サンプル"])
+
+        scores = index.score_all("（株）テスト")
+
+        self.assertEqual(scores[0], 1.0)
+        self.assertLess(scores[1], 1.0)
+        self.assertGreater(scores[1], 0.0)
+        self.assertEqual(scores[2], LEGAL_FORM_MISMATCH_PENALTY)
+        self.assertEqual(scores[3], 0.0)
+        self.assertEqual(normalize_company_name("医療法人社団　健康会").core, "健康会")
+
+
+
+class AddressParserTests(SimpleTestCase):
+    def test_parses_prefecture_municipality_and_remainder(self):
+        cases = {
+            "東京都千代田区丸の内1-1-1": ("東京都", "千代田区", "丸の内1-1-1"),
+            "北海道札幌市中央区北1条西2丁目": ("北海道", "札幌市中央区", "北1条西2丁目"),
+            "三重県四日市市諏訪町1-5": ("三重県", "四日市市", "諏訪町1-5"),
+            "山形県北村山郡大石田町緑町1": ("山形県", "北村山郡大石田町", "緑町1"),
+            "奈良県大和郡山市北郡山町248-4": ("奈良県", "大和郡山市", "北郡山町248-4"),
+            "千葉県市川市八幡1-1-1": ("千葉県", "市川市", "八幡1-1-1"),
+            "名古屋市中村区名駅1": ("愛知県", "名古屋市中村区", "名駅1"),
+            # 名称に「市・村」を含む郡
+            "奈良県高市郡明日香村岡55": ("奈良県", "高市郡明日香村", "岡55"),
+            "北海道余市郡余市町黒川町1": ("北海道", "余市郡余市町", "黒川町1"),
+            "福島県田村郡三春町大町1": ("福島県", "田村郡三春町", "大町1"),
+        }
+        for address, expected in cases.items():
+            parsed = parse_address(address)
+            self.assertEqual((parsed.prefecture, parsed.municipality, parsed.remainder), expected, address)
+
+        self.assertEqual(parse_address("京都府京都市中京区").prefecture_code, "26")
+        self.assertEqual(parse_address("東京都 港区芝公園4-2-8").city, "港区芝公園4-2-8")
+
+    def test_batch_and_split_helpers(self):
+        parsed = parse_addresses(["大阪府大阪市北区梅田1", "", None, "大阪府大阪市北区梅田1"])
+
+        self.assertEqual([item.prefecture for item in parsed], ["大阪府", "", "", "大阪府"])
+        self.assertEqual(split_prefecture("沖縄県那覇市泉崎1-2-2"), ("沖縄県", "那覇市泉崎1-2-2"))
+        self.assertEqual(split_prefecture("那覇市泉崎1-2-2"), ("", "那覇市泉崎1-2-2"))
+        self.assertEqual(build_name_location_key("㈱テスト", "東京"), ("テスト", "13"))
 
 @override_settings(CORPORATE_NUMBER_API_TOKEN="dummy-token")
 class ImportCorporateNumbersCommandTests(TestCase):
@@ -957,11 +1331,599 @@ class ImportCorporateNumbersCommandTests(TestCase):
         call_command("import_corporate_numbers", "--dry-run")
         mock_ingest.assert_not_called()
 
+    @mock.patch("companies.management.commands.import_corporate_numbers.ingest_corporate_number_candidates")
+    @mock.patch("companies.management.commands.import_corporate_numbers.CorporateNumberAPIClient")
+    def test_legal_form_variant_is_matched_and_unrelated_name_skipped(self, mock_client_cls, mock_ingest):
+        other = Company.objects.create(name="無関係商事", prefecture="東京都")
+        mock_client_cls.return_value.search.side_effect = lambda name, **kwargs: [
+            {"corporate_number": "1234567890123", "name": "(株)テスト", "prefecture": "東京都"}
+        ]
+
+        result = run_corporate_number_import(company_ids=[self.company.id, other.id])
+
+        self.assertEqual(result["stats"]["matched"], 1)
+        self.assertEqual(result["stats"]["skipped_name"], 1)
+        entries = mock_ingest.call_args[0][0]
+        self.assertEqual(entries[0]["company_id"], self.company.id)
+        self.assertEqual(entries[0]["confidence"], 100)
+
+    @override_settings(CORPORATE_NUMBER_MATCH_MIN_CONFIDENCE=1.01)
+    @mock.patch("companies.management.commands.import_corporate_numbers.ingest_corporate_number_candidates")
+    @mock.patch("companies.management.commands.import_corporate_numbers.CorporateNumberAPIClient")
+    def test_min_confidence_is_read_per_run(self, mock_client_cls, mock_ingest):
+        mock_client_cls.return_value.search.return_value = [
+            {"corporate_number": "1234567890123", "name": "テスト株式会社", "prefecture": "東京都"}
+        ]
+
+        result = run_corporate_number_import(company_ids=[self.company.id])
+        self.assertEqual(result["stats"]["skipped_name"], 1)
+
+        result = run_corporate_number_import(company_ids=[self.company.id], min_confidence=0.5, force_refresh=True)
+        self.assertEqual(result["stats"]["matched"], 1)
+
     @override_settings(CORPORATE_NUMBER_API_TOKEN="")
     def test_missing_token_raises(self):
         with self.assertRaises(CommandError):
             call_command("import_corporate_numbers", "--company-id", str(self.company.id))
 
+    @mock.patch("companies.management.commands.import_corporate_numbers.time.sleep")
+    @mock.patch("companies.management.commands.import_corporate_numbers.CorporateNumberAPIClient")
+    def test_workers_fetch_in_parallel_and_cache_results_on_main_thread(self, mock_client_cls, mock_sleep):
+        other = Company.objects.create(name="サンプル株式会社", prefecture="大阪府")
+        mock_client = mock_client_cls.return_value
+        mock_client.fetch.side_effect = lambda name, prefecture=None: [
+            {"corporate_number": "1234567890123", "name": name, "name_normalized": name, "prefecture": prefecture}
+        ]
+
+        result = run_corporate_number_import(company_ids=[self.company.id, other.id], dry_run=True, workers=2)
+
+        self.assertEqual(result["workers"], 2)
+        self.assertEqual(result["stats"]["matched"], 2)
+        self.assertEqual(mock_client.fetch.call_count, 2)
+        mock_client.search.assert_not_called()
+        # 2回目の呼び出しは間隔（既定2秒）の分だけ待ってから行う
+        self.assertTrue(any(call.args[0] > 0 for call in mock_sleep.call_args_list))
+        self.assertEqual(CorporateNumberSearchCache.objects.count(), 2)
+
+    @mock.patch("companies.management.commands.import_corporate_numbers.DEFAULT_DAILY_LIMIT", 1)
+    @mock.patch("companies.management.commands.import_corporate_numbers.time.sleep")
+    @mock.patch("companies.management.commands.import_corporate_numbers.CorporateNumberAPIClient")
+    def test_daily_limit_is_shared_across_runs(self, mock_client_cls, _sleep):
+        mock_client_cls.return_value.search.return_value = []
+
+        first = run_corporate_number_import(company_ids=[self.company.id], dry_run=True)
+        second = run_corporate_number_import(company_ids=[self.company.id], dry_run=True)
+
+        self.assertEqual(first["stats"]["not_found"], 1)
+        self.assertTrue(second["daily_rate_limit_reached"])
+        self.assertEqual(second["stats"]["skipped_rate_limit"], 1)
+        self.assertEqual(mock_client_cls.return_value.search.call_count, 1)
+
+
+def _registry_row(corporate_number, name, prefecture, city, *, process="01", latest="1", close_date=""):
+    """法人番号公表サイト形式（30列・ヘッダなし）の1行"""
+    row = [""] * 30
+    row[0] = "1"
+    row[1] = corporate_number
+    row[2] = process
+    row[4] = "2024-04-01"
+    row[6] = name
+    row[8] = "301"
+    row[9] = prefecture
+    row[10] = city
+    row[11] = "1-2-3"
+    row[18] = close_date
+    row[23] = latest
+    return ",".join(row)
+
+
+class CorporateNumberRegistryTests(TestCase):
+    def _write_zip(self, rows):
+        directory = Path(tempfile.mkdtemp())
+        path = directory / "00_zenkoku_all.zip"
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("00_zenkoku_all.csv", "\n".join(rows) + "\n")
+        return path
+
+    def test_load_registry_file_upserts_and_applies_deletions(self):
+        path = self._write_zip(
+            [
+                _registry_row("1000000000001", "テスト株式会社", "東京都", "千代田区"),
+                _registry_row("1000000000001", "テスト株式会社", "東京都", "港区"),
+                _registry_row("1000000000002", "旧名株式会社", "東京都", "港区", latest="0"),
+                _registry_row("1000000000003", "削除株式会社", "大阪府", "北区"),
+                _registry_row("1000000000003", "削除株式会社", "大阪府", "北区", process="99"),
+            ]
+        )
+
+        stats = load_registry_file(path, batch_size=2)
+
+        self.assertEqual(stats["rows"], 5)
+        self.assertEqual(stats["skipped_history"], 1)
+        entry = CorporateNumberRegistryEntry.objects.get()
+        self.assertEqual(entry.city_name, "港区")
+        self.assertEqual(entry.prefecture_code, "13")
+
+    def test_find_registry_candidates_requires_unique_match_in_prefecture(self):
+        path = self._write_zip(
+            [
+                _registry_row("1000000000001", "テスト株式会社", "東京都", "千代田区"),
+                _registry_row("1000000000002", "テスト株式会社", "大阪府", "北区"),
+                _registry_row("1000000000003", "閉鎖株式会社", "東京都", "港区", close_date="2020-01-01"),
+            ]
+        )
+        load_registry_file(path)
+        tokyo = Company.objects.create(name="テスト 株式会社", prefecture="東京都")
+        unknown = Company.objects.create(name="テスト株式会社", prefecture="")
+        closed = Company.objects.create(name="閉鎖株式会社", prefecture="東京都")
+
+        matches = find_registry_candidates([tokyo, unknown, closed])
+
+        self.assertEqual([c["corporate_number"] for c in matches[tokyo.id]], ["1000000000001"])
+        self.assertNotIn(unknown.id, matches)
+        self.assertNotIn(closed.id, matches)
+
+    def test_name_core_backfill_makes_previously_loaded_rows_matchable(self):
+        load_registry_file(self._write_zip([_registry_row("1000000000001", "テスト株式会社", "東京都", "千代田区")]))
+        # name_core 追加前（0014 より前）に取り込んだ行
+        CorporateNumberRegistryEntry.objects.update(name_core="")
+        company = Company.objects.create(name="(株)テスト", prefecture="東京都")
+        self.assertNotIn(company.id, find_registry_candidates([company]))
+
+        migration = importlib.import_module("companies.migrations.0018_corporate_number_registry_name_core_backfill")
+        migration.backfill_name_core(django_apps, None)
+
+        matches = find_registry_candidates([company])
+        self.assertEqual([c["corporate_number"] for c in matches[company.id]], ["1000000000001"])
+
+    @override_settings(CORPORATE_NUMBER_API_TOKEN="dummy-token")
+    @mock.patch("companies.management.commands.import_corporate_numbers.time.sleep")
+    @mock.patch("companies.management.commands.import_corporate_numbers.CorporateNumberAPIClient")
+    def test_import_uses_registry_before_api(self, mock_client_cls, _sleep):
+        load_registry_file(self._write_zip([_registry_row("1000000000001", "テスト株式会社", "東京都", "千代田区")]))
+        matched = Company.objects.create(name="テスト株式会社", prefecture="東京都")
+        other = Company.objects.create(name="サンプル株式会社", prefecture="東京都")
+        mock_client_cls.return_value.search.return_value = []
+
+        result = run_corporate_number_import(company_ids=[matched.id, other.id], source="auto")
+
+        self.assertEqual(result["stats"]["registry_hits"], 1)
+        self.assertEqual(result["stats"]["not_found"], 1)
+        mock_client_cls.return_value.search.assert_called_once_with("サンプル株式会社", prefecture="東京都", refresh=True)
+        candidate = CompanyUpdateCandidate.objects.get(company=matched, field="corporate_number")
+        self.assertEqual(candidate.candidate_value, "1000000000001")
+        self.assertTrue(
+            CompanyUpdateCandidate.objects.filter(company=matched, field="city", source_detail="nta-bulk").exists()
+        )
+
+    @override_settings(CORPORATE_NUMBER_API_TOKEN="")
+    @mock.patch("companies.management.commands.import_corporate_numbers.CorporateNumberAPIClient")
+    def test_registry_source_does_not_require_api_token(self, mock_client_cls):
+        company = Company.objects.create(name="未登録株式会社", prefecture="東京都")
+
+        result = run_corporate_number_import(company_ids=[company.id], source="registry", dry_run=True)
+
+        self.assertEqual(result["stats"]["not_found"], 1)
+        mock_client_cls.return_value.search.assert_not_called()
+
+
+class TokenBucketLimiterTests(TestCase):
+    def test_waits_for_next_token_and_reserves_future_slots(self):
+        limiter = TokenBucketLimiter("test-api", rate_per_second=0.5, capacity=1)
+        now = timezone.now()
+
+        self.assertEqual(limiter.acquire(now).wait_seconds, 0.0)
+        self.assertAlmostEqual(limiter.acquire(now).wait_seconds, 2.0)
+        # 先に確保された枠の後ろに並ぶ
+        self.assertAlmostEqual(limiter.acquire(now).wait_seconds, 4.0)
+        self.assertAlmostEqual(limiter.acquire(now + timedelta(seconds=10)).wait_seconds, 0.0)
+
+    def test_daily_limit_is_exact_and_resets_next_day(self):
+        limiter = TokenBucketLimiter("test-api", rate_per_second=0, daily_limit=2, seed_day_count=lambda day: 1)
+        now = timezone.now()
+
+        self.assertTrue(limiter.acquire(now).allowed)
+        self.assertFalse(limiter.acquire(now).allowed)
+        self.assertEqual(limiter.day_count(now), 2)
+
+        tomorrow = now + timedelta(days=1)
+        slot = limiter.acquire(tomorrow)
+        self.assertTrue(slot.allowed)
+        self.assertEqual(slot.day_count, 1)
+
+
+class _FakeProviderServer:
+    """テスト用のローカル HTTP サーバ（responses を順に返し、最後の応答を繰り返す）"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.hits = 0
+        self.connections = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server.hits += 1
+                server.connections.add(self.client_address)
+                status_code, headers, body = server.responses.pop(0) if len(server.responses) > 1 else server.responses[0]
+                self.send_response(status_code)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class HTTPSessionRegistryTests(TestCase):
+    def setUp(self) -> None:
+        close_sessions()
+        self.addCleanup(close_sessions)
+
+    def test_session_is_shared_per_provider(self):
+        session = get_session("corporate-number")
+        self.assertIs(get_session("corporate-number"), session)
+        self.assertIsNot(get_session("facebook"), session)
+        self.assertIs(CorporateNumberAPIClient(token="dummy-token").session, session)
+
+    def test_session_is_rebuilt_after_fork(self):
+        session = get_session("facebook")
+        with mock.patch("saleslist_backend.http_sessions.os.getpid", return_value=-1):
+            self.assertIsNot(get_session("facebook"), session)
+
+    def test_client_reuses_connection_across_calls(self):
+        cache.clear()
+        body = b'{"hojin-infos": []}'
+        with _FakeProviderServer([(200, {"Content-Type": "application/json"}, body)]) as server:
+            client = CorporateNumberAPIClient(token="dummy-token", base_url=server.url)
+            for name in ("株式会社A", "株式会社B", "株式会社C"):
+                client.fetch(name)
+
+        self.assertEqual(server.hits, 3)
+        self.assertEqual(len(server.connections), 1)
+
+
+@override_settings(FACEBOOK_ACCESS_TOKEN="dummy-token")
+class FacebookBatchTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    @staticmethod
+    def _item(code, body):
+        return {"code": code, "body": json.dumps(body)}
+
+    @mock.patch("companies.facebook_client.BATCH_SIZE", 2)
+    @mock.patch("requests.Session.post")
+    def test_fetch_pages_metrics_batches_and_reports_item_errors(self, mock_post):
+        first = mock.Mock(status_code=200, headers={})
+        first.json.return_value = [
+            self._item(200, {"fan_count": 10, "posts": {"data": [{"created_time": "2024-01-01T00:00:00+0000"}]}}),
+            self._item(404, {"error": {"message": "Unsupported get request"}}),
+        ]
+        second = mock.Mock(status_code=200, headers={})
+        second.json.return_value = [self._item(200, {"fan_count": 3})]
+        mock_post.side_effect = [first, second]
+
+        results = FacebookClient().fetch_pages_metrics(["p1", "p2", "p3", "p1"])
+
+        self.assertEqual(mock_post.call_count, 2)
+        batch = json.loads(mock_post.call_args_list[0].kwargs["data"]["batch"])
+        self.assertEqual([item["relative_url"].split("?")[0] for item in batch], ["p1", "p2"])
+        self.assertEqual(results["p1"]["friend_count"], 10)
+        self.assertEqual(results["p1"]["latest_posted_at"], "2024-01-01T00:00:00+0000")
+        self.assertIsInstance(results["p2"], FacebookAPIError)
+        self.assertEqual(results["p3"]["friend_count"], 3)
+
+    @mock.patch("requests.Session.post")
+    def test_throttled_or_timed_out_items_fail_the_batch_and_open_the_circuit(self, mock_post):
+        throttled = mock.Mock(status_code=200, headers={})
+        throttled.json.return_value = [
+            self._item(200, {"fan_count": 1}),
+            self._item(403, {"error": {"message": "Application request limit reached", "code": 4}}),
+        ]
+        timed_out = mock.Mock(status_code=200, headers={})
+        timed_out.json.return_value = [self._item(200, {"fan_count": 1}), None]
+        client = FacebookClient()
+        breaker = facebook_breaker()
+
+        for _ in range(breaker.failure_threshold - 1):
+            mock_post.return_value = throttled
+            with self.assertRaises(FacebookRateLimitError):
+                client.fetch_pages_metrics(["p1", "p2"])
+        self.assertFalse(breaker.is_open())
+
+        mock_post.return_value = timed_out
+        with self.assertRaises(FacebookRateLimitError) as raised:
+            client.fetch_pages_metrics(["p1", "p2"])
+        self.assertTrue(breaker.is_open())
+        self.assertGreater(raised.exception.retry_after, 0)
+
+    @mock.patch("requests.Session.post")
+    def test_malformed_batch_response_keeps_half_open_circuit_open(self, mock_post):
+        malformed = mock.Mock(status_code=200, headers={})
+        malformed.json.return_value = {"unexpected": True}
+        mock_post.return_value = malformed
+        breaker = facebook_breaker()
+        breaker.record_failure(retry_after=30)
+
+        later = time.time() + 31
+        with mock.patch("saleslist_backend.circuit_breaker.time.time", return_value=later):
+            with self.assertRaises(FacebookAPIError):
+                FacebookClient().fetch_pages_metrics(["p1", "p2"])
+            self.assertTrue(breaker.is_open())
+
+    @mock.patch("companies.facebook_client.FacebookClient.fetch_pages_metrics")
+    def test_sync_chunk_leaves_pages_due_when_batch_is_throttled(self, mock_fetch):
+        company = Company.objects.create(name="FB制限", facebook_page_id="throttled-page")
+        mock_fetch.side_effect = FacebookRateLimitError("throttled", 30)
+
+        with self.assertRaises(FacebookRateLimitError):
+            sync_facebook_chunk.run([company.id])
+
+        company.refresh_from_db()
+        self.assertEqual(company.facebook_sync_failures, 0)
+        self.assertFalse(CompanyFacebookSnapshot.objects.filter(company=company).exists())
+
+    @mock.patch("companies.facebook_client.FacebookClient.fetch_pages_metrics")
+    def test_sync_chunk_fetches_pages_in_batches_and_skips_failed_pages(self, mock_fetch):
+        ok = Company.objects.create(name="FB成功", facebook_page_id="ok-page")
+        shared = Company.objects.create(name="FB共有", facebook_page_id="ok-page")
+        failed = Company.objects.create(name="FB失敗", facebook_page_id="gone-page")
+        no_page = Company.objects.create(name="FBなし")
+        mock_fetch.return_value = {"ok-page": {"friend_count": 1}, "gone-page": FacebookAPIError("gone")}
+
+        processed = sync_facebook_chunk.run([ok.id, shared.id, failed.id, no_page.id])
+
+        self.assertEqual(processed, 2)
+        mock_fetch.assert_called_once()
+        self.assertCountEqual(mock_fetch.call_args.args[0], ["ok-page", "gone-page"])
+        self.assertCountEqual(
+            CompanyFacebookSnapshot.objects.values_list("company_id", flat=True), [ok.id, shared.id]
+        )
+
+
+class FacebookMetricsBulkTests(TestCase):
+    def _companies(self, prefix):
+        companies = [Company.objects.create(name=f"{prefix}{index}") for index in range(4)]
+        earlier = timezone.now() - timedelta(days=3)
+        # 増加・減少・投稿あり（前回なし）・前回なしの企業
+        for company, count in zip(companies[:2], (10, 20)):
+            CompanyFacebookSnapshot.objects.create(company=company, friend_count=count, latest_posted_at=earlier)
+        metrics = [
+            {"friend_count": 12, "latest_posted_at": earlier.isoformat()},
+            {"friend_count": 15, "latest_posted_at": None},
+            {"friend_count": None, "latest_posted_at": timezone.now().isoformat()},
+            {"friend_count": 5},
+        ]
+        return companies, metrics
+
+    @staticmethod
+    def _state(companies):
+        rows = []
+        for company in companies:
+            company.refresh_from_db()
+            latest = company.facebook_snapshots.order_by("-created_at", "-id").first()
+            rows.append(
+                (
+                    company.facebook_friend_count,
+                    company.facebook_latest_post_at is not None,
+                    company.latest_activity_at is not None,
+                    latest.friend_count,
+                    company.facebook_snapshots.count(),
+                )
+            )
+        return rows
+
+    def test_bulk_matches_per_company_processing(self):
+        single, single_metrics = self._companies("単体")
+        single_updated = [
+            process_company_metrics(company, metrics) for company, metrics in zip(single, single_metrics)
+        ]
+        bulk, bulk_metrics = self._companies("一括")
+        bulk_updated = process_companies_metrics(list(zip(bulk, bulk_metrics)))
+
+        self.assertEqual(single_updated, [bulk_updated[company.id] for company in bulk])
+        self.assertEqual(single_updated, [True, False, True, True])
+        self.assertEqual(self._state(single), self._state(bulk))
+
+    def test_bulk_uses_constant_number_of_queries(self):
+        companies = [Company.objects.create(name=f"件数{index}") for index in range(20)]
+        items = [(company, {"friend_count": 3}) for company in companies]
+        # savepoint・ロック・直近スナップショット・企業の更新・スナップショット作成・release
+        with self.assertNumQueries(6):
+            process_companies_metrics(items)
+        self.assertEqual(CompanyFacebookSnapshot.objects.count(), len(items))
+        self.assertEqual(Company.objects.filter(facebook_friend_count=3, latest_activity_at__isnull=False).count(), 20)
+
+
+@override_settings(FACEBOOK_ACCESS_TOKEN="dummy-token")
+class FacebookSyncScheduleTests(TestCase):
+    def test_next_sync_follows_change_rate(self):
+        now = timezone.now()
+        company = Company.objects.create(name="活発", facebook_page_id="active")
+        CompanyFacebookSnapshot.objects.create(company=company, friend_count=10, latest_posted_at=now - timedelta(days=1))
+
+        process_company_metrics(company, {"friend_count": 11, "latest_posted_at": (now - timedelta(days=1)).isoformat()})
+        company.refresh_from_db()
+        self.assertAlmostEqual((company.facebook_next_sync_at - now).total_seconds() / 3600, 6, delta=0.1)
+
+        # 変化がなければ最新投稿からの経過時間に応じて間隔を延ばす（上限あり）
+        process_company_metrics(company, {"friend_count": 11, "latest_posted_at": (now - timedelta(days=8)).isoformat()})
+        company.refresh_from_db()
+        self.assertAlmostEqual((company.facebook_next_sync_at - now).total_seconds() / 3600, 48, delta=0.1)
+        process_company_metrics(company, {"friend_count": 11, "latest_posted_at": (now - timedelta(days=365)).isoformat()})
+        company.refresh_from_db()
+        self.assertAlmostEqual((company.facebook_next_sync_at - now).total_seconds() / 3600, 168, delta=0.1)
+
+    def test_failures_back_off_and_reset_on_success(self):
+        company = Company.objects.create(name="失敗", facebook_page_id="gone", facebook_sync_failures=2)
+        now = timezone.now()
+        record_sync_failures([company], now=now)
+        company.refresh_from_db()
+        self.assertEqual(company.facebook_sync_failures, 3)
+        self.assertEqual(company.facebook_next_sync_at, now + timedelta(hours=24))
+
+        process_company_metrics(company, {"friend_count": 1})
+        company.refresh_from_db()
+        self.assertEqual(company.facebook_sync_failures, 0)
+
+    @mock.patch("companies.tasks.group")
+    def test_dispatch_syncs_only_due_pages_within_budget(self, mock_group):
+        now = timezone.now()
+        never = Company.objects.create(name="未同期", facebook_page_id="p-never")
+        overdue = Company.objects.create(
+            name="期限切れ", facebook_page_id="p-overdue", facebook_next_sync_at=now - timedelta(hours=1)
+        )
+        Company.objects.create(
+            name="期限切れ（予算外）", facebook_page_id="p-late", facebook_next_sync_at=now - timedelta(minutes=1)
+        )
+        Company.objects.create(name="期限前", facebook_page_id="p-fresh", facebook_next_sync_at=now + timedelta(days=1))
+        Company.objects.create(name="ページなし")
+
+        dispatched = dispatch_facebook_sync.run(payload={"budget": 2})
+
+        self.assertEqual(dispatched, 2)
+        chunks = [signature.args[0] for signature in mock_group.call_args.args[0]]
+        self.assertEqual(chunks, [[never.id, overdue.id]])
+        # 配信済みのページはリース期間中は再配信しない
+        self.assertEqual(dispatch_facebook_sync.run(payload={"budget": 2}), 1)
+        run = DataCollectionRun.objects.filter(job_name="clone.facebook_sync").order_by("-id").first()
+        self.assertEqual(run.metadata["due_count"], 1)
+
+
+class FacebookSnapshotRollupTests(TestCase):
+    def _snapshot(self, company, created_at, friend_count, latest_posted_at=None):
+        snapshot = CompanyFacebookSnapshot.objects.create(
+            company=company, friend_count=friend_count, latest_posted_at=latest_posted_at
+        )
+        CompanyFacebookSnapshot.objects.filter(pk=snapshot.pk).update(created_at=created_at)
+        return snapshot
+
+    def test_rollup_aggregates_old_snapshots_and_keeps_latest(self):
+        now = timezone.now()
+        day = timezone.localtime(now - timedelta(days=100)).replace(hour=9, minute=0, second=0, microsecond=0)
+        active = Company.objects.create(name="集計A")
+        dormant = Company.objects.create(name="集計B")
+        self._snapshot(active, day, 10, latest_posted_at=day - timedelta(hours=12))
+        self._snapshot(active, day + timedelta(hours=4), 8, latest_posted_at=day + timedelta(hours=3))
+        self._snapshot(active, day + timedelta(hours=8), 12, latest_posted_at=day + timedelta(hours=3))
+        self._snapshot(active, day + timedelta(days=1), 11)
+        recent = self._snapshot(active, now - timedelta(days=1), 20)
+        kept = self._snapshot(dormant, day, 5)
+
+        result = rollup_facebook_snapshots(retention_days=90, batch_size=2, now=now)
+
+        self.assertEqual((result["snapshots"], result["deleted"], result["batches"]), (4, 4, 2))
+        summary = CompanyFacebookDailySummary.objects.get(company=active, date=day.date())
+        self.assertEqual(
+            (summary.snapshot_count, summary.friend_count_min, summary.friend_count_max, summary.friend_count_last),
+            (3, 8, 12, 12),
+        )
+        # 前日の投稿は数えず、その日に最新投稿時刻が進んだ回数を数える
+        self.assertEqual(summary.post_count, 1)
+        self.assertEqual(summary.latest_posted_at, day + timedelta(hours=3))
+        next_day = CompanyFacebookDailySummary.objects.get(company=active, date=(day + timedelta(days=1)).date())
+        self.assertEqual(next_day.friend_count_last, 11)
+        # 企業ごとの最新（次回同期の差分判定に使う）は保持期間を過ぎても残す
+        self.assertCountEqual(CompanyFacebookSnapshot.objects.values_list("pk", flat=True), [recent.pk, kept.pk])
+        self.assertFalse(CompanyFacebookDailySummary.objects.filter(company=dormant).exists())
+
+        trend = daily_facebook_trend(active.id, since=day.date())
+        self.assertEqual([point.friend_count_last for point in trend], [12, 11, 20])
+        self.assertEqual(rollup_facebook_snapshots(retention_days=90, now=now)["snapshots"], 0)
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_retry_after_opens_circuit_and_fails_fast(self):
+        with _FakeProviderServer([(429, {"Retry-After": "120"}, b"")]) as server:
+            client = CorporateNumberAPIClient(token="dummy-token", base_url=server.url)
+            with self.assertRaises(CorporateNumberAPIError):
+                client.fetch("サンプル株式会社")
+            with self.assertRaises(CorporateNumberCircuitOpenError) as raised:
+                client.fetch("サンプル株式会社")
+
+        self.assertEqual(server.hits, 1)
+        self.assertAlmostEqual(raised.exception.retry_after, 120, delta=5)
+
+    def test_opens_after_threshold_and_closes_after_successful_probe(self):
+        breaker = CircuitBreaker("fake-provider", failure_threshold=2, reset_seconds=30, max_reset_seconds=300)
+        responses = [(503, {}, b""), (503, {}, b""), (200, {}, b"{}")]
+        with _FakeProviderServer(responses) as server:
+            send = lambda: requests.get(server.url, timeout=5)
+            self.assertEqual(breaker.request(send).status_code, 503)
+            self.assertFalse(breaker.is_open())
+            breaker.request(send)
+            self.assertAlmostEqual(breaker.retry_after(), 30, delta=2)
+            with self.assertRaises(CircuitOpenError):
+                breaker.request(send)
+
+            # 開いている期間が過ぎると1回だけ試行し、成功すれば閉じる
+            later = time.time() + 31
+            with mock.patch("saleslist_backend.circuit_breaker.time.time", return_value=later):
+                self.assertEqual(breaker.request(send).status_code, 200)
+                self.assertEqual(breaker.retry_after(), 0.0)
+                breaker.request(send)
+
+        self.assertEqual(server.hits, 4)
+
+    def test_failed_probe_doubles_open_period(self):
+        breaker = CircuitBreaker("fake-provider", failure_threshold=1, reset_seconds=30, max_reset_seconds=300)
+        breaker.record_failure()
+        later = time.time() + 31
+        with mock.patch("saleslist_backend.circuit_breaker.time.time", return_value=later):
+            breaker.before_call()
+            # 試行中は他の呼び出しを止める
+            with self.assertRaises(CircuitOpenError):
+                breaker.before_call()
+            breaker.record_failure()
+            self.assertAlmostEqual(breaker.retry_after(), 60, delta=1)
+
+    def test_long_retry_after_outlives_state_ttl(self):
+        breaker = CircuitBreaker("fake-provider", reset_seconds=5, max_reset_seconds=10)
+        with mock.patch.object(breaker.cache, "set", wraps=breaker.cache.set) as cache_set:
+            breaker.record_failure(retry_after=3600)
+
+        key, _value = cache_set.call_args.args
+        self.assertEqual(key, "circuit:fake-provider:open_until")
+        self.assertGreaterEqual(cache_set.call_args.kwargs["timeout"], 3600)
+        self.assertAlmostEqual(breaker.retry_after(), 3600, delta=2)
+
+    @override_settings(CORPORATE_NUMBER_API_TOKEN="dummy-token")
+    @mock.patch("companies.management.commands.import_corporate_numbers.CorporateNumberAPIClient")
+    def test_import_defers_remaining_companies_while_circuit_is_open(self, mock_client_cls):
+        Company.objects.create(name="停止中A")
+        Company.objects.create(name="停止中B")
+        corporate_number_breaker().record_failure(retry_after=300)
+
+        result = run_corporate_number_import(source="api", force_refresh=True)
+
+        mock_client_cls.return_value.search.assert_not_called()
+        self.assertEqual(result["stats"]["skipped_circuit_open"], 1)
+        self.assertGreater(result["circuit_open_retry_after"], 0)
+
 
 class RuleBasedIngestionTests(TestCase):
     def setUp(self) -> None:
@@ -1022,7 +1984,7 @@ class RuleBasedIngestionTests(TestCase):
         self.assertIsNotNone(phone_candidate)
         self.assertEqual(phone_candidate.candidate_value, "0312345678")
 
-    @mock.patch("companies.services.opendata_sources.requests.get")
+    @mock.patch("requests.Session.get")
     def test_ingest_opendata_sources_creates_candidates(self, mock_get):
         company = Company.objects.create(name="サンプル株式会社", corporate_number="9876543210000")
 
@@ -1032,7 +1994,8 @@ class RuleBasedIngestionTests(TestCase):
         )
         mock_response = mock.Mock()
         mock_response.status_code = 200
-        mock_response.content = csv_content.encode("utf-8")
+        mock_response.iter_content.return_value = [csv_content.encode("utf-8")]
+        mock_response.headers = {}
         mock_response.raise_for_status = mock.Mock()
         mock_get.return_value = mock_response
 
@@ -1226,6 +1226,9 @@ class CompanyReviewViewSet(viewsets.ReadOnlyModelViewSet):
             "source_keys": serializer.validated_data.get('sources'),
             "limit": serializer.validated_data.get('limit'),
             "dry_run": serializer.validated_data.get('dry_run', False),
+            "force": serializer.validated_data.get('force', False),
+            # 集計結果をレスポンスで返すため、ソースごとのサブタスクに分けず1タスクで処理する
+            "parallel": False,
         }
 
         try:
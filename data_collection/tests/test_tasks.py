@@ -2,10 +2,19 @@
 import uuid
 from unittest import mock
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
 
-from companies.tasks import run_corporate_number_import_task, run_opendata_ingestion_task, run_ai_ingestion_stub
+from companies.facebook_client import FacebookAPIError
+from companies.models import Company
+from companies.tasks import (
+    dispatch_facebook_sync,
+    ingest_opendata_source_task,
+    run_corporate_number_import_task,
+    run_opendata_ingestion_task,
+    run_ai_ingestion_stub,
+    sync_facebook_chunk,
+)
 from data_collection.models import DataCollectionRun
 
 
@@ -65,6 +74,142 @@ class DataCollectionTaskLoggingTests(TestCase):
         self.assertEqual(run.skipped_count, 6)
         self.assertEqual(run.status, DataCollectionRun.Status.SUCCESS)
 
+    @mock.patch('companies.tasks.group')
+    @mock.patch('companies.tasks.load_opendata_configs', return_value={'a': object(), 'b': object(), 'c': object()})
+    def test_opendata_task_dispatches_sources_with_concurrency_cap(self, mock_configs, mock_group):
+        result = run_opendata_ingestion_task.run(payload={'concurrency': 2, 'limit': 10}, execution_uuid=None)
+
+        self.assertTrue(result['dispatched'])
+        self.assertEqual(result['concurrency'], 2)
+        signatures = mock_group.call_args.args[0]
+        self.assertEqual([signature.args[1:] for signature in signatures], [
+            ('a', {'limit': 10}, ['c']),
+            ('b', {'limit': 10}, []),
+        ])
+        self.assertEqual(signatures[0].args[0], result['run_id'])
+        mock_group.return_value.apply_async.assert_called_once_with()
+
+        run = DataCollectionRun.objects.get(pk=result['run_id'])
+        self.assertEqual(run.status, DataCollectionRun.Status.RUNNING)
+        self.assertEqual(run.metadata['sources']['b'], {'status': 'queued'})
+
+    @mock.patch('companies.tasks.load_opendata_configs', return_value={})
+    @mock.patch('companies.tasks.ingest_opendata_sources')
+    @mock.patch('data_collection.tracker.compute_next_schedules', return_value={'clone.opendata': None, 'earliest': None})
+    def test_opendata_source_subtasks_merge_into_parent_run(self, mock_schedule, mock_ingest, mock_configs):
+        run = DataCollectionRun.objects.create(
+            job_name='clone.opendata',
+            data_source=['a', 'b'],
+            status=DataCollectionRun.Status.RUNNING,
+            started_at=timezone.now(),
+            metadata={'options': {}, 'sources': {'a': {'status': 'queued'}, 'b': {'status': 'queued'}}},
+        )
+
+        def _ingest(**kwargs):
+            if kwargs['source_keys'] == ['b']:
+                raise ValueError('broken zip')
+            kwargs['progress_callback']({'rows': 5, 'matched': 1, 'bytes_downloaded': 10, 'lookup_queries': 1})
+            return {'rows': 8, 'matched': 3, 'created': 2, 'processed_company_ids': [1, 2, 2]}
+
+        mock_ingest.side_effect = _ingest
+
+        self.assertEqual(ingest_opendata_source_task.run(run.pk, 'a', {})['status'], 'success')
+        run.refresh_from_db()
+        self.assertEqual(run.status, DataCollectionRun.Status.RUNNING)
+        self.assertEqual(run.input_count, 8)
+
+        # 最後のソースを記録したタスクが実行を完了させる
+        self.assertEqual(ingest_opendata_source_task.run(run.pk, 'b', {})['status'], 'failed')
+
+        run.refresh_from_db()
+        self.assertEqual(run.metadata['sources']['b']['error'], 'broken zip')
+        result = run.metadata['result']
+        self.assertEqual(result['rows'], 8)
+        self.assertEqual(result['failed_sources'], [{'source': 'b', 'error': 'broken zip'}])
+        self.assertEqual(run.status, DataCollectionRun.Status.SUCCESS)
+        self.assertEqual(run.inserted_count, 2)
+        self.assertEqual(run.error_count, 1)
+        self.assertEqual(run.metadata['processed_count'], 2)
+
+    @mock.patch.object(ingest_opendata_source_task, 'apply_async')
+    @mock.patch('companies.tasks.merge_run_metadata')
+    @mock.patch('companies.tasks.load_opendata_configs', return_value={})
+    @mock.patch('companies.tasks.ingest_opendata_sources')
+    def test_opendata_source_failure_still_dispatches_rest_of_lane(self, mock_ingest, mock_configs, mock_merge, mock_apply):
+        run = DataCollectionRun.objects.create(
+            job_name='clone.opendata',
+            status=DataCollectionRun.Status.RUNNING,
+            metadata={'sources': {'a': {'status': 'queued'}, 'b': {'status': 'queued'}, 'c': {'status': 'queued'}}},
+        )
+        # 開始の記録に失敗しても、ソースの失敗として記録してレーンの後続を配信する
+        mock_merge.side_effect = [RuntimeError('db down'), run]
+
+        summary = ingest_opendata_source_task.run(run.pk, 'a', {'limit': 5}, ['b', 'c'])
+
+        self.assertEqual(summary['status'], 'failed')
+        self.assertEqual(summary['error'], 'db down')
+        mock_ingest.assert_not_called()
+        mock_apply.assert_called_once_with(args=(run.pk, 'b', {'limit': 5}, ['c']))
+        run.refresh_from_db()
+        self.assertEqual(run.status, DataCollectionRun.Status.RUNNING)
+
+    @override_settings(FACEBOOK_ACCESS_TOKEN='dummy-token')
+    @mock.patch('companies.tasks.CHUNK_SIZE', 2)
+    @mock.patch('companies.tasks.group')
+    @mock.patch('companies.facebook_client.FacebookClient.fetch_pages_metrics')
+    @mock.patch('data_collection.tracker.compute_next_schedules', return_value={'clone.facebook_sync': None, 'earliest': None})
+    def test_facebook_sync_chunks_complete_parent_run(self, mock_schedule, mock_fetch, mock_group):
+        companies = [Company.objects.create(name=f'FB{index}', facebook_page_id=f'page-{index}') for index in range(3)]
+        mock_fetch.side_effect = lambda page_ids: {
+            page_id: FacebookAPIError('gone') if page_id == 'page-1' else {'friend_count': 5} for page_id in page_ids
+        }
+
+        self.assertEqual(dispatch_facebook_sync.run(payload={}), 3)
+        signatures = mock_group.call_args.args[0]
+        run_id = signatures[0].args[1]
+        run = DataCollectionRun.objects.get(pk=run_id)
+        self.assertEqual(run.status, DataCollectionRun.Status.RUNNING)
+        self.assertEqual(run.metadata['chunks'], {'0': {'status': 'queued'}, '1': {'status': 'queued'}})
+
+        sync_facebook_chunk.run(*signatures[0].args)
+        run.refresh_from_db()
+        self.assertEqual(run.status, DataCollectionRun.Status.RUNNING)
+        self.assertEqual((run.inserted_count, run.error_count), (1, 1))
+
+        sync_facebook_chunk.run(*signatures[1].args)
+        run.refresh_from_db()
+        self.assertEqual(run.status, DataCollectionRun.Status.SUCCESS)
+        self.assertEqual(run.input_count, len(companies))
+        self.assertEqual((run.inserted_count, run.error_count), (2, 1))
+        result = run.metadata['result']
+        self.assertEqual(
+            {key: result[key] for key in ('companies', 'processed', 'updated', 'failed', 'api_calls', 'chunks')},
+            {'companies': 3, 'processed': 2, 'updated': 2, 'failed': 1, 'api_calls': 2, 'chunks': 2},
+        )
+        self.assertIn('max', result['chunk_duration_seconds'])
+        self.assertEqual(run.metadata['chunks']['1']['status'], 'success')
+
+    @override_settings(FACEBOOK_ACCESS_TOKEN='dummy-token')
+    @mock.patch.object(sync_facebook_chunk, 'max_retries', 0)
+    @mock.patch('companies.facebook_client.FacebookClient.fetch_pages_metrics', side_effect=FacebookAPIError('down'))
+    @mock.patch('data_collection.tracker.compute_next_schedules', return_value={'clone.facebook_sync': None, 'earliest': None})
+    def test_facebook_sync_run_fails_when_every_chunk_fails(self, mock_schedule, mock_fetch):
+        company = Company.objects.create(name='FB', facebook_page_id='page')
+        run = DataCollectionRun.objects.create(
+            job_name='clone.facebook_sync',
+            status=DataCollectionRun.Status.RUNNING,
+            started_at=timezone.now(),
+            metadata={'options': {}, 'chunks': {'0': {'status': 'queued'}}},
+        )
+
+        with self.assertRaises(FacebookAPIError):
+            sync_facebook_chunk.run([company.id], run.pk, 0)
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, DataCollectionRun.Status.FAILURE)
+        self.assertEqual(run.error_count, 1)
+        self.assertEqual(run.error_summary, 'chunk 0: down')
+
     @mock.patch('data_collection.tracker.compute_next_schedules', return_value={'ai.enrich': None, 'clone.ai_stub': None, 'earliest': None})
     def test_ai_stub_creates_run(self, mock_schedule):
         result = run_ai_ingestion_stub.run(payload={'foo': 'bar'})
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Mapping, Optional
 
 from django.db import transaction
 from django.utils import timezone
@@ -19,11 +19,17 @@ class DataCollectionRunTracker:
     data_source: Optional[list[str]] = None
     metadata: Optional[Dict[str, Any]] = None
     execution_uuid: Optional[str] = None
+    # 既存の実行を引き継ぐ場合（hand_off した実行を後続のタスクで完了させる場合など）
+    run_id: Optional[int] = None
 
     run: DataCollectionRun = field(init=False)
     completed: bool = field(init=False, default=False)
 
     def __post_init__(self):
+        if self.run_id is not None:
+            self.run = DataCollectionRun.objects.get(pk=self.run_id)
+            return
+
         definition = get_job_definition(self.job_name)
         data_source = self.data_source or definition.default_sources
         metadata = self.metadata or {}
@@ -65,6 +71,10 @@ class DataCollectionRunTracker:
         update_fields = list(fields.keys()) + ["updated_at"]
         self.run.save(update_fields=update_fields)
 
+    def hand_off(self) -> None:
+        """完了の記録を後続のタスク（最後に終わったサブタスクなど）に委ねる。実行は RUNNING のまま残る"""
+        self.completed = True
+
     def complete_success(self, **fields: Any) -> None:
         self.completed = True
         if fields:
@@ -102,10 +112,41 @@ def track_data_collection_run(
     data_source: Optional[list[str]] = None,
     metadata: Optional[Dict[str, Any]] = None,
     execution_uuid: Optional[str] = None,
+    run_id: Optional[int] = None,
 ) -> DataCollectionRunTracker:
     return DataCollectionRunTracker(
         job_name=job_name,
         data_source=data_source,
         metadata=metadata,
         execution_uuid=execution_uuid,
+        run_id=run_id,
     )
+
+
+def merge_run_metadata(
+    run_id: int,
+    section: str,
+    key: str,
+    values: Dict[str, Any],
+    *,
+    totals: Optional[Mapping[str, str]] = None,
+) -> DataCollectionRun:
+    """
+    子タスクの進捗を親の実行の metadata[section][key] にマージする
+
+    並列に実行される子タスクから呼ばれるため、行ロックを取って読み直してから更新する。
+    totals（{run のフィールド: values のキー}）を指定すると、section 内の全項目の合計を run に設定する。
+    """
+    with transaction.atomic():
+        run = DataCollectionRun.objects.select_for_update().get(pk=run_id)
+        metadata = dict(run.metadata or {})
+        items = dict(metadata.get(section) or {})
+        items[key] = {**(items.get(key) or {}), **values}
+        metadata[section] = items
+        run.metadata = metadata
+        update_fields = ["metadata", "updated_at"]
+        for field_name, value_key in (totals or {}).items():
+            setattr(run, field_name, sum(int(item.get(value_key) or 0) for item in items.values()))
+            update_fields.append(field_name)
+        run.save(update_fields=update_fields)
+    return run
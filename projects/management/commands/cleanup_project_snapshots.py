@@ -2,6 +2,7 @@ from datetime import timedelta
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from projects.models import ProjectSnapshot
@@ -27,7 +28,15 @@ class Command(BaseCommand):
         dry_run = options.get('dry_run', False)
 
         cutoff = timezone.now() - timedelta(days=retention_days)
-        queryset = ProjectSnapshot.objects.filter(created_at__lt=cutoff)
+        # 保持期間内のスナップショットの復元に使うキーフレーム・差分は残す（キーフレーム単位で削除する）
+        kept_keyframe_ids = ProjectSnapshot.objects.filter(created_at__gte=cutoff).values(
+            keyframe_group=Coalesce('keyframe_id', 'id')
+        )
+        queryset = (
+            ProjectSnapshot.objects.filter(created_at__lt=cutoff)
+            .exclude(id__in=kept_keyframe_ids)
+            .exclude(keyframe_id__in=kept_keyframe_ids)
+        )
         count = queryset.count()
 
         if dry_run:
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_project_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectsnapshot',
+            name='base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.projectsnapshot', verbose_name='差分の基準'),
+        ),
+        migrations.AddField(
+            model_name='projectsnapshot',
+            name='delta_depth',
+            field=models.PositiveIntegerField(default=0, verbose_name='キーフレームからの差分数'),
+        ),
+        migrations.AddField(
+            model_name='projectsnapshot',
+            name='keyframe',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deltas', to='projects.projectsnapshot', verbose_name='キーフレーム'),
+        ),
+    ]
@@ -437,7 +437,12 @@ class PageEditLock(models.Model):
 
 
 class ProjectSnapshot(models.Model):
-    """案件一括編集に備えるスナップショット"""
+    """
+    案件一括編集に備えるスナップショット
+
+    一定間隔のキーフレーム（案件・全案件企業）と、その間の差分（直前のスナップショットから
+    変わった案件企業の行のみ）で保存する。保存・復元は projects.services.snapshot_store を使う。
+    """
 
     SOURCE_CHOICES = [
         ("bulk_edit", "一括編集"),
@@ -452,6 +457,23 @@ class ProjectSnapshot(models.Model):
         verbose_name="案件"
     )
     data = models.JSONField(verbose_name="スナップショットデータ")
+    keyframe = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="deltas",
+        verbose_name="キーフレーム"
+    )
+    base = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="差分の基準"
+    )
+    delta_depth = models.PositiveIntegerField(default=0, verbose_name="キーフレームからの差分数")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -478,6 +500,10 @@ class ProjectSnapshot(models.Model):
             models.Index(fields=["project", "created_at"]),
         ]
 
+    @property
+    def is_keyframe(self):
+        return self.keyframe_id is None
+
     def __str__(self):
         timestamp = self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else "unknown"
         return f"Snapshot(Project={self.project_id}, at={timestamp})"
@@ -132,7 +132,11 @@ class ProjectSnapshotSerializer(serializers.ModelSerializer):
         return [item.strip() for item in parts[1].split(',') if item.strip()]
 
     def get_project_overview(self, obj):
-        data = (obj.data or {}).get('project', {}) or {}
+        # 一覧（data を読み込まず project_data のみ注釈）ではその値を使う
+        if hasattr(obj, 'project_data'):
+            data = obj.project_data or {}
+        else:
+            data = (obj.data or {}).get('project', {}) or {}
         overview_keys = [
             'name',
             'client_name',
@@ -0,0 +1,130 @@
+"""
+案件スナップショットの保存と復元（キーフレーム + 差分）
+
+案件企業が数千件ある案件では、編集のたびに全行を保存すると1件あたり数MBになるため、
+
+- KEYFRAME_INTERVAL 件ごとにキーフレーム（data = {"project": ..., "project_companies": [全行]}）を保存し
+- その間は直前のスナップショットからの差分（data = {"project": ..., "changed_companies": [追加・変更された行],
+  "removed_company_ids": [削除された行の id]}）だけを保存する
+
+案件本体の項目（"project"）は1行のため、差分でも常に全項目を持つ（一覧の概要表示は data["project"] だけで済む）。
+変更された行が全体の半分を超える場合は、差分にしても小さくならないためキーフレームにする。
+
+復元は、キーフレームから対象まで base（差分の基準）をたどって差分を順に適用する。
+差分はすべて同じキーフレームを指すため、必要な行は1回のクエリで取得できる。
+同時に保存された差分が同じ基準を持つ（分岐する）場合も、base をたどるため正しく復元できる。
+"""
+from __future__ import annotations
+
+import logging
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Q
+
+from projects.models import Project, ProjectSnapshot
+
+logger = logging.getLogger(__name__)
+
+KEYFRAME_INTERVAL = getattr(settings, "PROJECT_SNAPSHOT_KEYFRAME_INTERVAL", 20)
+# 変更された行の割合がこれを超える場合はキーフレームにする
+MAX_DELTA_RATIO = 0.5
+
+
+class SnapshotChainError(Exception):
+    """キーフレームから対象のスナップショットまでの差分がそろっていない"""
+
+
+def diff_company_rows(previous_rows: List[dict], rows: List[dict]) -> Dict[str, list]:
+    """案件企業の行（id をキーとする）の差分。追加・変更された行は行全体を持つ"""
+    previous_by_id = {row.get("id"): row for row in previous_rows}
+    current_ids = set()
+    changed = []
+    for row in rows:
+        row_id = row.get("id")
+        current_ids.add(row_id)
+        if previous_by_id.get(row_id) != row:
+            changed.append(row)
+    removed = [row_id for row_id in previous_by_id if row_id not in current_ids]
+    return {"changed_companies": changed, "removed_company_ids": removed}
+
+
+def apply_company_delta(rows: List[dict], delta: dict) -> List[dict]:
+    """diff_company_rows の差分を行に適用する（既存の行の順序を保ち、追加された行は末尾に加える）"""
+    rows_by_id = {row.get("id"): row for row in rows}
+    for row_id in delta.get("removed_company_ids", []):
+        rows_by_id.pop(row_id, None)
+    for row in delta.get("changed_companies", []):
+        rows_by_id[row.get("id")] = row
+    return list(rows_by_id.values())
+
+
+def _replay(keyframe: ProjectSnapshot, deltas: List[ProjectSnapshot]) -> dict:
+    payload = keyframe.data or {}
+    rows = list(payload.get("project_companies", []))
+    project_data = payload.get("project", {})
+    for delta in deltas:
+        rows = apply_company_delta(rows, delta.data or {})
+        project_data = (delta.data or {}).get("project", {})
+    return {"project": project_data, "project_companies": rows}
+
+
+def reconstruct_payload(snapshot: ProjectSnapshot) -> dict:
+    """スナップショット時点の {"project": ..., "project_companies": [全行]} を復元する"""
+    if snapshot.is_keyframe:
+        return _replay(snapshot, [])
+
+    chain = {
+        row.id: row
+        for row in ProjectSnapshot.objects.filter(
+            Q(id=snapshot.keyframe_id) | Q(keyframe_id=snapshot.keyframe_id, id__lt=snapshot.id)
+        ).only("id", "keyframe_id", "base_id", "data")
+    }
+    chain[snapshot.id] = snapshot
+
+    deltas = []
+    current = snapshot
+    while not current.is_keyframe:
+        deltas.append(current)
+        current = chain.get(current.base_id)
+        if current is None:
+            raise SnapshotChainError(f"スナップショット #{snapshot.id} の差分の基準が見つかりません")
+    deltas.reverse()
+    return _replay(current, deltas)
+
+
+def store_snapshot(project: Project, payload: dict, *, keyframe_interval: Optional[int] = None, **fields) -> ProjectSnapshot:
+    """
+    payload（{"project": ..., "project_companies": [全行]}）をスナップショットとして保存する
+
+    直前のスナップショットからの差分が小さく、キーフレームからの差分数が間隔に達していなければ差分で保存する。
+    fields は ProjectSnapshot のその他の項目（created_by / source / reason）。
+    """
+    interval = max(int(keyframe_interval or KEYFRAME_INTERVAL), 1)
+    rows = payload.get("project_companies", [])
+    previous = (
+        ProjectSnapshot.objects.filter(project=project)
+        .only("id", "keyframe_id", "base_id", "delta_depth", "data")
+        .order_by("-id")
+        .first()
+    )
+
+    if previous is not None and previous.delta_depth + 1 < interval:
+        try:
+            previous_rows = reconstruct_payload(previous)["project_companies"]
+        except SnapshotChainError:
+            logger.warning("Snapshot chain broken at #%s; storing a keyframe", previous.id)
+        else:
+            delta = diff_company_rows(previous_rows, rows)
+            changed = len(delta["changed_companies"]) + len(delta["removed_company_ids"])
+            if changed <= max(len(rows), len(previous_rows)) * MAX_DELTA_RATIO:
+                return ProjectSnapshot.objects.create(
+                    project=project,
+                    data={"project": payload.get("project", {}), **delta},
+                    keyframe_id=previous.keyframe_id or previous.id,
+                    base=previous,
+                    delta_depth=previous.delta_depth + 1,
+                    **fields,
+                )
+
+    return ProjectSnapshot.objects.create(project=project, data=payload, **fields)
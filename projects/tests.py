@@ -43,6 +43,7 @@ from projects.models import (
     PageEditLock,
     ProjectNGCompany,
 )
+from projects.services.snapshot_store import reconstruct_payload
 from projects.views import ProjectViewSet
 
 
@@ -309,6 +310,125 @@ class ProjectSnapshotRestoreTests(TestCase):
         self.assertIn('restore', sources)
 
 
+class ProjectSnapshotDeltaStorageTests(TestCase):
+    """スナップショットのキーフレーム + 差分保存のテスト"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='delta-user@example.com',
+            password='password123',
+            username='delta-user@example.com',
+            name='差分保存ユーザー'
+        )
+        self.client_obj = Client.objects.create(name='差分クライアント')
+        self.project = Project.objects.create(client=self.client_obj, name='差分案件', appointment_count=1)
+        self.project_companies = [
+            ProjectCompany.objects.create(
+                project=self.project,
+                company=Company.objects.create(name=f'差分企業{index}', industry='IT'),
+                status='未接触'
+            )
+            for index in range(6)
+        ]
+        self.view = ProjectViewSet()
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.user)
+
+    def _snapshot(self):
+        snapshot = self.view._create_snapshot(self.project, self.user, reason='test')
+        expected = self.view._build_project_snapshot_payload(
+            Project.objects.get(pk=self.project.pk),
+            project_companies=list(self.project.project_companies.all()),
+        )
+        return snapshot, expected
+
+    def _rows_by_id(self, payload):
+        return {row['id']: row for row in payload['project_companies']}
+
+    def test_deltas_store_changed_rows_and_reconstruct_full_state(self):
+        keyframe, _ = self._snapshot()
+        self.assertTrue(keyframe.is_keyframe)
+        self.assertEqual(len(keyframe.data['project_companies']), 6)
+
+        first = self.project_companies[0]
+        first.status = 'DM送信済み'
+        first.save()
+        removed_id = self.project_companies[1].id
+        self.project_companies[1].delete()
+        added = ProjectCompany.objects.create(
+            project=self.project,
+            company=Company.objects.create(name='追加企業', industry='IT'),
+        )
+        self.project.appointment_count = 5
+        self.project.save()
+        delta, expected = self._snapshot()
+
+        self.assertFalse(delta.is_keyframe)
+        self.assertEqual(delta.keyframe_id, keyframe.id)
+        self.assertEqual(delta.base_id, keyframe.id)
+        self.assertEqual(sorted(row['id'] for row in delta.data['changed_companies']), [first.id, added.id])
+        self.assertEqual(delta.data['removed_company_ids'], [removed_id])
+        self.assertEqual(delta.data['project']['appointment_count'], 5)
+
+        unchanged, expected_unchanged = self._snapshot()
+        self.assertEqual(unchanged.data['changed_companies'], [])
+        self.assertEqual(unchanged.delta_depth, 2)
+
+        for snapshot, payload in ((delta, expected), (unchanged, expected_unchanged)):
+            snapshot = ProjectSnapshot.objects.get(pk=snapshot.pk)
+            with self.assertNumQueries(1):
+                restored = reconstruct_payload(snapshot)
+            self.assertEqual(restored['project'], payload['project'])
+            self.assertEqual(self._rows_by_id(restored), self._rows_by_id(payload))
+
+    def test_keyframe_every_interval_and_on_large_changes(self):
+        with patch('projects.services.snapshot_store.KEYFRAME_INTERVAL', 3):
+            snapshots = [self._snapshot()[0] for _ in range(4)]
+        self.assertEqual([s.is_keyframe for s in snapshots], [True, False, False, True])
+        self.assertEqual([s.delta_depth for s in snapshots], [0, 1, 2, 0])
+
+        ProjectCompany.objects.filter(project=self.project).update(status='DM送信済み')
+        snapshot, expected = self._snapshot()
+        self.assertTrue(snapshot.is_keyframe)
+        self.assertEqual(self._rows_by_id(snapshot.data), self._rows_by_id(expected))
+
+    def test_restore_and_list_delta_snapshot(self):
+        self._snapshot()
+        target = self.project_companies[2]
+        target.status = 'DM送信済み'
+        target.save()
+        delta, _ = self._snapshot()
+        self.assertFalse(delta.is_keyframe)
+
+        target.status = 'アポ獲得'
+        target.save()
+        restore_url = reverse('project-restore-snapshot', kwargs={'pk': self.project.id, 'snapshot_id': delta.id})
+        response = self.api_client.post(restore_url)
+        self.assertEqual(response.status_code, 200)
+        target.refresh_from_db()
+        self.assertEqual(target.status, 'DM送信済み')
+
+        with patch.object(ProjectViewSet, 'paginate_queryset', return_value=None):
+            response = self.api_client.get(reverse('project-list-snapshots', kwargs={'pk': self.project.id}))
+        self.assertEqual(response.status_code, 200)
+        overview = {item['id']: item['project_overview'] for item in response.data['results']}
+        self.assertEqual(overview[delta.id]['appointment_count'], 1)
+
+    def test_cleanup_keeps_keyframe_of_recent_deltas(self):
+        with patch('projects.services.snapshot_store.KEYFRAME_INTERVAL', 2):
+            old_keyframe, old_delta, keyframe, delta = [self._snapshot()[0] for _ in range(4)]
+        self.assertTrue(keyframe.is_keyframe)
+        self.assertEqual(delta.keyframe_id, keyframe.id)
+        ProjectSnapshot.objects.filter(pk__in=[old_keyframe.pk, old_delta.pk, keyframe.pk]).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+
+        call_command('cleanup_project_snapshots', '--days', '7', stdout=io.StringIO())
+
+        remaining = set(ProjectSnapshot.objects.values_list('id', flat=True))
+        self.assertEqual(remaining, {keyframe.id, delta.id})
+
+
 class ProjectAddCompaniesTests(TestCase):
     """案件への企業追加APIのユニットテスト"""
 
@@ -4,7 +4,7 @@ from datetime import date
 
 from django.conf import settings
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Count, F
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
@@ -30,6 +30,7 @@ from .serializers import (
     ProjectManagementListSerializer, ProjectManagementDetailSerializer,
     ProjectManagementUpdateSerializer, ProjectSnapshotSerializer
 )
+from .services.snapshot_store import reconstruct_payload, store_snapshot
 from companies.models import Company
 from clients.models import Client
 
@@ -179,9 +180,10 @@ class ProjectViewSet(viewsets.ModelViewSet):
             project_companies = list(project.project_companies.all())
 
         payload = self._build_project_snapshot_payload(project_for_snapshot, project_companies=project_companies)
-        snapshot = ProjectSnapshot.objects.create(
-            project=project,
-            data=payload,
+        # 直前のスナップショットからの差分（一定間隔でキーフレーム）として保存する
+        snapshot = store_snapshot(
+            project,
+            payload,
             created_by=user if user.is_authenticated else None,
             source=source,
             reason=reason or ''
@@ -193,11 +195,12 @@ class ProjectViewSet(viewsets.ModelViewSet):
             snapshot_id=snapshot.id,
             source=source,
             reason=reason or '',
+            keyframe=snapshot.is_keyframe,
         )
         return snapshot
 
     def _apply_snapshot(self, project: Project, snapshot: ProjectSnapshot, user) -> None:
-        payload = snapshot.data or {}
+        payload = reconstruct_payload(snapshot)
         project_payload = payload.get('project', {})
         companies_payload = payload.get('project_companies', [])
 
@@ -1018,7 +1021,12 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def list_snapshots(self, request, pk=None):
         """案件スナップショット一覧"""
         project = self.get_object()
-        queryset = project.snapshots.select_related('created_by').all()
+        # 一覧では案件の概要のみを使うため、キーフレームの全行は読み込まない
+        queryset = (
+            project.snapshots.select_related('created_by')
+            .defer('data')
+            .annotate(project_data=F('data__project'))
+        )
 
         page = self.paginate_queryset(queryset)
         serializer = ProjectSnapshotSerializer(page, many=True) if page is not None else ProjectSnapshotSerializer(queryset, many=True)
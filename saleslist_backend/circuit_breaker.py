@@ -0,0 +1,172 @@
+"""
+外部APIのサーキットブレーカー（プロバイダ単位。状態は Django キャッシュ = Redis / DB キャッシュで全プロセス共通）
+
+- 接続エラー・タイムアウト・429・5xx を失敗として数え、FAILURE_THRESHOLD 回続くとサーキットを開く
+- Retry-After が返された場合は回数に関係なく、その秒数だけサーキットを開く
+- 開いている間の呼び出しは CircuitOpenError（retry_after 付き）ですぐに失敗する
+- 開いてから一定時間後は1回だけ試行（half-open）し、成功すれば閉じ、失敗すれば開いている時間を倍にする
+"""
+from __future__ import annotations
+
+import logging
+import math
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, Type
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAILURE_THRESHOLD = getattr(settings, "CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5)
+# 失敗回数を数える期間（この期間に失敗がなければ回数をリセットする）
+DEFAULT_FAILURE_WINDOW_SECONDS = getattr(settings, "CIRCUIT_BREAKER_FAILURE_WINDOW_SECONDS", 60)
+DEFAULT_RESET_SECONDS = getattr(settings, "CIRCUIT_BREAKER_RESET_SECONDS", 30)
+DEFAULT_MAX_RESET_SECONDS = getattr(settings, "CIRCUIT_BREAKER_MAX_RESET_SECONDS", 600)
+CACHE_ALIAS = getattr(settings, "CIRCUIT_BREAKER_CACHE_ALIAS", "default")
+
+_KEY_PREFIX = "circuit"
+
+
+class CircuitOpenError(Exception):
+    """サーキットが開いているため呼び出さなかった（retry_after 秒後に再試行できる）"""
+
+    def __init__(self, provider: str, retry_after: float) -> None:
+        super().__init__(f"{provider} の呼び出しを停止中です（{retry_after:.0f}秒後に再試行）")
+        self.provider = provider
+        self.retry_after = max(float(retry_after), 0.0)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After ヘッダ（秒数または HTTP 日付）を秒数に変換する。解釈できない場合は None"""
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError, IndexError):
+            return None
+    return max(seconds, 0.0)
+
+
+def is_failure_status(status_code: int) -> bool:
+    """サーキットブレーカーの失敗として数えるステータス（429・5xx）"""
+    return status_code == 429 or status_code >= 500
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        provider: str,
+        *,
+        failure_threshold: Optional[int] = None,
+        failure_window_seconds: Optional[float] = None,
+        reset_seconds: Optional[float] = None,
+        max_reset_seconds: Optional[float] = None,
+        open_error: Type[CircuitOpenError] = CircuitOpenError,
+    ) -> None:
+        self.provider = provider
+        self.failure_threshold = max(int(failure_threshold or DEFAULT_FAILURE_THRESHOLD), 1)
+        self.failure_window_seconds = float(failure_window_seconds or DEFAULT_FAILURE_WINDOW_SECONDS)
+        self.reset_seconds = float(reset_seconds or DEFAULT_RESET_SECONDS)
+        self.max_reset_seconds = max(float(max_reset_seconds or DEFAULT_MAX_RESET_SECONDS), self.reset_seconds)
+        self.open_error = open_error
+        self.cache = caches[CACHE_ALIAS]
+
+    def _key(self, name: str) -> str:
+        return f"{_KEY_PREFIX}:{self.provider}:{name}"
+
+    @property
+    def _state_ttl(self) -> int:
+        # 開いている期間が過ぎた後も half-open の判定・連続回数の保持に使うため長めに残す
+        return int(self.max_reset_seconds * 4) + 60
+
+    def _incr(self, name: str, timeout: float) -> int:
+        key = self._key(name)
+        if self.cache.add(key, 1, timeout=int(timeout) or 1):
+            return 1
+        try:
+            return int(self.cache.incr(key))
+        except ValueError:  # 期限切れで消えた場合
+            self.cache.set(key, 1, timeout=int(timeout) or 1)
+            return 1
+
+    def retry_after(self) -> float:
+        """サーキットが開いている残り秒数（閉じている・half-open の場合は 0）"""
+        open_until = self.cache.get(self._key("open_until"))
+        if open_until is None:
+            return 0.0
+        return max(float(open_until) - time.time(), 0.0)
+
+    def is_open(self) -> bool:
+        return self.retry_after() > 0
+
+    def before_call(self) -> None:
+        """呼び出し前の確認。開いている場合、half-open の試行中の場合は open_error を送出する"""
+        open_until = self.cache.get(self._key("open_until"))
+        if open_until is None:
+            return
+        remaining = float(open_until) - time.time()
+        if remaining > 0:
+            raise self.open_error(self.provider, remaining)
+        # half-open: 試行は全プロセスで1回だけ（結果が出るまで他の呼び出しは止める）
+        if not self.cache.add(self._key("probe"), 1, timeout=int(self.reset_seconds) or 1):
+            raise self.open_error(self.provider, min(self.reset_seconds, 1.0))
+
+    def record_success(self) -> None:
+        keys = [self._key(name) for name in ("failures", "open_until", "opens", "probe")]
+        if self.cache.get_many(keys[:2]):
+            self.cache.delete_many(keys)
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        half_open = self.cache.get(self._key("open_until")) is not None
+        failures = self._incr("failures", self.failure_window_seconds)
+        if not retry_after and not half_open and failures < self.failure_threshold:
+            return
+
+        opens = self._incr("opens", self._state_ttl)
+        if retry_after:
+            cooldown = float(retry_after)
+        else:
+            cooldown = min(self.reset_seconds * (2 ** (opens - 1)), self.max_reset_seconds)
+        # Retry-After は上限を設けないため、開いている期間より先にキーが消えないよう TTL を延ばす
+        self.cache.set(
+            self._key("open_until"),
+            time.time() + cooldown,
+            timeout=max(self._state_ttl, int(math.ceil(cooldown)) + 60),
+        )
+        self.cache.delete_many([self._key("failures"), self._key("probe")])
+        logger.warning(
+            "circuit opened provider=%s cooldown=%.1fs failures=%s opens=%s retry_after=%s",
+            self.provider,
+            cooldown,
+            failures,
+            opens,
+            retry_after,
+        )
+
+    def request(self, send: Callable[[], requests.Response], *, record_success: bool = True) -> requests.Response:
+        """
+        send()（HTTP リクエスト）をサーキットブレーカー越しに実行する
+
+        接続エラーは失敗として記録して送出し、429・5xx は失敗として記録してレスポンスをそのまま返す
+        （ステータスごとの扱いは呼び出し側のクライアントに任せる）。
+        record_success=False の場合、成功は記録しない（本文を確認してから呼び出し側で record_success /
+        record_failure する。バッチの各項目に制限のエラーが含まれる場合など）。
+        """
+        self.before_call()
+        try:
+            response = send()
+        except requests.RequestException:
+            self.record_failure()
+            raise
+        if is_failure_status(response.status_code):
+            self.record_failure(retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        elif record_success:
+            self.record_success()
+        return response
@@ -0,0 +1,117 @@
+"""
+外部APIの HTTP セッション（プロセス単位・プロバイダ単位で使い回す）
+
+requests.get を直接呼ぶと毎回 TCP / TLS 接続を張り直すため、プロバイダごとに
+requests.Session を1つ持ち、keep-alive の接続をコネクションプールで再利用する。
+
+- プールの大きさ・接続タイムアウト・再試行は設定で調整する（プロバイダ単位で上書きできる）
+- 再試行は接続エラーと GET / HEAD の読み取りエラーのみ（429・5xx はサーキットブレーカーに任せる）
+- タイムアウトを指定しない呼び出しには (接続, 読み取り) の既定値を使う
+- fork 後の子プロセス（Celery の prefork ワーカー）では親のソケットを共有しないよう作り直す
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, Mapping, Optional, Tuple, Union
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_POOL_MAXSIZE = getattr(settings, "HTTP_POOL_MAXSIZE", 10)
+DEFAULT_CONNECT_TIMEOUT = getattr(settings, "HTTP_CONNECT_TIMEOUT", 3.05)
+DEFAULT_READ_TIMEOUT = getattr(settings, "HTTP_READ_TIMEOUT", 30)
+DEFAULT_RETRY_TOTAL = getattr(settings, "HTTP_RETRY_TOTAL", 2)
+DEFAULT_RETRY_BACKOFF = getattr(settings, "HTTP_RETRY_BACKOFF_FACTOR", 0.3)
+# プロバイダごとの上書き（例: {"corporate-number": {"pool_maxsize": 16}}）
+PROVIDER_OPTIONS: Mapping[str, Mapping[str, object]] = getattr(settings, "HTTP_SESSION_PROVIDER_OPTIONS", {})
+
+Timeout = Union[float, Tuple[float, float]]
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_pid = os.getpid()
+_lock = threading.Lock()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """タイムアウトの指定がない呼び出しに既定の (接続, 読み取り) タイムアウトを使う HTTPAdapter"""
+
+    def __init__(self, *, timeout: Timeout, **kwargs) -> None:
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def _build_retry(total: int, backoff_factor: float) -> Retry:
+    return Retry(
+        total=total,
+        connect=total,
+        read=total,
+        status=0,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        backoff_factor=backoff_factor,
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+
+
+def build_session(
+    *,
+    pool_maxsize: Optional[int] = None,
+    connect_timeout: Optional[float] = None,
+    read_timeout: Optional[float] = None,
+    retries: Optional[int] = None,
+    backoff_factor: Optional[float] = None,
+) -> requests.Session:
+    """コネクションプール・既定タイムアウト・再試行を設定したセッションを作る"""
+    pool_maxsize = max(int(pool_maxsize or DEFAULT_POOL_MAXSIZE), 1)
+    adapter = PooledHTTPAdapter(
+        timeout=(
+            float(connect_timeout or DEFAULT_CONNECT_TIMEOUT),
+            float(read_timeout or DEFAULT_READ_TIMEOUT),
+        ),
+        pool_connections=4,
+        pool_maxsize=pool_maxsize,
+        max_retries=_build_retry(
+            DEFAULT_RETRY_TOTAL if retries is None else int(retries),
+            DEFAULT_RETRY_BACKOFF if backoff_factor is None else float(backoff_factor),
+        ),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(provider: str) -> requests.Session:
+    """プロバイダのセッション（プロセス内で1つ）を返す"""
+    global _sessions_pid
+    pid = os.getpid()
+    session = _sessions.get(provider) if pid == _sessions_pid else None
+    if session is not None:
+        return session
+    with _lock:
+        if pid != _sessions_pid:
+            # 親プロセスの接続は閉じずに手放す（閉じると親側のソケットも切れる）
+            _sessions.clear()
+            _sessions_pid = pid
+        session = _sessions.get(provider)
+        if session is None:
+            session = build_session(**dict(PROVIDER_OPTIONS.get(provider, {})))
+            _sessions[provider] = session
+    return session
+
+
+def close_sessions() -> None:
+    """このプロセスのセッションをすべて閉じる（テスト・計測用）"""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
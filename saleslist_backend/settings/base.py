@@ -2,6 +2,7 @@
 Base settings shared by all environments.
 """
 
+import json
 import os
 from datetime import timedelta
 from pathlib import Path
@@ -213,6 +214,8 @@ POWERPLEXY_MONTHLY_CALL_LIMIT = (
     else None
 )
 POWERPLEXY_COST_PER_REQUEST = config("POWERPLEXY_COST_PER_REQUEST", default=0.05, cast=float)
+# 呼び出し前に確保したコスト枠の有効期限（ワーカー異常終了時に枠が残り続けないように）
+POWERPLEXY_RESERVATION_TTL_SECONDS = config("POWERPLEXY_RESERVATION_TTL_SECONDS", default=600, cast=int)
 # ⑤ 日次上限: デフォルト10000件を明示（環境変数未設定時）
 _powerplexy_daily_record_limit = config("POWERPLEXY_DAILY_RECORD_LIMIT", default="10000")
 POWERPLEXY_DAILY_RECORD_LIMIT = (
@@ -240,14 +243,25 @@ CELERY_TIMEZONE = "Asia/Tokyo"
 CELERY_TASK_TIME_LIMIT = config("CELERY_TASK_TIME_LIMIT", default=7200, cast=int)
 CELERY_TASK_DEFAULT_QUEUE = config("CELERY_TASK_DEFAULT_QUEUE", default="default")
 CELERY_BEAT_SCHEDULE = {
+    # 次回同期時刻を過ぎたページだけを取得するため、毎時実行する
     "sync-facebook-activity": {
         "task": "companies.tasks.dispatch_facebook_sync",
-        "schedule": crontab(hour=2, minute=0),
+        "schedule": crontab(minute=0),
     },
     "run-ai-enrich": {
         "task": "ai_enrichment.tasks.run_ai_enrich_scheduled",
         "schedule": crontab(hour=3, minute=0),
     },
+    # 保持期間を過ぎた Facebook スナップショットを日次集計に集約して削除する
+    "rollup-facebook-snapshots": {
+        "task": "companies.tasks.rollup_facebook_snapshots_task",
+        "schedule": crontab(hour=4, minute=30),
+    },
+    # 送信予約に失敗した Slack 通知の取りこぼし防止
+    "dispatch-slack-notifications": {
+        "task": "ai_enrichment.tasks.dispatch_slack_notifications",
+        "schedule": crontab(minute="*/5"),
+    },
 }
 
 # Facebook API
@@ -255,6 +269,22 @@ FACEBOOK_GRAPH_API_VERSION = config("FACEBOOK_GRAPH_API_VERSION", default="v19.0
 FACEBOOK_ACCESS_TOKEN = config("FACEBOOK_ACCESS_TOKEN", default="")
 FACEBOOK_GRAPH_API_TIMEOUT = config("FACEBOOK_GRAPH_API_TIMEOUT", default=10, cast=int)
 FACEBOOK_SYNC_CHUNK_SIZE = config("FACEBOOK_SYNC_CHUNK_SIZE", default=500, cast=int)
+# Graph API のバッチリクエスト1回あたりのページ数（上限 50）
+FACEBOOK_GRAPH_BATCH_SIZE = config("FACEBOOK_GRAPH_BATCH_SIZE", default=50, cast=int)
+# ページごとの次回同期時刻（友だち数・最新投稿に変化があれば MIN、なければ最新投稿からの経過時間 ×
+# POST_AGE_FACTOR を MIN〜MAX に収める。取得に失敗したページは MIN から失敗回数ごとに倍にする）
+FACEBOOK_SYNC_MIN_INTERVAL_HOURS = config("FACEBOOK_SYNC_MIN_INTERVAL_HOURS", default=6, cast=float)
+FACEBOOK_SYNC_MAX_INTERVAL_HOURS = config("FACEBOOK_SYNC_MAX_INTERVAL_HOURS", default=168, cast=float)
+FACEBOOK_SYNC_POST_AGE_FACTOR = config("FACEBOOK_SYNC_POST_AGE_FACTOR", default=0.25, cast=float)
+# 1回の実行で同期するページ数の上限（0 は無制限）。期限を過ぎた順に取得する
+FACEBOOK_SYNC_BUDGET = config("FACEBOOK_SYNC_BUDGET", default=2000, cast=int)
+# 配信したページは処理が終わるまでこの時間は再配信しない
+FACEBOOK_SYNC_LEASE_MINUTES = config("FACEBOOK_SYNC_LEASE_MINUTES", default=120, cast=int)
+# スナップショットの保持日数（過ぎた分は企業・日付ごとの日次集計に集約して削除する。企業ごとの最新の1件は残す）
+FACEBOOK_SNAPSHOT_RETENTION_DAYS = config("FACEBOOK_SNAPSHOT_RETENTION_DAYS", default=90, cast=int)
+FACEBOOK_SNAPSHOT_ROLLUP_BATCH_SIZE = config("FACEBOOK_SNAPSHOT_ROLLUP_BATCH_SIZE", default=5000, cast=int)
+# 1回の実行で処理するバッチ数の上限（残りは次回に処理する）
+FACEBOOK_SNAPSHOT_ROLLUP_MAX_BATCHES = config("FACEBOOK_SNAPSHOT_ROLLUP_MAX_BATCHES", default=200, cast=int)
 
 # Corporate Number API (gBizINFO)
 CORPORATE_NUMBER_API_BASE_URL = config(
@@ -268,11 +298,93 @@ CORPORATE_NUMBER_API_MAX_RESULTS = config(
     default=5,
     cast=int,
 )
+# 検索結果の永続キャッシュ（正規化企業名 + 都道府県コード単位）
+# ヒットした結果は TTL_DAYS、404/0件の結果は NEGATIVE_CACHE_TTL_DAYS だけ保持する。0 で保存しない。
+CORPORATE_NUMBER_API_CACHE_ENABLED = config("CORPORATE_NUMBER_API_CACHE_ENABLED", default=True, cast=bool)
+CORPORATE_NUMBER_API_CACHE_TTL_DAYS = config("CORPORATE_NUMBER_API_CACHE_TTL_DAYS", default=30, cast=int)
+CORPORATE_NUMBER_API_NEGATIVE_CACHE_TTL_DAYS = config(
+    "CORPORATE_NUMBER_API_NEGATIVE_CACHE_TTL_DAYS",
+    default=3,
+    cast=int,
+)
+# import_corporate_numbers の呼び出し枠（DB上のトークンバケットで全プロセス・全ワーカー共通）
+# INTERVAL_SECONDS ごとに1回（BURST 回まで連続可）、1日 DAILY_LIMIT 回まで。
+CORPORATE_NUMBER_API_DAILY_LIMIT = config("CORPORATE_NUMBER_API_DAILY_LIMIT", default=5000, cast=int)
+CORPORATE_NUMBER_API_INTERVAL_SECONDS = config("CORPORATE_NUMBER_API_INTERVAL_SECONDS", default=2, cast=float)
+CORPORATE_NUMBER_API_BURST = config("CORPORATE_NUMBER_API_BURST", default=1, cast=int)
+# API呼び出しの並列数（1 = 逐次）
+CORPORATE_NUMBER_IMPORT_WORKERS = config("CORPORATE_NUMBER_IMPORT_WORKERS", default=1, cast=int)
+# 照合元（api / registry / auto）。auto は法人番号全件データ（load_corporate_number_registry）で
+# 一意に特定できない企業のみAPIを呼び出す。
+CORPORATE_NUMBER_IMPORT_SOURCE = config("CORPORATE_NUMBER_IMPORT_SOURCE", default="auto")
+# 企業名の照合の閾値（0.0〜1.0。法人格の表記ゆれを除いて一致すれば 1.0）。未満の候補は投入しない
+CORPORATE_NUMBER_MATCH_MIN_CONFIDENCE = config("CORPORATE_NUMBER_MATCH_MIN_CONFIDENCE", default=0.85, cast=float)
+# 外部APIのサーキットブレーカー（Facebook / 法人番号API / PowerPlexy / オープンデータ配信元。状態はキャッシュで共有）
+# 接続エラー・429・5xx が FAILURE_WINDOW_SECONDS 内に FAILURE_THRESHOLD 回続くと RESET_SECONDS 呼び出しを止める
+# （続けて開くたびに倍、MAX_RESET_SECONDS まで）。Retry-After が返された場合はその秒数止める。
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = config("CIRCUIT_BREAKER_FAILURE_THRESHOLD", default=5, cast=int)
+CIRCUIT_BREAKER_FAILURE_WINDOW_SECONDS = config("CIRCUIT_BREAKER_FAILURE_WINDOW_SECONDS", default=60, cast=int)
+CIRCUIT_BREAKER_RESET_SECONDS = config("CIRCUIT_BREAKER_RESET_SECONDS", default=30, cast=int)
+CIRCUIT_BREAKER_MAX_RESET_SECONDS = config("CIRCUIT_BREAKER_MAX_RESET_SECONDS", default=600, cast=int)
+# 外部APIの HTTP セッション（プロセス・プロバイダ単位で keep-alive 接続を再利用する）
+# POOL_MAXSIZE は並列に呼び出すスレッド数以上にする。再試行は接続エラーと GET の読み取りエラーのみ
+HTTP_POOL_MAXSIZE = config("HTTP_POOL_MAXSIZE", default=10, cast=int)
+HTTP_CONNECT_TIMEOUT = config("HTTP_CONNECT_TIMEOUT", default=3.05, cast=float)
+HTTP_READ_TIMEOUT = config("HTTP_READ_TIMEOUT", default=30, cast=float)
+HTTP_RETRY_TOTAL = config("HTTP_RETRY_TOTAL", default=2, cast=int)
+HTTP_RETRY_BACKOFF_FACTOR = config("HTTP_RETRY_BACKOFF_FACTOR", default=0.3, cast=float)
+HTTP_SESSION_PROVIDER_OPTIONS = {
+    "corporate-number": {"pool_maxsize": max(CORPORATE_NUMBER_IMPORT_WORKERS, HTTP_POOL_MAXSIZE)},
+    # Slack Webhook は送信タスクから1本ずつ送るため小さなプールで足りる
+    "slack": {"pool_maxsize": 4},
+}
+# 自治体オープンデータの取込（ダウンロードは一時ファイルにチャンク単位で書き出し、行を逐次処理する）
+OPENDATA_DOWNLOAD_CHUNK_SIZE = config("OPENDATA_DOWNLOAD_CHUNK_SIZE", default=1024 * 1024, cast=int)
+# DataCollectionRun に進捗（処理行数など）を書き込む行数の間隔
+OPENDATA_PROGRESS_EVERY_ROWS = config("OPENDATA_PROGRESS_EVERY_ROWS", default=5000, cast=int)
+# 企業の照合（法人番号・企業名の IN 検索）をまとめて行う行数
+OPENDATA_MATCH_CHUNK_SIZE = config("OPENDATA_MATCH_CHUNK_SIZE", default=500, cast=int)
+# 複数ソースの取込をソースごとの Celery サブタスクに分ける（最後に終わったサブタスクが集計）。同時に処理するソース数の上限
+OPENDATA_INGESTION_PARALLEL = config("OPENDATA_INGESTION_PARALLEL", default=True, cast=bool)
+OPENDATA_INGESTION_CONCURRENCY = config("OPENDATA_INGESTION_CONCURRENCY", default=2, cast=int)
 
 # AI Enrichment
 # スケジュール実行のオン/オフ（false で深夜のAI補完を停止）
 AI_ENRICHMENT_ENABLED = config("AI_ENRICHMENT_ENABLED", default=True, cast=bool)
 
+# 1回のAPIリクエストにまとめて補完する企業数（1 = 企業ごとに1リクエスト）
+AI_ENRICH_PROMPT_BATCH_SIZE = config("AI_ENRICH_PROMPT_BATCH_SIZE", default=1, cast=int)
+
+# 単一企業プロンプトの形式（compact: 要求フィールドの指示のみ / full: 従来の全文）
+AI_ENRICH_PROMPT_MODE = config("AI_ENRICH_PROMPT_MODE", default="compact")
+# compact 形式の推定入力トークン数の上限（超える場合は検索キーワード例・フィールド説明などを省く）。0 で無制限
+AI_ENRICH_PROMPT_MAX_TOKENS = config("AI_ENRICH_PROMPT_MAX_TOKENS", default=1000, cast=int)
+
+# モデルの振り分け（上から順に評価し、最初に条件を満たしたルールのモデルを使う。キーは ai_enrichment/model_routing.py を参照）
+# 環境変数 AI_ENRICH_MODEL_ROUTES に JSON の配列を指定すると置き換えられる
+AI_ENRICH_MODEL_ROUTING_ENABLED = config("AI_ENRICH_MODEL_ROUTING_ENABLED", default=True, cast=bool)
+AI_ENRICH_MODEL_ROUTES = json.loads(config("AI_ENRICH_MODEL_ROUTES", default="null")) or [
+    # 構造化しやすい項目が少数だけ不足している企業は安価なモデルで問い合わせる
+    {
+        "name": "cheap_fields",
+        "model": "sonar",
+        "fields": ["prefecture", "city", "established_year", "capital", "employee_count", "industry"],
+        "max_missing_fields": 2,
+        "skip_if_failed": True,
+        "escalate_to": POWERPLEXY_MODEL,
+    },
+    # 今月の残り予算が少ない場合は安価なモデルのみ
+    {"name": "low_budget", "model": "sonar", "max_remaining_budget_ratio": 0.1},
+]
+# 安価なモデルの回答の信頼度（confidence.py）がこれ未満なら上位モデルで問い合わせ直す
+AI_ENRICH_ESCALATION_CONFIDENCE = config("AI_ENRICH_ESCALATION_CONFIDENCE", default=0.6, cast=float)
+
+# AI補完の途中経過を run の metadata に保存する間隔（企業数）。Rate Limit で retry された場合はここから再開する
+AI_ENRICH_CHECKPOINT_INTERVAL = config("AI_ENRICH_CHECKPOINT_INTERVAL", default=5, cast=int)
+
+# AI補完の企業ごとの結果（AIEnrichmentResult）をまとめて書き込む件数
+AI_ENRICH_RESULT_BATCH_SIZE = config("AI_ENRICH_RESULT_BATCH_SIZE", default=100, cast=int)
+
 # AI補完の自動反映（レビューを通さずに反映する確信度の閾値）
 # 0 の場合は無効（常にレビューへ）。75 以上で Company へ即反映。
 AI_AUTO_MERGE_CONFIDENCE_THRESHOLD = config(
@@ -312,6 +424,18 @@ def get_ai_enrichment_cooldown_for_company(company) -> int:
 
 # Slack Notifications
 SLACK_WEBHOOK_URL = config("SLACK_WEBHOOK_URL", default="")
+# 通知は送信キュー（SlackNotificationOutbox）に登録し、低優先度タスクでまとめて送る。false でその場で送信
+SLACK_NOTIFY_ASYNC = config("SLACK_NOTIFY_ASYNC", default=True, cast=bool)
+# webhook: Slack に送信 / local: 送信せずメモリに保持（テスト・ローカル確認用）
+SLACK_NOTIFICATION_SINK = config("SLACK_NOTIFICATION_SINK", default="webhook")
+# 同じチャンネルの通知を1メッセージにまとめる時間枠（秒）。送信タスクはこの秒数だけ遅らせて実行する
+SLACK_NOTIFY_COALESCE_SECONDS = config("SLACK_NOTIFY_COALESCE_SECONDS", default=30, cast=int)
+SLACK_NOTIFY_QUEUE = config("SLACK_NOTIFY_QUEUE", default=CELERY_TASK_DEFAULT_QUEUE)
+SLACK_NOTIFY_PRIORITY = config("SLACK_NOTIFY_PRIORITY", default=9, cast=int)
+SLACK_NOTIFY_MAX_ATTEMPTS = config("SLACK_NOTIFY_MAX_ATTEMPTS", default=5, cast=int)
+SLACK_NOTIFY_RETENTION_DAYS = config("SLACK_NOTIFY_RETENTION_DAYS", default=7, cast=int)
+SLACK_WEBHOOK_CONNECT_TIMEOUT = config("SLACK_WEBHOOK_CONNECT_TIMEOUT", default=3, cast=float)
+SLACK_WEBHOOK_READ_TIMEOUT = config("SLACK_WEBHOOK_READ_TIMEOUT", default=10, cast=float)
 
 # CORS / CSRF
 DEFAULT_CORS_ORIGINS = (
@@ -363,6 +487,8 @@ else:
 
 # Snapshot retention
 SNAPSHOT_RETENTION_DAYS = config("SNAPSHOT_RETENTION_DAYS", default=7, cast=int)
+# 案件スナップショットはこの件数ごとに全件（キーフレーム）を保存し、その間は差分のみ保存する
+PROJECT_SNAPSHOT_KEYFRAME_INTERVAL = config("PROJECT_SNAPSHOT_KEYFRAME_INTERVAL", default=20, cast=int)
 
 # Logging
 configured_log_dir = config("PROJECT_LOG_DIR", default="")
@@ -31,12 +31,22 @@ ENABLE_REVIEW_SAMPLE_API = True
 
 # 開発環境でも本番同様に深夜帯に1回実行
 CELERY_BEAT_SCHEDULE = {
+    # 次回同期時刻を過ぎたページだけを取得するため、Facebook は毎時実行する
     "sync-facebook-activity": {
         "task": "companies.tasks.dispatch_facebook_sync",
-        "schedule": crontab(hour=2, minute=0),
+        "schedule": crontab(minute=0),
     },
     "run-ai-enrich": {
         "task": "ai_enrichment.tasks.run_ai_enrich_scheduled",
         "schedule": crontab(hour=3, minute=0),
     },
+    "rollup-facebook-snapshots": {
+        "task": "companies.tasks.rollup_facebook_snapshots_task",
+        "schedule": crontab(hour=4, minute=30),
+    },
+    # 送信予約に失敗した Slack 通知の取りこぼし防止
+    "dispatch-slack-notifications": {
+        "task": "ai_enrichment.tasks.dispatch_slack_notifications",
+        "schedule": crontab(minute="*/5"),
+    },
 }